@@ -0,0 +1,67 @@
+
+import argparse
+import tempfile
+import time
+from typing import Tuple
+from pathlib import Path
+
+import sys
+
+sys.path.append(Path(__file__).parent.parent.as_posix()+"/src") # Add src directory to python path so we can access src modules
+
+from repoManager.DirectoryIterator import DirectoryIterator
+from repoManager.DirectoryListingCache import DirectoryListingCache
+
+
+def create_synthetic_repo(repoPath: Path, dates: int, promptsPerDate: int):
+    """
+    Makes a repo of empty date and time prompt directories. Images aren't needed since the iterator only walks directories.
+    """
+    for day in range(dates):
+        date = f'{2000 + day // 365:04d}-{(day % 365) // 28 + 1:02d}-{day % 28 + 1:02d}'
+        for prompt in range(promptsPerDate):
+            (repoPath/date/f'{prompt:02d}:00:00.000000_prompt {day} {prompt}').mkdir(parents=True, exist_ok=True)
+
+
+def time_full_iteration(repoPath: Path, listingCache: DirectoryListingCache = None) -> Tuple[float, int]:
+    start = time.perf_counter()
+    count = sum(1 for _ in DirectoryIterator(pathToDirectories=repoPath, listingCache=listingCache))
+    elapsed = time.perf_counter() - start
+    return elapsed, count
+
+
+def main() -> None:
+    """
+    Compares walking a whole repo with a DirectoryIterator without a listing cache, with a cold cache and with a warm cache.
+
+    Run with `python3 benchmarks/bench_DirectoryIterator.py`.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark cold vs warm DirectoryIterator walks")
+    parser.add_argument("--dates", type=int, default=1000, help="number of date directories")
+    parser.add_argument("--prompts", type=int, default=5, help="number of prompt directories per date")
+    parser.add_argument("--rounds", type=int, default=5, help="number of warm walks to average")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tempDir:
+        repoPath = Path(tempDir)/"benchRepo"
+        create_synthetic_repo(repoPath, args.dates, args.prompts)
+
+        uncached, count = time_full_iteration(repoPath)
+
+        listingCache = DirectoryListingCache()
+        cold, _ = time_full_iteration(repoPath, listingCache)
+        coldScans = listingCache.stats()['scans']
+
+        warmTimes = [time_full_iteration(repoPath, listingCache)[0] for _ in range(args.rounds)]
+        warm = sum(warmTimes) / len(warmTimes)
+        warmScans = listingCache.stats()['scans'] - coldScans
+
+    print(f'{args.dates} dates x {args.prompts} prompts ({count} prompt directories)')
+    print(f'no cache   : {uncached * 1000:8.2f} ms')
+    print(f'cold cache : {cold * 1000:8.2f} ms ({coldScans} directory scans)')
+    print(f'warm cache : {warm * 1000:8.2f} ms ({warmScans} directory scans over {args.rounds} walks)')
+    print(f'speedup    : {cold / warm:8.2f}x')
+
+
+if __name__ == "__main__":
+    main()
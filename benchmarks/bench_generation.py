@@ -0,0 +1,226 @@
+
+import argparse
+import json
+import math
+import os
+import platform
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import sys
+
+sys.path.append(Path(__file__).parent.parent.as_posix()+"/src") # Add src directory to python path so we can access src modules
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+
+from imageProviders.DalleProvider import DalleProvider
+from imageProviders.ImageProvider import ImageProvider, ImageProviderResult, ProviderErrorKind
+from imageProviders.LocalBenchmarkProvider import LocalBenchmarkProvider, OpenAiStandIn
+from imageProviders.ResilientProvider import ResilientProvider
+from repoManager.RepoManager import RepoManager
+from ui.GenerationQueue import GenerationQueue
+from ui.widgets.home.ImageViewer import ImageViewer
+
+
+REPO = "benchRepo"
+
+STAGES = ["queueWait", "provider", "render", "save", "endToEnd"]
+
+PERCENTILES = [50, 95, 99]
+
+
+class TimingProvider(ImageProvider):
+    """
+    Records when the wrapped provider started and finished every prompt.
+    """
+    def __init__(self, provider: ImageProvider):
+        super().__init__()
+        self.provider = provider
+        self.lock = threading.Lock()
+        self.started: Dict[str, float] = {}
+        self.finished: Dict[str, float] = {}
+
+    def engine_name(self) -> str:
+        return self.provider.engine_name()
+
+    def get_image_from_string(self, prompt, timeout: float = None) -> ImageProviderResult:
+        start = time.perf_counter()
+        result = self.provider.get_image_from_string(prompt, timeout=timeout)
+        with self.lock:
+            self.started[prompt] = start
+            self.finished[prompt] = time.perf_counter()
+        return result
+
+
+def percentile(values: List[float], p: float) -> float:
+    """
+    Nearest rank percentile, 0 for no values.
+    """
+    if len(values) == 0:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def make_provider(args, standIn: OpenAiStandIn) -> ImageProvider:
+    if standIn is not None:
+        provider = DalleProvider(key="benchmark", maxRetries=0, baseUrl=standIn.base_url())
+    else:
+        provider = make_local_provider(args)
+    if args.resilient:
+        provider = ResilientProvider(provider, requestsPerMinute=args.requests_per_minute, burst=max(1, int(args.requests_per_minute)), baseBackoffSeconds=args.latency)
+    return provider
+
+
+def make_local_provider(args) -> LocalBenchmarkProvider:
+    return LocalBenchmarkProvider(
+        latencySeconds=args.latency,
+        latencySigma=args.latency_sigma,
+        imageSize=(args.image_size, args.image_size),
+        failureRate=args.failure_rate,
+        failureKinds={ProviderErrorKind.RATE_LIMITED: 1.0, ProviderErrorKind.SERVER: 1.0},
+        seed=args.seed
+    )
+
+
+def run(app: QApplication, args, concurrency: int, reposPath: Path) -> dict:
+    """
+    Submits every prompt at once to a GenerationQueue and follows each one through generation, rendering on the home page
+    image viewer and saving to the repo.
+    """
+    standIn = OpenAiStandIn(make_local_provider(args)).start() if args.stand_in else None
+    provider = TimingProvider(make_provider(args, standIn))
+    repoManager = RepoManager(reposPath, REPO)
+    queue = GenerationQueue(provider, repoManager, maxConcurrent=concurrency)
+    viewer = ImageViewer()
+    viewer.show()
+
+    prompts = [f'benchmark prompt {i}' for i in range(args.prompts)]
+    submitted: Dict[int, float] = {}
+    generated: Dict[int, float] = {}
+    saved: Dict[int, float] = {}
+    renders: List[float] = []
+    failed = set()
+    done = set()
+    promptOf: Dict[int, str] = {}
+
+    def on_generated(jobId: int, prompt: str, response: ImageProviderResult):
+        generated[jobId] = time.perf_counter()
+        if response['errorMessage'] is not None:
+            failed.add(jobId)
+            done.add(jobId)
+            return
+        renderStart = time.perf_counter()
+        viewer.replace_image(response['img'])
+        viewer.viewport().repaint()
+        renders.append(time.perf_counter() - renderStart)
+
+    def on_saved(jobId: int, future):
+        done.add(jobId)
+        if future.exception() is not None:
+            failed.add(jobId)
+            return
+        saved[jobId] = time.perf_counter()
+
+    queue.generatedSignal.connect(on_generated)
+    queue.savedSignal.connect(on_saved)
+
+    start = time.perf_counter()
+    for prompt in prompts:
+        submitTime = time.perf_counter()
+        jobId = queue.submit(prompt)
+        submitted[jobId] = submitTime
+        promptOf[jobId] = prompt
+    while len(done) < len(prompts):
+        app.processEvents()
+        time.sleep(0.001)
+    wallSeconds = time.perf_counter() - start
+
+    queue.close()
+    repoManager.close()
+    viewer.close()
+    if standIn is not None:
+        standIn.stop()
+
+    stages = {
+        "queueWait": [provider.started[promptOf[jobId]] - submitted[jobId] for jobId in submitted],
+        "provider": [provider.finished[promptOf[jobId]] - provider.started[promptOf[jobId]] for jobId in submitted],
+        "render": renders,
+        "save": [saved[jobId] - generated[jobId] for jobId in saved],
+        "endToEnd": [saved[jobId] - submitted[jobId] for jobId in saved],
+    }
+    return {
+        "concurrency": concurrency,
+        "prompts": len(prompts),
+        "saved": len(saved),
+        "failed": len(failed),
+        "wallSeconds": wallSeconds,
+        "imagesPerSecond": len(saved) / wallSeconds,
+        "stages": {
+            stage: {f'p{p}': percentile(values, p) for p in PERCENTILES} | {"count": len(values)}
+            for stage, values in stages.items()
+        },
+    }
+
+
+def main() -> None:
+    """
+    Drives prompts through the whole generation path, provider -> save -> render, using the LocalBenchmarkProvider so no
+    network or paid API is involved. Every prompt is submitted at once to a GenerationQueue, like a party's worth of guests
+    queueing up, and the run reports throughput along with p50/p95/p99 latencies of each stage:
+
+    - queueWait: submitted until the provider started on it
+    - provider: time spent in the provider (including retries when --resilient)
+    - render: drawing the image in the home page image viewer
+    - save: generated until saved to the repo
+    - endToEnd: submitted until saved
+
+    With --stand-in the images go through DalleProvider and the openai client talking to a local OpenAI stand in over HTTP.
+
+    Run with `python3 benchmarks/bench_generation.py --prompts 50 --concurrency 1 2 4 --latency 0.5 --latency-sigma 0.3`.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark image generation from prompt to saved and rendered image")
+    parser.add_argument("--prompts", type=int, default=30, help="number of prompts submitted per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4], help="generation queue concurrency limits to compare")
+    parser.add_argument("--latency", type=float, default=0.5, help="median seconds the provider takes per image")
+    parser.add_argument("--latency-sigma", type=float, default=0.3, help="spread of the log normal provider latency, 0 for fixed")
+    parser.add_argument("--image-size", type=int, default=1024, help="width and height of the generated images")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="chance of the provider failing an image")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the provider's latency and failure draws")
+    parser.add_argument("--stand-in", action="store_true", help="go through DalleProvider and a local OpenAI stand in over HTTP")
+    parser.add_argument("--resilient", action="store_true", help="wrap the provider in a ResilientProvider")
+    parser.add_argument("--requests-per-minute", type=float, default=600, help="rate limit of the ResilientProvider")
+    parser.add_argument("--dir", type=str, default=None, help="directory to make the repos in, defaults to a temp directory")
+    parser.add_argument("--output", type=str, default=None, help="file to write the JSON results to")
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    results = []
+    for concurrency in args.concurrency:
+        with tempfile.TemporaryDirectory(dir=args.dir) as tempDir:
+            result = run(app, args, concurrency, Path(tempDir))
+        results.append(result)
+        stages = result["stages"]
+        print(
+            f'concurrency {concurrency:>2}: {result["imagesPerSecond"]:6.2f} images/s, {result["failed"]} failed, '
+            + ", ".join(f'{stage} p50/p95/p99 {stages[stage]["p50"] * 1000:.0f}/{stages[stage]["p95"] * 1000:.0f}/{stages[stage]["p99"] * 1000:.0f} ms' for stage in STAGES)
+        )
+
+    if args.output is not None:
+        Path(args.output).write_text(json.dumps({
+            "benchmark": "generation",
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "arguments": vars(args),
+            "results": results,
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
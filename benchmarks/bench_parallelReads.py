@@ -0,0 +1,83 @@
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import sys
+
+sys.path.append(Path(__file__).parent.parent.as_posix()+"/src") # Add src directory to python path so we can access src modules
+
+from repoManager.RepoManager import DEFAULT_READ_WORKERS, RepoManager
+
+
+def create_synthetic_repo(repoPath: Path, prompts: int, imageBytes: int):
+    """
+    Makes a single date of time prompt directories each holding one image worth of random bytes.
+    """
+    date = "2024-01-14"
+    for prompt in range(prompts):
+        promptPath = repoPath/date/f'{prompt // 3600:02d}:{(prompt // 60) % 60:02d}:{prompt % 60:02d}.000000_prompt {prompt}'
+        promptPath.mkdir(parents=True, exist_ok=True)
+        (promptPath/"1.png").write_bytes(os.urandom(imageBytes))
+
+
+def drop_page_cache():
+    """
+    Best effort at making reads hit storage again. Needs root on linux, otherwise reads are served from memory.
+    """
+    try:
+        os.sync()
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3")
+        return True
+    except OSError:
+        return False
+
+
+def time_page(repoManager: RepoManager, pageSize: int, rounds: int, dropCaches: bool) -> float:
+    times = []
+    for _ in range(rounds):
+        if dropCaches:
+            drop_page_cache()
+        start = time.perf_counter()
+        result = repoManager.get_images(pageSize, eager=True)
+        times.append(time.perf_counter() - start)
+        assert len(result.results) == pageSize and result.errorMessage is None
+    return sorted(times)[len(times) // 2]
+
+
+def main() -> None:
+    """
+    Compares reading gallery pages of 10 to 50 prompts one file at a time against reading them on the RepoManager read pool.
+    Page caching is turned off so every round reads from storage. Run as root (or point --dir at an SD card) for cold reads.
+
+    Run with `python3 benchmarks/bench_parallelReads.py`.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark sequential vs parallel gallery page reads")
+    parser.add_argument("--dir", type=str, default=None, help="directory to make the synthetic repo in, defaults to a temp directory")
+    parser.add_argument("--image-kb", type=int, default=1024, help="size of each image in KiB")
+    parser.add_argument("--workers", type=int, default=DEFAULT_READ_WORKERS, help="read pool size to compare against")
+    parser.add_argument("--rounds", type=int, default=5, help="rounds per page size, the median is reported")
+    args = parser.parse_args()
+
+    pageSizes = [10, 20, 30, 40, 50]
+    with tempfile.TemporaryDirectory(dir=args.dir) as tempDir:
+        reposPath = Path(tempDir)
+        create_synthetic_repo(reposPath/"benchRepo", max(pageSizes), args.image_kb * 1024)
+
+        dropCaches = drop_page_cache()
+        sequential = RepoManager(reposPath, "benchRepo", pageCacheBytes=0, readWorkers=1)
+        parallel = RepoManager(reposPath, "benchRepo", pageCacheBytes=0, readWorkers=args.workers)
+
+        print(f'{args.image_kb} KiB images, {args.workers} workers, {"cold" if dropCaches else "warm (can not drop caches)"} reads')
+        print(f'{"prompts":>8} {"sequential":>12} {"parallel":>12} {"speedup":>8}')
+        for pageSize in pageSizes:
+            sequentialTime = time_page(sequential, pageSize, args.rounds, dropCaches)
+            parallelTime = time_page(parallel, pageSize, args.rounds, dropCaches)
+            print(f'{pageSize:>8} {sequentialTime * 1000:>9.2f} ms {parallelTime * 1000:>9.2f} ms {sequentialTime / parallelTime:>7.2f}x')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import sys
+
+sys.path.append(Path(__file__).parent.parent.as_posix()+"/src") # Add src directory to python path so we can access src modules
+
+from repoManager.RepoIndex import RepoIndex
+from utils.enums import DIRECTION
+
+WORDS = [
+    "shrek", "donkey", "fiona", "farquaad", "puss", "dragon", "castle", "swamp", "onion", "waffle",
+    "eat", "chips", "sunset", "portrait", "painting", "oil", "watercolor", "neon", "city", "forest",
+    "mountain", "ocean", "robot", "cat", "dog", "astronaut", "horse", "moon", "space", "cyberpunk",
+]
+
+
+def create_synthetic_repo(repoPath: Path, prompts: int, promptsPerDate: int, seed: int = 0):
+    """
+    Makes a repo of empty time prompt directories with prompts of random words. Images aren't needed to build the index.
+    """
+    rng = random.Random(seed)
+    for prompt in range(prompts):
+        day = prompt // promptsPerDate
+        date = f'{2000 + day // 336:04d}-{(day % 336) // 28 + 1:02d}-{day % 28 + 1:02d}'
+        words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 8)))
+        (repoPath/date/f'{prompt % promptsPerDate:06d}.000000_{words} {prompt}').mkdir(parents=True, exist_ok=True)
+
+
+def time_search(repoIndex: RepoIndex, query: str, pageSize: int, rounds: int) -> float:
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in zip(range(pageSize), repoIndex.iterate_search("benchRepo", query, direction=DIRECTION.FORWARD, batchSize=pageSize + 1)):
+            pass
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2]
+
+
+def main() -> None:
+    """
+    Times getting the first page of prompt searches from a RepoIndex over a synthetic repo of 100k prompts.
+
+    Run with `python3 benchmarks/bench_search.py`.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark prompt search over the repo index")
+    parser.add_argument("--prompts", type=int, default=100_000, help="number of prompt directories")
+    parser.add_argument("--prompts-per-date", type=int, default=50, help="number of prompt directories per date")
+    parser.add_argument("--page", type=int, default=10, help="page size")
+    parser.add_argument("--rounds", type=int, default=9, help="rounds per query, the median is reported")
+    args = parser.parse_args()
+
+    queries = ["shrek", "cat", "dragon castle", "neon city robot", "wat", "onion waffle swamp sunset", "nothingmatches"]
+    with tempfile.TemporaryDirectory() as tempDir:
+        repoPath = Path(tempDir)/"benchRepo"
+        create_synthetic_repo(repoPath, args.prompts, args.prompts_per_date)
+
+        repoIndex = RepoIndex(Path(tempDir)/"index.sqlite")
+        start = time.perf_counter()
+        repoIndex.ensure_fresh("benchRepo", repoPath)
+        print(f'{args.prompts} prompts indexed in {time.perf_counter() - start:.2f} s')
+
+        print(f'{"query":>28} {"first page":>12}')
+        for query in queries:
+            print(f'{query:>28} {time_search(repoIndex, query, args.page, args.rounds) * 1000:>9.2f} ms')
+
+
+if __name__ == "__main__":
+    main()
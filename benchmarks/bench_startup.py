@@ -0,0 +1,195 @@
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import sys
+
+# Taken before anything else is imported so the child's import time covers the whole app
+PROCESS_START = time.perf_counter()
+
+SRC_PATH = Path(__file__).parent.parent.as_posix()+"/src"
+sys.path.append(SRC_PATH) # Add src directory to python path so we can access src modules
+
+TEST_IMAGE = Path(__file__).parent.parent/"testResources"/"images"/"ai"/"test1.png"
+
+REPO = "benchRepo"
+
+METRICS = ["importSeconds", "containerBuildSeconds", "firstPaintSeconds", "timeToFirstPaintSeconds", "firstGalleryPageSeconds", "snapshotVerifiedSeconds", "processSeconds"]
+
+
+def create_synthetic_repo(repoPath: Path, prompts: int, promptsPerDate: int):
+    """
+    Makes a repo of time prompt directories each holding one real image. Every image is a hard link to the same file so even
+    big repos take next to no disk space.
+    """
+    for prompt in range(prompts):
+        day = prompt // promptsPerDate
+        date = f'{2000 + day // 336:04d}-{(day % 336) // 28 + 1:02d}-{day % 28 + 1:02d}'
+        promptPath = repoPath/date/f'{prompt % promptsPerDate:06d}.000000_prompt {prompt}'
+        promptPath.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(TEST_IMAGE, promptPath/"1.png")
+        except OSError:
+            shutil.copyfile(TEST_IMAGE, promptPath/"1.png")
+
+
+def measure_startup(reposPath: str) -> dict:
+    """
+    Starts the app the way main() does, minus the event loop, and times every phase up to a usable window.
+    Runs in its own process so imports are cold.
+    """
+    importStart = time.perf_counter()
+    from dependency_injector import providers
+    from PyQt5.QtCore import QEvent, QObject
+    from depdencyInjection.Container import Container
+    from imageProviders.ImageProvider import ImageProvider
+    from utils.pageUtils import PageName
+    importEnd = time.perf_counter()
+
+    imageBytes = TEST_IMAGE.read_bytes()
+    class StubImageProvider(ImageProvider):
+        def engine_name(self):
+            return REPO
+
+        def get_image_from_string(self, prompt):
+            return {'img': imageBytes, 'errorMessage': None}
+
+    buildStart = time.perf_counter()
+    container = Container()
+    container.config.repos.imageReposPath.from_value(reposPath)
+    container.config.repos.startingRepo.from_value(REPO)
+    container.imageProvider.override(providers.Object(StubImageProvider()))
+    orchestrator = container.uiOrchestrator()
+    buildEnd = time.perf_counter()
+
+    class PaintWatcher(QObject):
+        def __init__(self):
+            super().__init__()
+            self.paintedAt = None
+
+        def eventFilter(self, watched, event):
+            if event.type() == QEvent.Paint and self.paintedAt is None:
+                self.paintedAt = time.perf_counter()
+            return False
+
+    paintWatcher = PaintWatcher()
+    orchestrator.app.installEventFilter(paintWatcher)
+    showStart = time.perf_counter()
+    orchestrator.mainWindow.show()
+    verifyFuture = orchestrator.verify_startup_snapshot()
+    while paintWatcher.paintedAt is None and time.perf_counter() - showStart < 10:
+        orchestrator.app.processEvents()
+    if paintWatcher.paintedAt is None:
+        orchestrator.mainWindow.repaint()
+        paintWatcher.paintedAt = time.perf_counter()
+    orchestrator.app.removeEventFilter(paintWatcher)
+
+    galleryStart = time.perf_counter()
+    orchestrator.mainWindow.route_to_page(PageName.GALLERY)
+    # Built on the route, its page is read in the background unless it came from the startup snapshot
+    galleryPage = orchestrator.galleryPage
+    while galleryPage.shownPageRequest != galleryPage.pageRequest and time.perf_counter() - galleryStart < 10:
+        orchestrator.app.processEvents()
+    galleryEnd = time.perf_counter()
+    galleryEntries = galleryPage.gallery.contentWidget.layout().count()
+
+    verifyFuture.result()
+    verifiedEnd = time.perf_counter()
+    # Waits for the snapshot written after verification so the next warm start can use it
+    container.repoManager().close()
+
+    return {
+        "importSeconds": importEnd - importStart,
+        "containerBuildSeconds": buildEnd - buildStart,
+        "firstPaintSeconds": paintWatcher.paintedAt - showStart,
+        "timeToFirstPaintSeconds": paintWatcher.paintedAt - PROCESS_START,
+        "firstGalleryPageSeconds": galleryEnd - galleryStart,
+        "snapshotVerifiedSeconds": verifiedEnd - showStart,
+        "galleryEntries": galleryEntries,
+    }
+
+
+def run_child(reposPath: Path) -> dict:
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, __file__, "--child", reposPath.as_posix()], env=env, capture_output=True, text=True, check=True
+    )
+    run = json.loads(completed.stdout.strip().splitlines()[-1])
+    run["processSeconds"] = time.perf_counter() - start
+    return run
+
+
+def median(values: list) -> float:
+    return sorted(values)[len(values) // 2]
+
+
+def main() -> None:
+    """
+    Times how long the app takes to show a usable window against synthetic repos of different sizes. Every run starts the
+    full Container/UIOrchestrator stack in a fresh offscreen process with a stub image provider and records import time,
+    container build, first paint, the first gallery page and when the startup snapshot was verified.
+
+    "cold" runs start without an index or startup snapshot (like right after copying a repo over), "warm" runs start with
+    both left behind by the run before. Results are written as JSON so they can be compared between commits.
+
+    Run with `python3 benchmarks/bench_startup.py --sizes 0 1000 10000 --output startup.json`.
+    """
+    if len(sys.argv) == 3 and sys.argv[1] == "--child":
+        print(json.dumps(measure_startup(sys.argv[2])))
+        return
+
+    parser = argparse.ArgumentParser(description="Benchmark app startup and time to first frame")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 1000, 10000], help="number of prompt directories of each synthetic repo")
+    parser.add_argument("--prompts-per-date", type=int, default=20, help="number of prompt directories per date")
+    parser.add_argument("--runs", type=int, default=5, help="runs per size and state, the median is reported")
+    parser.add_argument("--dir", type=str, default=None, help="directory to make the synthetic repos in, defaults to a temp directory")
+    parser.add_argument("--output", type=str, default=None, help="file to write the JSON results to, defaults to stdout")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory(dir=args.dir) as tempDir:
+            reposPath = Path(tempDir)
+            create_synthetic_repo(reposPath/REPO, size, args.prompts_per_date)
+            for state in ["cold", "warm"]:
+                runs = []
+                if state == "warm":
+                    # Leaves an index and startup snapshot behind for the runs that follow
+                    run_child(reposPath)
+                for _ in range(args.runs):
+                    if state == "cold":
+                        shutil.rmtree(reposPath/".index", ignore_errors=True)
+                    runs.append(run_child(reposPath))
+                summary = {metric: median([run[metric] for run in runs]) for metric in METRICS}
+                results.append({"prompts": size, "state": state, "median": summary, "runs": runs})
+                print(
+                    f'{size:>8} prompts {state:>4}: first paint {summary["timeToFirstPaintSeconds"] * 1000:7.1f} ms '
+                    f'(import {summary["importSeconds"] * 1000:6.1f}, build {summary["containerBuildSeconds"] * 1000:6.1f}), '
+                    f'gallery {summary["firstGalleryPageSeconds"] * 1000:6.1f} ms, verified {summary["snapshotVerifiedSeconds"] * 1000:7.1f} ms',
+                    file=sys.stderr
+                )
+
+    report = json.dumps({
+        "benchmark": "startup",
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "runs": args.runs,
+        "results": results,
+    }, indent=2)
+    if args.output is not None:
+        Path(args.output).write_text(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
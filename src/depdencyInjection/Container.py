@@ -1,9 +1,15 @@
+from pathlib import Path
+
 from dependency_injector import containers, providers
+from imageProviders.CachingProvider import CachingProvider, prompt_cache_path
 from imageProviders.DalleProvider import DalleProvider
+from imageProviders.ResilientProvider import ResilientProvider
 from repoManager.RepoManager import RepoManager
+from repoManager.RepoWatcher import RepoWatcher
 from speechRecognition.GoogleSpeachRecognizer import GoogleSpeechRecognizer
 from ui.widgets.MainWindow import MainWindow
 from ui.QApplicationManager import QApplicationManager
+from ui.GenerationQueue import GenerationQueue
 from ui.UIOrchestrator import UIOrchestrator
 from ui.widgets.home.HomePage import HomePage
 from ui.widgets.gallery.GalleryPage import GalleryPage
@@ -17,16 +23,24 @@ class PagesDispatcher:
     pages: PageDictType
 
 
+def read_key(keyPath: Path) -> str:
+    with open(keyPath, "r") as keyFile:
+        return keyFile.read()
+
+
 class Container(containers.DeclarativeContainer):
 
     config = providers.Configuration()
 
-    dalleKeyFile = open(get_project_root()/".."/"dalle.key", "r")
-    dalleKey = dalleKeyFile.read()
-    imageProvider = providers.Singleton(
+    # Only read when the provider is first needed so importing the container (and tests overriding the provider) never need the key
+    dalleKey = providers.Callable(read_key, get_project_root()/".."/"dalle.key")
+    # Retries are left to the resilient provider so they share its rate limit, deadlines and circuit breaker
+    dalleProvider = providers.Singleton(
         DalleProvider,
-        key=dalleKey
+        key=dalleKey,
+        maxRetries=0
     )
+    resilientProvider = providers.Singleton(ResilientProvider, dalleProvider)
 
     qApplicationManager = providers.Singleton(
         QApplicationManager
@@ -42,11 +56,24 @@ class Container(containers.DeclarativeContainer):
         config.repos.startingRepo,
     )
 
-    home = providers.Singleton(HomePage, repoManager, imageProvider, speechRecognizer)
+    # Repeat prompts are served from the images already in the repo, only misses make it through to the paid API
+    imageProvider = providers.Singleton(
+        CachingProvider,
+        resilientProvider,
+        repoManager,
+        providers.Callable(prompt_cache_path, config.repos.imageReposPath)
+    )
+
+    repoWatcher = providers.Singleton(RepoWatcher, repoManager)
+
+    generationQueue = providers.Singleton(GenerationQueue, imageProvider, repoManager)
+
+    home = providers.Singleton(HomePage, repoManager, generationQueue, speechRecognizer)
     gallery = providers.Singleton(GalleryPage, repoManager)
 
-    homePageMeta = providers.Singleton(PageMetaDecorator, home, PageName.HOME, PageCaption.HOME, PageHint.HOME)
-    galleryPageMeta = providers.Singleton(PageMetaDecorator, gallery, PageName.GALLERY, PageCaption.GALLERY, PageHint.GALLERY)
+    # Pages are handed over as their providers so the MainWindow only builds them once they are routed to
+    homePageMeta = providers.Singleton(PageMetaDecorator, home.provider, PageName.HOME, PageCaption.HOME, PageHint.HOME)
+    galleryPageMeta = providers.Singleton(PageMetaDecorator, gallery.provider, PageName.GALLERY, PageCaption.GALLERY, PageHint.GALLERY)
 
     mainWindow = providers.Singleton(
         MainWindow,
@@ -58,6 +85,7 @@ class Container(containers.DeclarativeContainer):
         UIOrchestrator,
         qApplicationManager,
         home,
-        gallery,
-        mainWindow
+        mainWindow,
+        repoManager,
+        repoWatcher
     )
\ No newline at end of file
@@ -0,0 +1,329 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import Future, TimeoutError
+from pathlib import Path
+from typing import Callable, Dict, Set, Union
+
+from imageProviders.ImageProvider import ImageProvider, ImageProviderResult, ProviderErrorKind
+
+from utils.pathingUtils import INDEX_FOLDER, atomic_write_bytes, read_file_as_bytes
+
+
+# The index of the cache is kept next to the repo index, "${reposPath}/${INDEX_FOLDER}/${PROMPT_CACHE_FOLDER}"
+PROMPT_CACHE_FOLDER = "promptCache"
+
+PROMPT_CACHE_INDEX_FILE_NAME = "promptCache.json"
+
+# A kiosk sees the same prompts over a party or a weekend, not over months
+DEFAULT_MAX_AGE_SECONDS = 30 * 24 * 60 * 60
+
+# Entries only point at images in the repo so even a large index stays a few MB
+DEFAULT_MAX_ENTRIES = 10000
+
+# How long a call that joined one in flight waits for that image to be saved before handing it on unsaved. Saves take
+# milliseconds, this only runs out if the caller never saves (failed saves are told through image_save_failed).
+DEFAULT_SAVE_WAIT_SECONDS = 15.0
+
+# Bumped whenever normalization or the key layout changes so old entries are never matched
+CACHE_KEY_VERSION = 1
+
+
+def prompt_cache_path(reposPath: Union[str, Path]) -> Path:
+    return Path(reposPath)/INDEX_FOLDER/PROMPT_CACHE_FOLDER
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Makes prompts that only differ in case, spacing or a trailing full stop the same.
+    """
+    return " ".join(prompt.casefold().split()).rstrip(".")
+
+
+def cache_key(engine: str, prompt: str, parameters: dict) -> str:
+    keyData = json.dumps({"version": CACHE_KEY_VERSION, "engine": engine, "prompt": normalize_prompt(prompt), "parameters": parameters}, sort_keys=True)
+    return hashlib.sha256(keyData.encode("utf-8")).hexdigest()
+
+
+class CachingProvider(ImageProvider):
+    """
+    Serves prompts that were already generated from the repo instead of paying for another call to the wrapped provider.
+
+    Entries are keyed by the normalized prompt along with the engine and the generation parameters of the wrapped provider,
+    so changing the model or image size never serves an image made with the old ones. The cache doesn't keep images of
+    its own, each entry points at where the image was saved in the repo (repo, date, time, prompt and image number) and
+    the image is read back through the RepoManager. Entries are kept in a small JSON index written atomically.
+
+    Images are added once they are saved to the repo (see image_saved). Entries older then maxAgeSeconds are dropped, as
+    are entries whose image was deleted from the repo, and once there are more then maxEntries the least recently used
+    ones are dropped. A maxEntries of 0 turns the cache off.
+
+    Results served from the cache have 'cacheHit' set so the UI can say no new image was generated, along with the
+    existing repo entry as 'savedImage' so it isn't saved again.
+
+    Only one call per prompt goes to the wrapped provider at a time. The same prompt asked for again while it's being
+    generated waits for that image instead of paying for a second one, and then for it to be saved (see image_saved) so
+    it's served as a cache hit with the repo entry as 'savedImage' and never saved twice. If saving the image failed (see
+    image_save_failed) or it isn't saved within saveWaitSeconds it's handed on as a new image of its own.
+
+    When entries were last used is kept in memory and only written along with new entries or on close, so a hit never
+    writes to disk. The index is written outside of the lock so calls checking the cache never wait on the disk.
+
+    Attributes
+    ----------
+    provider (ImageProvider)
+        the provider asked on a cache miss
+
+    repoManager (RepoManager)
+        the repo manager the cached images are read back through
+
+    cachePath (Path)
+        directory holding the index of the cache
+
+    Methods
+    -------
+    get_image_from_string(prompt, timeout)
+        Gets the cached image of a prompt, or one from the wrapped provider
+
+    image_saved(prompt, savedImage)
+        Adds an image that was saved to the repo to the cache
+
+    image_save_failed(prompt)
+        Hands the image of a prompt on to the calls that joined it without waiting for it to be saved
+
+    clear()
+        Drops every entry
+
+    close()
+        Writes when entries were last used
+    """
+
+    # The repo manager isn't imported so importing the provider package never pulls in sqlite and PIL
+    def __init__(self, provider: ImageProvider, repoManager, cachePath: Union[str, Path], maxAgeSeconds: float = DEFAULT_MAX_AGE_SECONDS,
+            maxEntries: int = DEFAULT_MAX_ENTRIES, clock: Callable[[], float] = time.time, saveWaitSeconds: float = DEFAULT_SAVE_WAIT_SECONDS):
+        super().__init__(key=provider.key, keyname=provider.keyname)
+        self.provider = provider
+        self.repoManager = repoManager
+        self.cachePath = Path(cachePath)
+        self.maxAgeSeconds = maxAgeSeconds
+        self.maxEntries = maxEntries
+        self.clock = clock
+        self.saveWaitSeconds = saveWaitSeconds
+        self.lock = threading.Lock()
+        # Held while writing the index so writes happen one at a time, never taken while holding the lock
+        self.writeLock = threading.Lock()
+        # key -> {"prompt", "repo", "date", "time", "num", "createdAt", "lastUsed"}, read from disk on first use
+        self.entries: Union[Dict[str, dict], None] = None
+        # Whether lastUsed changed since the entries were last written
+        self.entriesDirty = False
+        # key -> result of the call to the wrapped provider in progress for it
+        self.inFlight: Dict[str, Future] = {}
+        # keys of the calls in progress that other calls joined
+        self.joined: Set[str] = set()
+        # key -> repo entry of an image generated for calls that joined it, resolved once the image is saved
+        self.pendingSaves: Dict[str, Future] = {}
+
+
+    def engine_name(self) -> str:
+        return self.provider.engine_name()
+
+
+    def generation_parameters(self) -> dict:
+        return self.provider.generation_parameters()
+
+
+    def warm_up(self):
+        self.provider.warm_up()
+
+
+    def close(self):
+        try:
+            self._write_entries(onlyIfDirty=True)
+        except Exception as e:
+            logging.error(f'Could not write prompt cache index : {traceback.format_exc()}')
+        self.provider.close()
+
+
+    def _load_entries(self) -> Dict[str, dict]:
+        if self.entries is None:
+            try:
+                self.entries = json.loads(read_file_as_bytes(self.cachePath/PROMPT_CACHE_INDEX_FILE_NAME))
+            except FileNotFoundError:
+                self.entries = {}
+            except Exception as e:
+                logging.error(f'Could not read prompt cache index, starting over : {traceback.format_exc()}')
+                self.entries = {}
+        return self.entries
+
+
+    def _write_entries(self, onlyIfDirty: bool = False):
+        # The entries are copied under the lock and written after, the write lock keeps the latest copy the one written last
+        with self.writeLock:
+            with self.lock:
+                if onlyIfDirty and not self.entriesDirty:
+                    return
+                data = json.dumps(self.entries if self.entries is not None else {}).encode("utf-8")
+                self.entriesDirty = False
+            os.makedirs(self.cachePath, exist_ok=True)
+            atomic_write_bytes(self.cachePath/PROMPT_CACHE_INDEX_FILE_NAME, data)
+
+
+    def _evict(self, now: float):
+        for key in [key for key, entry in self.entries.items() if now - entry["createdAt"] > self.maxAgeSeconds]:
+            del self.entries[key]
+        for key in sorted(self.entries, key=lambda key: self.entries[key]["lastUsed"])[:max(0, len(self.entries) - self.maxEntries)]:
+            del self.entries[key]
+
+
+    def _drop(self, key: str, entry: dict):
+        with self.lock:
+            # Only if it wasn't replaced by a newer save in the mean time
+            if self.entries.get(key) is not entry:
+                return
+            del self.entries[key]
+        self._write_entries()
+
+
+    def _get(self, key: str):
+        with self.lock:
+            entry = self._load_entries().get(key)
+            if entry is None:
+                return None
+            now = self.clock()
+            expired = now - entry["createdAt"] > self.maxAgeSeconds
+        if expired:
+            self._drop(key, entry)
+            return None
+
+        try:
+            savedImage = self.repoManager.get_saved_image(entry["repo"], entry["date"], entry["time"], entry["prompt"], entry["num"])
+        except OSError as e:
+            # Most likely trashed from the gallery since it was cached
+            logging.info(f'Cached image of prompt {entry["prompt"]} is no longer in the repo : {str(e)}')
+            self._drop(key, entry)
+            return None
+
+        with self.lock:
+            entry["lastUsed"] = now
+            self.entriesDirty = True
+        return savedImage
+
+
+    def image_saved(self, prompt, savedImage):
+        if self.maxEntries <= 0:
+            return
+        key = cache_key(self.engine_name(), prompt, self.generation_parameters())
+        with self.lock:
+            pendingSave = self.pendingSaves.pop(key, None)
+        if pendingSave is not None:
+            pendingSave.set_result(savedImage)
+        try:
+            with self.lock:
+                entries = self._load_entries()
+                now = self.clock()
+                entries[key] = {
+                    "prompt": savedImage.prompt, "repo": savedImage.repo, "date": savedImage.date, "time": savedImage.time,
+                    "num": savedImage.num, "createdAt": now, "lastUsed": now
+                }
+                self._evict(now)
+            self._write_entries()
+        except Exception as e:
+            logging.error(f'Could not cache image of prompt {prompt} : {traceback.format_exc()}')
+
+
+    def image_save_failed(self, prompt):
+        if self.maxEntries <= 0:
+            return
+        key = cache_key(self.engine_name(), prompt, self.generation_parameters())
+        with self.lock:
+            pendingSave = self.pendingSaves.pop(key, None)
+        if pendingSave is not None:
+            pendingSave.set_result(None)
+
+
+    def get_image_from_string(self, prompt, timeout: float = None) -> ImageProviderResult:
+        if self.maxEntries <= 0:
+            return self.provider.get_image_from_string(prompt, timeout=timeout)
+
+        key = cache_key(self.engine_name(), prompt, self.generation_parameters())
+        with self.lock:
+            inFlight = self.inFlight.get(key)
+            if inFlight is None:
+                self.inFlight[key] = Future()
+            else:
+                self.joined.add(key)
+        if inFlight is not None:
+            return self._wait_for(key, inFlight, prompt, timeout)
+
+        try:
+            result = self._get_or_generate(key, prompt, timeout)
+        except BaseException as e:
+            self._finish(key).set_exception(e)
+            raise
+        # Calls that joined get the result along with where to wait for it to be saved
+        pendingSave = Future() if result['errorMessage'] is None and result.get('savedImage') is None else None
+        self._finish(key, pendingSave).set_result((result, pendingSave))
+        return result
+
+
+    def _finish(self, key: str, pendingSave: Future = None) -> Future:
+        with self.lock:
+            # Only kept around when some call waits on it, image_saved resolves and drops it
+            if pendingSave is not None and key in self.joined:
+                self.pendingSaves[key] = pendingSave
+            self.joined.discard(key)
+            return self.inFlight.pop(key)
+
+
+    def _wait_for(self, key: str, inFlight: Future, prompt, timeout: float = None) -> ImageProviderResult:
+        logging.info("Prompt is already being generated, waiting for it : " + prompt)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        try:
+            result, pendingSave = inFlight.result(timeout=timeout)
+        except TimeoutError:
+            return { 'img': None, 'errorMessage': "Timeout generating image.", 'errorKind': ProviderErrorKind.TIMEOUT }
+        if result['errorMessage'] is not None:
+            return dict(result)
+
+        savedImage = result.get('savedImage')
+        if pendingSave is not None:
+            saveTimeout = self.saveWaitSeconds if deadline is None else min(self.saveWaitSeconds, max(0, deadline - time.monotonic()))
+            savedImage = self._wait_for_save(key, pendingSave, prompt, saveTimeout)
+        if savedImage is None:
+            return { 'img': result['img'], 'errorMessage': None }
+        return { 'img': result['img'], 'errorMessage': None, 'cacheHit': True, 'savedImage': savedImage }
+
+
+    def _wait_for_save(self, key: str, pendingSave: Future, prompt, timeout: float):
+        try:
+            return pendingSave.result(timeout=timeout)
+        except TimeoutError:
+            logging.info(f'Image of prompt {prompt} was not saved in time, handing it on as a new image')
+            with self.lock:
+                if self.pendingSaves.get(key) is pendingSave:
+                    del self.pendingSaves[key]
+            return None
+
+
+    def _get_or_generate(self, key: str, prompt, timeout: float = None) -> ImageProviderResult:
+        try:
+            savedImage = self._get(key)
+        except Exception as e:
+            # A broken cache must never stop images from being generated
+            logging.error(f'Could not read prompt cache : {traceback.format_exc()}')
+            savedImage = None
+        if savedImage is not None:
+            logging.info("Serving prompt from cache : " + prompt)
+            return { 'img': savedImage.images[0], 'errorMessage': None, 'cacheHit': True, 'savedImage': savedImage }
+
+        return self.provider.get_image_from_string(prompt, timeout=timeout)
+
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+        self._write_entries()
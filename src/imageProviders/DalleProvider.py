@@ -1,14 +1,40 @@
-from io import BytesIO
+import base64
 import logging
+import threading
+import time
 import traceback
-import openai
-import requests
-from imageProviders.ImageProvider import ImageProvider, ImageProviderResult
-from PIL import Image
+from typing import Union
+from imageProviders.ImageProvider import ImageProvider, ImageProviderResult, ProviderErrorKind
 
 
 ENGINE_NAME = "Dall-e"
 
+MODEL = "dall-e-3"
+
+SIZE = "1024x1024"
+
+QUALITY = "standard"
+
+# Images only returned as a url are downloaded in chunks of this size
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+# Seconds to wait on the image host for a connection and then between chunks, shortened to the time left when the caller
+# gave a timeout
+DOWNLOAD_TIMEOUT = (10, 60)
+
+
+def retry_after_seconds(error: BaseException) -> Union[float, None]:
+    """
+    Gets how long the API asked to wait before trying again from the Retry-After header of an error response, if it did.
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
 
 class DalleProvider(ImageProvider):
     """
@@ -16,32 +42,124 @@ class DalleProvider(ImageProvider):
 
     This is a waiting call so it should be threaded.
 
+    openai (and requests) take a good part of a second to import on a Pi so they are only imported, and the client only made,
+    the first time an image is generated or when warm_up is called from a background thread.
+
+    Images are asked for inline (base64 in the generation response) so getting one costs a single round trip to an already
+    open connection. If the API only hands back a url the image is streamed over a pooled keep-alive session instead, so
+    only the first download pays for a handshake with the image host.
+
     Attributes
     ----------
     key(str)
         the API key. See : https://openai.com/blog/dall-e-api-now-available-in-public-beta
 
+    maxRetries(int)
+        how often the openai client retries on its own, None for its default. 0 when a ResilientProvider does the retrying.
+
+    baseUrl(str)
+        url of the API, None for OpenAI's. Used to point the provider at a local stand in (see OpenAiStandIn).
+
     Methods
     -------
-    get_image_from_string(prompt)
-        Retrieves image from API. Image as bytes. Returns 'None' on failure
+    get_image_from_string(prompt, timeout)
+        Retrieves image from API. Image as bytes. Returns 'None' on failure along with an errorKind. The seconds spent in
+        each phase ("generate", "decode" or "download" and "total") are returned as 'timings'.
+
+    warm_up()
+        Imports openai and makes the client and download session ahead of the first image
     """
 
     # inherits from Provider
-    def __init__(self, key=None):
+    def __init__(self, key=None, maxRetries: int = None, baseUrl: str = None):
         super().__init__(key=key, keyname=key)
-        self.openAiClient = openai.OpenAI(api_key=key)
+        self.maxRetries = maxRetries
+        self.baseUrl = baseUrl
+        self.openAiClient = None
+        self.session = None
+        self.clientLock = threading.Lock()
         return
 
 
+    def _get_client(self):
+        with self.clientLock:
+            if self.openAiClient is None:
+                import openai
+                options = {}
+                if self.maxRetries is not None:
+                    options["max_retries"] = self.maxRetries
+                if self.baseUrl is not None:
+                    options["base_url"] = self.baseUrl
+                self.openAiClient = openai.OpenAI(api_key=self.key, **options)
+            return self.openAiClient
+
+
+    def _get_session(self):
+        with self.clientLock:
+            if self.session is None:
+                import requests
+                self.session = requests.Session()
+                self.session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4))
+            return self.session
+
+
+    def _download(self, url: str, deadline: float = None) -> bytes:
+        """
+        Streams an image from the image host, giving up with a TimeoutError once the deadline (a time.perf_counter() time)
+        has passed.
+        """
+        import requests
+        timeout = DOWNLOAD_TIMEOUT
+        if deadline is not None:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise TimeoutError("Timeout downloading image.")
+            timeout = tuple(min(limit, remaining) for limit in DOWNLOAD_TIMEOUT)
+        try:
+            with self._get_session().get(url, stream=True, timeout=timeout) as response:
+                response.raise_for_status()
+                chunks = []
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
+                    # The timeout of the session only covers each chunk, not the whole download
+                    if deadline is not None and time.perf_counter() > deadline:
+                        raise TimeoutError("Timeout downloading image.")
+                    chunks.append(chunk)
+                return b"".join(chunks)
+        except requests.exceptions.Timeout as e:
+            raise TimeoutError("Timeout downloading image.") from e
+
+
+    def warm_up(self):
+        try:
+            self._get_client()
+            self._get_session()
+        except BaseException as e:
+            # Reported again when an image is generated
+            logging.error(f'Could not make OpenAI client : {traceback.format_exc()}')
+
+
     def engine_name(self):
         return ENGINE_NAME
 
 
-    def get_image_from_string(self, prompt) -> ImageProviderResult:
+    def generation_parameters(self) -> dict:
+        return {"model": MODEL, "size": SIZE, "quality": QUALITY}
+
+
+    def get_image_from_string(self, prompt, timeout: float = None) -> ImageProviderResult:
         logging.info("Generating image for prompt : " + prompt)
+        try:
+            import openai
+        except ImportError as e:
+            logging.error(f'Could not load OpenAI client : {traceback.format_exc()}')
+            return { 'img': None, 'errorMessage': f'Could not load OpenAI client : {str(e)}', 'errorKind': ProviderErrorKind.OTHER }
         img = None
         errorMessage = None
+        errorKind = None
+        retryAfter = None
+        timings = {}
+        start = time.perf_counter()
+        deadline = start + timeout if timeout is not None else None
         try:
             # Select appropriate size from options in
             # res = list(DalleConst.SIZES.value.keys())[0]
@@ -52,33 +170,65 @@ class DalleProvider(ImageProvider):
             #            res = DalleConst.SIZES.value[key]
             #            break
 
-            response = self.openAiClient.images.generate(
-                model="dall-e-3",
+            client = self._get_client() if timeout is None else self._get_client().with_options(timeout=timeout)
+            response = client.images.generate(
+                model=MODEL,
                 prompt=prompt,
-                size="1024x1024",
-                quality="standard",
+                size=SIZE,
+                quality=QUALITY,
                 n=1,
+                response_format="b64_json",
             )
-
-            url = response.data[0].url
-            logging.info("Generated image at : " + url)
-            img = requests.get(url).content
-
+            timings["generate"] = time.perf_counter() - start
+
+            phaseStart = time.perf_counter()
+            if response.data[0].b64_json is not None:
+                img = base64.b64decode(response.data[0].b64_json)
+                timings["decode"] = time.perf_counter() - phaseStart
+            else:
+                url = response.data[0].url
+                logging.info("Generated image at : " + url)
+                img = self._download(url, deadline)
+                timings["download"] = time.perf_counter() - phaseStart
+
+        # Timeouts are connection errors as well so they have to be caught first
+        except openai.APITimeoutError as e:
+            logging.error(traceback.format_exc())            
+            errorMessage = "Timeout contacting OpenAI. Internet or provider may be down."
+            errorKind = ProviderErrorKind.TIMEOUT
+        except TimeoutError as e:
+            logging.error(traceback.format_exc())
+            errorMessage = "Timeout downloading image. Internet or provider may be down."
+            errorKind = ProviderErrorKind.TIMEOUT
         except openai.APIConnectionError as e:
             logging.error(traceback.format_exc())  
             errorMessage = "Unable to contact OpenAI. Internet or provider may be down."
+            errorKind = ProviderErrorKind.CONNECTION
         except openai.AuthenticationError as e:
             logging.error(traceback.format_exc())  
             errorMessage = "Error authenticating with OpenAI. Please check your credentials in '.creds'."
+            errorKind = ProviderErrorKind.AUTHENTICATION
         except openai.RateLimitError as e:
             logging.error(traceback.format_exc())  
             errorMessage = "OpenAI reporting Rate Limiting. Please check your account at openai.com."
-        except openai.APITimeoutError as e:
-            logging.error(traceback.format_exc())            
-            errorMessage = "Timeout contacting OpenAI. Internet or provider may be down."
+            errorKind = ProviderErrorKind.RATE_LIMITED
+            retryAfter = retry_after_seconds(e)
+        except openai.InternalServerError as e:
+            logging.error(traceback.format_exc())
+            errorMessage = "OpenAI had an internal error. Please try again later."
+            errorKind = ProviderErrorKind.SERVER
+            retryAfter = retry_after_seconds(e)
         except BaseException as e:
             logging.error(traceback.format_exc())  
             errorMessage = str(e)
-        
-        return { 'img': img, 'errorMessage': errorMessage }
+            errorKind = ProviderErrorKind.OTHER
+
+        timings["total"] = time.perf_counter() - start
+        logging.info("Image generation timings : " + ", ".join(f'{phase} {seconds:.3f}s' for phase, seconds in timings.items()))
+        result: ImageProviderResult = { 'img': img, 'errorMessage': errorMessage, 'timings': timings }
+        if errorKind is not None:
+            result['errorKind'] = errorKind
+        if retryAfter is not None:
+            result['retryAfter'] = retryAfter
+        return result
     
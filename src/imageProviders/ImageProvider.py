@@ -1,10 +1,33 @@
-from typing import TypedDict
+from enum import Enum
+from typing import Dict, TypedDict
 
 
+class ProviderErrorKind(Enum):
+    """
+    Why a provider failed, so callers can tell failures worth retrying from ones that aren't.
+    """
+    RATE_LIMITED = "rateLimited"
+    TIMEOUT = "timeout"
+    CONNECTION = "connection"
+    SERVER = "server"
+    AUTHENTICATION = "authentication"
+    UNAVAILABLE = "unavailable"
+    OTHER = "other"
+
+
+# Only 'img' and 'errorMessage' are always there. Providers that know why they failed add 'errorKind' (ProviderErrorKind)
+# and, when the upstream said how long to wait, 'retryAfter' in seconds. 'cacheHit' is set on images served from a cache,
+# along with the repo entry the image was read from (an ImagePrompResult) as 'savedImage' when there is one.
+# Providers that time their work add the seconds spent in each phase of the call as 'timings'.
 ImageProviderResult = TypedDict('ImageProviderResult', {
     'img': bytes,
     'errorMessage': str,
-})
+    'errorKind': ProviderErrorKind,
+    'retryAfter': float,
+    'cacheHit': bool,
+    'savedImage': object,
+    'timings': Dict[str, float],
+}, total=False)
 
 
 class ImageProvider(object):
@@ -16,8 +39,23 @@ class ImageProvider(object):
 
     Methods
     -------
-    get_image_from_string(prompt)
-        Retrieves image from API. Image as bytes. Returns 'None' on failure
+    get_image_from_string(prompt, timeout)
+        Retrieves image from API. Image as bytes. Returns 'None' on failure. Gives up after timeout seconds if given.
+
+    generation_parameters()
+        Everything besides the prompt that changes the generated image (model, size, ...). Used to key caches.
+
+    warm_up()
+        Does the slow setup (imports, clients, connections) ahead of the first image. Called from a background thread at startup.
+
+    image_saved(prompt, savedImage)
+        Told about every image of the provider once it's saved to the repo, with its ImagePrompResult. Used by caches.
+
+    image_save_failed(prompt)
+        Told about every image of the provider that could not be saved to the repo.
+
+    close()
+        Saves and releases whatever the provider holds. Called once no more images will be asked for.
     """
     def __init__(self, key=None, keyname=None):
         self.key = key
@@ -30,6 +68,26 @@ class ImageProvider(object):
         return
 
 
-    def get_image_from_string(self, prompt) -> ImageProviderResult:
+    def get_image_from_string(self, prompt, timeout: float = None) -> ImageProviderResult:
+        return
+
+
+    def generation_parameters(self) -> dict:
+        return {}
+
+
+    def warm_up(self):
+        return
+
+
+    def image_saved(self, prompt, savedImage):
+        return
+
+
+    def image_save_failed(self, prompt):
+        return
+
+
+    def close(self):
         return
     
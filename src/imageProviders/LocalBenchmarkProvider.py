@@ -0,0 +1,225 @@
+import base64
+import hashlib
+import io
+import json
+import logging
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Union
+
+from PIL import Image
+
+from imageProviders.ImageProvider import ImageProvider, ImageProviderResult, ProviderErrorKind
+
+
+ENGINE_NAME = "LocalBenchmark"
+
+DEFAULT_LATENCY_SECONDS = 1.0
+
+DEFAULT_IMAGE_SIZE = (1024, 1024)
+
+# HTTP status and OpenAI error type each failure is served as by the stand in
+STAND_IN_ERRORS = {
+    ProviderErrorKind.RATE_LIMITED: (429, "rate_limit_exceeded"),
+    ProviderErrorKind.SERVER: (500, "server_error"),
+    ProviderErrorKind.AUTHENTICATION: (401, "invalid_api_key"),
+    ProviderErrorKind.OTHER: (400, "invalid_request_error"),
+}
+
+
+def generate_procedural_image(prompt: str, size = DEFAULT_IMAGE_SIZE) -> bytes:
+    """
+    Draws an image that only depends on the prompt: a colour gradient over a coarse random pattern, scaled up to the
+    requested size. Encoded as PNG like the images of real providers.
+    """
+    seed = int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    start = [rng.randrange(256) for _ in range(3)]
+    end = [rng.randrange(256) for _ in range(3)]
+    cells = 32
+    pattern = Image.new("RGB", (cells, cells))
+    pattern.putdata([
+        tuple(min(255, int(start[c] + (end[c] - start[c]) * (x + y) / (2 * cells)) + rng.randrange(32)) for c in range(3))
+        for y in range(cells) for x in range(cells)
+    ])
+    image = pattern.resize(size, Image.BILINEAR)
+    imageBytes = io.BytesIO()
+    image.save(imageBytes, format="PNG")
+    return imageBytes.getvalue()
+
+
+class LocalBenchmarkProvider(ImageProvider):
+    """
+    Stand in for a real image provider that makes images locally, so the rest of the app can be tested and benchmarked
+    without network access or paying for images.
+
+    Images are drawn procedurally from the prompt (the same prompt always gives the same image). How long each image takes
+    and whether it fails are drawn from the given distributions using a seeded random generator, so a run with the same seed
+    and prompts behaves the same every time.
+
+    Latencies follow a log normal distribution around latencySeconds (latencySigma of 0 makes every image take exactly
+    latencySeconds). Each image fails with failureRate probability, the kind of failure is picked by the weights in
+    failureKinds. Failed images take as long as successful ones, like a real upstream.
+
+    Attributes
+    ----------
+    latencySeconds (float)
+        median time to make an image
+
+    latencySigma (float)
+        spread of the log normal latency distribution
+
+    imageSize (Tuple[int, int])
+        width and height of the images
+
+    failureRate (float)
+        chance of an image failing, between 0 and 1
+
+    failureKinds (Dict[ProviderErrorKind, float])
+        relative weight of each kind of failure
+
+    Methods
+    -------
+    get_image_from_string(prompt, timeout)
+        Makes the image of a prompt after the drawn latency, or fails with a TIMEOUT if that's longer then timeout
+
+    draw_outcome()
+        Draws the latency of the next image and how it fails, if it does
+    """
+
+    def __init__(self, latencySeconds: float = DEFAULT_LATENCY_SECONDS, latencySigma: float = 0.0, imageSize = DEFAULT_IMAGE_SIZE,
+            failureRate: float = 0.0, failureKinds: Dict[ProviderErrorKind, float] = None, seed: int = 0, engineName: str = ENGINE_NAME):
+        super().__init__()
+        self.latencySeconds = latencySeconds
+        self.latencySigma = latencySigma
+        self.imageSize = tuple(imageSize)
+        self.failureRate = failureRate
+        self.failureKinds = failureKinds if failureKinds is not None else {ProviderErrorKind.RATE_LIMITED: 1.0}
+        self.engineName = engineName
+        self.random = random.Random(seed)
+        self.randomLock = threading.Lock()
+
+
+    def engine_name(self) -> str:
+        return self.engineName
+
+
+    def generation_parameters(self) -> dict:
+        return {"size": f'{self.imageSize[0]}x{self.imageSize[1]}'}
+
+
+    def draw_outcome(self):
+        """
+        Returns
+        -------
+        Tuple[float, Union[ProviderErrorKind, None]]
+            Seconds the next image takes and the kind of failure it ends in, None if it succeeds
+        """
+        with self.randomLock:
+            latency = self.latencySeconds * math.exp(self.random.gauss(0, self.latencySigma)) if self.latencySigma > 0 else self.latencySeconds
+            failure = None
+            if self.failureRate > 0 and self.random.random() < self.failureRate:
+                kinds = list(self.failureKinds.keys())
+                failure = self.random.choices(kinds, weights=[self.failureKinds[kind] for kind in kinds])[0]
+        return latency, failure
+
+
+    def get_image_from_string(self, prompt, timeout: float = None) -> ImageProviderResult:
+        latency, failure = self.draw_outcome()
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            return { 'img': None, 'errorMessage': "Timeout generating image.", 'errorKind': ProviderErrorKind.TIMEOUT }
+
+        start = time.perf_counter()
+        image = generate_procedural_image(prompt, self.imageSize) if failure is None else None
+        time.sleep(max(0.0, latency - (time.perf_counter() - start)))
+        if failure is not None:
+            return { 'img': None, 'errorMessage': f'Simulated {failure.value} failure.', 'errorKind': failure }
+        return { 'img': image, 'errorMessage': None }
+
+
+class OpenAiStandIn(object):
+    """
+    Local HTTP server answering "POST /v1/images/generations" the way the OpenAI API does, with images and failures from
+    a LocalBenchmarkProvider. Point a DalleProvider at base_url() to exercise its whole request path (client, decoding,
+    error mapping) without network access.
+
+    Failures are answered with the matching status code (see STAND_IN_ERRORS), rate limits include a Retry-After header.
+    Timeouts are simulated by answering after the drawn latency, so only clients with a shorter timeout see them.
+
+    Methods
+    -------
+    start()
+        Starts serving on a background thread
+
+    base_url()
+        Url to hand the openai client
+
+    stop()
+        Stops serving
+    """
+
+    def __init__(self, provider: LocalBenchmarkProvider, host: str = "127.0.0.1", port: int = 0, retryAfterSeconds: float = 1.0):
+        self.provider = provider
+        self.retryAfterSeconds = retryAfterSeconds
+        standIn = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                if self.path.rstrip("/") != "/v1/images/generations":
+                    standIn._respond(self, 404, {"error": {"message": f'Unknown path {self.path}', "type": "invalid_request_error"}})
+                    return
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                result = standIn.provider.get_image_from_string(request.get("prompt", ""))
+                if result['errorMessage'] is None:
+                    # Images are always sent inline, the stand in doesn't host them for url responses
+                    data = {"b64_json": base64.b64encode(result['img']).decode("ascii"), "revised_prompt": request.get("prompt", "")}
+                    standIn._respond(self, 200, {"created": int(time.time()), "data": [data]})
+                    return
+                status, errorType = STAND_IN_ERRORS.get(result['errorKind'], STAND_IN_ERRORS[ProviderErrorKind.OTHER])
+                headers = {"retry-after": str(standIn.retryAfterSeconds)} if status == 429 else {}
+                standIn._respond(self, status, {"error": {"message": result['errorMessage'], "type": errorType, "code": errorType}}, headers)
+
+            def log_message(self, format, *args):
+                logging.debug("OpenAI stand in : " + format % args)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread: Union[threading.Thread, None] = None
+
+
+    def _respond(self, handler: BaseHTTPRequestHandler, status: int, body: dict, headers: Dict[str, str] = {}):
+        payload = json.dumps(body).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        try:
+            handler.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client timed out and hung up before the answer was ready
+            logging.debug("OpenAI stand in client went away before the response was sent")
+
+
+    def start(self) -> "OpenAiStandIn":
+        self.thread = threading.Thread(target=self.server.serve_forever, name="OpenAiStandIn", daemon=True)
+        self.thread.start()
+        return self
+
+
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
@@ -0,0 +1,366 @@
+import logging
+import math
+import random
+import threading
+import time
+import traceback
+from typing import Callable, Union
+
+from imageProviders.ImageProvider import ImageProvider, ImageProviderResult, ProviderErrorKind
+
+
+# Failures that say nothing about the prompt, trying again later can work
+RETRYABLE_ERRORS = {ProviderErrorKind.RATE_LIMITED, ProviderErrorKind.TIMEOUT, ProviderErrorKind.CONNECTION, ProviderErrorKind.SERVER}
+
+# Failures that mean the upstream is down (rather than busy) and count towards opening the circuit
+OUTAGE_ERRORS = {ProviderErrorKind.TIMEOUT, ProviderErrorKind.CONNECTION, ProviderErrorKind.SERVER}
+
+# Starting request rate, about what a first tier Dall-e 3 account is allowed
+DEFAULT_REQUESTS_PER_MINUTE = 5.0
+
+# The rate is never lowered below this so a burst of 429s can't stall the queue for good
+MIN_REQUESTS_PER_MINUTE = 0.5
+
+# Requests allowed back to back after being idle
+DEFAULT_BURST = 2
+
+DEFAULT_MAX_ATTEMPTS = 4
+
+DEFAULT_BASE_BACKOFF_SECONDS = 2.0
+
+DEFAULT_MAX_BACKOFF_SECONDS = 60.0
+
+# Total time a prompt may take, including waiting on the rate limit and retries
+DEFAULT_DEADLINE_SECONDS = 180.0
+
+# Outage failures in a row that open the circuit
+DEFAULT_FAILURE_THRESHOLD = 3
+
+# Seconds the circuit stays open before a single trial request is let through
+DEFAULT_RESET_SECONDS = 60.0
+
+
+class TokenBucket(object):
+    """
+    Token bucket rate limiter whose rate adapts to the upstream. The rate is halved whenever the upstream reports rate
+    limiting and creeps back up by a tenth of the starting rate on every success (AIMD), so it settles just under whatever
+    the account is actually allowed instead of hitting the limit over and over.
+
+    Thread safe, waiting callers sleep outside the lock.
+
+    Methods
+    -------
+    acquire(deadline)
+        Waits for a token. Returns False without taking one if none would be free before the deadline.
+
+    rate_limited(retryAfter)
+        Lowers the rate and holds every request back for retryAfter seconds if given
+
+    succeeded()
+        Raises the rate back towards the starting rate
+    """
+
+    def __init__(self, requestsPerMinute: float, burst: int, minRequestsPerMinute: float = MIN_REQUESTS_PER_MINUTE,
+            clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.maxRate = requestsPerMinute / 60
+        self.minRate = min(minRequestsPerMinute / 60, self.maxRate)
+        self.rate = self.maxRate
+        self.capacity = max(1, burst)
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.tokens = float(self.capacity)
+        self.updated = clock()
+        self.blockedUntil = 0.0
+
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+    def acquire(self, deadline: float) -> bool:
+        while True:
+            with self.lock:
+                now = self.clock()
+                self._refill(now)
+                if now >= self.blockedUntil and self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = max(self.blockedUntil - now, (1 - self.tokens) / self.rate)
+            if now + wait > deadline:
+                return False
+            self.sleep(wait)
+
+
+    def rate_limited(self, retryAfter: float = None):
+        with self.lock:
+            now = self.clock()
+            self._refill(now)
+            self.rate = max(self.minRate, self.rate / 2)
+            self.tokens = 0.0
+            if retryAfter is not None:
+                self.blockedUntil = max(self.blockedUntil, now + retryAfter)
+        logging.info(f'Rate limited, lowering rate to {self.rate * 60:.2f} requests per minute')
+
+
+    def succeeded(self):
+        with self.lock:
+            self._refill(self.clock())
+            self.rate = min(self.maxRate, self.rate + self.maxRate / 10)
+
+
+class CircuitBreaker(object):
+    """
+    Stops calls to an upstream that keeps failing. Opens after failureThreshold outage failures in a row, then fails every
+    call right away for resetSeconds. After that a single trial call is let through (half open), which closes the circuit
+    if it succeeds and opens it again if the upstream is still down. A trial that fails for another reason (a rejected
+    prompt, ...) says nothing about the upstream so the circuit stays half open and the next call is the trial.
+
+    Methods
+    -------
+    allow()
+        Whether a call may go through now
+
+    retry_in()
+        Seconds until the circuit lets a call through again, 0 if it does now or a trial call is deciding it
+
+    trial_running()
+        Whether a trial call is in flight, during which no other call is let through
+
+    record(failed)
+        Reports the outcome of a call that was allowed through
+
+    record_inconclusive()
+        Reports a call that was allowed through but failed for a reason other then an outage
+    """
+
+    def __init__(self, failureThreshold: int, resetSeconds: float, clock: Callable[[], float] = time.monotonic):
+        self.failureThreshold = max(1, failureThreshold)
+        self.resetSeconds = resetSeconds
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.openedAt = None
+        self.trialRunning = False
+
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.openedAt is None:
+                return True
+            if self.trialRunning or self.clock() - self.openedAt < self.resetSeconds:
+                return False
+            self.trialRunning = True
+            return True
+
+
+    def retry_in(self) -> float:
+        with self.lock:
+            if self.openedAt is None:
+                return 0.0
+            return max(0.0, self.openedAt + self.resetSeconds - self.clock())
+
+
+    def trial_running(self) -> bool:
+        with self.lock:
+            return self.openedAt is not None and self.trialRunning
+
+
+    def record(self, failed: bool):
+        with self.lock:
+            if not failed:
+                if self.openedAt is not None:
+                    logging.info("Image provider is back, closing circuit")
+                self.failures = 0
+                self.openedAt = None
+                self.trialRunning = False
+                return
+
+            self.failures += 1
+            if self.trialRunning or self.failures >= self.failureThreshold:
+                if self.openedAt is None or self.trialRunning:
+                    logging.warning(f'Image provider failed {self.failures} times in a row, opening circuit for {self.resetSeconds}s')
+                self.openedAt = self.clock()
+                self.trialRunning = False
+
+
+    def record_inconclusive(self):
+        with self.lock:
+            if self.openedAt is None:
+                # The upstream answered so the outage failures are no longer in a row
+                self.failures = 0
+            elif self.trialRunning:
+                logging.info("Trial call failed for another reason then an outage, keeping circuit half open")
+            self.trialRunning = False
+
+
+class ResilientProvider(ImageProvider):
+    """
+    Wraps any ImageProvider with the controls needed to keep a queue of prompts moving against a rate limited, sometimes
+    flaky, paid API:
+
+    - a TokenBucket spaces requests out and slows down whenever the upstream reports rate limiting
+    - failures worth retrying (see RETRYABLE_ERRORS) are retried with exponential backoff and full jitter, honouring
+      the upstream's Retry-After
+    - every prompt has a deadline covering waiting, retries and the calls themselves. The time left is passed on to the
+      wrapped provider as its timeout.
+    - a CircuitBreaker fails prompts right away while the upstream is down instead of letting each one time out
+
+    Failures that can't be fixed by waiting (authentication, bad prompts) are returned right away.
+
+    Attributes
+    ----------
+    provider (ImageProvider)
+        the provider doing the actual work
+
+    bucket (TokenBucket)
+        rate limiter shared by every prompt going through this provider
+
+    breaker (CircuitBreaker)
+        circuit breaker shared by every prompt going through this provider
+
+    Methods
+    -------
+    get_image_from_string(prompt, timeout)
+        Gets an image from the wrapped provider, retrying as needed. Fails with ProviderErrorKind.UNAVAILABLE while the
+        circuit is open.
+    """
+
+    def __init__(self, provider: ImageProvider,
+            requestsPerMinute: float = DEFAULT_REQUESTS_PER_MINUTE,
+            burst: int = DEFAULT_BURST,
+            maxAttempts: int = DEFAULT_MAX_ATTEMPTS,
+            baseBackoffSeconds: float = DEFAULT_BASE_BACKOFF_SECONDS,
+            maxBackoffSeconds: float = DEFAULT_MAX_BACKOFF_SECONDS,
+            deadlineSeconds: float = DEFAULT_DEADLINE_SECONDS,
+            failureThreshold: int = DEFAULT_FAILURE_THRESHOLD,
+            resetSeconds: float = DEFAULT_RESET_SECONDS,
+            clock: Callable[[], float] = time.monotonic,
+            sleep: Callable[[float], None] = time.sleep,
+            jitter: Callable[[], float] = random.random
+        ):
+        super().__init__(key=provider.key, keyname=provider.keyname)
+        self.provider = provider
+        self.maxAttempts = max(1, maxAttempts)
+        self.baseBackoffSeconds = baseBackoffSeconds
+        self.maxBackoffSeconds = maxBackoffSeconds
+        self.deadlineSeconds = deadlineSeconds
+        self.clock = clock
+        self.sleep = sleep
+        self.jitter = jitter
+        self.bucket = TokenBucket(requestsPerMinute, burst, clock=clock, sleep=sleep)
+        self.breaker = CircuitBreaker(failureThreshold, resetSeconds, clock=clock)
+
+
+    def engine_name(self) -> str:
+        return self.provider.engine_name()
+
+
+    def generation_parameters(self) -> dict:
+        return self.provider.generation_parameters()
+
+
+    def warm_up(self):
+        self.provider.warm_up()
+
+
+    def image_saved(self, prompt, savedImage):
+        self.provider.image_saved(prompt, savedImage)
+
+
+    def image_save_failed(self, prompt):
+        self.provider.image_save_failed(prompt)
+
+
+    def close(self):
+        self.provider.close()
+
+
+    def _unavailable(self) -> ImageProviderResult:
+        if self.breaker.trial_running():
+            # How long is up to the outcome of the trial call
+            errorMessage = "Image provider is unavailable. Checking whether it is back, please try again in a moment."
+        else:
+            errorMessage = f'Image provider is unavailable. Trying again in {math.ceil(self.breaker.retry_in())} seconds.'
+        return {
+            'img': None,
+            'errorMessage': errorMessage,
+            'errorKind': ProviderErrorKind.UNAVAILABLE,
+        }
+
+
+    def _timed_out(self) -> ImageProviderResult:
+        return {
+            'img': None,
+            'errorMessage': "Timed out waiting for a free request slot. Too many prompts are queued, please try again later.",
+            'errorKind': ProviderErrorKind.TIMEOUT,
+        }
+
+
+    def _call_provider(self, prompt, timeout: float) -> ImageProviderResult:
+        """
+        Calls the wrapped provider once it was let through by the circuit breaker. The outcome is always recorded, whatever the
+        provider does, so a trial call can never leave a trial running for good. Only a success closes an open circuit.
+        """
+        succeeded = False
+        failed = False
+        try:
+            result = self.provider.get_image_from_string(prompt, timeout=timeout)
+            if result is None:
+                result = {'img': None, 'errorMessage': "Image provider returned no result.", 'errorKind': ProviderErrorKind.OTHER}
+            result.setdefault('errorMessage', None)
+            if result['errorMessage'] is not None:
+                result.setdefault('errorKind', ProviderErrorKind.OTHER)
+            succeeded = result['errorMessage'] is None
+            failed = result.get('errorKind') in OUTAGE_ERRORS
+            return result
+        except Exception as e:
+            logging.error(f'Image provider failed for prompt {prompt} : {traceback.format_exc()}')
+            return {'img': None, 'errorMessage': str(e), 'errorKind': ProviderErrorKind.OTHER}
+        finally:
+            if succeeded or failed:
+                self.breaker.record(failed)
+            else:
+                self.breaker.record_inconclusive()
+
+
+    def _backoff(self, attempt: int, retryAfter: Union[float, None]) -> float:
+        backoff = self.jitter() * min(self.maxBackoffSeconds, self.baseBackoffSeconds * 2 ** attempt)
+        return max(backoff, retryAfter) if retryAfter is not None else backoff
+
+
+    def get_image_from_string(self, prompt, timeout: float = None) -> ImageProviderResult:
+        deadline = self.clock() + (min(timeout, self.deadlineSeconds) if timeout is not None else self.deadlineSeconds)
+        result: ImageProviderResult = None
+        for attempt in range(self.maxAttempts):
+            # Checked before waiting on the rate limit so prompts fail fast while the circuit is open
+            if self.breaker.retry_in() > 0 or self.breaker.trial_running():
+                return self._unavailable()
+            if not self.bucket.acquire(deadline):
+                break
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                break
+            if not self.breaker.allow():
+                return self._unavailable()
+
+            result = self._call_provider(prompt, remaining)
+            errorKind = result.get('errorKind') if result['errorMessage'] is not None else None
+            if errorKind is None:
+                self.bucket.succeeded()
+                return result
+            if errorKind == ProviderErrorKind.RATE_LIMITED:
+                self.bucket.rate_limited(result.get('retryAfter'))
+            if errorKind not in RETRYABLE_ERRORS or attempt + 1 == self.maxAttempts:
+                return result
+
+            backoff = self._backoff(attempt, result.get('retryAfter'))
+            if self.clock() + backoff >= deadline:
+                return result
+            logging.info(f'Attempt {attempt + 1} for prompt {prompt} failed ({errorKind.value}), retrying in {backoff:.1f}s')
+            self.sleep(backoff)
+
+        if result is not None:
+            return result
+        return self._timed_out()
@@ -0,0 +1,254 @@
+import os
+import shutil
+import struct
+import threading
+import time
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Tuple, Union
+
+from utils.pathingUtils import TEMPORARY_FILE_PREFIX, get_reverse_sorted_directory_by_name, is_temporary_file, sync_directory
+
+
+# Packed time prompt directories of a date live in this file within the date directory
+PACK_FILE_NAME = "pack.zip"
+
+# See the "local file header" of the zip specification
+LOCAL_HEADER = struct.Struct("<4s5H3I2H")
+LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+
+# (image name, offset of its local header within the pack, size in bytes, mtime)
+PackedImage = Tuple[str, int, int, float]
+
+
+def seek_packed_image(f: BinaryIO, headerOffset: int) -> int:
+    """
+    Moves an open pack file to the first byte of the image whose local header is at headerOffset. Returns that position.
+    """
+    f.seek(headerOffset)
+    header = f.read(LOCAL_HEADER.size)
+    if len(header) != LOCAL_HEADER.size:
+        raise OSError(f'Corrupt pack, no image at offset {headerOffset}')
+    signature, *_, nameLength, extraLength = LOCAL_HEADER.unpack(header)
+    if signature != LOCAL_HEADER_SIGNATURE:
+        raise OSError(f'Corrupt pack, no image at offset {headerOffset}')
+    return f.seek(nameLength + extraLength, os.SEEK_CUR)
+
+
+def read_packed_image(packPath: Union[str, Path], headerOffset: int, size: int) -> bytes:
+    """
+    Reads one image out of a pack with a single open and seek. Images are stored uncompressed so its bytes follow its header.
+    """
+    with open(packPath, "rb") as f:
+        seek_packed_image(f, headerOffset)
+        data = f.read(size)
+    if len(data) != size:
+        raise OSError(f'Corrupt pack {packPath}, image at offset {headerOffset} is truncated')
+    return data
+
+
+class DatePack(object):
+    """
+    The offset table of the pack of a date directory, read from the central directory of the zip.
+
+    Old date directories can be packed (see pack_date_directory) into a single uncompressed zip holding every image as
+    "$timePrompt/$imageName". That replaces a directory per prompt and a file per image with one file per day.
+
+    Attributes
+    ----------
+    path (Path)
+        location of the pack file
+
+    images (Dict[str, List[PackedImage]])
+        packed images of every time prompt
+    """
+
+    def __init__(self, datePath: Union[str, Path]):
+        self.path = Path(datePath)/PACK_FILE_NAME
+        self.images: Dict[str, List[PackedImage]] = {}
+        with zipfile.ZipFile(self.path) as archive:
+            for info in archive.infolist():
+                timePrompt, _, imageName = info.filename.partition("/")
+                if info.is_dir() or not imageName or info.compress_type != zipfile.ZIP_STORED:
+                    continue
+                mtime = time.mktime(info.date_time + (0, 0, -1))
+                self.images.setdefault(timePrompt, []).append((imageName, info.header_offset, info.file_size, mtime))
+
+
+    def time_prompts(self) -> List[str]:
+        return list(self.images.keys())
+
+
+    def read_image(self, packedImage: PackedImage) -> bytes:
+        _, headerOffset, size, _ = packedImage
+        return read_packed_image(self.path, headerOffset, size)
+
+
+class DatePackCache(object):
+    """
+    Remembers the offset table of every pack that was read so reading an image out of a pack doesn't parse the zip again.
+    A table is only read again when the pack file changed. Checking costs a single stat call.
+
+    Methods
+    -------
+    get(datePath)
+        Gets the pack of a date directory or None if the date isn't packed
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.packs: Dict[str, Tuple[tuple, DatePack]] = {}
+
+
+    def get(self, datePath: Union[str, Path]) -> Union[DatePack, None]:
+        key = str(datePath)
+        try:
+            stat = os.stat(Path(datePath)/PACK_FILE_NAME)
+        except OSError:
+            with self.lock:
+                self.packs.pop(key, None)
+            return None
+        signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+        with self.lock:
+            cached = self.packs.get(key)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+
+        pack = DatePack(datePath)
+        with self.lock:
+            self.packs[key] = (signature, pack)
+        return pack
+
+
+def get_reverse_sorted_listing(path: Union[str, Path]) -> List[str]:
+    """
+    Same as get_reverse_sorted_directory_by_name but the time prompts packed in a date directory are listed as though they
+    were still directories. Temporary files are left out.
+    """
+    path = Path(path)
+    listing = [name for name in get_reverse_sorted_directory_by_name(path) if not is_temporary_file(name)]
+    if PACK_FILE_NAME not in listing:
+        return listing
+    names = set(listing)
+    names.discard(PACK_FILE_NAME)
+    names.update(DatePack(path).time_prompts())
+    return sorted(names, reverse=True)
+
+
+def _write_pack(packPath: Path, keptMembers: List[str], looseImages: List[Tuple[str, str]]):
+    """
+    Writes the pack again with keptMembers copied over from the current pack and looseImages ((member name, path) pairs)
+    added from the file system. Images are streamed one at a time so only a single copy buffer is ever held in memory.
+    """
+    temporaryPath = packPath.with_name(f'{TEMPORARY_FILE_PREFIX}{packPath.name}.tmp')
+    try:
+        with open(temporaryPath, "wb") as f:
+            # Zip can't store times before 1980, older mtimes are clamped instead of failing the pack
+            with zipfile.ZipFile(f, "w", compression=zipfile.ZIP_STORED, strict_timestamps=False) as archive:
+                if len(keptMembers) > 0:
+                    with zipfile.ZipFile(packPath) as currentArchive:
+                        for memberName in keptMembers:
+                            info = currentArchive.getinfo(memberName)
+                            with currentArchive.open(info) as source, archive.open(zipfile.ZipInfo(memberName, date_time=info.date_time), "w") as target:
+                                shutil.copyfileobj(source, target)
+                for memberName, path in looseImages:
+                    archive.write(path, memberName)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporaryPath, packPath)
+    except BaseException:
+        try:
+            os.remove(temporaryPath)
+        except OSError:
+            pass
+        raise
+    sync_directory(packPath.parent)
+
+
+def pack_date_directory(datePath: Union[str, Path]) -> List[str]:
+    """
+    Moves every time prompt directory of a date into the pack of the date, joining whatever was packed before.
+
+    The new pack is fully written and synced before any directory is removed so a power loss at any point leaves every
+    image readable. A time prompt that is both packed and loose (power lost before the directories were removed) is taken
+    from its directory.
+
+    Returns
+    -------
+    List[str]
+        The time prompts that were moved into the pack.
+    """
+    datePath = Path(datePath)
+    loose = [
+        timePrompt for timePrompt in get_reverse_sorted_directory_by_name(datePath)
+        if "_" in timePrompt and not is_temporary_file(timePrompt) and (datePath/timePrompt).is_dir()
+    ]
+    if len(loose) == 0:
+        return []
+
+    keptMembers = []
+    if (datePath/PACK_FILE_NAME).exists():
+        pack = DatePack(datePath)
+        for timePrompt, packedImages in pack.images.items():
+            if timePrompt in loose:
+                continue
+            keptMembers.extend(f'{timePrompt}/{packedImage[0]}' for packedImage in packedImages)
+    looseImages = []
+    for timePrompt in loose:
+        with os.scandir(datePath/timePrompt) as entries:
+            for entry in sorted(entries, key=lambda entry: entry.name):
+                if entry.is_file() and not is_temporary_file(entry.name):
+                    looseImages.append((f'{timePrompt}/{entry.name}', entry.path))
+
+    _write_pack(datePath/PACK_FILE_NAME, keptMembers, looseImages)
+    for timePrompt in loose:
+        shutil.rmtree(datePath/timePrompt)
+    return loose
+
+
+def remove_packed_images(datePath: Union[str, Path], timePrompt: str, imageNames: List[str] = None) -> List[str]:
+    """
+    Removes images of a packed time prompt, or all of them when no names are given, by writing the pack again without them.
+    The pack file is removed once it holds nothing.
+
+    Returns
+    -------
+    List[str]
+        The names of the images that were removed.
+    """
+    return remove_packed_images_of_date(datePath, {timePrompt: imageNames}).get(timePrompt, [])
+
+
+def remove_packed_images_of_date(datePath: Union[str, Path], imageNames: Dict[str, Union[List[str], None]]) -> Dict[str, List[str]]:
+    """
+    Same as remove_packed_images for several time prompts of a date at once, writing the pack again only once.
+    imageNames maps each time prompt to the names of its images to remove, or None to remove all of them.
+
+    Returns
+    -------
+    Dict[str, List[str]]
+        The names of the images that were removed from each time prompt. Time prompts nothing was removed from are left out.
+    """
+    datePath = Path(datePath)
+    pack = DatePack(datePath)
+    removed: Dict[str, List[str]] = {}
+    for timePrompt, names in imageNames.items():
+        removedNames = [packedImage[0] for packedImage in pack.images.get(timePrompt, []) if names is None or packedImage[0] in names]
+        if len(removedNames) > 0:
+            removed[timePrompt] = removedNames
+    if len(removed) == 0:
+        return {}
+
+    keptMembers = [
+        f'{timePrompt}/{packedImage[0]}'
+        for timePrompt, packedImages in pack.images.items()
+        for packedImage in packedImages
+        if packedImage[0] not in removed.get(timePrompt, [])
+    ]
+    if len(keptMembers) == 0:
+        os.remove(pack.path)
+        sync_directory(datePath)
+    else:
+        _write_pack(pack.path, keptMembers, [])
+    return removed
@@ -2,11 +2,12 @@ import logging
 import os
 from pathlib import Path
 from typing import Union, List
+from repoManager.DatePack import get_reverse_sorted_listing
+from repoManager.DirectoryListingCache import DirectoryListingCache
 from repoManager.Models import ImagePromptDirectory
 from repoManager.utils import generate_file_name, extract_file_name
 
-from utils.pathingUtils import get_reverse_sorted_directory_by_name
-from utils.algoUtils import get_next_string_index_from_reverse_sorted
+from utils.algoUtils import get_next_string_index_from_reverse_sorted, reverse_bisect_left, reverse_bisect_right
 from utils.enums import DIRECTION
 
 
@@ -47,11 +48,33 @@ class DirectoryIterator:
     The DirectoryIterator has internal pointers to where it is in the directory structure. These pointers can be adjusted with a 
     provided startingDirectory arg. The startingDirectory does not need to be physical directory in the system and this 
     DirectoryIterator will iterate to the next logical entry from the provided starting directory.
+
+    An optional DirectoryListingCache can be shared between DirectoryIterators so directories that haven't changed since they
+    were last listed (like the date directories of past days) are not scanned and sorted again.
+
+    Time prompts packed into a date directory (see DatePack) are iterated as though they were still directories.
+
+    The dates iterated can be bounded with newestDate and oldestDate (inclusive). The bounds are found by bisecting the
+    snapshot of dates so dates outside of them are never listed.
     
     """
-    def __init__(self, pathToDirectories: Union[str, Path], startingDirectory: ImagePromptDirectory = None, direction: DIRECTION = DIRECTION.FORWARD):
+    def __init__(
+            self,
+            pathToDirectories: Union[str, Path],
+            startingDirectory: ImagePromptDirectory = None,
+            direction: DIRECTION = DIRECTION.FORWARD,
+            listingCache: DirectoryListingCache = None,
+            newestDate: str = None,
+            oldestDate: str = None
+        ):
         self.pathToDirectories = Path(pathToDirectories)
-        self.sortedDateDirectories = get_reverse_sorted_directory_by_name(self.pathToDirectories)
+        self.listingCache = listingCache
+        sortedDateDirectories = self._list_directory(self.pathToDirectories)
+        # Dates are sorted most recent first
+        self.sortedDateDirectories = sortedDateDirectories[
+            reverse_bisect_left(sortedDateDirectories, newestDate) if newestDate is not None else 0:
+            reverse_bisect_right(sortedDateDirectories, oldestDate) if oldestDate is not None else len(sortedDateDirectories)
+        ]
         self.direction = direction
 
         if(startingDirectory is not None):
@@ -60,7 +83,9 @@ class DirectoryIterator:
             self.currentDate = startingDirectory.date
             self.dateIndex = None
             timePromptPath = self.pathToDirectories/self.currentDate
-            self.currentTimePromptDirectories = get_reverse_sorted_directory_by_name(timePromptPath) if timePromptPath.exists() else []
+            inRange = (newestDate is None or self.currentDate <= newestDate) and (oldestDate is None or self.currentDate >= oldestDate)
+            # Starting outside of the bounds moves on to the nearest date within them
+            self.currentTimePromptDirectories = self._list_directory(timePromptPath) if inRange and timePromptPath.exists() else []
             self.currentTimePrompt = startingPromptWithTime
             self.timePromptIndex = None
         else:
@@ -75,6 +100,12 @@ class DirectoryIterator:
         return self
 
 
+    def _list_directory(self, path: Path) -> List[str]:
+        if self.listingCache is not None:
+            return self.listingCache.get_reverse_sorted(path)
+        return get_reverse_sorted_listing(path)
+
+
     def get_current_image_prompt_directory(self) -> ImagePromptDirectory:
         """
         Gets the current image prompt that this iterator is pointing to. 
@@ -150,7 +181,21 @@ class DirectoryIterator:
         if(nextDateIndex is not None):
             nextDate = self.sortedDateDirectories[nextDateIndex]
             logging.debug(f'Looking at date {nextDate}')
-            nextTimePromptDirectories = get_reverse_sorted_directory_by_name(self.pathToDirectories/nextDate)
+            try:
+                nextTimePromptDirectories = self._list_directory(self.pathToDirectories/nextDate)
+            except (FileNotFoundError, NotADirectoryError):
+                # Removed since the dates were listed or a stray file rather then a date directory
+                nextTimePromptDirectories = []
+
+            if len(nextTimePromptDirectories) == 0:
+                # Empty date directories (like ones left behind by a power loss) have nothing to offer so move past them
+                logging.debug(f'Date {nextDate} is empty')
+                self.currentDate = nextDate
+                self.dateIndex = nextDateIndex
+                self.currentTimePromptDirectories = []
+                self.currentTimePrompt = None
+                self.timePromptIndex = None
+                return None
 
             startIndexOfNextDateFolder = get_start_index(self.direction,  nextTimePromptDirectories)
             nextTimePrompt = nextTimePromptDirectories[startIndexOfNextDateFolder]
@@ -0,0 +1,80 @@
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+from repoManager.DatePack import get_reverse_sorted_listing
+from utils.pathingUtils import get_directory_signature
+
+
+class DirectoryListingCache(object):
+    """
+    Shared memo of reverse sorted directory listings.
+
+    Listing and sorting a directory is one of the most expensive parts of walking a repo on an SD card yet date directories of
+    past days almost never change. Every listing is remembered along with the signature (mtime and link count) of the directory
+    it came from. A directory is only listed again when its signature changes or when the RepoManager says it wrote to it.
+    Checking the signature is a single stat call, so steady state iteration of historical days doesn't scan any directory.
+
+    Listings returned are shared between callers so they must not be modified.
+
+    Attributes
+    ----------
+
+    Methods
+    -------
+    get_reverse_sorted(path)
+        Same as get_reverse_sorted_listing (packed time prompts included) but served from the cache when the directory hasn't changed
+
+    invalidate(path)
+        Forgets the listing of a directory
+
+    clear()
+        Forgets every listing
+
+    stats()
+        Gets how many listings were served from the cache (hits) and how many directory scans were done (scans)
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.listings: Dict[str, Tuple[str, List[str]]] = {}
+        self.hits = 0
+        self.scans = 0
+
+
+    def get_reverse_sorted(self, path: Union[str, Path]) -> List[str]:
+        key = str(path)
+        signature = get_directory_signature(path)
+        if signature is None:
+            raise FileNotFoundError(f'No such directory: {key}')
+
+        with self.lock:
+            cached = self.listings.get(key)
+            if cached is not None and cached[0] == signature:
+                self.hits += 1
+                return cached[1]
+
+        listing = get_reverse_sorted_listing(Path(path))
+        with self.lock:
+            self.scans += 1
+            self.listings[key] = (signature, listing)
+        return listing
+
+
+    def invalidate(self, path: Union[str, Path]):
+        with self.lock:
+            self.listings.pop(str(path), None)
+
+
+    def clear(self):
+        with self.lock:
+            self.listings.clear()
+
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'scans': self.scans,
+                'listings': len(self.listings),
+            }
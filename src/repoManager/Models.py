@@ -1,6 +1,10 @@
-from typing import List, Union
+import io
+from pathlib import Path
+from typing import Dict, List, Union
 from decorators.decorators import auto_str
 
+from utils.pathingUtils import read_file_as_bytes
+
 
 @auto_str
 class ImagePromptDirectory(object):
@@ -20,20 +24,74 @@ class NextToken(object):
         self.time = time
 
 
+@auto_str
+class MergedNextToken(object):
+    """
+    Bookmark within a timeline merged from several repos. Keeps the last entry taken from each repo so every repo
+    resumes on its own. Repos nothing was taken from yet aren't in it.
+    """
+    def __init__(self, repoTokens: Dict[str, NextToken]):
+        self.repoTokens = repoTokens
+
+
+@auto_str
+class ImageHandle(object):
+    """
+    Lazy reference to an image stored in a repo. Only the file system meta data is known until the image is loaded.
+    """
+    def __init__(self, path: Path, size: int, mtime: float):
+        self.path = Path(path)
+        self.size = size
+        self.mtime = mtime
+
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+
+    def read_bytes(self) -> bytes:
+        return read_file_as_bytes(self.path)
+
+
+    def load_image(self) -> "Image.Image":
+        # Imported here so the models don't need PIL unless an image is actually decoded
+        from PIL import Image
+        return Image.open(io.BytesIO(self.read_bytes()))
+
+
+@auto_str
+class PackedImageHandle(ImageHandle):
+    """
+    Lazy reference to an image stored in the pack of a date directory. path is where the image would be if it wasn't packed.
+    """
+    def __init__(self, path: Path, size: int, mtime: float, packPath: Path, headerOffset: int):
+        super().__init__(path, size, mtime)
+        self.packPath = Path(packPath)
+        self.headerOffset = headerOffset
+
+
+    def read_bytes(self) -> bytes:
+        # Imported here so the models don't depend on the pack storage layer
+        from repoManager.DatePack import read_packed_image
+        return read_packed_image(self.packPath, self.headerOffset, self.size)
+
+
 @auto_str
 class ImagePrompResult(object):
-    def __init__(self, prompt: str, repo: str, date: str, time: str, num: int, images: List[bytes]):
+    def __init__(self, prompt: str, repo: str, date: str, time: str, num: int, images: List[Union[ImageHandle, bytes]], thumbnails: Union[List[bytes], None] = None):
         self.prompt = prompt
         self.repo = repo
         self.date = date
         self.time = time
         self.num = num
         self.images = images
+        self.thumbnails = thumbnails
 
 
 @auto_str
 class GetImagePrompsResult(object):
-    def __init__(self, results: List[ImagePrompResult] = [], nextToken: NextToken = None, errorMessage: Union[str, None] = None):
+    def __init__(self, results: List[ImagePrompResult] = [], nextToken: Union[NextToken, MergedNextToken] = None, errorMessage: Union[str, None] = None):
         self.results = results
         self.nextToken = nextToken
         self.errorMessage = errorMessage
@@ -0,0 +1,101 @@
+import logging
+import traceback
+import zipfile
+from pathlib import Path
+from typing import Dict, List
+
+from repoManager.DatePack import DatePackCache, pack_date_directory, remove_packed_images_of_date
+from repoManager.DirectoryListingCache import DirectoryListingCache
+from repoManager.Models import PackedImageHandle
+
+
+class PackStore(object):
+    """
+    Handles the packed dates of the repos for the RepoManager (see DatePack). Packs old date directories and reads and
+    deletes the images of time prompts that were packed, which no longer have a directory of their own.
+
+    Attributes
+    ----------
+    packCache (DatePackCache)
+        offset tables of the packs read so far, shared with the RepoIndex
+
+    Methods
+    -------
+    is_packed(promptPath)
+        Whether a time prompt only exists in the pack of its date
+
+    get_image_handles(promptPath)
+        Gets handles to the images of a packed time prompt
+
+    pack_dates(repoPath, cutoff)
+        Packs every date of a repo older then a date
+
+    delete_images(datePath, imageNames)
+        Removes images from the pack of a date
+    """
+
+    def __init__(self, listingCache: DirectoryListingCache, packCache: DatePackCache = None):
+        self.listingCache = listingCache
+        self.packCache = packCache if packCache is not None else DatePackCache()
+
+
+    def is_packed(self, promptPath: Path) -> bool:
+        pack = self.packCache.get(promptPath.parent)
+        return pack is not None and promptPath.name in pack.images and not promptPath.is_dir()
+
+
+    def get_image_handles(self, promptPath: Path) -> List[PackedImageHandle]:
+        """
+        Raises
+        ------
+        FileNotFoundError
+            If the time prompt isn't in the pack of its date (or the date has no pack)
+        """
+        pack = self.packCache.get(promptPath.parent)
+        if pack is None or promptPath.name not in pack.images:
+            raise FileNotFoundError(f'{promptPath} is neither a directory nor packed')
+        return [
+            PackedImageHandle(path=promptPath/imageName, size=size, mtime=mtime, packPath=pack.path, headerOffset=headerOffset)
+            for imageName, headerOffset, size, mtime in pack.images[promptPath.name]
+        ]
+
+
+    def pack_dates(self, repoPath: Path, cutoff: str) -> int:
+        """
+        Packs the time prompt directories of every date of a repo before cutoff (iso-8601, exclusive). Dates that can't be
+        packed are logged and skipped.
+
+        Returns
+        -------
+        int
+            How many time prompt directories were packed.
+        """
+        numPacked = 0
+        for date in self.listingCache.get_reverse_sorted(repoPath):
+            if date >= cutoff or not (repoPath/date).is_dir():
+                continue
+            try:
+                numPacked += len(pack_date_directory(repoPath/date))
+            except OSError as e:
+                logging.error(f'Could not pack {repoPath/date} : {traceback.format_exc()}')
+            self.listingCache.invalidate(repoPath/date)
+        if numPacked > 0:
+            self.listingCache.invalidate(repoPath)
+        return numPacked
+
+
+    def delete_images(self, datePath: Path, imageNames: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        """
+        Removes images of time prompts from the pack of a date by writing the pack again without them. Failures are logged
+        and leave the pack as it was.
+
+        Returns
+        -------
+        Dict[str, List[str]]
+            The names of the images that were removed per time prompt.
+        """
+        try:
+            return remove_packed_images_of_date(datePath, imageNames)
+        except (OSError, zipfile.BadZipFile) as e:
+            logging.error(f'Could not delete packed images of {datePath} : {traceback.format_exc()}')
+            return {}
@@ -0,0 +1,147 @@
+import threading
+from typing import Dict, List, Tuple, Union
+
+from repoManager.Models import GetImagePrompsResult, ImagePromptDirectory
+from repoManager.utils import generate_file_name
+
+from utils.cacheUtils import LRUCache
+from utils.enums import DIRECTION
+
+
+DEFAULT_PAGE_CACHE_BYTES = 8 * 1024 * 1024
+
+# Rough in memory cost of a result or a lazy image handle besides any bytes it holds
+RESULT_OVERHEAD_BYTES = 512
+HANDLE_OVERHEAD_BYTES = 256
+
+
+DirectoryKey = Tuple[str, str]
+
+
+def directory_key(directory: ImagePromptDirectory) -> Union[DirectoryKey, None]:
+    """
+    Gets the sort key of an image prompt directory (or token). Repos are ordered by this key, most recent being the biggest.
+    """
+    if directory is None:
+        return None
+    return (directory.date, generate_file_name(directory.time, directory.prompt))
+
+
+def estimate_page_size(page: GetImagePrompsResult) -> int:
+    """
+    Estimates how many bytes a page of results keeps in memory.
+    """
+    size = 0
+    for result in page.results:
+        size += RESULT_OVERHEAD_BYTES
+        for image in result.images:
+            size += len(image) if isinstance(image, bytes) else HANDLE_OVERHEAD_BYTES
+        for thumbnail in (result.thumbnails or []):
+            size += len(thumbnail) if thumbnail is not None else 0
+    return size
+
+
+def get_page_bounds(token: ImagePromptDirectory, direction: DIRECTION, page: GetImagePrompsResult) -> Tuple[Union[DirectoryKey, None], Union[DirectoryKey, None]]:
+    """
+    Gets the range of directory keys a page depends on. Adding or removing any directory within the range (inclusive) can change
+    the page while changes outside of it can't. None stands for an unbounded side.
+
+    Going forward a page holds the entries right before the token down to its next token (the last entry of a full page).
+    Going backwards a page holds the token and entries after it up to its next token (the entry right after the page).
+    """
+    if direction is DIRECTION.BACKWARD:
+        return (directory_key(token), directory_key(page.nextToken))
+    return (directory_key(page.nextToken), directory_key(token))
+
+
+def is_within_bounds(key: DirectoryKey, lower: Union[DirectoryKey, None], upper: Union[DirectoryKey, None]) -> bool:
+    return (lower is None or lower <= key) and (upper is None or key <= upper)
+
+
+class PageCache(object):
+    """
+    In process cache of pages returned by RepoManager.get_images.
+
+    Pages are stored with least recently used eviction under a byte budget. Each page remembers the range of the repo it was
+    read from so that saving or deleting a single directory only invalidates the cached pages that range covers. Pages further
+    back in history stay cached when a new image is saved.
+
+    Pages can be read on other threads while the repo changes. Readers take the generation before reading a page and hand
+    it back to put so a page read before an invalidation is never cached after it.
+
+    Attributes
+    ----------
+
+    Methods
+    -------
+    get(repo, token, direction, number, options)
+        Gets a cached page or None
+
+    put(repo, token, direction, number, options, page, generation)
+        Caches a page unless the cache was invalidated since generation was taken
+
+    current_generation()
+        Gets a counter that changes on every invalidation
+
+    invalidate_directory(directory)
+        Removes cached pages that could change from the directory being added or removed
+
+    invalidate_directories(directories)
+        Same as invalidate_directory for many directories in a single pass over the cache
+
+    invalidate_repo(repo)
+        Removes every cached page of a repo
+
+    stats()
+        Gets the hit/miss counters and usage of the cache
+    """
+
+    def __init__(self, maxBytes: int = DEFAULT_PAGE_CACHE_BYTES):
+        self.cache = LRUCache(maxBytes, sizeOf=lambda entry: estimate_page_size(entry[0]))
+        self.lock = threading.Lock()
+        self.generation = 0
+
+
+    def _key(self, repo: str, token: ImagePromptDirectory, direction: DIRECTION, number: int, options: tuple) -> tuple:
+        return (repo, directory_key(token), direction, number, options)
+
+
+    def get(self, repo: str, token: ImagePromptDirectory, direction: DIRECTION, number: int, options: tuple = ()) -> Union[GetImagePrompsResult, None]:
+        entry = self.cache.get(self._key(repo, token, direction, number, options))
+        return entry[0] if entry is not None else None
+
+
+    def put(self, repo: str, token: ImagePromptDirectory, direction: DIRECTION, number: int, options: tuple, page: GetImagePrompsResult, generation: int = None):
+        lower, upper = get_page_bounds(token, direction, page)
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.cache.put(self._key(repo, token, direction, number, options), (page, lower, upper))
+
+
+    def current_generation(self) -> int:
+        with self.lock:
+            return self.generation
+
+
+    def invalidate_directory(self, directory: ImagePromptDirectory) -> int:
+        return self.invalidate_directories([directory])
+
+
+    def invalidate_directories(self, directories: List[ImagePromptDirectory]) -> int:
+        keys = [(directory.repo, directory_key(directory)) for directory in directories]
+        with self.lock:
+            self.generation += 1
+            return self.cache.remove_where(
+                lambda cacheKey, entry: any(cacheKey[0] == repo and is_within_bounds(key, entry[1], entry[2]) for repo, key in keys)
+            )
+
+
+    def invalidate_repo(self, repo: str) -> int:
+        with self.lock:
+            self.generation += 1
+            return self.cache.remove_where(lambda cacheKey, entry: cacheKey[0] == repo)
+
+
+    def stats(self) -> Dict[str, int]:
+        return self.cache.stats()
@@ -0,0 +1,182 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Union
+
+from repoManager.Models import GetImagePrompsResult, ImagePrompResult, ImagePromptDirectory, NextToken
+from repoManager.PageCache import DEFAULT_PAGE_CACHE_BYTES, PageCache
+
+from utils.enums import DIRECTION
+
+
+# Reads of a page are spread over this many threads. SD cards serve a few concurrent reads much faster then one at a time.
+DEFAULT_READ_WORKERS = 4
+
+# Niceness of the prefetch thread so speculative reads yield to everything else
+PREFETCH_NICENESS = 10
+
+
+def lower_thread_priority(niceness: int = PREFETCH_NICENESS):
+    """
+    Lowers the scheduling priority of the calling thread. On linux niceness applies per thread, elsewhere this does nothing.
+    """
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), niceness)
+    except (AttributeError, OSError):
+        pass
+
+
+class PageReader(object):
+    """
+    Reads the pages of the RepoManager. Keeps pages read recently in a PageCache, reads the files of a page on a pool of
+    read threads and reads pages ahead of time on a single low priority prefetch thread. Pages the UI waits on are read on
+    their own thread so they never queue behind prefetches.
+
+    Which directories belong on a page is up to the RepoManager, that hands over a callable reading the page on a miss.
+
+    Attributes
+    ----------
+    pageCache (PageCache)
+        pages read recently, bounded by pageCacheBytes
+
+    readWorkers (int)
+        number of read threads, the files of a page are read on the calling thread when 1 or less
+
+    Methods
+    -------
+    read_page(directories, includeThumbnails, eager, parallel)
+        Reads the files of every directory of a page
+
+    get_page(repo, token, direction, number, options, readPage)
+        Gets a page from the cache, reading and caching it on a miss
+
+    prefetch(readPage)
+        Reads a page on the prefetch thread
+
+    cancel_prefetches()
+        Drops every prefetch that hasn't started yet
+
+    submit_read(read, *args, **kwargs)
+        Runs a read for the UI in the background
+
+    submit_background(read, *args, **kwargs)
+        Runs a read on the low priority prefetch thread
+
+    submit_page(read, *args, **kwargs)
+        Runs a read of a page for the UI in the background
+
+    close()
+        Drops pending prefetches and waits for every read to finish
+    """
+
+    def __init__(
+            self,
+            readDirectory: Callable[[ImagePromptDirectory, bool, bool], ImagePrompResult],
+            pageCacheBytes: int = DEFAULT_PAGE_CACHE_BYTES,
+            readWorkers: int = DEFAULT_READ_WORKERS
+        ):
+        self.readDirectory = readDirectory
+        self.pageCache = PageCache(pageCacheBytes)
+        self.readWorkers = readWorkers
+        self.readExecutor = ThreadPoolExecutor(max_workers=readWorkers, thread_name_prefix="RepoManagerRead") if readWorkers > 1 else None
+        self.prefetchExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="RepoManagerPrefetch", initializer=lower_thread_priority)
+        self.pageExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="RepoManagerPage")
+        # Bumped by the UI thread to cancel prefetches and checked by the prefetch thread, only touched under the lock
+        self.lock = threading.Lock()
+        self.prefetchGeneration = 0
+
+
+    def read_page(self, directories: List[ImagePromptDirectory], includeThumbnails: bool = False, eager: bool = False, parallel: bool = True) -> List[ImagePrompResult]:
+        """
+        Reads the files of every directory of a page. Reads run concurrently on the read pool but results keep the order of directories.
+        """
+        def read(directory: ImagePromptDirectory) -> ImagePrompResult:
+            return self.readDirectory(directory, includeThumbnails, eager)
+
+        if not parallel or self.readExecutor is None or len(directories) < 2:
+            return [read(directory) for directory in directories]
+        return list(self.readExecutor.map(read, directories))
+
+
+    def get_page(
+            self,
+            repo: str,
+            token: NextToken,
+            direction: DIRECTION,
+            number: int,
+            options: tuple,
+            readPage: Callable[[], GetImagePrompsResult]
+        ) -> GetImagePrompsResult:
+        """
+        Gets a cached page, or reads it with readPage and caches it unless reading it failed. Pages read while the cache was
+        invalidated are returned but not cached.
+        """
+        cachedPage = self.pageCache.get(repo, token, direction, number, options)
+        if cachedPage is not None:
+            return cachedPage
+
+        generation = self.pageCache.current_generation()
+        page = readPage()
+        if page.errorMessage is None:
+            self.pageCache.put(repo, token, direction, number, options, page, generation)
+        return page
+
+
+    def prefetch(self, readPage: Callable[[], GetImagePrompsResult]) -> Future:
+        """
+        Reads a page on the prefetch thread. Prefetches run one at a time so they don't crowd out the read pool.
+
+        Returns
+        -------
+        Future
+            Resolves to the page, or None if the prefetch was cancelled before it started.
+        """
+        generation = self.current_prefetch_generation()
+        def prefetch() -> Union[GetImagePrompsResult, None]:
+            if generation != self.current_prefetch_generation():
+                return None
+            return readPage()
+        return self.prefetchExecutor.submit(prefetch)
+
+
+    def cancel_prefetches(self):
+        """
+        Drops every prefetch that hasn't started yet. A prefetch that already started still finishes and gets cached.
+        """
+        with self.lock:
+            self.prefetchGeneration += 1
+
+
+    def current_prefetch_generation(self) -> int:
+        with self.lock:
+            return self.prefetchGeneration
+
+
+    def submit_read(self, read: Callable, *args, **kwargs) -> Future:
+        """
+        Runs a read for the UI on the read pool, or on the prefetch thread when reads aren't pooled. Only for reads that
+        don't read pages through the read pool themselves, those would wait on the pool they're running on.
+        """
+        executor = self.readExecutor if self.readExecutor is not None else self.prefetchExecutor
+        return executor.submit(read, *args, **kwargs)
+
+
+    def submit_background(self, read: Callable, *args, **kwargs) -> Future:
+        """
+        Runs a read on the low priority prefetch thread so it doesn't compete with the UI.
+        """
+        return self.prefetchExecutor.submit(read, *args, **kwargs)
+
+
+    def submit_page(self, read: Callable, *args, **kwargs) -> Future:
+        """
+        Runs a read of a page for the UI on the page thread. Unlike submit_read the read can spread its files over the read pool.
+        """
+        return self.pageExecutor.submit(read, *args, **kwargs)
+
+
+    def close(self):
+        self.cancel_prefetches()
+        for executor in [self.pageExecutor, self.prefetchExecutor, self.readExecutor]:
+            if executor is not None:
+                executor.shutdown(wait=True)
@@ -0,0 +1,53 @@
+from bisect import bisect_right
+from typing import List, Tuple, Union
+
+
+class PromptCounts(object):
+    """
+    How many time prompt directories each date of a repo holds, most recent date first.
+
+    Keeps the running total of entries before every date (prefix sums) so the date holding the n-th most recent entry
+    of the repo can be found with a binary search instead of walking every date before it.
+
+    Attributes
+    ----------
+    dates (List[str])
+        Dates of the repo that hold at least one entry, most recent first
+
+    total (int)
+        Number of entries in the repo
+
+    Methods
+    -------
+    locate(offset)
+        Finds the date holding the entry offset places from the most recent entry and where in the date it is
+    """
+
+    def __init__(self, dateCounts: List[Tuple[str, int]]):
+        self.dates: List[str] = []
+        self.offsets: List[int] = []
+        self.total = 0
+        for date, count in dateCounts:
+            if count <= 0:
+                continue
+            self.dates.append(date)
+            self.offsets.append(self.total)
+            self.total += count
+
+
+    def locate(self, offset: int) -> Union[Tuple[str, int], None]:
+        """
+        Parameters
+        ----------
+        offset (int):
+            How many entries come before the wanted entry, going from most recent to oldest.
+
+        Returns
+        -------
+        Tuple[str, int]
+            The date of the entry and how many entries of that date come before it, or None if the repo has no such entry.
+        """
+        if offset < 0 or offset >= self.total:
+            return None
+        dateIndex = bisect_right(self.offsets, offset) - 1
+        return (self.dates[dateIndex], offset - self.offsets[dateIndex])
@@ -0,0 +1,338 @@
+import logging
+import os
+import shutil
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+from repoManager.DatePack import PACK_FILE_NAME, DatePack, remove_packed_images_of_date, seek_packed_image
+from repoManager.Models import ImagePromptDirectory
+from repoManager.RepoManager import RepoManager
+from repoManager.utils import extract_file_name
+
+from utils.pathingUtils import is_temporary_file
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Every complete PNG ends with an empty IEND chunk (length, type and crc)
+PNG_END = b"\x00\x00\x00\x00IEND\xaeB`\x82"
+
+# Signature, IHDR chunk and IEND chunk. Anything smaller can't be a PNG.
+MIN_PNG_BYTES = len(PNG_SIGNATURE) + 25 + len(PNG_END)
+
+# Images are handed to the worker processes in batches of this size so process overhead doesn't dominate
+CHECK_BATCH_SIZE = 256
+
+# Temporary files modified more recently than this may still be written by a running app and are left alone
+DEFAULT_TEMPORARY_FILE_MIN_AGE_SECONDS = 60 * 60
+
+# (path of the image, path of its pack or None if loose, header offset within the pack, size)
+ImageCheck = Tuple[Path, Union[Path, None], int, int]
+
+
+def check_png_ends(head: bytes, tail: bytes, size: int) -> Union[str, None]:
+    """
+    Checks the first and last bytes of an image. Returns what's wrong with it or None if it looks like a complete PNG.
+    """
+    if size == 0:
+        return "empty"
+    if size < MIN_PNG_BYTES or not head.startswith(PNG_SIGNATURE):
+        return "not a png"
+    if tail != PNG_END:
+        return "truncated"
+    return None
+
+
+def check_image(image: ImageCheck) -> Union[str, None]:
+    """
+    Validates a single image by reading only its header and its end, so checking costs the same for small and big images.
+    """
+    path, packPath, headerOffset, size = image
+    try:
+        with open(packPath if packPath is not None else path, "rb") as f:
+            start = seek_packed_image(f, headerOffset) if packPath is not None else 0
+            if packPath is None:
+                size = os.fstat(f.fileno()).st_size
+            head = f.read(min(size, len(PNG_SIGNATURE)))
+            f.seek(start + max(0, size - len(PNG_END)))
+            tail = f.read(min(size, len(PNG_END)))
+    except OSError as e:
+        return f'unreadable ({e})'
+    if len(head) < min(size, len(PNG_SIGNATURE)) or len(tail) < min(size, len(PNG_END)):
+        return "truncated"
+    return check_png_ends(head, tail, size)
+
+
+def check_images(images: List[ImageCheck]) -> List[Tuple[ImageCheck, str]]:
+    """
+    Checks a batch of images in a worker process. Returns only the images that have a problem along with the problem.
+    """
+    problems = []
+    for image in images:
+        problem = check_image(image)
+        if problem is not None:
+            problems.append((image, problem))
+    return problems
+
+
+def is_empty_directory(path: Path) -> bool:
+    with os.scandir(path) as entries:
+        return not any(entries)
+
+
+class FsckReport(object):
+    """
+    What a repo check found (and repaired) along with how fast the check went.
+
+    Attributes
+    ----------
+    corruptImages (List[Tuple[Path, str]])
+        Images that are empty, not PNGs or truncated, along with what's wrong with them
+
+    temporaryFiles (List[Path])
+        Leftovers of writes that never finished, only the ones old enough that no write can still be in progress
+
+    emptyPromptDirectories (List[Path])
+        Time prompt directories without any image
+
+    emptyDateDirectories (List[Path])
+        Date directories without any time prompt
+
+    orphanThumbnails (List[Path])
+        Thumbnails whose image no longer exists
+
+    strayFiles (List[Path])
+        Files where only directories belong. Only reported, never removed.
+
+    corruptPacks (List[Path])
+        Packs whose offset table can't be read. Only reported, never removed.
+    """
+
+    def __init__(self, repo: str):
+        self.repo = repo
+        self.corruptImages: List[Tuple[Path, str]] = []
+        self.temporaryFiles: List[Path] = []
+        self.emptyPromptDirectories: List[Path] = []
+        self.emptyDateDirectories: List[Path] = []
+        self.orphanThumbnails: List[Path] = []
+        self.strayFiles: List[Path] = []
+        self.corruptPacks: List[Path] = []
+        self.imagesChecked = 0
+        self.bytesChecked = 0
+        self.seconds = 0.0
+        self.repaired = False
+
+
+    def problem_count(self) -> int:
+        return (
+            len(self.corruptImages) + len(self.temporaryFiles) + len(self.emptyPromptDirectories) + len(self.emptyDateDirectories)
+            + len(self.orphanThumbnails) + len(self.strayFiles) + len(self.corruptPacks)
+        )
+
+
+    def unrepaired_count(self) -> int:
+        """
+        Problems still there after a repair, the ones that are only reported.
+        """
+        return len(self.strayFiles) + len(self.corruptPacks)
+
+
+    def images_per_second(self) -> float:
+        return self.imagesChecked / self.seconds if self.seconds > 0 else 0.0
+
+
+class RepoFsck(object):
+    """
+    Finds (and optionally repairs) what power losses and interrupted writes leave behind in a repo: empty, truncated or
+    non PNG images, temporary files, empty prompt and date directories and thumbnails of images that are gone.
+
+    The directory walk happens in the calling process while the images are validated on a pool of worker processes.
+    Only the first and last bytes of every image are read so a check is bound by the number of images rather then their size.
+
+    Repairs remove what's broken and then rebuild the index, listings, cached pages and missing thumbnails of the repo.
+    Temporary files are only reported once they haven't been modified for temporaryFileMinAge seconds, so the
+    temporary files and directories of a save still in progress in a running app are never removed from under it.
+
+    Attributes
+    ----------
+    repoManager (RepoManager)
+        manager of the repos being checked
+
+    workers (int)
+        number of worker processes, checks run in the calling process when 1 or less
+
+    temporaryFileMinAge (float)
+        seconds since their last modification after which temporary files count as leftovers
+
+    Methods
+    -------
+    check(repo, repair)
+        Checks a repo, repairing what it can if asked to
+    """
+
+    def __init__(self, repoManager: RepoManager, workers: int = None, temporaryFileMinAge: float = DEFAULT_TEMPORARY_FILE_MIN_AGE_SECONDS):
+        self.repoManager = repoManager
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.temporaryFileMinAge = temporaryFileMinAge
+
+
+    def _add_temporary_file(self, path: Path, report: FsckReport):
+        try:
+            modified = os.lstat(path).st_mtime
+        except FileNotFoundError:
+            # The write it belonged to just finished
+            return
+        if time.time() - modified >= self.temporaryFileMinAge:
+            report.temporaryFiles.append(path)
+
+
+    def _walk(self, repoPath: Path, report: FsckReport) -> List[ImageCheck]:
+        images: List[ImageCheck] = []
+        for date in sorted(os.listdir(repoPath), reverse=True):
+            datePath = repoPath/date
+            if is_temporary_file(date):
+                self._add_temporary_file(datePath, report)
+                continue
+            if not datePath.is_dir():
+                report.strayFiles.append(datePath)
+                continue
+
+            hasTimePrompts = False
+            with os.scandir(datePath) as dateEntries:
+                dateEntries = sorted(dateEntries, key=lambda entry: entry.name)
+            for entry in dateEntries:
+                path = Path(entry.path)
+                if is_temporary_file(entry.name):
+                    self._add_temporary_file(path, report)
+                elif entry.name == PACK_FILE_NAME:
+                    hasTimePrompts = True
+                    try:
+                        pack = DatePack(datePath)
+                    except Exception as e:
+                        logging.error(f'Could not read pack {path} : {traceback.format_exc()}')
+                        report.corruptPacks.append(path)
+                        continue
+                    for timePrompt, packedImages in pack.images.items():
+                        for imageName, headerOffset, size, _ in packedImages:
+                            images.append((datePath/timePrompt/imageName, pack.path, headerOffset, size))
+                elif not entry.is_dir() or "_" not in entry.name:
+                    report.strayFiles.append(path)
+                else:
+                    hasTimePrompts = True
+                    hasImages = False
+                    with os.scandir(path) as imageEntries:
+                        for image in imageEntries:
+                            if is_temporary_file(image.name):
+                                self._add_temporary_file(Path(image.path), report)
+                            elif image.is_file():
+                                hasImages = True
+                                images.append((Path(image.path), None, 0, image.stat().st_size))
+                    if not hasImages:
+                        report.emptyPromptDirectories.append(path)
+            if not hasTimePrompts:
+                report.emptyDateDirectories.append(datePath)
+        return images
+
+
+    def _check_images(self, images: List[ImageCheck]) -> List[Tuple[ImageCheck, str]]:
+        batches = [images[i:i + CHECK_BATCH_SIZE] for i in range(0, len(images), CHECK_BATCH_SIZE)]
+        if self.workers <= 1 or len(batches) < 2:
+            return [problem for batch in batches for problem in check_images(batch)]
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            return [problem for problems in executor.map(check_images, batches) for problem in problems]
+
+
+    def _image_exists(self, repoPath: Path, date: str, timePrompt: str, imageName: str) -> bool:
+        if (repoPath/date/timePrompt/imageName).is_file():
+            return True
+        pack = self.repoManager.packStore.packCache.get(repoPath/date)
+        return pack is not None and any(packedImage[0] == imageName for packedImage in pack.images.get(timePrompt, []))
+
+
+    def _find_orphan_thumbnails(self, repo: str, repoPath: Path, report: FsckReport):
+        thumbnailsPath = self.repoManager.thumbnailStore.thumbnailsPath/repo
+        if not thumbnailsPath.is_dir():
+            return
+        for date in os.listdir(thumbnailsPath):
+            for timePrompt in (os.listdir(thumbnailsPath/date) if (thumbnailsPath/date).is_dir() else []):
+                for imageName in (os.listdir(thumbnailsPath/date/timePrompt) if (thumbnailsPath/date/timePrompt).is_dir() else []):
+                    if not self._image_exists(repoPath, date, timePrompt, imageName):
+                        report.orphanThumbnails.append(thumbnailsPath/date/timePrompt/imageName)
+
+
+    def _repair(self, repo: str, repoPath: Path, report: FsckReport):
+        for path in report.temporaryFiles:
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
+
+        # date path -> time prompt -> names of packed images to remove
+        packedImages: Dict[Path, Dict[str, List[str]]] = {}
+        for path, problem in report.corruptImages:
+            logging.info(f'Removing {problem} image {path}')
+            if path.is_file():
+                path.unlink()
+            else:
+                packedImages.setdefault(path.parent.parent, {}).setdefault(path.parent.name, []).append(path.name)
+        # Packs are written again once per date rather then once per image
+        for datePath, imageNames in packedImages.items():
+            remove_packed_images_of_date(datePath, imageNames)
+
+        # Removing broken images can leave more directories empty than the walk found
+        for date in os.listdir(repoPath):
+            datePath = repoPath/date
+            if not datePath.is_dir():
+                continue
+            for timePrompt in os.listdir(datePath):
+                if (datePath/timePrompt).is_dir() and "_" in timePrompt and is_empty_directory(datePath/timePrompt):
+                    (datePath/timePrompt).rmdir()
+            if is_empty_directory(datePath):
+                datePath.rmdir()
+
+        for path in report.orphanThumbnails:
+            timeOfPrompt, prompt = extract_file_name(path.parent.name)
+            directory = ImagePromptDirectory(prompt=prompt, repo=repo, date=path.parent.parent.name, time=timeOfPrompt)
+            self.repoManager.thumbnailStore.delete_thumbnails(directory, [path.name])
+
+        self.repoManager.listingCache.clear()
+        self.repoManager.repoIndex.rebuild(repo, repoPath)
+        self.repoManager.pageCache.invalidate_repo(repo)
+        self.repoManager.backfill_thumbnails(repo)
+        report.repaired = True
+
+
+    def check(self, repo: str = None, repair: bool = False) -> FsckReport:
+        """
+        Parameters
+        ----------
+        repo (str):
+            The repo to check. Defaults to the current repo of the manager.
+
+        repair (bool):
+            Whether to remove what's broken and rebuild the index and caches of the repo afterwards. Defaults to only reporting.
+
+        Returns
+        -------
+        FsckReport
+            Everything that was found along with throughput stats of the check.
+        """
+        repo = repo if repo is not None else self.repoManager.current_repo()
+        repoPath = self.repoManager.reposPath/repo
+        report = FsckReport(repo)
+
+        start = time.perf_counter()
+        images = self._walk(repoPath, report)
+        for image, problem in self._check_images(images):
+            report.corruptImages.append((image[0], problem))
+        self._find_orphan_thumbnails(repo, repoPath, report)
+        report.imagesChecked = len(images)
+        report.bytesChecked = sum(image[3] for image in images)
+        report.seconds = time.perf_counter() - start
+
+        if repair:
+            self._repair(repo, repoPath, report)
+        return report
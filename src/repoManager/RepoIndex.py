@@ -0,0 +1,676 @@
+import logging
+import math
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple, Union
+
+from repoManager.DatePack import DatePack, DatePackCache, get_reverse_sorted_listing
+from repoManager.DirectoryListingCache import DirectoryListingCache
+from repoManager.Models import ImagePromptDirectory
+from repoManager.PromptCounts import PromptCounts
+from repoManager.utils import extract_file_name, generate_file_name, tokenize_prompt
+
+from utils.pathingUtils import get_directory_signature, is_temporary_file
+from utils.enums import DIRECTION
+
+
+INDEX_SCHEMA_VERSION = "3"
+
+# Sorts after every real character. Added to a search word to get the range of words starting with it.
+LAST_CHARACTER = "\U0010ffff"
+
+IN_MEMORY_INDEX = ":memory:"
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS repos (
+    repo TEXT PRIMARY KEY,
+    rootSignature TEXT,
+    headDate TEXT,
+    headSignature TEXT
+);
+
+CREATE TABLE IF NOT EXISTS dates (
+    repo TEXT NOT NULL,
+    date TEXT NOT NULL,
+    signature TEXT,
+    PRIMARY KEY (repo, date)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS prompts (
+    repo TEXT NOT NULL,
+    date TEXT NOT NULL,
+    timePrompt TEXT NOT NULL,
+    time TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    imageCount INTEGER NOT NULL,
+    sizeBytes INTEGER NOT NULL,
+    PRIMARY KEY (repo, date, timePrompt)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS promptTokens (
+    repo TEXT NOT NULL,
+    token TEXT NOT NULL,
+    date TEXT NOT NULL,
+    timePrompt TEXT NOT NULL,
+    PRIMARY KEY (repo, token, date, timePrompt)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS promptTokensByEntry ON promptTokens (repo, date, timePrompt, token);
+"""
+
+
+def scan_image_prompt_directory(path: Path) -> List[int]:
+    """
+    Counts the images in a time prompt directory and the total bytes they take up on disk.
+    Will be returned as a list where the image count is the first index and the size is the second index.
+    """
+    imageCount = 0
+    sizeBytes = 0
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_file() and not is_temporary_file(entry.name):
+                imageCount += 1
+                sizeBytes += entry.stat().st_size
+    return [imageCount, sizeBytes]
+
+
+def scan_time_prompt(datePath: Path, timePrompt: str, pack: DatePack = None) -> Union[List[int], None]:
+    """
+    Same as scan_image_prompt_directory for a time prompt that's either a directory or in the pack of its date.
+    Returns None if it's neither.
+    """
+    if (datePath/timePrompt).is_dir():
+        return scan_image_prompt_directory(datePath/timePrompt)
+    if pack is not None and timePrompt in pack.images:
+        packedImages = pack.images[timePrompt]
+        return [len(packedImages), sum(packedImage[2] for packedImage in packedImages)]
+    return None
+
+
+class RepoIndex(object):
+    """
+    Persistent SQLite index of the image prompt directories of every image repo.
+
+    Walking the file system of a repo requires listing and sorting every date directory that is passed on the way to a page.
+    The index instead stores a row per time prompt directory (date, time, prompt, repo, image count and sizes) keyed
+    by the same ordering the DirectoryIterator uses so pages can be served with a single keyset query on the primary key.
+
+    Prompts are also searchable by word. Every entry has a row per word of its prompt in an inverted index (promptTokens)
+    that is kept up to date along with the entries themselves.
+
+    The file system is always the source of truth. Every repo in the index records a signature of its root directory, of its
+    most recent date directory and of every date directory. The first time a repo is used after the index was opened the
+    signature of every date is checked, so dates changed while the app was closed are scanned again. After that only
+    the root and the most recent date are checked, changes to older dates are picked up by the RepoWatcher. Writes done
+    through the RepoManager keep the index up to date so it never goes stale from them.
+
+    If the index file can't be opened (for example because the directory is not writable) an in memory index is used instead. That
+    index starts empty so every repo is rebuilt from the file system the first time it is used in the process.
+
+    Rebuilds list directories through an optional DirectoryListingCache so only the directories that actually changed get scanned again.
+    Time prompts packed into their date directory (see DatePack) are indexed the same as the ones still in directories.
+
+    Attributes
+    ----------
+    indexPath (Path)
+        location of the SQLite file backing this index
+
+    Methods
+    -------
+    ensure_fresh(repo, repoPath)
+        Builds the repo if its missing from the index and scans the dates that changed again if its stale. Returns if
+        anything had to be read from the file system.
+
+    rebuild(repo, repoPath)
+        Replaces all index entries of a repo with what is in the file system
+
+    invalidate(repo)
+        Marks a repo as stale so the next ensure_fresh call rebuilds it
+
+    add_directory(directory, imageCount, sizeBytes, repoPath)
+        Adds or replaces a single time prompt directory entry
+
+    remove_directory(directory, repoPath)
+        Removes a single time prompt directory entry
+
+    update_directories(repo, repoPath, scannedDirectories)
+        Adds, replaces or removes the entries of many time prompt directories in one transaction
+
+    reconcile_date(repo, repoPath, date)
+        Brings the entries of a single date in line with the file system after it was changed externally
+
+    iterate_directories(repo, startingDirectory, direction, batchSize, newestDate, oldestDate)
+        Iterates the index in the same order and with the same token semantics as the DirectoryIterator
+
+    get_prompt_counts(repo)
+        Gets how many entries every date of a repo holds. Kept in memory until the repo changes.
+
+    get_directory_at(repo, date, offset)
+        Gets the entry of a date that has offset entries of the same date before it
+
+    iterate_search(repo, query, startingDirectory, direction, batchSize)
+        Iterates the entries whose prompts match a search query, with the same ordering and token semantics as iterate_directories
+    """
+
+    def __init__(self, indexPath: Union[str, Path] = IN_MEMORY_INDEX, listingCache: DirectoryListingCache = None, packCache: DatePackCache = None):
+        self.indexPath = indexPath
+        self.listingCache = listingCache
+        self.packCache = packCache if packCache is not None else DatePackCache()
+        self.lock = threading.RLock()
+        self.connection = self._connect(indexPath)
+        self.promptCounts: Dict[str, PromptCounts] = {}
+        # Repos whose every date was checked since the index was opened
+        self.checkedRepos = set()
+
+
+    def _connect(self, indexPath: Union[str, Path]) -> sqlite3.Connection:
+        try:
+            if indexPath != IN_MEMORY_INDEX:
+                os.makedirs(Path(indexPath).parent, exist_ok=True)
+            connection = self._open(indexPath)
+        except (sqlite3.Error, OSError) as e:
+            logging.warning(f'Could not open repo index at {indexPath}. Falling back to an in memory index : {str(e)}')
+            self.indexPath = IN_MEMORY_INDEX
+            connection = self._open(IN_MEMORY_INDEX)
+        return connection
+
+
+    def _open(self, indexPath: Union[str, Path]) -> sqlite3.Connection:
+        connection = sqlite3.connect(str(indexPath), check_same_thread=False)
+        try:
+            if indexPath != IN_MEMORY_INDEX:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+
+            version = connection.execute("SELECT value FROM meta WHERE key = 'schemaVersion'").fetchone()
+            if version is None or version[0] != INDEX_SCHEMA_VERSION:
+                # Older layouts are simply rebuilt from the file system
+                with connection:
+                    connection.execute("DELETE FROM promptTokens")
+                    connection.execute("DELETE FROM prompts")
+                    connection.execute("DELETE FROM dates")
+                    connection.execute("DELETE FROM repos")
+                    connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('schemaVersion', ?)", (INDEX_SCHEMA_VERSION,))
+        except BaseException:
+            connection.close()
+            raise
+        return connection
+
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+    def _is_stale(self, repo: str, repoPath: Path) -> bool:
+        """
+        Only the root and the most recent date directory are checked. That catches new dates, removed dates and new prompts
+        of today. Older dates are checked by _find_changed_dates once per repo after opening.
+        """
+        rootSignature, headDate, headSignature = self.connection.execute(
+            "SELECT rootSignature, headDate, headSignature FROM repos WHERE repo = ?", (repo,)
+        ).fetchone()
+        if rootSignature != get_directory_signature(repoPath):
+            return True
+        return headDate is not None and headSignature != get_directory_signature(repoPath/headDate)
+
+
+    def _find_changed_dates(self, repo: str, repoPath: Path) -> List[str]:
+        """
+        Compares the signature of every date directory with the one recorded when the date was last scanned. Costs a stat
+        per date rather then a walk of the repo.
+        """
+        recorded = dict(self.connection.execute("SELECT date, signature FROM dates WHERE repo = ?", (repo,)).fetchall())
+        onDisk = [date for date in self._list_directory(repoPath) if (repoPath/date).is_dir()]
+        changed = [date for date in onDisk if recorded.get(date) != get_directory_signature(repoPath/date)]
+        return changed + sorted(set(recorded) - set(onDisk), reverse=True)
+
+
+    def ensure_fresh(self, repo: str, repoPath: Union[str, Path]) -> bool:
+        """
+        Makes sure the index of the given repo matches the file system. Checking is only a couple of stat calls.
+
+        Parameters
+        ----------
+        repo (str):
+            Name of the repo.
+
+        repoPath (Path):
+            Absolute path to the repo on the file system.
+
+        Returns
+        -------
+        bool
+            True if the repo had to be built or dates had to be scanned again.
+        """
+        repoPath = Path(repoPath)
+        with self.lock:
+            if self.connection.execute("SELECT 1 FROM repos WHERE repo = ?", (repo,)).fetchone() is None:
+                logging.info(f'Repo index for {repo} is missing. Building from {repoPath}')
+                self.rebuild(repo, repoPath)
+                return True
+            if repo in self.checkedRepos and not self._is_stale(repo, repoPath):
+                return False
+
+            changedDates = self._find_changed_dates(repo, repoPath)
+            self.checkedRepos.add(repo)
+            if len(changedDates) == 0:
+                with self.connection:
+                    self._refresh_signatures(repo, repoPath, [])
+                return False
+            logging.info(f'Repo index for {repo} is stale. Scanning {len(changedDates)} changed dates again')
+            self._rescan_dates(repo, repoPath, changedDates)
+            return True
+
+
+    def rebuild(self, repo: str, repoPath: Union[str, Path]):
+        """
+        Replaces every index entry of the repo with the directories currently in the file system.
+        """
+        repoPath = Path(repoPath)
+        with self.lock:
+            # Take the signatures before walking so changes made during the walk make the repo stale again
+            rootSignature = get_directory_signature(repoPath)
+            dates = [date for date in self._list_directory(repoPath) if (repoPath/date).is_dir()]
+            headDate = dates[0] if len(dates) > 0 else None
+            headSignature = get_directory_signature(repoPath/headDate) if headDate is not None else None
+            dateSignatures = [(repo, date, get_directory_signature(repoPath/date)) for date in dates]
+
+            rows = []
+            for date in dates:
+                rows += self._scan_date(repo, repoPath, date)
+
+            self.promptCounts.pop(repo, None)
+            with self.connection:
+                self.connection.execute("DELETE FROM prompts WHERE repo = ?", (repo,))
+                self.connection.execute("DELETE FROM promptTokens WHERE repo = ?", (repo,))
+                self.connection.execute("DELETE FROM dates WHERE repo = ?", (repo,))
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO prompts (repo, date, timePrompt, time, prompt, imageCount, sizeBytes) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._insert_tokens([(row[0], row[1], row[2], row[4]) for row in rows])
+                self.connection.executemany("INSERT INTO dates (repo, date, signature) VALUES (?, ?, ?)", dateSignatures)
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO repos (repo, rootSignature, headDate, headSignature) VALUES (?, ?, ?, ?)",
+                    (repo, rootSignature, headDate, headSignature)
+                )
+            self.checkedRepos.add(repo)
+            logging.info(f'Indexed {len(rows)} prompt directories across {len(dates)} dates for repo {repo}')
+
+
+    def _scan_date(self, repo: str, repoPath: Path, date: str) -> List[tuple]:
+        """
+        Gets the rows of every time prompt of a date on the file system, none if the date no longer exists.
+        """
+        datePath = repoPath/date
+        if not datePath.is_dir():
+            return []
+        rows = []
+        pack = self.packCache.get(datePath)
+        for timePrompt in self._list_directory(datePath):
+            scanned = scan_time_prompt(datePath, timePrompt, pack) if "_" in timePrompt else None
+            if scanned is None:
+                continue
+            time, prompt = extract_file_name(timePrompt)
+            rows.append((repo, date, timePrompt, time, prompt, *scanned))
+        return rows
+
+
+    def _rescan_dates(self, repo: str, repoPath: Path, dates: List[str]):
+        """
+        Replaces the entries of some dates of a repo with what is in the file system, leaving the other dates alone.
+        """
+        rows = []
+        for date in dates:
+            rows += self._scan_date(repo, repoPath, date)
+
+        self.promptCounts.pop(repo, None)
+        with self.connection:
+            self.connection.executemany("DELETE FROM prompts WHERE repo = ? AND date = ?", [(repo, date) for date in dates])
+            self.connection.executemany("DELETE FROM promptTokens WHERE repo = ? AND date = ?", [(repo, date) for date in dates])
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO prompts (repo, date, timePrompt, time, prompt, imageCount, sizeBytes) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._insert_tokens([(row[0], row[1], row[2], row[4]) for row in rows])
+            self._refresh_signatures(repo, repoPath, dates)
+
+
+    def _list_directory(self, path: Path) -> List[str]:
+        if self.listingCache is not None:
+            return self.listingCache.get_reverse_sorted(path)
+        return get_reverse_sorted_listing(path)
+
+
+    def invalidate(self, repo: str):
+        """
+        Forgets the signatures of the repo so the next ensure_fresh call rebuilds it.
+        """
+        with self.lock:
+            self.promptCounts.pop(repo, None)
+            self.checkedRepos.discard(repo)
+            with self.connection:
+                self.connection.execute("DELETE FROM repos WHERE repo = ?", (repo,))
+
+
+    def _insert_tokens(self, entries: List[tuple]):
+        """
+        Adds the words of each (repo, date, timePrompt, prompt) entry to the search index.
+        """
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO promptTokens (repo, token, date, timePrompt) VALUES (?, ?, ?, ?)",
+            ((repo, token, date, timePrompt) for repo, date, timePrompt, prompt in entries for token in tokenize_prompt(prompt))
+        )
+
+
+    def _delete_tokens(self, entries: List[tuple]):
+        """
+        Removes every word of each (repo, date, timePrompt) entry from the search index.
+        """
+        self.connection.executemany(
+            "DELETE FROM promptTokens WHERE repo = ? AND date = ? AND timePrompt = ?",
+            entries
+        )
+
+
+    def _refresh_signatures(self, repo: str, repoPath: Path, dates: List[str]):
+        """
+        Records the signatures of the repo root, the most recent date and the given dates after they were brought in line
+        with the file system.
+        """
+        for date in dates:
+            signature = get_directory_signature(repoPath/date)
+            if signature is None:
+                self.connection.execute("DELETE FROM dates WHERE repo = ? AND date = ?", (repo, date))
+            else:
+                self.connection.execute("INSERT OR REPLACE INTO dates (repo, date, signature) VALUES (?, ?, ?)", (repo, date, signature))
+        headDate = self.connection.execute("SELECT MAX(date) FROM prompts WHERE repo = ?", (repo,)).fetchone()[0]
+        self.connection.execute(
+            "UPDATE repos SET rootSignature = ?, headDate = ?, headSignature = ? WHERE repo = ?",
+            (
+                get_directory_signature(repoPath),
+                headDate,
+                get_directory_signature(repoPath/headDate) if headDate is not None else None,
+                repo
+            )
+        )
+
+
+    def add_directory(self, directory: ImagePromptDirectory, imageCount: int, sizeBytes: int, repoPath: Union[str, Path]):
+        """
+        Adds (or replaces) the entry of a time prompt directory that was just written to the file system.
+
+        Should only be called after the directory was changed on the file system since the signatures of the
+        repo are refreshed as part of adding the entry.
+        """
+        self.update_directories(directory.repo, repoPath, [(directory, [imageCount, sizeBytes])])
+
+
+    def remove_directory(self, directory: ImagePromptDirectory, repoPath: Union[str, Path]):
+        """
+        Removes the entry of a time prompt directory that was just deleted from the file system.
+        """
+        self.update_directories(directory.repo, repoPath, [(directory, None)])
+
+
+    def update_directories(self, repo: str, repoPath: Union[str, Path], scannedDirectories: List[Tuple[ImagePromptDirectory, Union[List[int], None]]]):
+        """
+        Same as add_directory and remove_directory for many time prompt directories of a repo at once, in a single transaction.
+        Every directory comes with its image count and size (see scan_time_prompt) or None if it no longer exists.
+        """
+        keys = [(repo, directory.date, generate_file_name(directory.time, directory.prompt)) for directory, _ in scannedDirectories]
+        with self.lock:
+            self.promptCounts.pop(repo, None)
+            with self.connection:
+                self._delete_tokens(keys)
+                self.connection.executemany(
+                    "DELETE FROM prompts WHERE repo = ? AND date = ? AND timePrompt = ?",
+                    [key for key, (_, scanned) in zip(keys, scannedDirectories) if scanned is None]
+                )
+                rows = [
+                    (repo, directory.date, key[2], directory.time, directory.prompt, *scanned)
+                    for key, (directory, scanned) in zip(keys, scannedDirectories) if scanned is not None
+                ]
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO prompts (repo, date, timePrompt, time, prompt, imageCount, sizeBytes) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._insert_tokens([(row[0], row[1], row[2], row[4]) for row in rows])
+                self._refresh_signatures(repo, Path(repoPath), sorted(set(directory.date for directory, _ in scannedDirectories)))
+
+
+    def reconcile_date(self, repo: str, repoPath: Union[str, Path], date: str) -> List[List[ImagePromptDirectory]]:
+        """
+        Compares the time prompt directories of a date on the file system with the index and adds or removes the entries that differ.
+        Directories that exist on both sides are scanned again so images copied into or removed from them update their image count and size.
+        Costs a listing of the one date directory and of its time prompt directories rather then a rebuild of the whole repo.
+
+        Repos that were never built are skipped since they get fully built the next time they are used anyway.
+
+        Returns
+        -------
+        List[List[ImagePromptDirectory]]
+            The directories that were added as the first index, the directories that were removed as the second index and the
+            directories whose images changed as the third index.
+        """
+        repoPath = Path(repoPath)
+        datePath = repoPath/date
+        with self.lock:
+            if self.connection.execute("SELECT 1 FROM repos WHERE repo = ?", (repo,)).fetchone() is None:
+                return [[], [], []]
+
+            pack = self.packCache.get(datePath)
+            onDisk = set(
+                timePrompt for timePrompt in self._list_directory(datePath)
+                if "_" in timePrompt and ((datePath/timePrompt).is_dir() or (pack is not None and timePrompt in pack.images))
+            ) if datePath.is_dir() else set()
+            indexed = dict((row[0], [row[1], row[2]]) for row in self.connection.execute(
+                "SELECT timePrompt, imageCount, sizeBytes FROM prompts WHERE repo = ? AND date = ?", (repo, date)
+            ))
+
+            added = []
+            rows = []
+            for timePrompt in onDisk - indexed.keys():
+                time, prompt = extract_file_name(timePrompt)
+                rows.append((repo, date, timePrompt, time, prompt, *scan_time_prompt(datePath, timePrompt, pack)))
+                added.append(ImagePromptDirectory(prompt=prompt, repo=repo, date=date, time=time))
+
+            updated = []
+            for timePrompt in onDisk & indexed.keys():
+                scanned = scan_time_prompt(datePath, timePrompt, pack)
+                if scanned is None or list(scanned) == indexed[timePrompt]:
+                    continue
+                time, prompt = extract_file_name(timePrompt)
+                rows.append((repo, date, timePrompt, time, prompt, *scanned))
+                updated.append(ImagePromptDirectory(prompt=prompt, repo=repo, date=date, time=time))
+
+            removed = []
+            for timePrompt in indexed.keys() - onDisk:
+                time, prompt = extract_file_name(timePrompt)
+                removed.append(ImagePromptDirectory(prompt=prompt, repo=repo, date=date, time=time))
+
+            self.promptCounts.pop(repo, None)
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO prompts (repo, date, timePrompt, time, prompt, imageCount, sizeBytes) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._insert_tokens([(row[0], row[1], row[2], row[4]) for row in rows])
+                removedKeys = [(repo, date, generate_file_name(directory.time, directory.prompt)) for directory in removed]
+                self.connection.executemany(
+                    "DELETE FROM prompts WHERE repo = ? AND date = ? AND timePrompt = ?",
+                    removedKeys
+                )
+                self._delete_tokens(removedKeys)
+                self._refresh_signatures(repo, repoPath, [date])
+            return [added, removed, updated]
+
+
+    def _query_page(self, repo: str, key: Union[tuple, None], direction: DIRECTION, limit: int, newestDate: str = None, oldestDate: str = None) -> List[tuple]:
+        order = "DESC" if direction is not DIRECTION.BACKWARD else "ASC"
+        comparison = "<" if direction is not DIRECTION.BACKWARD else ">"
+        clauses = ""
+        parameters = [repo]
+        if key is not None:
+            clauses += f" AND (date, timePrompt) {comparison} (?, ?)"
+            parameters += key
+        if newestDate is not None:
+            clauses += " AND date <= ?"
+            parameters.append(newestDate)
+        if oldestDate is not None:
+            clauses += " AND date >= ?"
+            parameters.append(oldestDate)
+        with self.lock:
+            return self.connection.execute(
+                f"SELECT date, timePrompt, time, prompt FROM prompts WHERE repo = ?{clauses} ORDER BY date {order}, timePrompt {order} LIMIT ?",
+                (*parameters, limit)
+            ).fetchall()
+
+
+    def iterate_directories(
+            self,
+            repo: str,
+            startingDirectory: ImagePromptDirectory = None,
+            direction: DIRECTION = DIRECTION.FORWARD,
+            batchSize: int = 10,
+            newestDate: str = None,
+            oldestDate: str = None
+        ) -> Iterator[ImagePromptDirectory]:
+        """
+        Iterates the image prompt directories of a repo with keyset pagination over the index.
+
+        Like the DirectoryIterator the startingDirectory does not need to exist. Iteration begins with the next logical
+        entry after it in the given direction. Rows are fetched from the index in batches of batchSize.
+
+        newestDate and oldestDate (iso-8601, inclusive) bound the dates of the entries. Both are part of the keyset query so
+        iteration seeks straight to the range and stops at its end.
+
+        Returns
+        -------
+        Iterator[ImagePromptDirectory]
+            Directory models for the entries of the repo in order of the given direction.
+        """
+        key = (startingDirectory.date, generate_file_name(startingDirectory.time, startingDirectory.prompt)) if startingDirectory is not None else None
+        while True:
+            rows = self._query_page(repo, key, direction, batchSize, newestDate=newestDate, oldestDate=oldestDate)
+            for date, timePrompt, time, prompt in rows:
+                yield ImagePromptDirectory(prompt=prompt, repo=repo, date=date, time=time)
+            if len(rows) < batchSize:
+                return
+            date, timePrompt, _, _ = rows[-1]
+            key = (date, timePrompt)
+
+
+    def get_prompt_counts(self, repo: str) -> PromptCounts:
+        """
+        Gets the number of entries of every date of a repo. Counted once with a single grouped query and then kept until
+        the repo changes, so repeated lookups (like jumping between pages) don't touch the database.
+        """
+        with self.lock:
+            promptCounts = self.promptCounts.get(repo)
+            if promptCounts is None:
+                promptCounts = PromptCounts(self.connection.execute(
+                    "SELECT date, COUNT(*) FROM prompts WHERE repo = ? GROUP BY date ORDER BY date DESC", (repo,)
+                ).fetchall())
+                self.promptCounts[repo] = promptCounts
+            return promptCounts
+
+
+    def get_directory_at(self, repo: str, date: str, offset: int) -> Union[ImagePromptDirectory, None]:
+        """
+        Gets the entry of a date with offset more recent entries of the same date before it, or None if there is no such entry.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT time, prompt FROM prompts WHERE repo = ? AND date = ? ORDER BY timePrompt DESC LIMIT 1 OFFSET ?",
+                (repo, date, offset)
+            ).fetchone()
+        if row is None:
+            return None
+        time, prompt = row
+        return ImagePromptDirectory(prompt=prompt, repo=repo, date=date, time=time)
+
+
+    def _count_token_matches(self, repo: str, token: str) -> int:
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM promptTokens WHERE repo = ? AND token >= ? AND token < ?",
+                (repo, token, token + LAST_CHARACTER)
+            ).fetchone()[0]
+
+
+    def _query_search_page(self, repo: str, queryTokens: List[str], walkInOrder: bool, key: Union[tuple, None], direction: DIRECTION, limit: int) -> List[tuple]:
+        order = "DESC" if direction is not DIRECTION.BACKWARD else "ASC"
+        comparison = "<" if direction is not DIRECTION.BACKWARD else ">"
+
+        # The first word drives the search and the rest are checked per entry
+        drivingToken, *otherTokens = queryTokens
+        sql = (
+            f"SELECT DISTINCT t.date, t.timePrompt FROM promptTokens t {'INDEXED BY promptTokensByEntry' if walkInOrder else ''}"
+            " WHERE t.repo = ? AND t.token >= ? AND t.token < ?"
+        )
+        parameters = [repo, drivingToken, drivingToken + LAST_CHARACTER]
+        if key is not None:
+            sql += f" AND (t.date, t.timePrompt) {comparison} (?, ?)"
+            parameters += list(key)
+        for token in otherTokens:
+            sql += (
+                " AND EXISTS (SELECT 1 FROM promptTokens o WHERE o.repo = t.repo AND o.date = t.date AND o.timePrompt = t.timePrompt"
+                " AND o.token >= ? AND o.token < ?)"
+            )
+            parameters += [token, token + LAST_CHARACTER]
+        # The unary plus keeps SQLite from walking every entry in order to skip the sort when there are only a few to sort
+        sql += f" ORDER BY t.date {order}, t.timePrompt {order} LIMIT ?" if walkInOrder else f" ORDER BY +t.date {order}, +t.timePrompt {order} LIMIT ?"
+        parameters.append(limit)
+
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+
+    def iterate_search(self, repo: str, query: str, startingDirectory: ImagePromptDirectory = None, direction: DIRECTION = DIRECTION.FORWARD, batchSize: int = 10) -> Iterator[ImagePromptDirectory]:
+        """
+        Iterates the image prompt directories of a repo whose prompt matches a search query. Every word of the query has to
+        start a word of the prompt (case insensitive), so "cat" finds "Cats on a mat". A query without words matches nothing.
+
+        Ordering and startingDirectory work the same as iterate_directories.
+
+        Returns
+        -------
+        Iterator[ImagePromptDirectory]
+            Directory models for the matching entries of the repo in order of the given direction.
+        """
+        queryTokens = tokenize_prompt(query)
+        if len(queryTokens) == 0:
+            return
+
+        # Drive the search by the rarest word
+        matchCounts = {token: self._count_token_matches(repo, token) for token in queryTokens}
+        if min(matchCounts.values()) == 0:
+            return
+        queryTokens.sort(key=matchCounts.get)
+
+        # Either every entry with the rarest word is gathered and sorted, or entries are walked in order until a batch matched.
+        # Pick whichever looks at fewer entries, guessing how many match from how common each word is on its own.
+        total = max(1, self.get_prompt_counts(repo).total)
+        matchingShare = math.prod(min(1.0, count / total) for count in matchCounts.values())
+        walkInOrder = batchSize / matchingShare < matchCounts[queryTokens[0]]
+
+        key = (startingDirectory.date, generate_file_name(startingDirectory.time, startingDirectory.prompt)) if startingDirectory is not None else None
+        while True:
+            rows = self._query_search_page(repo, queryTokens, walkInOrder, key, direction, batchSize)
+            for date, timePrompt in rows:
+                time, prompt = extract_file_name(timePrompt)
+                yield ImagePromptDirectory(prompt=prompt, repo=repo, date=date, time=time)
+            if len(rows) < batchSize:
+                return
+            key = rows[-1]
@@ -0,0 +1,240 @@
+import heapq
+import itertools
+import logging
+import sqlite3
+import traceback
+from pathlib import Path
+from typing import Callable, Iterator, List, Union
+
+from repoManager.DirectoryIterator import DirectoryIterator
+from repoManager.DirectoryListingCache import DirectoryListingCache
+from repoManager.Models import GetImagePrompsResult, ImagePrompResult, ImagePromptDirectory, MergedNextToken, NextToken
+from repoManager.PageCache import directory_key
+from repoManager.PageReader import PageReader
+from repoManager.RepoIndex import RepoIndex
+from repoManager.utils import generate_nextToken, prompt_matches, tokenize_prompt
+
+from utils.enums import DIRECTION
+
+
+# Directories are walked in batches of this size by iter_images when the caller doesn't batch
+ITER_BATCH_SIZE = 64
+
+def iterate_with_fallback(
+        iterateIndex: Callable[[], Iterator[ImagePromptDirectory]],
+        walk: Callable[[ImagePromptDirectory], Iterator[ImagePromptDirectory]],
+        startingDirectory: ImagePromptDirectory = None
+    ) -> Iterator[ImagePromptDirectory]:
+    """
+    Iterates the index, switching to walking the file system if the index fails part way through. The walk picks up
+    right after the last entry handed out so nothing is repeated or skipped.
+    """
+    lastDirectory = startingDirectory
+    try:
+        for directory in iterateIndex():
+            lastDirectory = directory
+            yield directory
+        return
+    except sqlite3.Error as e:
+        logging.error(f'Repo index failed, walking the file system instead : {traceback.format_exc()}')
+    yield from walk(lastDirectory)
+
+
+class RepoIterator(object):
+    """
+    Iterates the entries of the repos for the RepoManager. Entries are looked up in the RepoIndex, falling back to walking
+    the file system with a DirectoryIterator if the index can't be used. Reading the files of the entries is left to the
+    PageReader.
+
+    Attributes
+    ----------
+    reposPath (Path)
+        directory holding every repo
+
+    repoIndex (RepoIndex)
+        index of the entries of every repo
+
+    listingCache (DirectoryListingCache)
+        listings shared with the RepoIndex, used by the file system walks
+
+    pageReader (PageReader)
+        reads the files of the entries, its cached pages are dropped when a repo changed externally
+
+    Methods
+    -------
+    ensure_index_fresh(repo)
+        Makes sure the index of a repo matches the file system
+
+    iterate_directories(repo, startingDirectory, direction, batchSize, newestDate, oldestDate)
+        Iterates the entries of a repo
+
+    iterate_search(repo, query, startingDirectory, direction, batchSize)
+        Iterates the entries of a repo whose prompt matches a search
+
+    iter_images(repo, startToken, stopToken, direction, newestDate, oldestDate, batchSize, loadImages, includeThumbnails, eager)
+        Iterates the entries of a repo without pages
+
+    get_merged_images(number, repos, token, includeThumbnails, eager)
+        Gets a page of several repos merged into one timeline
+    """
+
+    def __init__(self, reposPath: Union[str, Path], repoIndex: RepoIndex, listingCache: DirectoryListingCache, pageReader: PageReader):
+        self.reposPath = Path(reposPath)
+        self.repoIndex = repoIndex
+        self.listingCache = listingCache
+        self.pageReader = pageReader
+
+
+    def ensure_index_fresh(self, repo: str) -> bool:
+        """
+        Makes sure the index of the repo matches the file system. If the repo may of changed outside of the RepoManager (the
+        index had to be rebuilt or could not be checked) every cached page of the repo is dropped since any of them could be affected.
+        """
+        try:
+            changedExternally = self.repoIndex.ensure_fresh(repo, self.reposPath/repo)
+        except sqlite3.Error as e:
+            logging.error(f'Could not refresh repo index : {traceback.format_exc()}')
+            changedExternally = True
+
+        if changedExternally:
+            self.pageReader.pageCache.invalidate_repo(repo)
+        return changedExternally
+
+
+    def iterate_directories(
+            self,
+            repo: str,
+            startingDirectory: ImagePromptDirectory = None,
+            direction: DIRECTION = DIRECTION.FORWARD,
+            batchSize: int = 10,
+            newestDate: str = None,
+            oldestDate: str = None
+        ) -> Iterator[ImagePromptDirectory]:
+        """
+        Iterates the entries of a repo from the index, falling back to walking the file system. newestDate and oldestDate
+        (inclusive) bound the dates of the entries.
+        """
+        def walk(startingDirectory: ImagePromptDirectory) -> Iterator[ImagePromptDirectory]:
+            return DirectoryIterator(
+                pathToDirectories=self.reposPath/repo, startingDirectory=startingDirectory, direction=direction, listingCache=self.listingCache,
+                newestDate=newestDate, oldestDate=oldestDate
+            )
+
+        try:
+            self.repoIndex.ensure_fresh(repo, self.reposPath/repo)
+        except sqlite3.Error as e:
+            logging.error(f'Repo index unavailable, walking the file system instead : {traceback.format_exc()}')
+            return walk(startingDirectory)
+        return iterate_with_fallback(
+            lambda: self.repoIndex.iterate_directories(repo, startingDirectory=startingDirectory, direction=direction, batchSize=batchSize, newestDate=newestDate, oldestDate=oldestDate),
+            walk,
+            startingDirectory
+        )
+
+
+    def iterate_search(self, repo: str, query: str, startingDirectory: ImagePromptDirectory = None, direction: DIRECTION = DIRECTION.FORWARD, batchSize: int = 10) -> Iterator[ImagePromptDirectory]:
+        """
+        Iterates the entries of a repo whose prompt matches a search query (see prompt_matches) from the inverted index of
+        prompt words, falling back to walking the file system.
+        """
+        queryTokens = tokenize_prompt(query)
+        def walk(startingDirectory: ImagePromptDirectory) -> Iterator[ImagePromptDirectory]:
+            if len(queryTokens) == 0:
+                return iter([])
+            directoryIterator = DirectoryIterator(pathToDirectories=self.reposPath/repo, startingDirectory=startingDirectory, direction=direction, listingCache=self.listingCache)
+            return (directory for directory in directoryIterator if prompt_matches(queryTokens, directory.prompt))
+
+        return iterate_with_fallback(
+            lambda: self.repoIndex.iterate_search(repo, query, startingDirectory=startingDirectory, direction=direction, batchSize=batchSize),
+            walk,
+            startingDirectory
+        )
+
+
+    def iter_images(
+            self,
+            repo: str,
+            startToken: NextToken = None,
+            stopToken: NextToken = None,
+            direction: DIRECTION = DIRECTION.FORWARD,
+            newestDate: str = None,
+            oldestDate: str = None,
+            batchSize: int = None,
+            loadImages: bool = False,
+            includeThumbnails: bool = False,
+            eager: bool = False
+        ) -> Iterator[Union[ImagePromptDirectory, ImagePrompResult, List[Union[ImagePromptDirectory, ImagePrompResult]]]]:
+        """
+        Streams the entries of a repo. See RepoManager.iter_images.
+        """
+        forward = direction is not DIRECTION.BACKWARD
+        stopKey = directory_key(stopToken)
+        def in_range(directory: ImagePromptDirectory) -> bool:
+            return stopKey is None or (directory_key(directory) > stopKey if forward else directory_key(directory) < stopKey)
+
+        def load(directories: List[ImagePromptDirectory]) -> List[Union[ImagePromptDirectory, ImagePrompResult]]:
+            if not loadImages:
+                return directories
+            return self.pageReader.read_page(directories, includeThumbnails=includeThumbnails, eager=eager)
+
+        self.ensure_index_fresh(repo)
+        directoryIterator = self.iterate_directories(
+            repo, startingDirectory=startToken, direction=direction, batchSize=max(batchSize or 0, ITER_BATCH_SIZE), newestDate=newestDate, oldestDate=oldestDate
+        )
+
+        batch: List[ImagePromptDirectory] = []
+        for directory in directoryIterator:
+            if not in_range(directory):
+                break
+            batch.append(directory)
+            if len(batch) >= (batchSize or ITER_BATCH_SIZE):
+                yield from ([load(batch)] if batchSize else load(batch))
+                batch = []
+        if batch:
+            yield from ([load(batch)] if batchSize else load(batch))
+
+
+    def get_merged_images(
+            self,
+            number: int,
+            repos: List[str],
+            token: MergedNextToken = None,
+            includeThumbnails: bool = False,
+            eager: bool = False
+        ) -> GetImagePrompsResult:
+        """
+        Pages through several repos at once as a single timeline. See RepoManager.get_merged_images.
+
+        Every repo is read through its own stream and the streams are merged with a heap (k-way merge). Only the entries that
+        make it onto the page, plus a small read ahead per repo, are taken from each stream.
+        """
+        if(number < 1):
+            return GetImagePrompsResult(results=[], errorMessage="Number must be greater then 0")
+
+        try:
+            repoTokens = dict(token.repoTokens) if token is not None else {}
+
+            # Every repo reads ahead its share of the page, repos with more entries on the page just fetch more batches
+            batchSize = number // max(1, len(repos)) + 1
+            streams = []
+            for repo in repos:
+                self.ensure_index_fresh(repo)
+                streams.append(self.iterate_directories(repo, startingDirectory=repoTokens.get(repo), batchSize=batchSize))
+
+            # Ties on time between repos are broken by the repo name so the order never changes between pages
+            merged = heapq.merge(*streams, key=lambda directory: (*directory_key(directory), directory.repo), reverse=True)
+            pageDirectories = list(itertools.islice(merged, number))
+            imagePromptResults = self.pageReader.read_page(pageDirectories, includeThumbnails=includeThumbnails, eager=eager)
+
+            for directory in pageDirectories:
+                repoTokens[directory.repo] = generate_nextToken(directory)
+            return GetImagePrompsResult(
+                imagePromptResults,
+                nextToken=MergedNextToken(repoTokens) if len(pageDirectories) >= number else None,
+            )
+        except BaseException as e:
+            logging.error(traceback.format_exc())
+            return GetImagePrompsResult(
+                results=[],
+                errorMessage = f'Critical error retrieving any results : {str(e)}',
+            )
@@ -1,50 +1,46 @@
+import itertools
 import logging
+import shutil
+import sqlite3
+import threading
 import traceback
 import os
+from datetime import date as Date, timedelta
+from time import monotonic
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Union, List
-from repoManager.DirectoryIterator import DirectoryIterator
-from repoManager.Models import DeleteImagePrompsRequest, ImagePrompResult, NextToken, ImagePromptDirectory, GetImagePrompsResult
-
-from repoManager.utils import generate_file_name, generate_image_prompt_path
+from typing import Callable, Dict, Iterator, Tuple, Union, List
+from repoManager.DirectoryListingCache import DirectoryListingCache
+from repoManager.Models import DeleteImagePrompsRequest, ImageHandle, ImagePrompResult, MergedNextToken, NextToken, ImagePromptDirectory, GetImagePrompsResult
+from repoManager.PackStore import PackStore
+from repoManager.PageCache import DEFAULT_PAGE_CACHE_BYTES
+from repoManager.PageReader import DEFAULT_READ_WORKERS, PageReader
+from repoManager.RepoIndex import RepoIndex, scan_time_prompt
+from repoManager.RepoIterator import RepoIterator
+from repoManager.StartupSnapshot import StartupSnapshot, StartupSnapshotStore
+from repoManager.ThumbnailStore import ThumbnailStore
+
+from repoManager.utils import generate_file_name, generate_image_prompt_path, generate_nextToken, image_as_bytes
 from utils.dateUtils import generate_ios_date_time_strs
+from utils.pathingUtils import INDEX_FOLDER, TEMPORARY_FILE_PREFIX, atomic_write_bytes, is_temporary_file, remove_directory_if_empty, sync_directory
 
-from utils.pathingUtils import read_file_as_bytes
 from utils.enums import DIRECTION
 
-from PIL import Image
 
 
-def generate_nextToken(directoryToTokenize: ImagePromptDirectory):
-    """
-    Takes an image prompt directory and generates a token for it. Tokens are uesd in pagination systems
-    to bookmark what page a client was last at when getting items.
+INDEX_FILE_NAME = "repoIndex.sqlite"
 
-    For the repo manager a token is basically just a image prompt directory. This doesn't have to be the
-    case though. In fact for clients, the actual implementation of the token shouldn't be important for
-    most interactions with the repo manager. The only thing the client has to do is provide previous nexttokens
-    in order to get the next page of imageprompt directories from the system.
+THUMBNAILS_FOLDER = ".thumbnails"
 
-    Parameters
-    ----------
-    directoryToTokenize (ImagePromptDirectory): 
-        Model of a image prompt directory that will be tokenized
+# Dates older then this many days are packed by pack_cold_dates unless told otherwise
+DEFAULT_PACK_AFTER_DAYS = 30
 
-    Returns
-    -------
-    NextToken
-        The nexttoken used for pagination and bookmarking.
+# Same as the gallery page size so the first gallery page can be drawn from the startup snapshot
+DEFAULT_SNAPSHOT_PAGE_SIZE = 10
 
-    """
-    nextToken = None
-    if(directoryToTokenize is not None):
-        nextToken = NextToken(
-            prompt=directoryToTokenize.prompt,
-            repo=directoryToTokenize.repo,
-            date=directoryToTokenize.date,
-            time=directoryToTokenize.time
-        )
-    return nextToken
+# Time prompt directories this manager wrote are not reported as outside changes for this many seconds, long enough for
+# a RepoWatcher to see the write
+OWN_WRITE_SECONDS = 30.0
 
 
 class RepoManager(object):
@@ -59,12 +55,64 @@ class RepoManager(object):
     The repo manager will attempt to make a folder of the provided reposPath if it doesn't already exist. If the Repo Manager
     cannot make the provided reposPath for any reason it will throw an exception.
 
-    Accessing images supports pagination.
-    
+    Accessing images supports pagination. Which entries belong on a page is looked up in a persistent RepoIndex (stored
+    under "$reposPath/.index") that is kept up to date by the writes of this manager, with the file system as the source of truth.
+
+    Attributes
+    ----------
+    reposPath (Path)
+        directory holding every repo
+
+    repoIndex (RepoIndex)
+        index of the entries of every repo
+
+    thumbnailStore (ThumbnailStore)
+        small renditions of every image, stored under "$reposPath/.thumbnails"
+
+    pageReader (PageReader)
+        reads pages through the page cache, the read pool and the prefetch thread
+
+    pageCache (PageCache)
+        pages read recently, bounded by pageCacheBytes
+
+    packStore (PackStore)
+        packs old dates and reads and deletes packed images
+
+    repoIterator (RepoIterator)
+        iterates the entries of the repos from the index, falling back to the file system
+
+    snapshotStore (StartupSnapshotStore)
+        reads and writes the startup snapshot of the current repo
+
     """
-    def __init__(self, reposPath: Union[str, Path], startingRepo: str):
+    def __init__(
+            self,
+            reposPath: Union[str, Path],
+            startingRepo: str,
+            indexPath: Union[str, Path] = None,
+            pageCacheBytes: int = DEFAULT_PAGE_CACHE_BYTES,
+            readWorkers: int = DEFAULT_READ_WORKERS,
+            snapshotPageSize: int = DEFAULT_SNAPSHOT_PAGE_SIZE
+        ):
         self.reposPath = Path(reposPath)
         os.makedirs(self.reposPath, exist_ok=True)
+        self.listingCache = DirectoryListingCache()
+        self.packStore = PackStore(self.listingCache)
+        self.repoIndex = RepoIndex(indexPath if indexPath is not None else self.reposPath/INDEX_FOLDER/INDEX_FILE_NAME, listingCache=self.listingCache, packCache=self.packStore.packCache)
+        self.thumbnailStore = ThumbnailStore(self.reposPath/THUMBNAILS_FOLDER)
+        self.pageReader = PageReader(self._get_files_isolated, pageCacheBytes=pageCacheBytes, readWorkers=readWorkers)
+        self.pageCache = self.pageReader.pageCache
+        self.repoIterator = RepoIterator(self.reposPath, self.repoIndex, self.listingCache, self.pageReader)
+        # Time prompt directory (repo, date, time, prompt) -> when this manager last wrote it
+        self.ownWrites: Dict[tuple, float] = {}
+        self.ownWritesLock = threading.Lock()
+        # A single worker keeps saves in the order they were requested
+        self.saveExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="RepoManagerSave")
+        # Same arguments the gallery reads its first page with so the page cache is shared with it
+        self.snapshotStore = StartupSnapshotStore(
+            self.reposPath/INDEX_FOLDER, self.reposPath, snapshotPageSize, self.current_repo,
+            lambda number: self._get_page(number, includeThumbnails=True, parallel=False), self.count_images, self.saveExecutor
+        )
         self.switch_repo(startingRepo)
 
 
@@ -76,6 +124,14 @@ class RepoManager(object):
         return self.reposPath/self.current_repo()
 
 
+    def list_repos(self) -> List[str]:
+        """
+        Gets the names of every repo under reposPath, sorted. Folders of the manager itself (index, thumbnails) are skipped.
+        """
+        with os.scandir(self.reposPath) as entries:
+            return sorted(entry.name for entry in entries if entry.is_dir() and not is_temporary_file(entry.name))
+
+
     def switch_repo(self, newRepo: str):
         """
         Changes the repo folder for the manager. 
@@ -92,7 +148,7 @@ class RepoManager(object):
         os.makedirs(self.imageRepo, exist_ok=True)
 
 
-    def generate_image_prompt_directory(self, prompt: str) -> [ImagePromptDirectory, str]:
+    def generate_image_prompt_directory(self, prompt: str, create: bool = True) -> [ImagePromptDirectory, str]:
         """
         Take the given prompt and generate a date/time-prompt entry within the given repo directory.
         Will use the current date and time this method was called to generate the directory.
@@ -105,6 +161,9 @@ class RepoManager(object):
         prompt (str): 
             the prompt to generate an repo entry for
 
+        create (bool):
+            Whether to create the directory. Otherwise only the date directory is created.
+
         Returns
         -------
         ImagePromptDirectory
@@ -116,7 +175,10 @@ class RepoManager(object):
 
         promptWithTime = generate_file_name(time, prompt)
         promptAbsPath = dayDirectory/promptWithTime
-        promptAbsPath.mkdir( parents=True, exist_ok=True )
+        if create:
+            promptAbsPath.mkdir( parents=True, exist_ok=True )
+        else:
+            dayDirectory.mkdir( parents=True, exist_ok=True )
 
         return [
             ImagePromptDirectory(
@@ -134,11 +196,34 @@ class RepoManager(object):
         return self.reposPath/directorySubPath
 
 
-    def _get_files(self, directory: ImagePromptDirectory) -> ImagePrompResult:
+    def _get_image_handles(self, fullPathToImagePromptFolder: Path) -> List[ImageHandle]:
+        handles = []
+        try:
+            with os.scandir(fullPathToImagePromptFolder) as entries:
+                for entry in entries:
+                    if is_temporary_file(entry.name):
+                        continue
+                    stat = entry.stat()
+                    handles.append(ImageHandle(path=fullPathToImagePromptFolder/entry.name, size=stat.st_size, mtime=stat.st_mtime))
+        except FileNotFoundError:
+            return self.packStore.get_image_handles(fullPathToImagePromptFolder)
+        return handles
+
+
+    def _is_packed(self, directory: ImagePromptDirectory) -> bool:
+        return self.packStore.is_packed(self._generate_abs_image_prompt_path(directory))
+
+
+    def _get_files(self, directory: ImagePromptDirectory, includeThumbnails: bool = False, eager: bool = False) -> ImagePrompResult:
         logging.info(f"Attempting to load images from path {self.reposPath} and directory {directory}")
         fullPathToImagePromptFolder = self._generate_abs_image_prompt_path(directory)
 
-        images = [read_file_as_bytes(fullPathToImagePromptFolder/img_file) for img_file in os.listdir(fullPathToImagePromptFolder)]
+        handles = self._get_image_handles(fullPathToImagePromptFolder)
+        if eager:
+            handles, images = self._read_handles(handles)
+        else:
+            images = handles
+        thumbnails = [self.thumbnailStore.get_thumbnail(directory, handle.name, handle) for handle in handles] if includeThumbnails else None
 
         logging.info(f"Found {len(images)} images")
         return ImagePrompResult(
@@ -147,16 +232,160 @@ class RepoManager(object):
             date=directory.date,
             time=directory.time,
             num="1",
-            images=images
+            images=images,
+            thumbnails=thumbnails
         )
 
 
-    def get_latest_images_in_repo(self) -> ImagePrompResult:
+    def _read_handles(self, handles: List[ImageHandle]) -> List[List]:
+        """
+        Reads the bytes of every handle. Images that can't be read are left out rather then failing the rest.
+        Returns the handles that were read as the first index and their bytes as the second index.
+        """
+        readHandles = []
+        images = []
+        for handle in handles:
+            try:
+                images.append(handle.read_bytes())
+                readHandles.append(handle)
+            except OSError as e:
+                logging.error(f'Could not read image {handle.path} : {traceback.format_exc()}')
+        return [readHandles, images]
+
+
+    def _get_files_isolated(self, directory: ImagePromptDirectory, includeThumbnails: bool, eager: bool) -> ImagePrompResult:
+        # One unreadable directory (removed mid read, bad sector, ...) shouldn't fail the whole page
+        try:
+            return self._get_files(directory, includeThumbnails=includeThumbnails, eager=eager)
+        except OSError as e:
+            logging.error(f'Could not read image prompt directory {directory} : {traceback.format_exc()}')
+            return ImagePrompResult(
+                prompt=directory.prompt,
+                repo=directory.repo,
+                date=directory.date,
+                time=directory.time,
+                num="1",
+                images=[],
+                thumbnails=[] if includeThumbnails else None
+            )
+
+
+    def get_saved_image(self, repo: str, date: str, time: str, prompt: str, num: int = 1) -> ImagePrompResult:
+        """
+        Reads back one image of an entry, packed or not, like the ImagePrompResult save_image returned for it.
+
+        Raises
+        ------
+        FileNotFoundError
+            If the image is no longer in the repo
+        """
+        directory = ImagePromptDirectory(prompt=prompt, repo=repo, date=date, time=time)
+        imageName = f'{num}.png'
+        for handle in self._get_image_handles(self._generate_abs_image_prompt_path(directory)):
+            if handle.name == imageName:
+                return ImagePrompResult(prompt=prompt, repo=repo, date=date, time=time, num=num, images=[handle.read_bytes()])
+        raise FileNotFoundError(f'No image {imageName} in {directory}')
+
+
+    def read_image_async(self, image: Union[ImageHandle, bytes]) -> Future:
+        """
+        Reads an image of a result into bytes on the read pool so the UI thread never waits on the SD card (or a seek into a
+        pack). Images already held as bytes are handed back as they are.
+        """
+        return self.pageReader.submit_read(image_as_bytes, image)
+
+
+    def get_thumbnail(self, directory: ImagePromptDirectory, num: str = "1") -> Union[bytes, None]:
+        """
+        Gets the small rendition of an image in the repo. Thumbnails missing for older images are made on demand.
+
+        Parameters
+        ----------
+        directory (ImagePromptDirectory):
+            The image prompt directory the image belongs to.
+
+        num (str):
+            Which image of the prompt to get the thumbnail of.
+
+        Returns
+        -------
+        bytes
+            The thumbnail as PNG bytes or None if the image doesn't exist.
+        """
+        imageName = num + ".png"
+        source = self._generate_abs_image_prompt_path(directory)/imageName
+        if self._is_packed(directory):
+            source = next((handle for handle in self._get_image_handles(source.parent) if handle.name == imageName), source)
+        return self.thumbnailStore.get_thumbnail(directory, imageName, source)
+
+
+    def backfill_thumbnails(self, repo: str = None) -> int:
+        """
+        Makes thumbnails for every image in a repo saved before thumbnails existed. 
+        Can take a long time on big repos so it should be run in the background or from the command line.
+
+        Parameters
+        ----------
+        repo (str):
+            The repo to backfill. Defaults to the current repo.
+
+        Returns
+        -------
+        int
+            How many thumbnails were made.
+        """
+        repo = repo if repo is not None else self.current_repo()
+        return self.thumbnailStore.backfill(self.reposPath/repo, repo)
+
+
+    def pack_cold_dates(self, olderThanDays: int = DEFAULT_PACK_AFTER_DAYS, repo: str = None) -> int:
+        """
+        Packs the time prompt directories of every date older then the given number of days into one file per date.
+        Dates that were packed before only have the directories added since packed. Thumbnails are made for every image
+        first so galleries never need to read a packed image just to show it small.
+
+        Can take a long time the first time it's run on a big repo so it should be run in the background or from the command line.
+
+        Parameters
+        ----------
+        olderThanDays (int):
+            Only dates at least this many days before today are packed.
+
+        repo (str):
+            The repo to pack. Defaults to the current repo.
+
+        Returns
+        -------
+        int
+            How many time prompt directories were packed.
+        """
+        repo = repo if repo is not None else self.current_repo()
+        repoPath = self.reposPath/repo
+        cutoff = (Date.today() - timedelta(days=olderThanDays)).isoformat()
+        self.backfill_thumbnails(repo)
+
+        numPacked = self.packStore.pack_dates(repoPath, cutoff)
+        if numPacked > 0:
+            logging.info(f'Packed {numPacked} prompt directories of repo {repo} older then {cutoff}')
+            # Entries stay the same but loose paths cached in pages are gone
+            self.pageCache.invalidate_repo(repo)
+            self.repoIterator.ensure_index_fresh(repo)
+            if repo == self.current_repo():
+                self.snapshotStore.schedule()
+        return numPacked
+
+
+    def get_latest_images_in_repo(self, eager: bool = True) -> ImagePrompResult:
         """
         Gets the very first prompt_time images from the repo if possible.
         Unlike other paginated access functions this method will return None
         at any point there is a exception.
 
+        Parameters
+        ----------
+        eager (bool):
+            Whether to read the images as bytes (the default) or to return lazy ImageHandles like get_images does.
+
         Returns
         -------
         ImagePrompResult
@@ -165,18 +394,34 @@ class RepoManager(object):
         """
         logging.info("Attempting to load last image created")
         try:
-            return self.get_images(number = 1).results[0]
+            return self.get_images(number = 1, eager = eager).results[0]
         except:
             return None
 
 
-    def get_images(self, number: int, token: NextToken = None, direction: DIRECTION = DIRECTION.FORWARD) -> GetImagePrompsResult:
+    def get_latest_images_in_repo_async(self, eager: bool = True) -> Future:
+        """
+        Same as get_latest_images_in_repo but runs on the read pool so the UI thread never waits on the SD card.
+        """
+        return self.pageReader.submit_read(self.get_latest_images_in_repo, eager=eager)
+
+
+    def get_images_async(self, number: int, token: NextToken = None, direction: DIRECTION = DIRECTION.FORWARD, includeThumbnails: bool = False, eager: bool = False) -> Future:
+        """
+        Same as get_images but runs on the page thread so the UI thread never waits on the SD card.
+        """
+        return self.pageReader.submit_page(self.get_images, number, token=token, direction=direction, includeThumbnails=includeThumbnails, eager=eager)
+
+
+    def get_images(self, number: int, token: NextToken = None, direction: DIRECTION = DIRECTION.FORWARD, includeThumbnails: bool = False, eager: bool = False) -> GetImagePrompsResult:
         """
         Pagination call to get prompts and their images from the repo. Results will be returned in order by the most recent date 
         and time.
         
         If there are less items avaialble then requested then those entries will be returned in full instead of the requested number.
         The results returned will contain the prompts, their metadata and all existing images created by the prompt. 
+        By default the images are lazy ImageHandles (path, size and mtime) that only read the image when asked to. 
+        Callers that want the bytes of every image up front can opt into eager loading.
 
         Any intenal exceptions will be caught and returned as a response with whatever results were collected up to that point if
         possible.
@@ -192,6 +437,12 @@ class RepoManager(object):
         token was generated) and if provided these tokens will still get the next logical pages worth of resutls as though the token
         did represent a physical entry.
 
+        The entries of a page are looked up in the RepoIndex, falling back to walking the file system with a DirectoryIterator
+        if the index can't be used. Pages are kept in the PageCache so flipping back and forth doesn't read them again, saves
+        and deletes only drop the cached pages covering the changed directory. The prompt directories of a page are read
+        concurrently on a pool of readWorkers threads. A directory that can't be read is returned without images instead of
+        failing the page.
+
         Parameters
         ----------
         number (int):
@@ -203,6 +454,12 @@ class RepoManager(object):
         direction: (DIRECTION):
             The direciton to get page results from. Supports "forward" or "backward". Default is to go forward.
 
+        includeThumbnails: (bool):
+            Whether to also load the thumbnail of every image in the results. Defaults to false.
+
+        eager: (bool):
+            Whether to read every image into bytes instead of returning lazy ImageHandles. Defaults to false.
+
         Returns
         -------
         GetImagePrompsResult
@@ -211,9 +468,65 @@ class RepoManager(object):
             Results are sorted by most recent date then most recent time. 
 
         """
+        return self._get_page(number, token=token, direction=direction, includeThumbnails=includeThumbnails, eager=eager)
+
+
+    def prefetch_images(self, number: int, token: NextToken = None, direction: DIRECTION = DIRECTION.FORWARD, includeThumbnails: bool = False, eager: bool = False) -> Future:
+        """
+        Reads a page in the background so a later get_images call with the same arguments is served from the PageCache.
+        Prefetches run on a single low priority thread and read one file at a time so they don't crowd out the read pool.
+
+        Returns
+        -------
+        Future
+            Resolves to the page, or None if the prefetch was cancelled before it started.
+        """
+        return self.pageReader.prefetch(
+            lambda: self._get_page(number, token=token, direction=direction, includeThumbnails=includeThumbnails, eager=eager, parallel=False)
+        )
+
+
+    def cancel_prefetches(self):
+        """
+        Drops every prefetch that hasn't started yet. A prefetch that already started still finishes and gets cached.
+        """
+        self.pageReader.cancel_prefetches()
+
+
+    def close(self):
+        """
+        Drops pending prefetches, waits for every background save and read to finish and writes the pending startup snapshot.
+        """
+        self.pageReader.cancel_prefetches()
+        # Saves go first since snapshots written after them read through the other pools
+        self.saveExecutor.shutdown(wait=True)
+        self.snapshotStore.close()
+        self.pageReader.close()
+
+
+    def _get_page(
+            self,
+            number: int,
+            token: NextToken = None,
+            direction: DIRECTION = DIRECTION.FORWARD,
+            includeThumbnails: bool = False,
+            eager: bool = False,
+            parallel: bool = True,
+            newestDate: str = None,
+            oldestDate: str = None
+        ) -> GetImagePrompsResult:
         try:
             logging.debug(f"Provided token : {token}")
-            return self._get_images(number, startingDirectory=token, direction=direction)
+            repo = self.current_repo()
+            self.repoIterator.ensure_index_fresh(repo)
+
+            def iterate_dates(startingDirectory: ImagePromptDirectory, direction: DIRECTION, batchSize: int) -> Iterator[ImagePromptDirectory]:
+                return self._iterate_directories(startingDirectory=startingDirectory, direction=direction, batchSize=batchSize, newestDate=newestDate, oldestDate=oldestDate)
+
+            return self.pageReader.get_page(
+                repo, token, direction, number, (includeThumbnails, eager, newestDate, oldestDate),
+                lambda: self._get_images(number, startingDirectory=token, direction=direction, includeThumbnails=includeThumbnails, eager=eager, parallel=parallel, iterateDirectories=iterate_dates)
+            )
         except BaseException as e:
             logging.error(traceback.format_exc())
             return GetImagePrompsResult(
@@ -222,30 +535,492 @@ class RepoManager(object):
             )
 
 
+    def iter_images(
+            self,
+            startToken: NextToken = None,
+            stopToken: NextToken = None,
+            direction: DIRECTION = DIRECTION.FORWARD,
+            newestDate: str = None,
+            oldestDate: str = None,
+            batchSize: int = None,
+            loadImages: bool = False,
+            includeThumbnails: bool = False,
+            eager: bool = False
+        ) -> Iterator[Union[ImagePromptDirectory, ImagePrompResult, List[Union[ImagePromptDirectory, ImagePrompResult]]]]:
+        """
+        Streams the entries of the current repo for jobs that go over the whole repo (exports, statistics, backfills, ...).
+        Unlike get_images nothing is collected into pages, so memory stays constant however big the repo is.
+
+        Entries are yielded most recent first going forward and oldest first going backwards. The repo may change while
+        iterating, entries are looked up a batch at a time so the iteration just continues from where it left off.
+
+        Parameters
+        ----------
+        startToken (NextToken):
+            Iteration starts right after this entry (not including it). Starts at the edge of the repo if not given.
+
+        stopToken (NextToken):
+            Iteration stops right before this entry (not including it). Goes to the other edge of the repo if not given.
+
+        direction (DIRECTION):
+            The direction to iterate. Defaults to forward.
+
+        newestDate (str):
+            Only entries of this date or older are yielded. Inclusive.
+
+        oldestDate (str):
+            Only entries of this date or newer are yielded. Inclusive.
+
+        batchSize (int):
+            If given, lists of up to this many entries are yielded instead of single entries.
+
+        loadImages (bool):
+            Whether to yield ImagePrompResults (with lazy ImageHandles) instead of ImagePromptDirectories. Defaults to false.
+
+        includeThumbnails (bool):
+            Whether loaded results also get their thumbnails. Only used with loadImages.
+
+        eager (bool):
+            Whether loaded results read their images into bytes. Only used with loadImages.
+
+        Returns
+        -------
+        Iterator
+            Entries one at a time or, with batchSize, in lists.
+        """
+        return self.repoIterator.iter_images(
+            self.current_repo(), startToken=startToken, stopToken=stopToken, direction=direction, newestDate=newestDate, oldestDate=oldestDate,
+            batchSize=batchSize, loadImages=loadImages, includeThumbnails=includeThumbnails, eager=eager
+        )
+
+
+    def count_images(self) -> int:
+        """
+        Counts the image prompt directories of the current repo, the same unit get_images pages by. The index keeps how many
+        entries each date holds so this doesn't walk the repo.
+        """
+        repo = self.current_repo()
+        self.repoIterator.ensure_index_fresh(repo)
+        try:
+            return self.repoIndex.get_prompt_counts(repo).total
+        except sqlite3.Error as e:
+            logging.error(f'Repo index unavailable, counting the file system instead : {traceback.format_exc()}')
+            return sum(1 for _ in self.iter_images())
+
+
+    def count_images_async(self) -> Future:
+        """
+        Same as count_images but runs on the read pool so the UI thread never waits on the index.
+        """
+        return self.pageReader.submit_read(self.count_images)
+
+
+    def get_page_token_async(self, pageNumber: int, pageSize: int) -> Future:
+        """
+        Same as get_page_token but runs on the read pool so the UI thread never waits on the index.
+        """
+        return self.pageReader.submit_read(self.get_page_token, pageNumber, pageSize)
+
+
+    def get_page_token(self, pageNumber: int, pageSize: int) -> NextToken:
+        """
+        Gets the token that get_images needs (going forward) to return a given page, without going through the pages before it.
+        The date holding the page is found with a binary search over the entry counts of each date, so jumping deep into the
+        history costs the same as page 1.
+
+        Parameters
+        ----------
+        pageNumber (int):
+            The page wanted, starting at 1. Pages past the last page get the token of the last entry, which gives an empty page.
+
+        pageSize (int):
+            The number of prompts per page, the same number that will be given to get_images.
+
+        Returns
+        -------
+        NextToken
+            The token of the last entry of the page before. None for the first page.
+        """
+        if pageNumber <= 1:
+            return None
+        # A forward page starts right after the last entry of the page before it
+        offset = (pageNumber - 1) * pageSize - 1
+        repo = self.current_repo()
+        self.repoIterator.ensure_index_fresh(repo)
+        try:
+            promptCounts = self.repoIndex.get_prompt_counts(repo)
+            location = promptCounts.locate(min(offset, promptCounts.total - 1))
+            return generate_nextToken(self.repoIndex.get_directory_at(repo, *location) if location is not None else None)
+        except sqlite3.Error as e:
+            logging.error(f'Repo index unavailable, walking the file system instead : {traceback.format_exc()}')
+            lastDirectory = None
+            for lastDirectory in itertools.islice(self.iter_images(), offset + 1):
+                pass
+            return generate_nextToken(lastDirectory)
+
+
+    def get_images_in_range(
+            self,
+            startDate: str,
+            endDate: str,
+            number: int,
+            token: NextToken = None,
+            direction: DIRECTION = DIRECTION.FORWARD,
+            includeThumbnails: bool = False,
+            eager: bool = False
+        ) -> GetImagePrompsResult:
+        """
+        Same as get_images but only returns entries saved between two dates, like everything from a given day or week.
+        Tokens work the same as with get_images but only move within the range. To go over a whole range without pages
+        use iter_images with newestDate and oldestDate instead.
+
+        Pages are read from the index with a keyset query bounded by the dates of the range, so the cost depends on the size
+        of the result rather then on how long ago the range is. Pages are cached in the PageCache like the ones of get_images.
+
+        Parameters
+        ----------
+        startDate (str):
+            Oldest date of the range (iso-8601, ex: 2024-01-11). Inclusive.
+
+        endDate (str):
+            Most recent date of the range (iso-8601). Inclusive.
+
+        number (int):
+            The number of prompts per page.
+
+        token (NextToken):
+            An optional token from a previous page of the same range.
+
+        direction (DIRECTION):
+            The direction to get page results from. Default is to go forward.
+
+        Returns
+        -------
+        GetImagePrompsResult
+            The page of results in the range. Also contains a nextToken if the range is not exhausted.
+        """
+        return self._get_page(number, token=token, direction=direction, includeThumbnails=includeThumbnails, eager=eager, newestDate=endDate, oldestDate=startDate)
+
+
+    def search_images_async(self, query: str, number: int, token: NextToken = None, direction: DIRECTION = DIRECTION.FORWARD, includeThumbnails: bool = False, eager: bool = False) -> Future:
+        """
+        Same as search_images but runs on the page thread so the UI thread never waits on the index.
+        """
+        return self.pageReader.submit_page(self.search_images, query, number, token=token, direction=direction, includeThumbnails=includeThumbnails, eager=eager)
+
+
+    def search_images(
+            self,
+            query: str,
+            number: int,
+            token: NextToken = None,
+            direction: DIRECTION = DIRECTION.FORWARD,
+            includeThumbnails: bool = False,
+            eager: bool = False
+        ) -> GetImagePrompsResult:
+        """
+        Same as get_images but only returns entries whose prompt matches a search query. Every word of the query has to
+        start a word of the prompt, ignoring case, so "shrek chip" finds "Shrek Eat Chips". A query without any words has no results.
+        Tokens work the same as with get_images but only move between matching entries.
+
+        The index keeps an inverted index of prompt words so a search costs about the same as a page however many prompts
+        the repo holds.
+
+        Parameters
+        ----------
+        query (str):
+            The words to search for.
+
+        number (int):
+            The number of prompts per page.
+
+        token (NextToken):
+            An optional token from a previous page of the same search.
+
+        direction (DIRECTION):
+            The direction to get page results from. Default is to go forward.
+
+        Returns
+        -------
+        GetImagePrompsResult
+            The page of matching results, most recent first. Also contains a nextToken if there are more matches.
+        """
+        try:
+            self.repoIterator.ensure_index_fresh(self.current_repo())
+            def iterate_search(startingDirectory: ImagePromptDirectory, direction: DIRECTION, batchSize: int) -> Iterator[ImagePromptDirectory]:
+                return self.repoIterator.iterate_search(self.current_repo(), query, startingDirectory=startingDirectory, direction=direction, batchSize=batchSize)
+            return self._get_images(number, startingDirectory=token, direction=direction, includeThumbnails=includeThumbnails, eager=eager, iterateDirectories=iterate_search)
+        except BaseException as e:
+            logging.error(traceback.format_exc())
+            return GetImagePrompsResult(
+                results=[],
+                errorMessage = f'Critical error retrieving any results : {str(e)}',
+            )
+
+
+    def get_merged_images(
+            self,
+            number: int,
+            repos: List[str] = None,
+            token: MergedNextToken = None,
+            includeThumbnails: bool = False,
+            eager: bool = False
+        ) -> GetImagePrompsResult:
+        """
+        Pages through several repos at once as a single timeline, most recent entry first whichever repo it's in.
+
+        Every repo is read through its own stream and the streams are merged with a heap (k-way merge). Only the entries that
+        make it onto the page, plus a small read ahead per repo, are taken from each stream. A page costs
+        O(number x log(repos)) instead of walking every repo again.
+
+        Merged timelines only page forward. The returned MergedNextToken keeps where each repo's stream is at.
+
+        Parameters
+        ----------
+        number (int):
+            The number of prompts per page.
+
+        repos (List[str]):
+            The repos to merge. Defaults to every repo (see list_repos).
+
+        token (MergedNextToken):
+            An optional token from the previous page of the same merged timeline.
+
+        Returns
+        -------
+        GetImagePrompsResult
+            The page of results from every repo. Also contains a MergedNextToken if the page is full.
+        """
+        return self.repoIterator.get_merged_images(number, repos if repos is not None else self.list_repos(), token=token, includeThumbnails=includeThumbnails, eager=eager)
+
+
     def _directory_exists(self, directory: ImagePromptDirectory):
-        return directory is not None and os.path.exists(self._generate_abs_image_prompt_path(directory))
+        return directory is not None and (os.path.exists(self._generate_abs_image_prompt_path(directory)) or self._is_packed(directory))
+
+
+    def _iterate_directories(
+            self,
+            startingDirectory: ImagePromptDirectory = None,
+            direction: DIRECTION = DIRECTION.FORWARD,
+            batchSize: int = 10,
+            newestDate: str = None,
+            oldestDate: str = None
+        ) -> Iterator[ImagePromptDirectory]:
+        return self.repoIterator.iterate_directories(
+            self.current_repo(), startingDirectory=startingDirectory, direction=direction, batchSize=batchSize, newestDate=newestDate, oldestDate=oldestDate
+        )
+
+
+    def get_startup_snapshot(self) -> Union[StartupSnapshot, None]:
+        """
+        Reads the snapshot of the current repo written after the last save or delete. Only reads the snapshot file, so it
+        costs the same however big the repo is. The snapshot is read once, later calls return the same snapshot.
+
+        Returns
+        -------
+        StartupSnapshot
+            The snapshot, or None if there is none (or it was taken with another page size) and the repo has to be read instead.
+        """
+        return self.snapshotStore.get()
+
+
+    def write_startup_snapshot(self) -> Union[StartupSnapshot, None]:
+        """
+        Takes a snapshot of the current repo and writes it for the next startup. Never raises, failing to write a snapshot only
+        means the next startup reads the repo.
+
+        Returns
+        -------
+        StartupSnapshot
+            The snapshot written, or None if it couldn't be.
+        """
+        return self.snapshotStore.write()
+
+
+    def verify_startup_snapshot(self) -> bool:
+        """
+        Checks the snapshot returned by get_startup_snapshot against the repo. A new snapshot is written in the background
+        if it no longer matches (or there was none). Reads the repo so it should be called off the UI thread, see
+        verify_startup_snapshot_async.
 
+        Returns
+        -------
+        bool
+            Whether what was drawn at startup is still current. False if it was drawn from a snapshot that no longer matches.
+        """
+        return self.snapshotStore.verify()
+
+
+    def verify_startup_snapshot_async(self) -> Future:
+        """
+        Same as verify_startup_snapshot but runs on the low priority prefetch thread so it doesn't compete with the UI.
+        """
+        return self.pageReader.submit_background(self.verify_startup_snapshot)
+
+
+    def page_cache_stats(self) -> dict:
+        """
+        Gets the hits, misses, evictions and memory usage of the page cache. Useful to size pageCacheBytes for a device.
+        """
+        return self.pageCache.stats()
+
+
+    def _directory_changed(self, directory: ImagePromptDirectory):
+        """
+        Updates the index and caches after this manager changed a single time prompt directory.
+        """
+        self._directories_changed(directory.repo, [directory])
+
+
+    def _directories_changed(self, repo: str, directories: List[ImagePromptDirectory]):
+        """
+        Updates the index and caches after this manager changed time prompt directories of a repo, once for all of them.
+        """
+        # Listings are invalidated first so the index never reads a listing from before the change
+        repoPath = self.reposPath/repo
+        self.listingCache.invalidate(repoPath)
+        for date in set(directory.date for directory in directories):
+            self.listingCache.invalidate(repoPath/date)
+        self._update_index(repo, directories)
+        self.pageCache.invalidate_directories(directories)
+
+
+    def apply_external_changes(self, dates: List[str], repo: str = None) -> List[ImagePromptDirectory]:
+        """
+        Updates the index and caches after date directories of a repo were changed by something other then this manager
+        (like a sync script copying images in). Only the given dates are looked at so the cost is proportional to the change
+        rather then the size of the repo.
+
+        Parameters
+        ----------
+        dates (List[str]):
+            Names of the date directories that changed. Dates that no longer exist on the file system are fine.
+
+        repo (str):
+            The repo the dates belong to. Defaults to the current repo.
+
+        Returns
+        -------
+        List[ImagePromptDirectory]
+            The time prompt directories that were added, removed or had images added or removed. Directories this manager
+            wrote itself in the last OWN_WRITE_SECONDS are left out, they were already applied when written.
+        """
+        repo = repo if repo is not None else self.current_repo()
+        repoPath = self.reposPath/repo
+        self.listingCache.invalidate(repoPath)
+
+        changed: List[ImagePromptDirectory] = []
+        for date in dates:
+            self.listingCache.invalidate(repoPath/date)
+            try:
+                added, removed, updated = self.repoIndex.reconcile_date(repo, repoPath, date)
+            except sqlite3.Error as e:
+                logging.error(f'Could not update repo index, marking it stale : {traceback.format_exc()}')
+                self.invalidate_repo(repo)
+                return changed
+
+            for directory in removed + updated:
+                if not self._is_own_write(directory):
+                    self.thumbnailStore.delete_directory(directory)
+            changed += added + removed + updated
+
+        for directory in changed:
+            self.pageCache.invalidate_directory(directory)
+        # Watchers also see the writes of this manager, which found the index already up to date unless they raced it
+        changed = [directory for directory in changed if not self._is_own_write(directory)]
+        if len(changed) > 0 and repo == self.current_repo():
+            self.snapshotStore.schedule()
+        logging.info(f'Applied external changes to {len(dates)} dates in repo {repo}, {len(changed)} prompt directories changed')
+        return changed
+
+
+    def _record_own_writes(self, directories: List[ImagePromptDirectory]):
+        """
+        Remembers time prompt directories this manager is about to write so apply_external_changes doesn't report them.
+        """
+        now = monotonic()
+        with self.ownWritesLock:
+            for key in [key for key, writtenAt in self.ownWrites.items() if now - writtenAt > OWN_WRITE_SECONDS]:
+                del self.ownWrites[key]
+            for directory in directories:
+                self.ownWrites[(directory.repo, directory.date, directory.time, directory.prompt)] = now
+
+
+    def _is_own_write(self, directory: ImagePromptDirectory) -> bool:
+        with self.ownWritesLock:
+            writtenAt = self.ownWrites.get((directory.repo, directory.date, directory.time, directory.prompt))
+        return writtenAt is not None and monotonic() - writtenAt <= OWN_WRITE_SECONDS
+
+
+    def invalidate_repo(self, repo: str = None):
+        """
+        Forgets what the index and caches know about a repo so the next read checks it against the file system again. For
+        when the repo may of changed without anyone seeing it, like a RepoWatcher that lost events.
+
+        Parameters
+        ----------
+        repo (str):
+            The repo to forget. Defaults to the current repo.
+        """
+        repo = repo if repo is not None else self.current_repo()
+        self.listingCache.clear()
+        self.repoIndex.invalidate(repo)
+        self.pageCache.invalidate_repo(repo)
 
-    def _get_images(self, number: int, startingDirectory: ImagePromptDirectory = None, direction: DIRECTION = DIRECTION.FORWARD) -> GetImagePrompsResult:
+
+    def _update_index(self, repo: str, directories: List[ImagePromptDirectory]):
+        """
+        Brings the index entries of time prompt directories in line with the file system after this manager changed them.
+        Failing to update the index should never fail the write itself so the repo is marked stale instead.
+        """
+        try:
+            scannedDirectories = []
+            for directory in directories:
+                absImageDirPath = self._generate_abs_image_prompt_path(directory)
+                scanned = scan_time_prompt(absImageDirPath.parent, absImageDirPath.name, self.packStore.packCache.get(absImageDirPath.parent))
+                scannedDirectories.append((directory, list(scanned) if scanned is not None else None))
+            self.repoIndex.update_directories(repo, self.reposPath/repo, scannedDirectories)
+        except sqlite3.Error as e:
+            logging.error(f'Could not update repo index, marking it stale : {traceback.format_exc()}')
+            self.repoIndex.invalidate(repo)
+
+
+    def _get_images(
+            self,
+            number: int,
+            startingDirectory: ImagePromptDirectory = None,
+            direction: DIRECTION = DIRECTION.FORWARD,
+            includeThumbnails: bool = False,
+            eager: bool = False,
+            parallel: bool = True,
+            iterateDirectories: Callable[[ImagePromptDirectory, DIRECTION, int], Iterator[ImagePromptDirectory]] = None
+        ) -> GetImagePrompsResult:
         logging.info(msg="Getting images")
         if(number < 1):
             return GetImagePrompsResult(results=[], errorMessage="Number must be greater then 0")
 
         imagePromptResults: List[ImagePrompResult] = []
+        pageDirectories: List[ImagePromptDirectory] = []
+        directoryIterator = iter([])
         errorMessage = None
 
         try:
             # If going backwards add the current directory but only if it actually exists. Otherwise continue iterating from the start directory.
             if(direction is DIRECTION.BACKWARD and self._directory_exists(startingDirectory)):
-                imagePromptResults.append(self._get_files(directory=startingDirectory))
+                pageDirectories.append(startingDirectory)
 
-            directoryIterator = DirectoryIterator(pathToDirectories=self.imageRepo, startingDirectory=startingDirectory, direction=direction)
+            # Fetch one more then the page so the backwards token can be found without another query
+            iterateDirectories = iterateDirectories if iterateDirectories is not None else self._iterate_directories
+            directoryIterator = iterateDirectories(startingDirectory, direction, number + 1)
 
             # Iterate prompt directories until either we found enough prompt directories to match the number requested or until there are none left in the direction we are iterating
             # Utilize assignment expressions to use an iterator in a while loop with other short circuit conditions. Should be safe since "None" is effectively exhausting the iterator in this case anyways
             # See : https://stackoverflow.com/questions/59092561/how-to-use-iterator-in-while-loop-statement-in-python
-            while (len(imagePromptResults) < number) and (nextTimeWithPromptDirectory := next(directoryIterator, None)):
-                imagePromptResults.append(self._get_files(directory=nextTimeWithPromptDirectory))
+            while (len(pageDirectories) < number) and (nextTimeWithPromptDirectory := next(directoryIterator, None)):
+                pageDirectories.append(nextTimeWithPromptDirectory)
+
+            # Only once the whole page is known are its files read, all at once
+            imagePromptResults = self.pageReader.read_page(pageDirectories, includeThumbnails=includeThumbnails, eager=eager, parallel=parallel)
 
         except BaseException as e:
             logging.error(traceback.format_exc())
@@ -272,34 +1047,27 @@ class RepoManager(object):
         date and time in which they were saved. Additionally the image will be saved to whatever repo this repo manager
         is currently set to.
 
+        Images are written atomically (temporary file, fsync, rename) so a power loss never leaves a half written image
+        behind. The prompt directory is filled under a temporary name and renamed into place once the image is in it, so
+        nothing watching the repo (see RepoWatcher) ever sees the directory empty. A thumbnail is made along with the image and a new StartupSnapshot is written in the background (see StartupSnapshotStore).
+
         Parameters
         ----------
         prompt (str):
             The prompt used to save the image
 
-        image: (Image):
-            The actual image to be saved
+        imageBytes: (bytes):
+            The actual image to be saved, already encoded as a PNG
 
         Returns
         -------
         ImagePrompResult
-            The meta information after the image was saved.
+            The meta information after the image was saved. Since the image is already in memory its returned as bytes.
         """
-        directoryResult, absolutePath = self.generate_image_prompt_directory(prompt)
-
-        try:
-            with Image.open(imageBytes) as image:
-                image.save(absolutePath/"1.png", "PNG") 
-                logging.info(f'Saved {absolutePath/"1.png"}')
-        except BaseException as e:
-            # In scenarios where the Pillow libraries encoder doesn't work 
-            # (fake filesystem issues : https://github.com/pytest-dev/pyfakefs/discussions/858)
-            # attempt to save the file via native os API
-            with open(absolutePath/"1.png", 'wb') as f:
-                f.write(imageBytes)
-                logging.info(f'Saved {absolutePath/"1.png"}')
-
-        return ImagePrompResult(
+        # Pick up any external changes before this write refreshes the index signatures
+        self.repoIterator.ensure_index_fresh(self.current_repo())
+        directoryResult, absolutePath = self.generate_image_prompt_directory(prompt, create=False)
+        savedResult = ImagePrompResult(
             prompt = directoryResult.prompt,
             repo = directoryResult.repo,
             date = directoryResult.date,
@@ -307,6 +1075,40 @@ class RepoManager(object):
             num = 1,
             images = [imageBytes]
         )
+        # The preview of the snapshot is made from the bytes in memory rather then read back
+        self.snapshotStore.remember_saved(savedResult)
+        self._record_own_writes([directoryResult])
+
+        temporaryPath = absolutePath.with_name(f'{TEMPORARY_FILE_PREFIX}{absolutePath.name}.tmp')
+        temporaryPath.mkdir(exist_ok=True)
+        try:
+            # Providers already hand back encoded PNGs so they are written as is rather then decoded and encoded again
+            atomic_write_bytes(temporaryPath/"1.png", imageBytes)
+            # Made before the directory shows up so no read of the repo has to make it from the image again
+            self.thumbnailStore.save_thumbnail(directoryResult, "1.png", imageBytes)
+            os.rename(temporaryPath, absolutePath)
+        except BaseException:
+            shutil.rmtree(temporaryPath, ignore_errors=True)
+            self.thumbnailStore.delete_thumbnails(directoryResult, ["1.png"])
+            raise
+        sync_directory(absolutePath.parent)
+        logging.info(f'Saved {absolutePath/"1.png"}')
+
+        self._directory_changed(directoryResult)
+        self.snapshotStore.schedule()
+        return savedResult
+
+
+    def save_image_async(self, prompt: str, imageBytes: bytes) -> Future:
+        """
+        Same as save_image but runs on a background thread. Saves are done one at a time in the order they were requested.
+
+        Returns
+        -------
+        Future
+            Resolves to the ImagePrompResult of save_image or raises whatever save_image raised.
+        """
+        return self.saveExecutor.submit(self.save_image, prompt, imageBytes)
 
 
     def delete_image(self, deleteImagePrompsRequest: DeleteImagePrompsRequest) -> int:
@@ -316,34 +1118,84 @@ class RepoManager(object):
 
         Parameters
         ----------
-        prompt (str):
-            The prompt used to save the image
-
-        image: (Image):
-            The actual image to be saved
+        deleteImagePrompsRequest (DeleteImagePrompsRequest):
+            The image prompt directory and the numbers of the images in it to delete
 
         Returns
         -------
-        ImagePrompResult
-            The meta information after the image was saved.
+        int
+            How many images were deleted.
         """
-        absImageDirPath = self._generate_abs_image_prompt_path(deleteImagePrompsRequest)
-        numDeleted = 0
+        return self.delete_images([deleteImagePrompsRequest])
 
-        for num in deleteImagePrompsRequest.nums:
-            path = absImageDirPath/(num + ".png")
-            try:
-                path.unlink()
-                numDeleted += 1
-            except BaseException as e:
-                logging.info(f'Could not delete {path}')
 
-        # Delete the directory if its now empty
-        if not any(Path(absImageDirPath).iterdir()):
-           absImageDirPath.rmdir()
+    def delete_images(self, deleteImagePrompsRequests: List[DeleteImagePrompsRequest]) -> int:
+        """
+        Same as delete_image for many image prompt directories at once. Requests are grouped by directory so each pack is
+        written again once, emptied prompt and date directories are removed once and the index and cached pages are
+        updated once for the whole batch rather then once per image. Callers should refresh their views once afterwards.
 
-        # Delete the directory if its now empty
-        if not any(Path(absImageDirPath.parent).iterdir()):
-           absImageDirPath.parent.rmdir()
+        Requests for the same directory are merged and directories that no longer exist are skipped.
 
-        return numDeleted
\ No newline at end of file
+        Parameters
+        ----------
+        deleteImagePrompsRequests (List[DeleteImagePrompsRequest]):
+            The image prompt directories and the numbers of the images in them to delete
+
+        Returns
+        -------
+        int
+            How many images were deleted.
+        """
+        # repo -> date -> time prompt -> (directory, names of the images to delete)
+        grouped: Dict[str, Dict[str, Dict[str, Tuple[ImagePromptDirectory, List[str]]]]] = {}
+        for request in deleteImagePrompsRequests:
+            timePrompts = grouped.setdefault(request.repo, {}).setdefault(request.date, {})
+            _, imageNames = timePrompts.setdefault(generate_file_name(request.time, request.prompt), (request, []))
+            imageNames += [str(num) + ".png" for num in request.nums if str(num) + ".png" not in imageNames]
+
+        numDeleted = 0
+        for repo, dates in grouped.items():
+            self.repoIterator.ensure_index_fresh(repo)
+            self._record_own_writes([directory for timePrompts in dates.values() for directory, _ in timePrompts.values()])
+            changed: List[ImagePromptDirectory] = []
+            repacked = False
+            for date, timePrompts in dates.items():
+                datePath = self.reposPath/repo/date
+                packed = {timePrompt: imageNames for timePrompt, (directory, imageNames) in timePrompts.items() if self._is_packed(directory)}
+                if len(packed) > 0:
+                    # Packed images are removed by writing the pack of the date again without them
+                    removed = self.packStore.delete_images(datePath, packed)
+                    numDeleted += sum(len(imageNames) for imageNames in removed.values())
+                    repacked = repacked or len(removed) > 0
+
+                for timePrompt, (directory, imageNames) in timePrompts.items():
+                    if timePrompt in packed:
+                        continue
+                    for imageName in imageNames:
+                        path = datePath/timePrompt/imageName
+                        try:
+                            path.unlink()
+                            numDeleted += 1
+                        except FileNotFoundError:
+                            logging.info(f'Image already deleted {path}')
+                        except OSError as e:
+                            logging.error(f'Could not delete {path} : {traceback.format_exc()}')
+                    # Delete the directory if its now empty
+                    remove_directory_if_empty(datePath/timePrompt)
+
+                # Delete the directory if its now empty
+                remove_directory_if_empty(datePath)
+
+                for directory, imageNames in timePrompts.values():
+                    self.thumbnailStore.delete_thumbnails(directory, imageNames)
+                    changed.append(directory)
+
+            self._directories_changed(repo, changed)
+            if repacked:
+                # Every other image of a rewritten pack moved within it so no cached handle into it can be trusted
+                self.pageCache.invalidate_repo(repo)
+
+        if self.current_repo() in grouped:
+            self.snapshotStore.schedule()
+        return numDeleted
@@ -0,0 +1,405 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+import traceback
+from pathlib import Path
+from typing import Callable, Dict, List, Set, Union
+
+from repoManager.Models import ImagePromptDirectory
+from repoManager.RepoManager import RepoManager
+
+from utils.pathingUtils import get_directory_signature, is_temporary_file
+
+
+DEFAULT_POLL_INTERVAL_SECONDS = 5.0
+
+# Events within this window are applied together so a sync copying many prompt directories triggers a single update
+DEFAULT_DEBOUNCE_SECONDS = 0.5
+
+# See "man inotify"
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+
+# Images copied into an existing time prompt directory are written in place so their final size is only known once closed
+PROMPT_WATCH_MASK = WATCH_MASK | IN_CLOSE_WRITE
+
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatch(object):
+    """
+    Thin ctypes binding over the linux inotify api that watches a repo root, every date directory and every time prompt
+    directory within it.
+
+    Date directories report time prompt directories being added or removed, time prompt directories report images being
+    added, removed or written. Either is reported as the date of the directory having changed. Temporary directories (like
+    the ones images are saved to before being moved in place) are not watched, moving them in is reported by their date.
+
+    Every time prompt directory costs a watch. Raises OSError if inotify isn't available (not linux, out of watches, ...)
+    so callers can fall back to polling.
+
+    Attributes
+    ----------
+
+    Methods
+    -------
+    read_changed_dates(timeout)
+        Waits up to timeout seconds for events and returns the names of the date directories that changed
+
+    close()
+        Releases the inotify instance
+    """
+
+    def __init__(self, repoPath: Union[str, Path]):
+        self.repoPath = Path(repoPath)
+        libcName = ctypes.util.find_library("c")
+        if libcName is None:
+            raise OSError("libc not found, inotify unavailable")
+        self.libc = ctypes.CDLL(libcName, use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError("inotify unavailable on this platform")
+
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+        # watch descriptor -> date name, None for the repo root
+        self.watches: Dict[int, Union[str, None]] = {}
+        # watch descriptors of date directories, the others are time prompt directories
+        self.dateWatches: Set[int] = set()
+        try:
+            self._add_watch(self.repoPath, None, WATCH_MASK)
+            with os.scandir(self.repoPath) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        self._add_date_watch(entry.name)
+        except OSError:
+            self.close()
+            raise
+
+
+    def _add_watch(self, path: Path, date: Union[str, None], mask: int) -> int:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), str(path))
+        self.watches[wd] = date
+        return wd
+
+
+    def _add_date_watch(self, date: str):
+        """
+        Watches a date directory and the time prompt directories already in it
+        """
+        self.dateWatches.add(self._add_watch(self.repoPath/date, date, WATCH_MASK))
+        with os.scandir(self.repoPath/date) as entries:
+            for entry in entries:
+                if entry.is_dir() and not is_temporary_file(entry.name):
+                    self._add_prompt_watch(date, entry.name)
+
+
+    def _add_prompt_watch(self, date: str, timePrompt: str):
+        try:
+            self._add_watch(self.repoPath/date/timePrompt, date, PROMPT_WATCH_MASK)
+        except (FileNotFoundError, NotADirectoryError):
+            # Removed again since it was seen, which the date watch reports
+            logging.info(f'Could not watch time prompt directory {date}/{timePrompt} : {traceback.format_exc()}')
+
+
+    def read_changed_dates(self, timeout: float) -> Set[str]:
+        """
+        Raises
+        ------
+        OSError
+            If the repo root itself went away, events were lost or new directories could not be watched (out of watches).
+            Callers should start over with a fresh watch.
+        """
+        if self.fd is None:
+            raise OSError(f'Watch of {self.repoPath} is closed')
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        dates = set()
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(buffer):
+            wd, mask, _, nameLength = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset:offset + nameLength].rstrip(b"\0"))
+            offset += nameLength
+
+            if mask & IN_Q_OVERFLOW:
+                raise OSError("inotify event queue overflowed")
+
+            watchedDate = self.watches.get(wd)
+            if wd in self.watches and watchedDate is None:
+                # Event in the repo root
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    raise OSError(f'Watched repo {self.repoPath} was removed')
+                if not (mask & IN_ISDIR) or not name:
+                    continue
+                dates.add(name)
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        self._add_date_watch(name)
+                    except FileNotFoundError:
+                        # Created and removed again before we got to it
+                        logging.info(f'Could not watch new date directory {name} : {traceback.format_exc()}')
+            elif watchedDate is not None:
+                dates.add(watchedDate)
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    self.dateWatches.discard(wd)
+                elif wd in self.dateWatches and mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and not is_temporary_file(name):
+                    self._add_prompt_watch(watchedDate, name)
+        return dates
+
+
+    def close(self):
+        if self.fd is not None and self.fd >= 0:
+            os.close(self.fd)
+        self.fd = None
+
+
+class PollingWatch(object):
+    """
+    Portable stand in for InotifyWatch. Remembers the signature (mtime and link count) of each date directory and reports
+    the dates whose signature changed. Costs a listing of the repo root and a stat per date directory per poll, however
+    many prompts the dates hold.
+
+    Only time prompt directories being added, removed or moved in change the signature of their date. Images added to or
+    removed from a time prompt directory that stays in place are picked up the next time its date changes, when
+    apply_external_changes scans the image counts of every time prompt of the date again. Polling is the fallback for when
+    inotify is unavailable or out of watches, see InotifyWatch.
+
+    Attributes
+    ----------
+
+    Methods
+    -------
+    read_changed_dates(timeout)
+        Sleeps for timeout seconds then returns the names of the date directories that changed since the last call
+
+    close()
+        Stops any sleep in progress
+    """
+
+    def __init__(self, repoPath: Union[str, Path]):
+        self.repoPath = Path(repoPath)
+        self.closed = threading.Event()
+        self.signatures = self._snapshot()
+
+
+    def _snapshot(self) -> Dict[str, str]:
+        signatures = {}
+        try:
+            with os.scandir(self.repoPath) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        signatures[entry.name] = get_directory_signature(entry.path)
+        except OSError:
+            pass
+        return signatures
+
+
+    def read_changed_dates(self, timeout: float) -> Set[str]:
+        if self.closed.wait(timeout):
+            return set()
+        signatures = self._snapshot()
+        dates = set(
+            date for date in signatures.keys() | self.signatures.keys()
+            if signatures.get(date) != self.signatures.get(date)
+        )
+        self.signatures = signatures
+        return dates
+
+
+    def close(self):
+        self.closed.set()
+
+
+class RepoWatcher(object):
+    """
+    Watches the current repo of a RepoManager for changes made outside of the manager (sync scripts, manual edits, ...)
+    and incrementally applies them to the manager's index and caches instead of letting the next read rebuild everything.
+    Changes are always applied to the repo they were seen in. Once the manager switches repos the watch moves over to the
+    new current repo on the next poll.
+
+    Uses inotify when available and falls back to polling otherwise, including once inotify runs out of watches. Watching happens on a daemon thread started with start().
+    Changed dates are debounced and applied together, after which onChange is called (from the watcher thread) with the
+    time prompt directories that were added, removed or had images added or removed, leaving out the ones the manager wrote
+    itself. UI code should hop back onto its own thread, e.g. by emitting a signal.
+
+    Attributes
+    ----------
+    onChange (Callable[[List[ImagePromptDirectory]], None]):
+        Called after changes were applied. Can be set after construction.
+
+    backend (str):
+        "inotify" or "polling" once started
+
+    repo (str):
+        name of the repo being watched, None until started
+
+    Methods
+    -------
+    start()
+        Starts watching on a background thread
+
+    stop()
+        Stops watching and waits for the background thread to finish
+
+    poll_once(timeout)
+        Waits for and applies one batch of changes on the calling thread. Returns the changed directories.
+    """
+
+    def __init__(
+            self,
+            repoManager: RepoManager,
+            onChange: Callable[[List[ImagePromptDirectory]], None] = None,
+            pollInterval: float = DEFAULT_POLL_INTERVAL_SECONDS,
+            debounce: float = DEFAULT_DEBOUNCE_SECONDS,
+            useInotify: bool = True
+        ):
+        self.repoManager = repoManager
+        self.onChange = onChange
+        self.pollInterval = pollInterval
+        self.debounce = debounce
+        self.useInotify = useInotify
+        self.stopped = threading.Event()
+        self.thread: threading.Thread = None
+        self.watch: Union[InotifyWatch, PollingWatch] = None
+        self.backend: str = None
+        self.repo: str = None
+
+
+    def _open_watch(self):
+        # Set before opening so the watched repo is known even if opening fails
+        self.repo = self.repoManager.current_repo()
+        repoPath = self.repoManager.reposPath/self.repo
+        if self.useInotify:
+            try:
+                self.watch = InotifyWatch(repoPath)
+                self.backend = "inotify"
+                return
+            except OSError as e:
+                logging.info(f'inotify unavailable for {repoPath}, falling back to polling : {str(e)}')
+        self.watch = PollingWatch(repoPath)
+        self.backend = "polling"
+
+
+    def _reset_watch(self):
+        """
+        Replaces the watch with a fresh one. If that fails too the watch is left unset and opened again on the next poll.
+        """
+        watch, self.watch = self.watch, None
+        if watch is not None:
+            try:
+                watch.close()
+            except OSError as e:
+                logging.info(f'Could not close repo watch : {str(e)}')
+        try:
+            self._open_watch()
+        except Exception as e:
+            logging.error(f'Could not watch repo again, trying on the next poll : {traceback.format_exc()}')
+
+
+    def _wait_timeout(self) -> float:
+        return 1.0 if self.backend == "inotify" else self.pollInterval
+
+
+    def _collect(self, timeout: float) -> Set[str]:
+        try:
+            dates = self.watch.read_changed_dates(timeout)
+            # Keep collecting while events keep coming in so a burst is applied once
+            while dates and not self.stopped.is_set():
+                more = self.watch.read_changed_dates(self.debounce if self.backend == "inotify" else 0)
+                if not more:
+                    break
+                dates |= more
+            return dates
+        except Exception as e:
+            # Lost track of the repo, start over and let the index notice whatever was missed
+            logging.error(f'Repo watch failed, restarting it : {traceback.format_exc()}')
+            repo = self.repo
+            self._reset_watch()
+            self.repoManager.invalidate_repo(repo)
+            return set()
+
+
+    def poll_once(self, timeout: float = None) -> List[ImagePromptDirectory]:
+        if self.watch is None:
+            self._open_watch()
+        elif self.repo != self.repoManager.current_repo():
+            logging.info(f'Repo switched from {self.repo} to {self.repoManager.current_repo()}, watching the new repo')
+            self._reset_watch()
+            if self.watch is None:
+                return []
+        # The repo may be switched while waiting, changes seen still belong to the repo they were seen in
+        repo = self.repo
+        dates = self._collect(self._wait_timeout() if timeout is None else timeout)
+        if not dates:
+            return []
+
+        changed = self.repoManager.apply_external_changes(sorted(dates), repo=repo)
+        if changed and self.onChange is not None:
+            try:
+                self.onChange(changed)
+            except BaseException as e:
+                logging.error(f'Repo change listener failed : {traceback.format_exc()}')
+        return changed
+
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                self.poll_once()
+            except BaseException as e:
+                logging.error(f'Error while watching repo : {traceback.format_exc()}')
+                self.stopped.wait(self.pollInterval)
+        if self.watch is not None:
+            self.watch.close()
+
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self._open_watch()
+        logging.info(f'Watching repo {self.repo} using {self.backend}')
+        self.thread = threading.Thread(target=self._run, name="RepoWatcher", daemon=True)
+        self.thread.start()
+
+
+    def stop(self):
+        self.stopped.set()
+        watch = self.watch
+        if watch is not None and self.backend == "polling":
+            watch.close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
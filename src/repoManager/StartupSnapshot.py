@@ -0,0 +1,435 @@
+import base64
+import io
+import json
+import logging
+import threading
+import time
+import traceback
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple, Union
+
+from PIL import Image
+
+from repoManager.Models import GetImagePrompsResult, ImageHandle, ImagePrompResult, NextToken, PackedImageHandle
+from repoManager.ThumbnailStore import generate_thumbnail
+from repoManager.utils import image_as_bytes
+
+from utils.pathingUtils import atomic_write_bytes, read_file_as_bytes
+
+
+# Bumped whenever the layout of the snapshot file changes, snapshots of other versions are ignored
+SNAPSHOT_VERSION = 1
+
+# Snapshots of a repo are stored as "${repo}${SNAPSHOT_SUFFIX}" next to the repo index
+SNAPSHOT_SUFFIX = ".snapshot.json"
+
+# The latest image is kept at this size, a quarter of a full resolution image to read and decode. The full image replaces
+# it once the app is up.
+PREVIEW_SIZE = (512, 512)
+
+# Snapshots are written at most once per this many seconds. Saving a batch of images writes one snapshot rather then one per image.
+DEFAULT_SNAPSHOT_WRITE_SECONDS = 5.0
+
+
+def generate_preview(imageBytes: bytes, size = PREVIEW_SIZE) -> bytes:
+    """
+    Gets the rendition of an image shown before the repo is read. Images that already fit are kept as they are
+    rather then encoded again.
+    """
+    with Image.open(io.BytesIO(imageBytes)) as image:
+        if image.width <= size[0] and image.height <= size[1]:
+            return imageBytes
+    return generate_thumbnail(imageBytes, size)
+
+
+def result_key(result: Union[ImagePrompResult, NextToken]) -> tuple:
+    return (result.repo, result.date, result.time, result.prompt)
+
+
+def encode_bytes(data: Union[bytes, None]) -> Union[str, None]:
+    return base64.b64encode(data).decode("ascii") if data is not None else None
+
+
+def decode_bytes(data: Union[str, None]) -> Union[bytes, None]:
+    return base64.b64decode(data) if data is not None else None
+
+
+class StartupSnapshot(object):
+    """
+    What the app shows right after launch (the latest image and the first gallery page) saved to a single small file so the
+    window can be drawn without walking the repo or decoding full resolution images. The time it takes to read doesn't depend
+    on how many images the repo holds.
+
+    The repo manager writes the snapshot shortly after saves and deletes (see StartupSnapshotStore). Since the repo can also
+    change while the app isn't running, whatever was drawn from a snapshot has to be verified against the repo afterwards
+    (see RepoManager.verify_startup_snapshot).
+
+    Images of the page are kept as references (ImageHandles) to where they are in the repo, only their thumbnails are
+    stored in the snapshot. Paths are stored relative to the repos path so the repos can be moved.
+
+    Attributes
+    ----------
+    repo (str)
+        repo the snapshot was taken of
+
+    pageSize (int)
+        number of image prompts the page was read with
+
+    imageCount (int)
+        number of image prompt directories in the repo, needed to draw the page links
+
+    latest (ImagePrompResult)
+        the most recent image prompt with the preview of its image as bytes, None when the repo is empty
+
+    page (GetImagePrompsResult)
+        the first page with ImageHandles and thumbnails
+
+    Methods
+    -------
+    key()
+        What the snapshot shows, without any image bytes. Two snapshots with the same key draw the same screen.
+
+    to_bytes(reposPath)
+        Serializes the snapshot
+
+    from_bytes(data, reposPath)
+        Reads a serialized snapshot back
+    """
+
+    def __init__(self, repo: str, pageSize: int, imageCount: int, latest: Union[ImagePrompResult, None], page: GetImagePrompsResult):
+        self.repo = repo
+        self.pageSize = pageSize
+        self.imageCount = imageCount
+        self.latest = latest
+        self.page = page
+
+
+    def key(self) -> tuple:
+        return (
+            self.repo,
+            self.pageSize,
+            self.imageCount,
+            result_key(self.latest) if self.latest is not None else None,
+            tuple((result_key(result), tuple(image.name for image in result.images)) for result in self.page.results),
+            result_key(self.page.nextToken) if self.page.nextToken is not None else None,
+        )
+
+
+    def to_bytes(self, reposPath: Union[str, Path]) -> bytes:
+        reposPath = Path(reposPath)
+        def handle_to_dict(handle: ImageHandle) -> dict:
+            handleDict = {"path": Path(handle.path).relative_to(reposPath).as_posix(), "size": handle.size, "mtime": handle.mtime}
+            if isinstance(handle, PackedImageHandle):
+                handleDict["packPath"] = Path(handle.packPath).relative_to(reposPath).as_posix()
+                handleDict["headerOffset"] = handle.headerOffset
+            return handleDict
+
+        def result_to_dict(result: ImagePrompResult) -> dict:
+            return {"prompt": result.prompt, "repo": result.repo, "date": result.date, "time": result.time, "num": result.num}
+
+        latest = None
+        if self.latest is not None:
+            latest = result_to_dict(self.latest)
+            latest["images"] = [encode_bytes(image_as_bytes(image)) for image in self.latest.images]
+
+        results = []
+        for result in self.page.results:
+            resultDict = result_to_dict(result)
+            resultDict["images"] = [handle_to_dict(handle) for handle in result.images]
+            resultDict["thumbnails"] = [encode_bytes(thumbnail) for thumbnail in result.thumbnails] if result.thumbnails is not None else None
+            results.append(resultDict)
+
+        nextToken = self.page.nextToken
+        return json.dumps({
+            "version": SNAPSHOT_VERSION,
+            "repo": self.repo,
+            "pageSize": self.pageSize,
+            "imageCount": self.imageCount,
+            "latest": latest,
+            "results": results,
+            "nextToken": {"prompt": nextToken.prompt, "repo": nextToken.repo, "date": nextToken.date, "time": nextToken.time} if nextToken is not None else None,
+        }).encode("utf-8")
+
+
+    @staticmethod
+    def from_bytes(data: bytes, reposPath: Union[str, Path]) -> "StartupSnapshot":
+        """
+        Raises
+        ------
+        ValueError
+            If the data isn't a snapshot of the current version
+        """
+        reposPath = Path(reposPath)
+        snapshot = json.loads(data)
+        if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+            raise ValueError("Not a startup snapshot of the current version")
+
+        def dict_to_handle(handleDict: dict) -> ImageHandle:
+            if "packPath" in handleDict:
+                return PackedImageHandle(reposPath/handleDict["path"], handleDict["size"], handleDict["mtime"], reposPath/handleDict["packPath"], handleDict["headerOffset"])
+            return ImageHandle(reposPath/handleDict["path"], handleDict["size"], handleDict["mtime"])
+
+        def dict_to_result(resultDict: dict, images: list, thumbnails: Union[List[bytes], None] = None) -> ImagePrompResult:
+            return ImagePrompResult(
+                prompt=resultDict["prompt"], repo=resultDict["repo"], date=resultDict["date"], time=resultDict["time"], num=resultDict["num"],
+                images=images, thumbnails=thumbnails
+            )
+
+        latestDict = snapshot["latest"]
+        latest = dict_to_result(latestDict, [decode_bytes(image) for image in latestDict["images"]]) if latestDict is not None else None
+        results = [
+            dict_to_result(
+                resultDict,
+                [dict_to_handle(handleDict) for handleDict in resultDict["images"]],
+                [decode_bytes(thumbnail) for thumbnail in resultDict["thumbnails"]] if resultDict["thumbnails"] is not None else None
+            )
+            for resultDict in snapshot["results"]
+        ]
+        nextToken = NextToken(**snapshot["nextToken"]) if snapshot["nextToken"] is not None else None
+        return StartupSnapshot(snapshot["repo"], snapshot["pageSize"], snapshot["imageCount"], latest, GetImagePrompsResult(results, nextToken=nextToken))
+
+
+def write_snapshot(path: Union[str, Path], snapshot: StartupSnapshot, reposPath: Union[str, Path]):
+    """
+    Writes a snapshot atomically so a power loss leaves either the previous snapshot or the new one behind.
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    atomic_write_bytes(Path(path), snapshot.to_bytes(reposPath))
+
+
+def read_snapshot(path: Union[str, Path], reposPath: Union[str, Path]) -> Union[StartupSnapshot, None]:
+    """
+    Reads a snapshot back. Returns None if there is no snapshot or it can't be used, callers then read the repo instead.
+    """
+    try:
+        return StartupSnapshot.from_bytes(read_file_as_bytes(Path(path)), reposPath)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.error(f'Could not read startup snapshot {path} : {traceback.format_exc()}')
+        return None
+
+
+class StartupSnapshotStore(object):
+    """
+    Reads, takes and writes the startup snapshots of the RepoManager. The snapshot of a repo is stored as
+    "${repo}${SNAPSHOT_SUFFIX}" under snapshotsPath.
+
+    Snapshots are taken from the repo through the callables handed over by the RepoManager and written on its save
+    executor, so a snapshot is always taken after the saves requested before it. Writes are coalesced: only one write is
+    pending at a time, snapshots are written at most once per writeSeconds and a pending write is done on close. A single
+    timer thread per store hands pending writes to the executor once they are due. The preview of an image handed over
+    with remember_saved is made from the saved bytes rather then read back from the repo.
+
+    Attributes
+    ----------
+    snapshotsPath (Path)
+        directory the snapshots are written to
+
+    reposPath (Path)
+        directory holding every repo, paths in snapshots are stored relative to it
+
+    pageSize (int)
+        number of image prompts on the page of a snapshot
+
+    writeSeconds (float)
+        least number of seconds between two writes
+
+    Methods
+    -------
+    get()
+        Reads the snapshot of the current repo, once
+
+    take(readPreview)
+        Takes a snapshot of the current repo without writing it
+
+    write()
+        Takes a snapshot of the current repo and writes it
+
+    remember_saved(saved)
+        Keeps the bytes of an image being saved until the next write
+
+    schedule()
+        Writes a snapshot on the executor, unless a write is already pending
+
+    verify()
+        Checks the snapshot returned by get against the repo
+
+    close()
+        Writes the pending snapshot, if any. Nothing is written after.
+    """
+
+    def __init__(
+            self,
+            snapshotsPath: Union[str, Path],
+            reposPath: Union[str, Path],
+            pageSize: int,
+            currentRepo: Callable[[], str],
+            readPage: Callable[[int], GetImagePrompsResult],
+            countImages: Callable[[], int],
+            executor: Executor,
+            writeSeconds: float = DEFAULT_SNAPSHOT_WRITE_SECONDS
+        ):
+        self.snapshotsPath = Path(snapshotsPath)
+        self.reposPath = Path(reposPath)
+        self.pageSize = pageSize
+        self.currentRepo = currentRepo
+        self.readPage = readPage
+        self.countImages = countImages
+        self.executor = executor
+        self.writeSeconds = writeSeconds
+        # Guards the pending write and the saved image, schedule is called from whichever thread saved or deleted
+        self.lock = threading.Lock()
+        self.pending = False
+        self.submitted = False
+        # One timer thread per store, started on the first schedule, waits on this until a pending write is due
+        self.due = threading.Condition(self.lock)
+        self.timer: Union[threading.Thread, None] = None
+        self.lastWrite = float("-inf")
+        self.closed = False
+        # Images saved since the last write, by result_key, and the last preview made, keyed by the result and its image names
+        self.saved: Dict[tuple, ImagePrompResult] = {}
+        self.preview: Union[Tuple[tuple, List[bytes]], None] = None
+        # Snapshot read at startup, only read once since its only worth anything before the repo was read
+        self.snapshot: Union[StartupSnapshot, None] = None
+        self.snapshotRead = False
+
+
+    def snapshot_path(self, repo: str) -> Path:
+        return self.snapshotsPath/(repo + SNAPSHOT_SUFFIX)
+
+
+    def get(self) -> Union[StartupSnapshot, None]:
+        if not self.snapshotRead:
+            self.snapshotRead = True
+            repo = self.currentRepo()
+            snapshot = read_snapshot(self.snapshot_path(repo), self.reposPath)
+            if snapshot is not None and snapshot.repo == repo and snapshot.pageSize == self.pageSize:
+                self.snapshot = snapshot
+        return self.snapshot
+
+
+    def take(self, readPreview: bool) -> StartupSnapshot:
+        page = self.readPage(self.pageSize)
+        latest = None
+        if len(page.results) > 0:
+            first = page.results[0]
+            latest = ImagePrompResult(
+                prompt=first.prompt, repo=first.repo, date=first.date, time=first.time, num=first.num,
+                images=self._preview(first) if readPreview else first.images
+            )
+        return StartupSnapshot(self.currentRepo(), self.pageSize, self.countImages(), latest, page)
+
+
+    def _preview(self, latest: ImagePrompResult) -> List[bytes]:
+        key = (result_key(latest), tuple(image.name for image in latest.images))
+        with self.lock:
+            if self.preview is not None and self.preview[0] == key:
+                return self.preview[1]
+            saved = self.saved.get(result_key(latest))
+        # Images of a saved result are held as bytes and named after its num
+        images = latest.images
+        if saved is not None and (f'{saved.num}.png',) == key[1]:
+            images = saved.images
+        preview = [generate_preview(image_as_bytes(image)) for image in images]
+        with self.lock:
+            self.preview = (key, preview)
+        return preview
+
+
+    def write(self) -> Union[StartupSnapshot, None]:
+        try:
+            snapshot = self.take(readPreview=True)
+            if snapshot.page.errorMessage is not None:
+                logging.info(f'Not writing startup snapshot of a page that failed : {snapshot.page.errorMessage}')
+                return None
+            write_snapshot(self.snapshot_path(snapshot.repo), snapshot, self.reposPath)
+            return snapshot
+        except BaseException as e:
+            logging.error(f'Could not write startup snapshot : {traceback.format_exc()}')
+            return None
+
+
+    def remember_saved(self, saved: ImagePrompResult):
+        # Remembered before the image shows up in the repo so no write can see the image without its bytes
+        with self.lock:
+            if not self.closed:
+                self.saved[result_key(saved)] = saved
+
+
+    def schedule(self):
+        with self.lock:
+            if self.pending or self.closed:
+                return
+            self.pending = True
+            if self.timer is None:
+                self.timer = threading.Thread(target=self._run_timer, name="startup-snapshot-timer", daemon=True)
+                self.timer.start()
+            self.due.notify()
+
+
+    def _seconds_until_due(self) -> Union[float, None]:
+        # None while there is nothing to submit, called with the lock held
+        if not self.pending or self.submitted:
+            return None
+        return self.lastWrite + self.writeSeconds - time.monotonic()
+
+
+    def _run_timer(self):
+        while True:
+            with self.lock:
+                secondsUntilDue = self._seconds_until_due()
+                while not self.closed and (secondsUntilDue is None or secondsUntilDue > 0):
+                    self.due.wait(secondsUntilDue)
+                    secondsUntilDue = self._seconds_until_due()
+                if self.closed:
+                    return
+                self.submitted = True
+            self._submit_write()
+
+
+    def _submit_write(self):
+        try:
+            self.executor.submit(self._write_pending)
+        except RuntimeError as e:
+            # Still pending so close writes it
+            logging.info('Not writing startup snapshot yet, repo manager is closing')
+
+
+    def _write_pending(self):
+        with self.lock:
+            if not self.pending:
+                return
+            # Saves and deletes from now on need another write
+            self.pending = False
+            self.submitted = False
+            self.lastWrite = time.monotonic()
+            written = list(self.saved)
+        self.write()
+        with self.lock:
+            # Images saved during the write are kept for the write they scheduled
+            for key in written:
+                self.saved.pop(key, None)
+
+
+    def verify(self) -> bool:
+        snapshot = self.get()
+        current = self.take(readPreview=False)
+        if snapshot is not None and snapshot.key() == current.key():
+            return True
+        logging.info("Startup snapshot missing or out of date, writing a new one")
+        self.schedule()
+        return snapshot is None
+
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            pending = self.pending
+            self.pending = False
+            self.due.notify()
+        if pending:
+            self.write()
+        with self.lock:
+            self.saved.clear()
@@ -0,0 +1,189 @@
+import io
+import logging
+import os
+import shutil
+import traceback
+from pathlib import Path
+from typing import List, Tuple, Union
+
+from PIL import Image
+
+from repoManager.DatePack import PACK_FILE_NAME
+from repoManager.Models import ImageHandle, ImagePromptDirectory
+from repoManager.utils import extract_file_name, generate_image_prompt_path
+
+from utils.pathingUtils import atomic_write_bytes, is_temporary_file, read_file_as_bytes
+
+
+THUMBNAIL_SIZE = (128, 128)
+
+
+def generate_thumbnail(imageBytes: bytes, size: Tuple[int, int] = THUMBNAIL_SIZE) -> bytes:
+    """
+    Takes the bytes of a full resolution image and makes a small PNG rendition of it that keeps the aspect ratio.
+    """
+    with Image.open(io.BytesIO(imageBytes)) as image:
+        image.thumbnail(size)
+        output = io.BytesIO()
+        image.save(output, "PNG")
+    return output.getvalue()
+
+
+class ThumbnailStore(object):
+    """
+    Cache of small renditions of the images saved in the image repos.
+
+    Decoding a full 1024x1024 PNG just to draw it at gallery size is expensive on a raspberry pi so a thumbnail is
+    written next to every image when its saved. Thumbnails live in their own tree mirroring the repos so they never show up
+    when the repos are iterated:
+        ${thumbnailsPath}/
+            Dall-e/
+                2024-01-11/
+                    15:05:06.713451_Sad rat/
+                        1.png
+
+    Thumbnails missing from the store (like for images saved before the store existed) are made on demand the first
+    time they are requested or in bulk with backfill.
+
+    Attributes
+    ----------
+    thumbnailsPath (Path)
+        root of the thumbnail tree
+
+    Methods
+    -------
+    save_thumbnail(directory, imageName, imageBytes)
+        Makes and stores the thumbnail of a freshly saved image
+
+    get_thumbnail(directory, imageName, source)
+        Gets the bytes of a thumbnail, making it from the full resolution image if its missing
+
+    delete_thumbnails(directory, imageNames)
+        Removes thumbnails of deleted images
+
+    delete_directory(directory)
+        Removes every thumbnail of a deleted image prompt directory
+
+    backfill(repoPath, repo)
+        Makes thumbnails for every image in a repo that doesn't have one yet
+    """
+
+    def __init__(self, thumbnailsPath: Union[str, Path], size: Tuple[int, int] = THUMBNAIL_SIZE):
+        self.thumbnailsPath = Path(thumbnailsPath)
+        self.size = size
+
+
+    def thumbnail_path(self, directory: ImagePromptDirectory, imageName: str) -> Path:
+        return self.thumbnailsPath/generate_image_prompt_path(directory)/imageName
+
+
+    def _write_thumbnail(self, directory: ImagePromptDirectory, imageName: str, imageBytes: bytes) -> Union[bytes, None]:
+        # Thumbnails are only a cache so failing to make one should never fail the caller
+        try:
+            thumbnailBytes = generate_thumbnail(imageBytes, self.size)
+
+            path = self.thumbnail_path(directory, imageName)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_bytes(path, thumbnailBytes)
+            return thumbnailBytes
+        except BaseException as e:
+            logging.warning(f'Could not make a thumbnail of {directory} {imageName} : {traceback.format_exc()}')
+            return None
+
+
+    def save_thumbnail(self, directory: ImagePromptDirectory, imageName: str, imageBytes: bytes) -> Union[bytes, None]:
+        """
+        Makes the thumbnail of an image that was just saved to the repo.
+
+        Returns
+        -------
+        bytes
+            The thumbnail as PNG bytes or None if the image could not be decoded.
+        """
+        return self._write_thumbnail(directory, imageName, imageBytes)
+
+
+    def get_thumbnail(self, directory: ImagePromptDirectory, imageName: str, source: Union[str, Path, ImageHandle]) -> Union[bytes, None]:
+        """
+        Gets the thumbnail of an image in a repo. Missing thumbnails are made from the full resolution image at source
+        (a path or a handle).
+
+        Returns
+        -------
+        bytes
+            The thumbnail as PNG bytes or None if neither a thumbnail nor a decodable source image exists.
+        """
+        path = self.thumbnail_path(directory, imageName)
+        try:
+            return read_file_as_bytes(path)
+        except FileNotFoundError:
+            pass
+
+        try:
+            sourceBytes = source.read_bytes() if isinstance(source, ImageHandle) else read_file_as_bytes(source)
+        except FileNotFoundError:
+            return None
+        logging.info(f'Backfilling thumbnail {path}')
+        return self._write_thumbnail(directory, imageName, sourceBytes)
+
+
+    def delete_thumbnails(self, directory: ImagePromptDirectory, imageNames: List[str]):
+        """
+        Removes the thumbnails of the given images and prunes any thumbnail directories left empty.
+        """
+        for imageName in imageNames:
+            try:
+                self.thumbnail_path(directory, imageName).unlink()
+            except FileNotFoundError:
+                pass
+
+        self._prune(directory)
+
+
+    def delete_directory(self, directory: ImagePromptDirectory):
+        """
+        Removes every thumbnail of an image prompt directory. Used when images were deleted without knowing their names.
+        """
+        shutil.rmtree(self.thumbnailsPath/generate_image_prompt_path(directory), ignore_errors=True)
+        self._prune(directory)
+
+
+    def _prune(self, directory: ImagePromptDirectory):
+        promptPath = self.thumbnailsPath/generate_image_prompt_path(directory)
+        for path in [promptPath, promptPath.parent]:
+            try:
+                path.rmdir()
+            except OSError:
+                # Not empty or already gone
+                break
+
+
+    def backfill(self, repoPath: Union[str, Path], repo: str) -> int:
+        """
+        Walks a whole repo and makes the thumbnails that are missing. Temporary files of writes still in progress and
+        packs are skipped, packed images already got their thumbnails when they were packed.
+
+        Returns
+        -------
+        int
+            How many thumbnails were made.
+        """
+        repoPath = Path(repoPath)
+        made = 0
+        for date in sorted(os.listdir(repoPath), reverse=True):
+            if not (repoPath/date).is_dir():
+                continue
+            for timePrompt in os.listdir(repoPath/date):
+                if "_" not in timePrompt or is_temporary_file(timePrompt) or not (repoPath/date/timePrompt).is_dir():
+                    continue
+                time, prompt = extract_file_name(timePrompt)
+                directory = ImagePromptDirectory(prompt=prompt, repo=repo, date=date, time=time)
+                for imageName in os.listdir(repoPath/date/timePrompt):
+                    if is_temporary_file(imageName) or imageName == PACK_FILE_NAME:
+                        continue
+                    if self.thumbnail_path(directory, imageName).exists():
+                        continue
+                    if self._write_thumbnail(directory, imageName, read_file_as_bytes(repoPath/date/timePrompt/imageName)) is not None:
+                        made += 1
+        logging.info(f'Backfilled {made} thumbnails for repo {repo}')
+        return made
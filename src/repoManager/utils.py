@@ -1,5 +1,7 @@
-from repoManager.Models import ImagePromptDirectory
+import re
+from repoManager.Models import ImageHandle, ImagePromptDirectory, NextToken
 from pathlib import Path
+from typing import List, Union
 
 
 def extract_file_name(timePrompt: str):
@@ -35,4 +37,58 @@ def generate_image_prompt_path(directory: ImagePromptDirectory) -> Path:
         Can be used to do filesystem operations on the directory.
     
     """
-    return Path(directory.repo)/directory.date/generate_file_name(directory.time, directory.prompt)
\ No newline at end of file
+    return Path(directory.repo)/directory.date/generate_file_name(directory.time, directory.prompt)
+
+
+def image_as_bytes(image: Union[ImageHandle, bytes]) -> bytes:
+    """
+    Gets the bytes of an image from a result whether it was loaded eagerly (bytes) or lazily (ImageHandle).
+    """
+    return image.read_bytes() if isinstance(image, ImageHandle) else image
+
+
+def tokenize_prompt(prompt: str) -> List[str]:
+    """
+    Splits a prompt (or a search query) into the lower cased words it's searchable by. Duplicate words are only kept once.
+    """
+    return list(dict.fromkeys(re.findall(r"\w+", prompt.lower())))
+
+
+def prompt_matches(queryTokens: List[str], prompt: str) -> bool:
+    """
+    Whether a prompt matches a search query. Every word of the query has to start a word of the prompt, so "cat" finds "cats".
+    """
+    promptTokens = tokenize_prompt(prompt)
+    return all(any(promptToken.startswith(queryToken) for promptToken in promptTokens) for queryToken in queryTokens)
+
+
+def generate_nextToken(directoryToTokenize: ImagePromptDirectory):
+    """
+    Takes an image prompt directory and generates a token for it. Tokens are uesd in pagination systems
+    to bookmark what page a client was last at when getting items.
+
+    For the repo manager a token is basically just a image prompt directory. This doesn't have to be the
+    case though. In fact for clients, the actual implementation of the token shouldn't be important for
+    most interactions with the repo manager. The only thing the client has to do is provide previous nexttokens
+    in order to get the next page of imageprompt directories from the system.
+
+    Parameters
+    ----------
+    directoryToTokenize (ImagePromptDirectory): 
+        Model of a image prompt directory that will be tokenized
+
+    Returns
+    -------
+    NextToken
+        The nexttoken used for pagination and bookmarking.
+
+    """
+    nextToken = None
+    if(directoryToTokenize is not None):
+        nextToken = NextToken(
+            prompt=directoryToTokenize.prompt,
+            repo=directoryToTokenize.repo,
+            date=directoryToTokenize.date,
+            time=directoryToTokenize.time
+        )
+    return nextToken
@@ -1,6 +1,5 @@
 import logging
 import traceback
-from speech_recognition import Recognizer, UnknownValueError, RequestError, Microphone
 import logging
 from typing import Callable
 
@@ -20,12 +19,13 @@ class GoogleSpeechRecognizer(SpeechRecognizer):
 
     Right now there is no way to configure this class to use any other API key so it is stuck the service limitations
     of the default API key.
+
+    speech_recognition is only imported (and the recognizer only made) the first time something is transcribed.
     """
 
     def __init__(self):
         super().__init__()
-        # Initialize the recognizer 
-        self.r = Recognizer()
+        self.r = None
         self.trascription = ""
         return
 
@@ -35,6 +35,10 @@ class GoogleSpeechRecognizer(SpeechRecognizer):
 
 
     def transcribe(self, notify: Callable = None) -> Callable:
+        from speech_recognition import Recognizer, UnknownValueError, RequestError, Microphone
+        if self.r is None:
+            # Initialize the recognizer 
+            self.r = Recognizer()
         self.trascription = ""
         try:
             # this is called from the background thread
@@ -0,0 +1,192 @@
+import logging
+import threading
+import traceback
+from concurrent.futures import Future
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from imageProviders.ImageProvider import ImageProvider, ImageProviderResult
+from repoManager.RepoManager import RepoManager
+
+
+# Dall-e takes 10 to 20 seconds per image, a couple in flight keeps a queue of prompts moving without tripping rate limits
+DEFAULT_MAX_CONCURRENT_GENERATIONS = 2
+
+
+class GenerationRunnable(QRunnable):
+    def __init__(self, target, args):
+        QRunnable.__init__(self)
+        self.t = target
+        self.args = args
+
+    def run(self):
+        self.t(*self.args)
+
+
+class GenerationQueue(QObject):
+    """
+    Queue of prompts waiting to be turned into images by an ImageProvider. Any number of prompts can be submitted at once,
+    at most maxConcurrent of them are sent to the provider at a time and the rest wait their turn in the thread pool.
+    Submitting never blocks so the UI can take prompts faster than the provider answers them.
+
+    Results are handed on in the order the provider finishes them, not the order they were submitted. Every new image is
+    saved to the repo through RepoManager.save_image_async as soon as it arrives, which keeps the saves (and the times
+    the images are stored under) in completion order as well. The provider is told about every saved image so caches can
+    point at it. Cache hits of images already in the repo (with a 'savedImage') aren't saved again.
+
+    All signals are emitted from background threads, connected slots of widgets run on the UI thread.
+
+    Attributes
+    ----------
+    jobQueuedSignal(int, str)
+        emitted with the job id and prompt of every submitted prompt
+
+    generatedSignal(int, str, dict)
+        emitted with the job id, prompt and ImageProviderResult once the provider is done with a prompt, successful or not
+
+    savedSignal(int, Future)
+        emitted with the job id and the Future of save_image_async once the image of a job is saved (or failed to save).
+        Not emitted for cache hits that weren't saved again.
+
+    queueChangedSignal(int, int)
+        emitted with the number of waiting and running jobs whenever either changes
+
+    Methods
+    -------
+    submit(prompt)
+        Queues a prompt and returns the id of its job
+
+    warm_up()
+        Runs the slow setup of the provider on a background thread ahead of the first prompt
+
+    pending_count()
+        Number of jobs waiting for a free slot
+
+    running_count()
+        Number of jobs the provider is working on
+
+    close(timeoutMs)
+        Drops waiting jobs, waits for running ones to finish and closes the provider
+    """
+    jobQueuedSignal = pyqtSignal(int, str)
+    generatedSignal = pyqtSignal(int, str, dict)
+    savedSignal = pyqtSignal(int, object)
+    queueChangedSignal = pyqtSignal(int, int)
+
+    def __init__(self, imageProvider: ImageProvider, repoManager: RepoManager, maxConcurrent: int = DEFAULT_MAX_CONCURRENT_GENERATIONS):
+        super().__init__()
+        self.imageProvider = imageProvider
+        self.repoManager = repoManager
+        self.maxConcurrent = max(1, maxConcurrent)
+
+        self.threadpool = QThreadPool()
+        self.threadpool.setMaxThreadCount(self.maxConcurrent)
+
+        # Counts and closed are used from the pool's threads
+        self.lock = threading.Lock()
+        self.jobCount = 0
+        self.pending = 0
+        self.running = 0
+        self.closed = False
+
+
+    def _queue_changed(self, pendingDelta: int, runningDelta: int):
+        with self.lock:
+            self.pending += pendingDelta
+            self.running += runningDelta
+            pending, running = self.pending, self.running
+        self.queueChangedSignal.emit(pending, running)
+
+
+    def submit(self, prompt: str) -> int:
+        """
+        Parameters
+        ----------
+        prompt (str):
+            The prompt to generate an image of
+
+        Returns
+        -------
+        int
+            Id of the job, passed along with every signal about it
+        """
+        with self.lock:
+            self.jobCount += 1
+            jobId = self.jobCount
+        self.jobQueuedSignal.emit(jobId, prompt)
+        self._queue_changed(1, 0)
+        self.threadpool.start(GenerationRunnable(target=self._run_job, args=(jobId, prompt)))
+        return jobId
+
+
+    def _run_job(self, jobId: int, prompt: str):
+        with self.lock:
+            closed = self.closed
+        if closed:
+            self._queue_changed(-1, 0)
+            return
+        self._queue_changed(-1, 1)
+        try:
+            response = self.imageProvider.get_image_from_string(prompt)
+        except BaseException as e:
+            logging.error(f'Could not generate image for prompt {prompt} : {traceback.format_exc()}')
+            response = { 'img': None, 'errorMessage': str(e) }
+        finally:
+            self._queue_changed(0, -1)
+
+        self.generatedSignal.emit(jobId, prompt, response)
+        if response['errorMessage'] is None and response.get('savedImage') is None:
+            self._save(jobId, prompt, response)
+
+
+    def _save(self, jobId: int, prompt: str, response: ImageProviderResult):
+        try:
+            saveFuture = self.repoManager.save_image_async(prompt, response['img'])
+        except RuntimeError as e:
+            # The repo manager was closed while the provider was still working
+            logging.error(f'Could not save image for prompt {prompt} : {traceback.format_exc()}')
+            saveFuture = Future()
+            saveFuture.set_exception(e)
+        saveFuture.add_done_callback(lambda future: self._saved(jobId, prompt, future))
+
+
+    def _saved(self, jobId: int, prompt: str, saveFuture: Future):
+        try:
+            if saveFuture.exception() is None:
+                self.imageProvider.image_saved(prompt, saveFuture.result())
+            else:
+                self.imageProvider.image_save_failed(prompt)
+        except Exception as e:
+            logging.error(f'Provider could not take the outcome of saving the image of prompt {prompt} : {traceback.format_exc()}')
+        self.savedSignal.emit(jobId, saveFuture)
+
+
+    def warm_up(self):
+        # Not on the pool so the first prompts never wait behind it for a slot
+        threading.Thread(target=self.imageProvider.warm_up, name="ProviderWarmUp", daemon=True).start()
+
+
+    def pending_count(self) -> int:
+        with self.lock:
+            return self.pending
+
+
+    def running_count(self) -> int:
+        with self.lock:
+            return self.running
+
+
+    def close(self, timeoutMs: int = -1) -> bool:
+        """
+        Returns
+        -------
+        bool
+            Whether every running job finished within the timeout
+        """
+        # Waiting jobs still get their turn on the pool but return right away
+        with self.lock:
+            self.closed = True
+        logging.info(f'Closing generation queue, dropping {self.pending_count()} waiting prompts')
+        finished = self.threadpool.waitForDone(timeoutMs)
+        self.imageProvider.close()
+        return finished
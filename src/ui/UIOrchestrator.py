@@ -1,14 +1,20 @@
 
 import logging
 import sys
+import traceback
+from concurrent.futures import Future
 
 from PyQt5.QtGui import QImage
+from PyQt5.QtWidgets import QWidget
 
+from repoManager.RepoManager import RepoManager
+from repoManager.RepoWatcher import RepoWatcher
 from ui.widgets.MainWindow import MainWindow
 from ui.QApplicationManager import QApplicationManager
 from ui.widgets.gallery.GalleryPage import GalleryPage
 from ui.widgets.home.HomePage import HomePage
 from ui.widgets.home.ImageMeta import ImageMetaInfo
+from utils.pageUtils import PageName
 
 
 class QtBot():
@@ -26,6 +32,9 @@ class UIOrchestrator():
     """
     Orchestrator class that takes all high level QT resources, combines them together and generally controls how they are used.
 
+    The gallery is only built once it's first routed to, it's wired to the other pages then. Until then there is nothing on it
+    to refresh.
+
     Attributes
     ----------
 
@@ -33,40 +42,99 @@ class UIOrchestrator():
     ----------
     start()
         Runs the PAIID application UI. Will close the current python interpreter after the UI application runs or at least failed to run.
+        Also starts watching the repo for outside changes if a repo watcher was given.
+
+    verify_startup_snapshot()
+        Checks what the pages drew from the startup snapshot against the repo in the background and refreshes them if it changed.
+        The preview of the latest image is replaced with the full image either way.
+
+    page_created(pageName, page)
+        Wires a page to the others once the main window built it
+
+    refresh_gallery()
+        Refreshes the gallery, if it was built
 
     start_with_bot(qtbot)
         Runs the PAIID application UI on the current thread but with a QTbot running alongside it.
         Does not close the python interpreter.
     """
 
-    def __init__(self, qApplicationManager: QApplicationManager, homePage: HomePage, galleryPage: GalleryPage, mainWindow: MainWindow):
+    def __init__(self, qApplicationManager: QApplicationManager, homePage: HomePage, mainWindow: MainWindow, repoManager: RepoManager, repoWatcher: RepoWatcher = None):
         self.app = qApplicationManager.getQApp()
         self.homePage = homePage
-        self.galleryPage = galleryPage
+        self.galleryPage: GalleryPage = None
         self.mainWindow = mainWindow
+        self.repoManager = repoManager
+        self.repoWatcher = repoWatcher
 
-        # Clicking on gallery images refocuses them on the homepage
-        def loadImageToMainPage(metaInfo: ImageMetaInfo, image: QImage):
-            self.homePage.loadImageSignal.emit(metaInfo, image)
-            self.mainWindow.route_to_page(self.homePage)
-        self.galleryPage.imageClickedSignal.connect(loadImageToMainPage)
+        self.mainWindow.pageCreatedSignal.connect(self.page_created)
 
         # Home Page Image Generation Must Refresh Gallery. Optimize by only refreshing the first page
         def refreshFirstPage():
-            if self.galleryPage.leftBookmarkPageToken is None:
+            if self.galleryPage is not None and self.galleryPage.leftBookmarkPageToken is None:
                 self.galleryPage.galleryRefreshSignal.emit()
         self.homePage.successfulSavedImageSignal.connect(refreshFirstPage)
         # Home Page image trashing must refresh all pages. TODO Probably a better way to optimize this.
-        def refreshGallery():
+        self.homePage.successfulTrashImageSignal.connect(self.refresh_gallery)
+
+        # Outside changes to the repo are reported from the watcher thread, the signal hops them onto the UI thread
+        if self.repoWatcher is not None:
+            def reportChanges(directories):
+                galleryPage = self.galleryPage
+                if galleryPage is not None:
+                    galleryPage.repoChangedSignal.emit(directories)
+            self.repoWatcher.onChange = reportChanges
+
+
+    def page_created(self, pageName: str, page: QWidget):
+        if pageName != PageName.GALLERY:
+            return
+        self.galleryPage = page
+
+        # Clicking on gallery images refocuses them on the homepage
+        def loadImageToMainPage(metaInfo: ImageMetaInfo, image: QImage):
+            self.homePage.loadImageSignal.emit(metaInfo, image)
+            self.mainWindow.route_to_page(PageName.HOME)
+        self.galleryPage.imageClickedSignal.connect(loadImageToMainPage)
+
+
+    def refresh_gallery(self):
+        if self.galleryPage is not None:
             self.galleryPage.galleryRefreshSignal.emit()
-        self.homePage.successfulTrashImageSignal.connect(refreshGallery)
+
+
+    def verify_startup_snapshot(self) -> Future:
+        # Called back on the verifying thread, the signals hop back onto the UI thread
+        def refreshIfStale(future: Future):
+            self.homePage.replacePreviewSignal.emit()
+            try:
+                if future.result():
+                    return
+            except BaseException as e:
+                logging.error(f'Could not verify startup snapshot : {traceback.format_exc()}')
+            self.refresh_gallery()
+
+        verifyFuture = self.repoManager.verify_startup_snapshot_async()
+        verifyFuture.add_done_callback(refreshIfStale)
+        return verifyFuture
 
 
     def start(self):
         logging.info("Starting UI")
 
+        if self.repoWatcher is not None:
+            self.repoWatcher.start()
+
         self.mainWindow.show()
-        sys.exit(self.app.exec_())
+        self.verify_startup_snapshot()
+        exitCode = self.app.exec_()
+
+        if self.repoWatcher is not None:
+            self.repoWatcher.stop()
+        # Images already being generated are paid for, so they are still saved before the repo manager closes
+        self.homePage.generationQueue.close()
+        self.repoManager.close()
+        sys.exit(exitCode)
 
 
     def start_with_bot(self, qtbot: QtBot):
@@ -74,3 +142,4 @@ class UIOrchestrator():
 
         qtbot.addWidget(self.mainWindow)
         self.mainWindow.show()
+        self.verify_startup_snapshot()
@@ -1,9 +1,25 @@
-from PyQt5.QtWidgets import QMainWindow, QStackedWidget, QToolBar, QAction
+from PyQt5.QtWidgets import QMainWindow, QStackedWidget, QToolBar, QAction, QWidget
+from PyQt5.QtCore import pyqtSignal
 
-from utils.pageUtils import PageMetaDecorator
+from utils.pageUtils import PageMetaDecorator, PageName
 
 
 class MainWindow(QMainWindow):
+    """
+    Full screen window with a toolbar to route between pages. Only the first page is built up front, every other page is
+    built the first time it's routed to.
+
+    Attributes
+    ----------
+    pageCreatedSignal
+        signal emited with the name and widget of a page once it was built
+
+    Methods
+    ----------
+    route_to_page(pageName)
+        Shows a page, building it first if it wasn't yet
+    """
+    pageCreatedSignal = pyqtSignal(str, QWidget)
 
     def __init__(self, *arg: PageMetaDecorator):
         super(MainWindow, self).__init__()               
@@ -22,12 +38,11 @@ class MainWindow(QMainWindow):
         self.init_toolbar()
 
         self.central_widget = QStackedWidget()
-        
-        for page in self.pages.values():
-            self.central_widget.addWidget(page.widget)
-
         self.setCentralWidget(self.central_widget)
 
+        # The first page is the one shown at startup
+        self.route_to_page(next(iter(self.pages)))
+
 
     def init_toolbar(self):
         # Toolbar
@@ -38,9 +53,18 @@ class MainWindow(QMainWindow):
             page_routing_button = QAction(page.pageCaption, self)
             page_routing_button.setStatusTip(page.hint)
             # Use default arg trick in lambdas to save current variables value rather then the variable itself in the lambda scope
-            page_routing_button.triggered.connect(lambda _, pageWidget=page.widget: self.route_to_page(pageWidget))
+            page_routing_button.triggered.connect(lambda _, pageName=page.pageName: self.route_to_page(pageName))
             toolbar.addAction(page_routing_button)
 
 
-    def route_to_page(self, widget):
-        self.central_widget.setCurrentWidget(widget)
\ No newline at end of file
+    def route_to_page(self, pageName: PageName):
+        pageMeta = self.pages[pageName]
+        created = pageMeta.widget is None
+        widget = pageMeta.get_widget()
+        if created:
+            self.central_widget.addWidget(widget)
+            self.pageCreatedSignal.emit(pageName, widget)
+        # Pages that defer reading their data load it before they are first shown rather then showing up empty
+        if hasattr(widget, "ensure_loaded"):
+            widget.ensure_loaded()
+        self.central_widget.setCurrentWidget(widget)
@@ -1,12 +1,17 @@
 
 import logging
+import traceback
+from concurrent.futures import Future
 from PyQt5.QtWidgets import QWidget, QLabel, QVBoxLayout, QHBoxLayout, QScrollArea
 from PyQt5.QtCore import pyqtSignal, Qt
 from PyQt5.QtGui import QPixmap
 
-from typing import List
+from typing import Callable, List, Union
 
+from repoManager.Models import ImageHandle
 from repoManager.RepoManager import ImagePrompResult
+from repoManager.utils import image_as_bytes
+from ui.dialogs.ErrorMessage import ErrorMessage
 from ui.widgets.common.QLine import QHLine
 from ui.widgets.home.ImageMeta import ImageMetaInfo
 
@@ -19,16 +24,22 @@ class ImagesDisplay(QWidget):
     Attributes
     ----------
     imageClickedSignal
-        signal that is emited when the image is clicked in the gallery
+        signal that is emited when the image is clicked in the gallery, once the image was read in the background
+
+    imageReadSignal
+        signal emited with the meta info and the Future of a clicked image once it was read in the background
 
     Methods
     ----------
     """
     imageClickedSignal =  pyqtSignal(ImageMetaInfo, bytes)
+    imageReadSignal = pyqtSignal(ImageMetaInfo, object)
 
-    def __init__(self, imageResult: ImagePrompResult):
+    def __init__(self, imageResult: ImagePrompResult, readImageAsync: Callable[[Union[ImageHandle, bytes]], Future]):
         super().__init__()
 
+        self.readImageAsync = readImageAsync
+        self.imageReadSignal.connect(self.image_read)
         self.init_ui(imageResult)
 
 
@@ -41,8 +52,9 @@ class ImagesDisplay(QWidget):
 
         layout.addWidget(QHLine())
 
-        for image in imageResult.images:
-            self.image_label = self.create_image(imageResult, image)
+        thumbnails = imageResult.thumbnails if imageResult.thumbnails is not None else [image_as_bytes(image) for image in imageResult.images]
+        for image, thumbnail in zip(imageResult.images, thumbnails):
+            self.image_label = self.create_image(imageResult, image, thumbnail)
             layout.addWidget(self.image_label)
 
         self.setLayout(layout)
@@ -67,24 +79,35 @@ class ImagesDisplay(QWidget):
         return headerLayout
     
 
-    def create_image(self, imageResult: ImagePrompResult, imageBytes: bytes) -> QLabel:
+    def create_image(self, imageResult: ImagePrompResult, image: Union[ImageHandle, bytes], thumbnailBytes: bytes) -> QLabel:
+        # Thumbnails are small renditions so only they get decoded for the gallery. The full image is only read on click.
         pixmap = QPixmap()
-        pixmap.loadFromData(imageBytes)
+        if thumbnailBytes is not None:
+            pixmap.loadFromData(thumbnailBytes)
         label = QLabel()
         label.resize(75, 75)
         label.setPixmap(pixmap.scaled(label.size(), Qt.IgnoreAspectRatio))
         def leftClickEvent(event):
             if event.button() == Qt.LeftButton:
-                self.imageClickedSignal.emit(
-                    ImageMetaInfo(
-                        prompt=imageResult.prompt, date=imageResult.date, time=imageResult.time, engine=imageResult.repo, num="1"
-                    ), 
-                    imageBytes
+                metaInfo = ImageMetaInfo(
+                    prompt=imageResult.prompt, date=imageResult.date, time=imageResult.time, engine=imageResult.repo, num="1"
                 )
+                # The full image may sit on the SD card or in a pack so it's read in the background and emitted once read
+                self.readImageAsync(image).add_done_callback(lambda future: self.imageReadSignal.emit(metaInfo, future))
         label.mousePressEvent = leftClickEvent
         return label
 
 
+    def image_read(self, metaInfo: ImageMetaInfo, readFuture: Future):
+        try:
+            imageBytes = readFuture.result()
+        except BaseException as e:
+            logging.error(f'Could not read image : {traceback.format_exc()}')
+            ErrorMessage(f'Could not read image : {str(e)}').exec()
+            return
+        self.imageClickedSignal.emit(metaInfo, imageBytes)
+
+
 class GalleryDisplay(QScrollArea):
     """
     QT Widget to display a single page worth of image prompts.
@@ -102,9 +125,10 @@ class GalleryDisplay(QScrollArea):
     imageClickedSignal = pyqtSignal(ImageMetaInfo, object)
 
 
-    def __init__(self, images: List[ImagePrompResult] = []):
+    def __init__(self, readImageAsync: Callable[[Union[ImageHandle, bytes]], Future], images: List[ImagePrompResult] = []):
         super().__init__()
 
+        self.readImageAsync = readImageAsync
         self.init_ui(images)
 
 
@@ -126,7 +150,7 @@ class GalleryDisplay(QScrollArea):
         logging.debug(f'Recieving {len(imageResults)} images')
 
         for imageResult in imageResults:
-            imageDisplay = ImagesDisplay(imageResult)
+            imageDisplay = ImagesDisplay(imageResult, self.readImageAsync)
             imageDisplay.imageClickedSignal.connect(self.imageClickedSignal.emit)
             layout.addWidget(imageDisplay)
 
@@ -1,8 +1,12 @@
 import logging
-from typing import Callable
-from PyQt5.QtWidgets import QWidget, QLabel, QVBoxLayout, QHBoxLayout, QPushButton
+import math
+import traceback
+from concurrent.futures import Future
+from typing import Callable, List
+from PyQt5.QtWidgets import QWidget, QLabel, QLineEdit, QVBoxLayout, QHBoxLayout, QPushButton
 from PyQt5.QtCore import pyqtSignal, Qt
-from repoManager.Models import NextToken
+from repoManager.Models import GetImagePrompsResult, ImagePromptDirectory, NextToken
+from repoManager.PageCache import directory_key, is_within_bounds
 
 from ui.dialogs.ErrorMessage import ErrorMessage
 from ui.widgets.home.ImageMeta import ImageMetaInfo
@@ -34,18 +38,27 @@ class PageLink(QLabel):
         # self.setFont(QFont())
 
     def mousePressEvent(self, event):
-        self.clicked.emit(self.text())   # emit the clicked signal when pressed
+        self.clicked.emit(self.text)   # emit the clicked signal when pressed
         return super().mousePressEvent(event)
 
 
 PAGE_SIZE = 10
 
+# How many page links are shown on each side of the current page
+PAGE_LINK_WINDOW = 2
+
 
 class GalleryPage(QWidget):
     """
     QT Widget to display a paginated array of image prompts that are already generated.
     Has controls for changing the page.
 
+    Nothing is read from the repo until the page is first shown (see ensure_loaded) so a gallery that isn't on screen costs
+    nothing at startup. Refreshes requested before then are dropped since the first load reads the repo as it is anyway.
+
+    Pages are read in the background and only shown if no other page was asked for since. A refresh asked for while a page
+    is being read is done once that page is shown.
+
     Attributes
     ----------
     imageClickedSignal
@@ -54,13 +67,54 @@ class GalleryPage(QWidget):
     galleryRefreshSignal
         signal, if emited, will refresh the contents of the gallery page
 
+    repoChangedSignal
+        signal emited with the image prompt directories that changed in the repo. Refreshes the page only if it shows any of them.
+
+    imagesCountedSignal
+        signal emited with the id of the request and the Future of the repo's image count once it was counted in the background
+
+    pageTokenFoundSignal
+        signal emited with the id of the request, the page number and the Future of the page's token once it was found in the background
+
+    pageLoadedSignal
+        signal emited with the id of the request, the Future of the page and the callable showing it once it was read in the background
+
     Methods
     ----------
+    ensure_loaded()
+        Loads the first page the first time its called, does nothing afterwards
+
+    init_page_from_snapshot()
+        Shows the first page from the repo's startup snapshot without reading the repo, or reads it if there is no snapshot
+
+    search(query)
+        Only shows the images whose prompt matches the query, or every image again if the query is empty
+
     change_page()
         Changes the contents of the current page to another pages contents 
+
+    jump_to_page(pageNum)
+        Shows any page directly, without going through the pages in between. The token of the page is looked up in the
+        background and the page is shown once it's found.
+
+    load_page(token, direction, show)
+        Reads a page in the background and shows it with show, unless another page was asked for since
+
+    refresh_page()
+        Reloads the contents of the current page without changing pages
+
+    repo_changed(directories)
+        Refreshes the current page if any of the changed directories fall within it
+
+    prefetch_adjacent_pages()
+        Reads the pages before and after the current page in the background so flipping to them is instant
     """
     imageClickedSignal = pyqtSignal(ImageMetaInfo, object)
     galleryRefreshSignal = pyqtSignal()
+    repoChangedSignal = pyqtSignal(object)
+    imagesCountedSignal = pyqtSignal(int, object)
+    pageTokenFoundSignal = pyqtSignal(int, int, object)
+    pageLoadedSignal = pyqtSignal(int, object, object)
 
     def __init__(self, repoManager: RepoManager):
         super().__init__()
@@ -70,12 +124,29 @@ class GalleryPage(QWidget):
         # Set bookmark variables
         self.leftBookmarkPageToken = None
         self.rightBookmarkPageToken = None
+        self.currentPageNum = 1
+        self.prefetches = []
+        self.searchQuery = None
+        self.loaded = False
+        # Last known number of images in the repo, None until first counted
+        self.imageCount = None
+        # Ids of the latest background count and page jump, answers to older requests are dropped
+        self.countRequest = 0
+        self.jumpRequest = 0
+        # Id of the latest page read and of the one last shown, they differ while a page is being read
+        self.pageRequest = 0
+        self.shownPageRequest = 0
+        self.refreshAfterLoad = False
 
         self.init_ui()
 
         # pass through emit from child to this parent
         self.gallery.imageClickedSignal.connect(self.imageClickedSignal.emit)
         self.galleryRefreshSignal.connect(self.refresh_page)
+        self.repoChangedSignal.connect(self.repo_changed)
+        self.imagesCountedSignal.connect(self.images_counted)
+        self.pageTokenFoundSignal.connect(self.page_token_found)
+        self.pageLoadedSignal.connect(self.page_loaded)
 
 
     def set_left_bookmark(self, bookmark: NextToken):
@@ -93,62 +164,211 @@ class GalleryPage(QWidget):
         layout = QVBoxLayout()
         self.setLayout(layout)
 
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("Search prompts")
+        self.search_box.setClearButtonEnabled(True)
+        self.search_box.returnPressed.connect(lambda : self.search(self.search_box.text()))
+        layout.addWidget(self.search_box)
+
         # create the stacked widget that will contain each page...       
-        self.gallery = GalleryDisplay()
+        self.gallery = GalleryDisplay(self.repoManager.read_image_async)
         layout.addWidget(self.gallery)
 
         # setup the layout for the page numbers below the stacked widget
         self.pagination_layout = QHBoxLayout()
         self.pagination_layout.addStretch(0)
-        self.pagination_layout.addWidget(generateWiderButton("<<", lambda _ : self.init_page()))
+        self.first_page_button = generateWiderButton("<<", lambda _ : self.init_page())
+        self.pagination_layout.addWidget(self.first_page_button)
         self.backward_page_button = generateWiderButton("<", lambda _ : self.change_page(self.leftBookmarkPageToken, DIRECTION.BACKWARD))
         self.pagination_layout.addWidget(self.backward_page_button)
 
         self.page_num_layout = QHBoxLayout()
-        self.change_page_nums(DIRECTION.FORWARD)
         self.pagination_layout.addLayout(self.page_num_layout)
 
         self.forward_page_button = generateWiderButton(">", lambda _ : self.change_page(self.rightBookmarkPageToken, DIRECTION.FORWARD))
         self.pagination_layout.addWidget(self.forward_page_button)
+        self.last_page_button = generateWiderButton(">>", lambda _ : self.jump_to_page(self.count_pages(self.imageCount)))
+        self.pagination_layout.addWidget(self.last_page_button)
         layout.addLayout(self.pagination_layout)
 
-        self.init_page()
+
+    def ensure_loaded(self):
+        if self.loaded:
+            return
+        self.loaded = True
+        self.init_page_from_snapshot()
+
+
+    def showEvent(self, event):
+        # Covers the gallery being shown without being routed to, like on its own
+        self.ensure_loaded()
+        super().showEvent(event)
+
+
+    def init_page_from_snapshot(self):
+        snapshot = self.repoManager.get_startup_snapshot()
+        if snapshot is None or snapshot.pageSize != PAGE_SIZE:
+            self.init_page()
+            return
+
+        logging.info("Init First Page from startup snapshot")
+        self.gallery.replace_display(snapshot.page.results)
+        self.set_left_bookmark(None)
+        self.set_right_bookmark(snapshot.page.nextToken)
+        self.currentPageNum = 1
+        # The repo isn't counted until the snapshot was verified so the count of the snapshot is used for the page links
+        self.change_page_nums(snapshot.imageCount)
 
 
     def init_page(self):
         logging.info("Init First Page")
-        getImagesResult = self.repoManager.get_images(PAGE_SIZE)
+        self.jump_to_page(1)
 
-        if(getImagesResult is not None):
-            if(getImagesResult.errorMessage is not None):
-                ErrorMessage(getImagesResult.errorMessage).exec()
-        
-            self.set_right_bookmark(getImagesResult.nextToken)
-            self.gallery.replace_display(getImagesResult.results)
-        
-        self.set_left_bookmark(None)
 
+    def search(self, query: str):
+        logging.info(f'Searching for "{query}"')
+        self.searchQuery = query.strip() or None
+        self.loaded = True
+        self.init_page()
 
-    def change_page_nums(self, direction: DIRECTION):
 
-        if(self.leftBookmarkPageToken is None):
-            self.current_page = PageLink(str(1), parent=self)
+    def load_page(self, token: NextToken, direction: DIRECTION, show: Callable[[GetImagePrompsResult], None]):
+        self.pageRequest += 1
+        requestId = self.pageRequest
+        if self.searchQuery is not None:
+            pageFuture = self.repoManager.search_images_async(self.searchQuery, PAGE_SIZE, token=token, direction=direction, includeThumbnails=True)
         else:
-            num = int(self.current_page.text)
-            nextNum = num + 1 if direction is DIRECTION.FORWARD else num - 1
-            self.current_page = PageLink(str(nextNum), parent=self)
+            pageFuture = self.repoManager.get_images_async(PAGE_SIZE, token=token, direction=direction, includeThumbnails=True)
+        pageFuture.add_done_callback(lambda future: self.pageLoadedSignal.emit(requestId, future, show))
+
+
+    def page_loaded(self, requestId: int, pageFuture: Future, show: Callable[[GetImagePrompsResult], None]):
+        # Dropped if another page was asked for since
+        if requestId != self.pageRequest:
+            return
+        self.shownPageRequest = requestId
+        try:
+            getImagesResult = pageFuture.result()
+        except BaseException as e:
+            logging.error(f'Could not load page : {traceback.format_exc()}')
+            getImagesResult = GetImagePrompsResult(results=[], errorMessage=f'Could not load page : {str(e)}')
+
+        if(getImagesResult.errorMessage is not None):
+            ErrorMessage(getImagesResult.errorMessage).exec()
+        show(getImagesResult)
+
+        if self.refreshAfterLoad:
+            self.refreshAfterLoad = False
+            self.refresh_page()
+
+
+    def count_pages(self, imageCount: int) -> int:
+        return max(1, math.ceil(imageCount / PAGE_SIZE))
+
+
+    def change_page_nums(self, imageCount: int = None):
+        """
+        Shows the page links with the given image count. Without one the links are shown with the last known count right
+        away and shown again once the repo was counted in the background.
+        """
+        if imageCount is not None:
+            self.imageCount = imageCount
+        elif self.searchQuery is None:
+            self.countRequest += 1
+            requestId = self.countRequest
+            self.repoManager.count_images_async().add_done_callback(lambda future: self.imagesCountedSignal.emit(requestId, future))
+        self.show_page_nums()
+
+
+    def images_counted(self, requestId: int, countFuture: Future):
+        if requestId != self.countRequest:
+            return
+        try:
+            self.imageCount = countFuture.result()
+        except BaseException as e:
+            logging.error(f'Could not count images : {traceback.format_exc()}')
+            return
+        # Images may of been deleted from under the current page
+        self.currentPageNum = min(self.currentPageNum, self.count_pages(self.imageCount))
+        self.show_page_nums()
+
+
+    def show_page_nums(self):
+        if self.searchQuery is not None:
+            # How many pages a search has isn't known up front so only the page being shown is listed
+            clear_layout(self.page_num_layout)
+            self.current_page = PageLink(str(self.currentPageNum), parent=self)
+            self.current_page.setStyleSheet("font-weight: bold;")
+            self.page_num_layout.addWidget(self.current_page)
+            self.first_page_button.setDisabled(self.currentPageNum == 1)
+            self.last_page_button.setDisabled(True)
+            return
+
+        # Links to the first and last pages and to the pages around the current one, with gaps between them marked.
+        # The count can be behind the page being shown until the repo was counted again.
+        countKnown = self.imageCount is not None
+        lastPageNum = max(self.count_pages(self.imageCount), self.currentPageNum) if countKnown else self.currentPageNum
+        pageNums = sorted(set(
+            [1, lastPageNum] + list(range(max(1, self.currentPageNum - PAGE_LINK_WINDOW), min(lastPageNum, self.currentPageNum + PAGE_LINK_WINDOW) + 1))
+        ))
 
         clear_layout(self.page_num_layout)
-        self.page_num_layout.addWidget(self.current_page)
-
+        previousPageNum = 0
+        for pageNum in pageNums:
+            if pageNum > previousPageNum + 1:
+                self.page_num_layout.addWidget(QLabel("..."))
+            pageLink = PageLink(str(pageNum), parent=self)
+            if pageNum == self.currentPageNum:
+                pageLink.setStyleSheet("font-weight: bold;")
+                self.current_page = pageLink
+            else:
+                pageLink.clicked.connect(lambda text : self.jump_to_page(int(text)))
+            self.page_num_layout.addWidget(pageLink)
+            previousPageNum = pageNum
+
+        self.first_page_button.setDisabled(self.currentPageNum == 1)
+        self.last_page_button.setDisabled(not countKnown or self.currentPageNum == lastPageNum)
+
+
+    def jump_to_page(self, pageNum: int):
+        self.jumpRequest += 1
+        # The first page needs no token and searches can only start over
+        if pageNum <= 1 or self.searchQuery is not None:
+            self.show_page(None, 1)
+            return
+        # The repo manager finds the token of any page directly so this costs the same for every page
+        requestId = self.jumpRequest
+        self.repoManager.get_page_token_async(pageNum, PAGE_SIZE).add_done_callback(lambda future: self.pageTokenFoundSignal.emit(requestId, pageNum, future))
+
+
+    def page_token_found(self, requestId: int, pageNum: int, tokenFuture: Future):
+        # Dropped if the user went to another page since
+        if requestId != self.jumpRequest:
+            return
+        try:
+            token = tokenFuture.result()
+        except BaseException as e:
+            logging.error(f'Could not find page {pageNum} : {traceback.format_exc()}')
+            ErrorMessage(f'Could not find page {pageNum} : {str(e)}').exec()
+            return
+        self.show_page(token, pageNum)
+
+
+    def show_page(self, token: NextToken, pageNum: int):
+        def show(getImagesResult: GetImagePrompsResult):
+            self.gallery.replace_display(getImagesResult.results)
+            self.set_left_bookmark(token)
+            self.set_right_bookmark(getImagesResult.nextToken)
+            self.currentPageNum = max(1, pageNum)
+            self.change_page_nums()
+            self.prefetch_adjacent_pages()
 
-    def change_page(self, currentNextToken = None, direction: DIRECTION = DIRECTION.FORWARD):
-        getImagesResult = self.repoManager.get_images(PAGE_SIZE, token=currentNextToken, direction=direction)
+        self.load_page(token, DIRECTION.FORWARD, show)
 
-        if(getImagesResult is not None):
-            if(getImagesResult.errorMessage is not None):
-                ErrorMessage(getImagesResult.errorMessage).exec()
 
+    def change_page(self, currentNextToken = None, direction: DIRECTION = DIRECTION.FORWARD):
+        self.jumpRequest += 1
+        def show(getImagesResult: GetImagePrompsResult):
             self.gallery.replace_display(getImagesResult.results)
             # Set the new "edge" token based on the direciton we are going
             if(direction is DIRECTION.FORWARD):
@@ -159,9 +379,49 @@ class GalleryPage(QWidget):
                 self.set_left_bookmark(getImagesResult.nextToken)
 
             # Update page num
-            self.change_page_nums(direction)
+            self.currentPageNum = self.currentPageNum + 1 if direction is DIRECTION.FORWARD else self.currentPageNum - 1
+            if self.leftBookmarkPageToken is None:
+                self.currentPageNum = 1
+            self.change_page_nums()
+            self.prefetch_adjacent_pages()
+
+        self.load_page(currentNextToken, direction, show)
 
 
     def refresh_page(self):
         logging.info("refresh_page")
-        self.change_page(currentNextToken = self.leftBookmarkPageToken)
\ No newline at end of file
+        if not self.loaded:
+            return
+        if self.shownPageRequest != self.pageRequest:
+            # The bookmarks of the page being read aren't known yet
+            self.refreshAfterLoad = True
+            return
+        def show(getImagesResult: GetImagePrompsResult):
+            self.gallery.replace_display(getImagesResult.results)
+            self.set_right_bookmark(getImagesResult.nextToken)
+            self.change_page_nums()
+            self.prefetch_adjacent_pages()
+
+        # Going forward from the left bookmark always lands on the current page, whichever way it was reached
+        self.load_page(self.leftBookmarkPageToken, DIRECTION.FORWARD, show)
+
+
+    def prefetch_adjacent_pages(self):
+        # Same arguments the page buttons use so their clicks are served from the page cache
+        self.repoManager.cancel_prefetches()
+        self.prefetches = []
+        if self.searchQuery is not None:
+            return
+        if self.rightBookmarkPageToken is not None:
+            self.prefetches.append(self.repoManager.prefetch_images(PAGE_SIZE, token=self.rightBookmarkPageToken, direction=DIRECTION.FORWARD, includeThumbnails=True))
+        if self.leftBookmarkPageToken is not None:
+            self.prefetches.append(self.repoManager.prefetch_images(PAGE_SIZE, token=self.leftBookmarkPageToken, direction=DIRECTION.BACKWARD, includeThumbnails=True))
+
+
+    def repo_changed(self, directories: List[ImagePromptDirectory]):
+        if not self.loaded:
+            return
+        # The page spans from its last entry (the right bookmark) up to the left bookmark, both unbounded when missing
+        lower, upper = directory_key(self.rightBookmarkPageToken), directory_key(self.leftBookmarkPageToken)
+        if any(is_within_bounds(directory_key(directory), lower, upper) for directory in directories):
+            self.refresh_page()
\ No newline at end of file
@@ -1,12 +1,14 @@
 import logging
+import traceback
+from concurrent.futures import Future
 from PyQt5.QtWidgets import QSplitter
-from PyQt5.QtCore import pyqtSignal, QRunnable, QThreadPool
+from PyQt5.QtCore import pyqtSignal
 
-from imageProviders.ImageProvider import ImageProvider, ImageProviderResult
+from imageProviders.ImageProvider import ImageProviderResult
 from repoManager.Models import DeleteImagePrompsRequest
 from repoManager.RepoManager import RepoManager, ImagePrompResult
+from ui.GenerationQueue import GenerationQueue
 from ui.dialogs.ErrorMessage import ErrorMessage
-from ui.dialogs.LoadingPopup import LoadingPopup
 
 from ui.widgets.home.ImageGenerator import ImageGenerator
 from ui.widgets.home.ImageMeta import ImageMeta, ImageMetaInfo
@@ -14,65 +16,68 @@ from ui.widgets.home.ImageViewer import ImageViewer
 from speechRecognition.SpeechRegonizer import SpeechRecognizer
 
 
-class ProcessRunnable(QRunnable):
-    def __init__(self, target, args):
-        QRunnable.__init__(self)
-        self.t = target
-        self.args = args
-
-    def run(self):
-        self.t(*self.args)
-
-    def start(self):
-        QThreadPool.globalInstance().start(self)
-
-
-def background_create_image_process(imageProvider: ImageProvider, prompt: str, loadSignal: pyqtSignal(str, object)):
-    if(prompt is not None):
-        response = imageProvider.get_image_from_string(prompt)
-
-        loadSignal.emit(prompt, response)
-    else:
-        logging.warning("Prompt not provided!")
-
-
 class HomePage(QSplitter):
     createImageSignal = pyqtSignal(str)
-    loadNewImageSignal = pyqtSignal(str, dict)
     loadImageSignal = pyqtSignal(ImageMetaInfo, bytes)
     successfulSavedImageSignal = pyqtSignal()
     trashImageSignal = pyqtSignal()
     successfulTrashImageSignal = pyqtSignal()
+    replacePreviewSignal = pyqtSignal()
+    latestImageLoadedSignal = pyqtSignal(object)
 
     """
     QT Widget to generate and display AI images off of a prompt.
-    Will load up the last generated image in PAIID.
+    Will load up the last generated image in PAIID, from the repo's startup snapshot when there is one.
+
+    Prompts are handed to a GenerationQueue so guests can keep submitting while earlier prompts are still being generated.
+    Every generated image is shown as it arrives.
 
     Attributes
     ----------
+    replacePreviewSignal
+        signal, if emited, will replace the preview shown from the startup snapshot with the latest image of the repo
+
+    latestImageLoadedSignal
+        signal emited with the Future of the latest image once it was read in the background
 
     Methods
     ----------
-
+    replace_preview()
+        Reads the full resolution latest image of the repo in the background, shown if the preview from the startup
+        snapshot is still shown by then
     """
 
-    def __init__(self, repoManager: RepoManager, imageProvider : ImageProvider, speechRecognizer : SpeechRecognizer):
+    def __init__(self, repoManager: RepoManager, generationQueue : GenerationQueue, speechRecognizer : SpeechRecognizer):
         super().__init__()
 
         self.repoManager = repoManager
-        self.imageProvider = imageProvider
-
-        self.threadpool = QThreadPool()
-        # Pre-load common popups so there isn't a delay when they show up
-        self.loadingScreen = LoadingPopup()
+        self.generationQueue = generationQueue
 
         self.createImageSignal.connect(self.create_image_action)
-        self.loadNewImageSignal.connect(self.load_new_image_response)
         self.loadImageSignal.connect(self.load_image_response)
         self.trashImageSignal.connect(self.trash_image)
-
-        loadResult = self.repoManager.get_latest_images_in_repo()
-        self.init_ui(loadResult, speechRecognizer)
+        self.replacePreviewSignal.connect(self.replace_preview)
+        self.latestImageLoadedSignal.connect(self.latest_image_loaded)
+        self.generationQueue.generatedSignal.connect(self.load_new_image_response)
+        self.generationQueue.savedSignal.connect(self.save_image_response)
+
+        # Id of the job whose image is shown while it's still being saved, None once saved or another image is shown
+        self.shownSave = None
+        self.shownCacheHit = False
+        # Whether the latest image is being read in the background, a replace asked for meanwhile is served by that read
+        self.readingLatest = False
+
+        # The snapshot already holds a preview of the latest image so startup doesn't have to read the repo.
+        # Without one the page starts out empty and the latest image is read in the background.
+        snapshot = self.repoManager.get_startup_snapshot()
+        self.showingPreview = True
+        self.init_ui(snapshot.latest if snapshot is not None else None, speechRecognizer)
+        self.generationQueue.queueChangedSignal.connect(self.imageGenerator.show_queue_status)
+        if snapshot is None:
+            self.replace_preview()
+
+        # Slow provider setup (imports, clients) happens off the UI thread while the first frame is drawn
+        self.generationQueue.warm_up()
 
 
     def init_ui(self, lastImageResult: ImagePrompResult, speechRecognizer : SpeechRecognizer):
@@ -93,37 +98,84 @@ class HomePage(QSplitter):
         self.setSizes([200, 800, 0])
 
 
-    def load_new_image_response(self, prompt: str, response: ImageProviderResult):        
+    def load_new_image_response(self, jobId: int, prompt: str, response: ImageProviderResult):
         if response['errorMessage'] != None:
             logging.info("error message  : " + response['errorMessage'])
-            # Remove loading Screen so it doesn't overlap the error message
-            self.loadingScreen.stop()
             ErrorMessage(response['errorMessage']).exec()
+        elif response.get('savedImage') is not None:
+            # Served from the cache, the image is already in the repo so it's shown as that entry
+            savedImage = response['savedImage']
+            self.load_image_response(
+                ImageMetaInfo(prompt=savedImage.prompt, date=savedImage.date, time=savedImage.time, engine=savedImage.repo, num=str(savedImage.num), cached=True),
+                response['img']
+            )
         else:
-            saveResult = self.repoManager.save_image(prompt, response['img'])
-            self.successfulSavedImageSignal.emit()
-
-            self.imageViewer.replace_image(saveResult.images[0])
+            # Show the image straight from memory, the queue saves it in the background and reports back through savedSignal
+            self.shownSave = jobId
+            self.shownCacheHit = response.get('cacheHit', False)
+            self.showingPreview = False
+            self.imageViewer.replace_image(response['img'])
+
+
+    def save_image_response(self, saveId: int, saveFuture: Future):
+        try:
+            saveResult = saveFuture.result()
+        except BaseException as e:
+            logging.error(f'Could not save image : {traceback.format_exc()}')
+            if self.shownSave == saveId:
+                self.shownSave = None
+            ErrorMessage(f'Could not save image : {str(e)}').exec()
+            return
+
+        self.successfulSavedImageSignal.emit()
+
+        # Only describe the image if it's still the one being shown
+        if self.shownSave == saveId:
+            self.shownSave = None
             self.imageMetaInfo = ImageMetaInfo(
-                prompt= prompt,
+                prompt= saveResult.prompt,
                 date= saveResult.date,
                 time= saveResult.time,
                 engine= saveResult.repo,
-                num=str(saveResult.num)
+                num=str(saveResult.num),
+                cached=self.shownCacheHit
             )
             self.imageMeta.loadMetaSignal.emit(self.imageMetaInfo)
 
-        self.loadingScreen.stop()
-        self.imageGenerator.toggle_disabled_prompting(False)
+
+    def replace_preview(self):
+        # Never replace an image the user picked or generated since startup
+        if not self.showingPreview or self.readingLatest:
+            return
+        self.readingLatest = True
+        self.repoManager.get_latest_images_in_repo_async().add_done_callback(self.latestImageLoadedSignal.emit)
+
+
+    def latest_image_loaded(self, loadFuture: Future):
+        self.readingLatest = False
+        # The user may of picked or generated an image while the latest one was read
+        if not self.showingPreview:
+            return
+        loadResult = loadFuture.result()
+        self.load_image_response(
+            ImageMetaInfo(prompt=loadResult.prompt, date=loadResult.date, time=loadResult.time, engine=loadResult.repo, num=loadResult.num) if loadResult is not None else None,
+            loadResult.images[0] if loadResult is not None and len(loadResult.images) > 0 else None
+        )
 
 
     def load_image_response(self, metaInfo: ImageMetaInfo, image):
+        self.shownSave = None
+        self.showingPreview = False
         self.imageMetaInfo = metaInfo
         self.imageViewer.replace_image(image)
         self.imageMeta.loadMetaSignal.emit(metaInfo)
 
 
     def trash_image(self):
+        if self.shownSave is not None:
+            logging.info("Image is still being saved, not deleting")
+            return
+
         result = self.repoManager.delete_image(DeleteImagePrompsRequest(
                 prompt=self.imageMetaInfo.prompt,
                 repo=self.imageMetaInfo.engine,
@@ -141,7 +193,7 @@ class HomePage(QSplitter):
 
 
     def create_image_action(self, prompt: str):
-        self.loadingScreen.showWithAnimation()
-
-        imageGenerationProcess = ProcessRunnable(target=background_create_image_process, args=(self.imageProvider, prompt, self.loadNewImageSignal))
-        self.threadpool.start(imageGenerationProcess)
\ No newline at end of file
+        if prompt is None or prompt == "":
+            logging.warning("Prompt not provided!")
+            return
+        self.generationQueue.submit(prompt)
\ No newline at end of file
@@ -1,5 +1,5 @@
 import logging
-from PyQt5.QtWidgets import QPushButton, QVBoxLayout, QHBoxLayout, QVBoxLayout, QTextEdit, QWidget, QGroupBox
+from PyQt5.QtWidgets import QPushButton, QVBoxLayout, QHBoxLayout, QVBoxLayout, QTextEdit, QWidget, QGroupBox, QLabel
 from PyQt5.QtCore import pyqtSignal
 
 from speechRecognition.SpeechRegonizer import SpeechRecognizer
@@ -10,12 +10,15 @@ class ImageGenerator(QWidget):
     """
     QT Widget to allow users to make the prompt used to generate images.
 
+    Prompting stays enabled while images are generated so more prompts can be queued up.
+
     Attributes
     ----------
 
     Methods
     ----------
-
+    show_queue_status(pending, running)
+        Shows how many prompts are being generated and how many are waiting, hidden when there are none
     """
     def __init__(self, createImageSignal: pyqtSignal, speechRecognizer: SpeechRecognizer):
         super().__init__()
@@ -34,6 +37,10 @@ class ImageGenerator(QWidget):
         imageGenerationLayout.addWidget(self.createPromptCreator())
         imageGenerationLayout.addLayout(self.createImageButtons())
 
+        self.queueStatus = QLabel(self)
+        self.queueStatus.hide()
+        imageGenerationLayout.addWidget(self.queueStatus)
+
         self.setLayout(imageGenerationLayout)
         self.prompt_text_changed_action() # disable actions for empty text
 
@@ -88,9 +95,15 @@ class ImageGenerator(QWidget):
         self.recordVoiceButton.setDisabled(flag)
 
 
+    def show_queue_status(self, pending: int, running: int):
+        if pending + running == 0:
+            self.queueStatus.hide()
+            return
+        self.queueStatus.setText(f'Generating {running} image{"s" if running != 1 else ""}, {pending} waiting')
+        self.queueStatus.show()
+
+
     def create_image_action(self):
-        self.toggle_disabled_prompting(True)
-        # self.loadingScreen.showWithAnimation()
         prompt = self.promptbox.toPlainText()
         self.createImageSignal.emit(prompt)
 
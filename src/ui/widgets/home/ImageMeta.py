@@ -8,12 +8,14 @@ from utils.qtUtils import clear_layout
 
 
 class ImageMetaInfo(object):
-    def __init__(self, prompt: str, engine: str, date: str, time: str, num: str):
+    def __init__(self, prompt: str, engine: str, date: str, time: str, num: str, cached: bool = False):
         self.prompt = prompt
         self.engine = engine
         self.date = date
         self.time = time
         self.num = num
+        # Whether the image was served from the prompt cache rather then generated
+        self.cached = cached
 
 
 DefaultImageMeta = ImageMetaInfo(prompt= '', date= '', time= '', engine= '', num= None)
@@ -74,6 +76,10 @@ class ImageMeta(QWidget):
             metaDetailLayout.addRow(QLabel("Time: "), QLabel(metaInfo.time))
             metaDetailLayout.addRow(QLabel("Engine: "), QLabel(metaInfo.engine))
             metaDetailLayout.addRow(QLabel("Num: "), QLabel(metaInfo.num))
+            if metaInfo.cached:
+                cachedLabel = QLabel("From cache, same prompt as before")
+                cachedLabel.setStyleSheet("color: green; font-weight: bold")
+                metaDetailLayout.addRow(QLabel("Source: "), cachedLabel)
 
             metaLayout.addLayout(metaDetailLayout)
 
@@ -0,0 +1,113 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable
+
+
+class LRUCache(object):
+    """
+    Thread safe least recently used cache bounded by the total size (in bytes) of its values rather then by the number of entries.
+
+    How big a value is gets decided by the provided sizeOf function. Values bigger then the whole budget are never cached.
+    Hits, misses and evictions are counted so the budget can be tuned for the device.
+
+    Attributes
+    ----------
+    maxBytes (int)
+        the byte budget of all cached values combined
+
+    Methods
+    -------
+    get(key, default)
+        Gets a value and marks it as most recently used. Counts as a hit or a miss.
+
+    put(key, value)
+        Adds or replaces a value, evicting the least recently used values until it fits the budget
+
+    remove(key)
+        Removes a single value if its cached
+
+    remove_where(predicate)
+        Removes every value the predicate (called with key and value) returns true for
+
+    clear()
+        Removes every value
+
+    stats()
+        Gets the counters and current usage of the cache
+    """
+
+    def __init__(self, maxBytes: int, sizeOf: Callable[[object], int]):
+        self.maxBytes = maxBytes
+        self.sizeOf = sizeOf
+        self.lock = threading.Lock()
+        self.entries: OrderedDict = OrderedDict()
+        self.currentBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    def get(self, key: Hashable, default=None):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self.lock:
+            return key in self.entries
+
+
+    def put(self, key: Hashable, value):
+        size = self.sizeOf(value)
+        with self.lock:
+            self._remove(key)
+            if size > self.maxBytes:
+                return
+            while self.currentBytes + size > self.maxBytes:
+                _, (_, evictedSize) = self.entries.popitem(last=False)
+                self.currentBytes -= evictedSize
+                self.evictions += 1
+            self.entries[key] = (value, size)
+            self.currentBytes += size
+
+
+    def _remove(self, key: Hashable):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.currentBytes -= entry[1]
+
+
+    def remove(self, key: Hashable):
+        with self.lock:
+            self._remove(key)
+
+
+    def remove_where(self, predicate: Callable[[Hashable, object], bool]) -> int:
+        with self.lock:
+            keys = [key for key, (value, _) in self.entries.items() if predicate(key, value)]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.currentBytes = 0
+
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.currentBytes,
+                'maxBytes': self.maxBytes,
+            }
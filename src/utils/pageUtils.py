@@ -1,6 +1,6 @@
 from PyQt5.QtWidgets import QWidget
 
-from typing import TypedDict
+from typing import Callable, TypedDict, Union
 from enum import Enum
 
 
@@ -27,28 +27,35 @@ PageDictType = TypedDict("PageDictType", {
 
 class PageMetaDecorator():
     """
-    QT Widget to display a singular and move a singular image.
-    
-    Images can be moved via:
-    1. Panning the image when click/touch drag movements
-    2. Zomming in/out of the image with a pinch (touch) gesture anywhere in the viewer
+    Describes a page of the MainWindow: its name, the caption and hint of its toolbar button and how to build its widget.
+
+    The widget isn't built until get_widget is first called so pages that are never visited cost nothing at startup.
 
     Attributes
     ----------
+    pageName (PageName)
+        name the page is routed to by
+
+    widget (QWidget)
+        widget of the page, None until it was built
 
     Methods
     ----------
-    replace_image(imagePath)
-        Replaces the current image with a new one from the given path. The new image will "fit" into the views current frame when fully loaded.
-
-    has_photo()
-        Returns if the current view has any image loaded to it currently
+    get_widget()
+        Gets the widget of the page, building it the first time its called
     """
 
-    def __init__(self, widget: QWidget, pageName: PageName, pageCaption: PageCaption, hint: PageHint):
+    def __init__(self, createWidget: Callable[[], QWidget], pageName: PageName, pageCaption: PageCaption, hint: PageHint):
         super().__init__()
 
-        self.widget = widget
+        self.createWidget = createWidget
+        self.widget: Union[QWidget, None] = None
         self.pageName = pageName
         self.pageCaption = pageCaption
         self.hint = hint
+
+
+    def get_widget(self) -> QWidget:
+        if self.widget is None:
+            self.widget = self.createWidget()
+        return self.widget
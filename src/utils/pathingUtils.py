@@ -1,10 +1,16 @@
 from pathlib import Path
 import os
-from typing import List
+from typing import List, Union
 
 
 RESOURCES_FOLDER = 'resources'
 
+# Files being written are hidden under this prefix until they are complete
+TEMPORARY_FILE_PREFIX = '.'
+
+# Folder within the repos path holding the repo index and everything else derived from the repos
+INDEX_FOLDER = '.index'
+
 
 def get_project_root() -> Path:
     """
@@ -56,6 +62,76 @@ def read_file_as_bytes(file_path: Path) -> bytes:
     return file_bytes
 
 
+def is_temporary_file(name: str) -> bool:
+    """
+    Whether a file name belongs to a file that is still being written (or was abandoned mid write by a power loss).
+    """
+    return name.startswith(TEMPORARY_FILE_PREFIX)
+
+
+def atomic_write_bytes(path: Path, data: bytes):
+    """
+    Writes bytes to a file so that the file is either fully written or not there at all, even if power is lost mid write.
+
+    The bytes are written to a hidden temporary file next to the destination, flushed to disk and then renamed over
+    the destination. The directory itself is synced afterwards so the rename survives a power loss too.
+
+    Parameters
+    ----------
+    path: (Path):
+        Where the file should end up. Its directory must already exist.
+
+    data: (bytes):
+        The contents of the file
+    """
+    path = Path(path)
+    temporaryPath = path.with_name(f'{TEMPORARY_FILE_PREFIX}{path.name}.tmp')
+    try:
+        with open(temporaryPath, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporaryPath, path)
+    except BaseException:
+        try:
+            os.remove(temporaryPath)
+        except OSError:
+            pass
+        raise
+
+    sync_directory(path.parent)
+
+
+def sync_directory(path: Path):
+    """
+    Flushes the entries of a directory (like a file just renamed into it) to disk. Does nothing where that isn't supported.
+    """
+    try:
+        directoryFd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(directoryFd)
+        finally:
+            os.close(directoryFd)
+    except OSError:
+        # Not every platform (or file system) allows syncing a directory
+        pass
+
+
+def remove_directory_if_empty(path: Path) -> bool:
+    """
+    Removes a directory if it holds nothing. Stops at the first entry instead of listing the whole directory.
+    Returns whether the directory was removed, a directory that doesn't exist is left alone.
+    """
+    try:
+        with os.scandir(path) as entries:
+            if next(entries, None) is not None:
+                return False
+        os.rmdir(path)
+        return True
+    except (FileNotFoundError, NotADirectoryError):
+        return False
+
+
 def get_sorted_directory_by_name(path: Path, reverse: bool) -> List[str]:
     """
     Gets all directories and files from the file system from the proivded directory path in sorted order.
@@ -88,3 +164,19 @@ def get_reverse_sorted_directory_by_name(directory: Path) -> List[str]:
     Same as get_sorted_directory_by_name but in reverse order.
     """
     return get_sorted_directory_by_name(directory, reverse=True)
+
+
+def get_directory_signature(path: Path) -> Union[str, None]:
+    """
+    Gets a cheap signature of a directory that changes whenever entries are added or removed from it.
+
+    The modification time alone is not enough on file systems with coarse time stamps (like FAT on SD cards) so the
+    link count is also included, which changes on most file systems when sub directories are added or removed.
+
+    Returns None if the directory does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return f'{stat.st_mtime_ns}:{stat.st_nlink}'
@@ -0,0 +1,355 @@
+import io
+import json
+import threading
+from pathlib import Path
+from typing import List
+
+import pytest
+from PIL import Image
+
+from imageProviders.CachingProvider import PROMPT_CACHE_INDEX_FILE_NAME, CachingProvider, prompt_cache_path
+from imageProviders.ImageProvider import ImageProvider, ImageProviderResult
+from repoManager.Models import DeleteImagePrompsRequest
+from repoManager.RepoManager import RepoManager
+
+
+class CountingProvider(ImageProvider):
+    """
+    Makes a distinct image for every call so tests can tell generated images from cached ones
+    """
+    def __init__(self):
+        super().__init__()
+        self.prompts: List[str] = []
+        self.parameters = {"size": "1024x1024"}
+
+    def engine_name(self) -> str:
+        return "counting"
+
+    def generation_parameters(self) -> dict:
+        return self.parameters
+
+    def get_image_from_string(self, prompt, timeout: float = None) -> ImageProviderResult:
+        self.prompts.append(prompt)
+        imageBytes = io.BytesIO()
+        Image.new("RGB", (4, 4), (len(self.prompts), 0, 0)).save(imageBytes, format="PNG")
+        return { 'img': imageBytes.getvalue(), 'errorMessage': None }
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def clock(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def repoManager(tmp_path: Path):
+    repoManager = RepoManager(tmp_path, "testRepo")
+    yield repoManager
+    repoManager.close()
+
+
+def generate(cachingProvider: CachingProvider, repoManager: RepoManager, prompt: str) -> ImageProviderResult:
+    """
+    Gets the image of a prompt and saves it the way the GenerationQueue does
+    """
+    result = cachingProvider.get_image_from_string(prompt)
+    if result['errorMessage'] is None and result.get('savedImage') is None:
+        cachingProvider.image_saved(prompt, repoManager.save_image(prompt, result['img']))
+    return result
+
+
+def test_repeat_prompt_served_from_repo(repoManager: RepoManager):
+    """
+    Given a prompt that was generated and saved before
+    When the same prompt is asked for again with different case and spacing
+    Then the saved image is read back from the repo without calling the provider and marked as a cache hit
+    """
+    # Arrange
+    provider = CountingProvider()
+    cachingProvider = CachingProvider(provider, repoManager, prompt_cache_path(repoManager.reposPath))
+    first = generate(cachingProvider, repoManager, "A cat  eating chips.")
+
+    # Act
+    second = generate(cachingProvider, repoManager, "a cat eating chips")
+
+    # Assert
+    assert provider.prompts == ["A cat  eating chips."]
+    assert second['img'] == first['img']
+    assert second['cacheHit'] is True
+    assert second['savedImage'].prompt == "A cat  eating chips."
+    assert 'cacheHit' not in first
+    assert repoManager.count_images() == 1
+    # Only the index is kept next to the repo, never a copy of the image
+    assert [path.name for path in prompt_cache_path(repoManager.reposPath).iterdir()] == [PROMPT_CACHE_INDEX_FILE_NAME]
+
+
+def test_cache_survives_restart_and_respects_parameters(repoManager: RepoManager):
+    """
+    Given a cached prompt
+    When a new caching provider is made over the same directory
+    Then the prompt is still served from the repo unless the generation parameters changed
+    """
+    # Arrange
+    provider = CountingProvider()
+    cachePath = prompt_cache_path(repoManager.reposPath)
+    generate(CachingProvider(provider, repoManager, cachePath), repoManager, "prompt")
+
+    # Act
+    afterRestart = generate(CachingProvider(provider, repoManager, cachePath), repoManager, "prompt")
+    provider.parameters = {"size": "512x512"}
+    otherParameters = generate(CachingProvider(provider, repoManager, cachePath), repoManager, "prompt")
+
+    # Assert
+    assert afterRestart.get('cacheHit') is True
+    assert otherParameters.get('cacheHit') is None
+    assert len(provider.prompts) == 2
+
+
+def test_trashed_image_no_longer_served(repoManager: RepoManager):
+    """
+    Given a cached prompt
+    When its image is deleted from the repo
+    Then the prompt is generated again
+    """
+    # Arrange
+    provider = CountingProvider()
+    cachingProvider = CachingProvider(provider, repoManager, prompt_cache_path(repoManager.reposPath))
+    saved = generate(cachingProvider, repoManager, "prompt")
+    savedImage = generate(cachingProvider, repoManager, "prompt")['savedImage']
+    repoManager.delete_image(DeleteImagePrompsRequest(prompt=savedImage.prompt, repo=savedImage.repo, date=savedImage.date, time=savedImage.time, nums=["1"]))
+
+    # Act
+    again = generate(cachingProvider, repoManager, "prompt")
+
+    # Assert
+    assert again.get('cacheHit') is None
+    assert provider.prompts == ["prompt", "prompt"]
+    assert again['img'] != saved['img']
+
+
+def test_entries_expire_and_least_recently_used_evicted(repoManager: RepoManager):
+    """
+    Given a cache with room for two entries that expire after an hour
+    When a third image is cached and later an hour passes
+    Then the least recently used entry is dropped first and every entry is dropped once expired
+    """
+    # Arrange
+    provider = CountingProvider()
+    fakeClock = FakeClock()
+    cachingProvider = CachingProvider(provider, repoManager, prompt_cache_path(repoManager.reposPath), maxAgeSeconds=3600, maxEntries=2, clock=fakeClock.clock)
+    generate(cachingProvider, repoManager, "first")
+    fakeClock.now += 1
+    generate(cachingProvider, repoManager, "second")
+    fakeClock.now += 1
+    generate(cachingProvider, repoManager, "first")
+
+    # Act
+    fakeClock.now += 1
+    generate(cachingProvider, repoManager, "third")
+    cachedAfterEviction = {prompt: cachingProvider.get_image_from_string(prompt).get('cacheHit', False) for prompt in ["first", "third"]}
+    fakeClock.now += 3601
+    expired = generate(cachingProvider, repoManager, "first")
+
+    # Assert
+    assert cachedAfterEviction == {"first": True, "third": True}
+    assert provider.prompts == ["first", "second", "third", "first"]
+    assert expired.get('cacheHit') is None
+    assert len(cachingProvider.entries) == 1
+
+
+def test_hits_only_write_last_used_on_close(repoManager: RepoManager):
+    """
+    Given a cached prompt
+    When it's served from the repo and the provider is closed
+    Then the index is only written on close and keeps when the prompt was last used
+    """
+    # Arrange
+    provider = CountingProvider()
+    fakeClock = FakeClock()
+    cachingProvider = CachingProvider(provider, repoManager, prompt_cache_path(repoManager.reposPath), clock=fakeClock.clock)
+    generate(cachingProvider, repoManager, "prompt")
+    indexPath = prompt_cache_path(repoManager.reposPath)/PROMPT_CACHE_INDEX_FILE_NAME
+    indexAfterSave = indexPath.read_bytes()
+
+    # Act
+    fakeClock.now += 10
+    hit = generate(cachingProvider, repoManager, "prompt")
+    indexAfterHit = indexPath.read_bytes()
+    cachingProvider.close()
+
+    # Assert
+    assert hit.get('cacheHit') is True
+    assert indexAfterHit == indexAfterSave
+    assert [entry["lastUsed"] for entry in json.loads(indexPath.read_bytes()).values()] == [fakeClock.now]
+
+
+def test_same_prompt_in_flight_generated_once(repoManager: RepoManager):
+    """
+    Given a prompt being generated
+    When the same prompt is asked for again before it's done
+    Then the second call waits for the first image to be saved instead of calling the provider again and is served that entry
+    """
+    # Arrange
+    release = threading.Event()
+    started = threading.Event()
+    class BlockingProvider(CountingProvider):
+        def get_image_from_string(self, prompt, timeout: float = None) -> ImageProviderResult:
+            started.set()
+            release.wait(10)
+            return super().get_image_from_string(prompt, timeout)
+    provider = BlockingProvider()
+    cachingProvider = CachingProvider(provider, repoManager, prompt_cache_path(repoManager.reposPath))
+    results = {}
+    first = threading.Thread(target=lambda: results.update(first=generate(cachingProvider, repoManager, "prompt")))
+    first.start()
+    started.wait(10)
+    waiting = threading.Event()
+    waitFor = cachingProvider._wait_for
+    def wait_for(*args, **kwargs):
+        waiting.set()
+        return waitFor(*args, **kwargs)
+    cachingProvider._wait_for = wait_for
+
+    # Act
+    second = threading.Thread(target=lambda: results.update(second=generate(cachingProvider, repoManager, "Prompt.")))
+    second.start()
+    assert waiting.wait(10), "second call joins the one in flight"
+    release.set()
+    first.join(10)
+    second.join(10)
+
+    # Assert
+    assert provider.prompts == ["prompt"]
+    assert results["second"]['img'] == results["first"]['img']
+    assert results["second"]['cacheHit'] is True
+    savedImages = repoManager.get_images(10).results
+    assert len(savedImages) == 1
+    assert (results["second"]['savedImage'].date, results["second"]['savedImage'].time) == (savedImages[0].date, savedImages[0].time)
+    assert cachingProvider.inFlight == {}
+    assert cachingProvider.pendingSaves == {}
+
+
+def test_joined_call_handed_on_when_image_not_saved(repoManager: RepoManager):
+    """
+    Given a prompt being generated whose image is never saved
+    When the same prompt is asked for again before it's done
+    Then the second call gets the image as a new one once it's done waiting for the save
+    """
+    # Arrange
+    release = threading.Event()
+    started = threading.Event()
+    class BlockingProvider(CountingProvider):
+        def get_image_from_string(self, prompt, timeout: float = None) -> ImageProviderResult:
+            started.set()
+            release.wait(10)
+            return super().get_image_from_string(prompt, timeout)
+    provider = BlockingProvider()
+    cachingProvider = CachingProvider(provider, repoManager, prompt_cache_path(repoManager.reposPath), saveWaitSeconds=0.1)
+    results = {}
+    first = threading.Thread(target=lambda: results.update(first=cachingProvider.get_image_from_string("prompt")))
+    first.start()
+    started.wait(10)
+    waiting = threading.Event()
+    waitFor = cachingProvider._wait_for
+    def wait_for(*args, **kwargs):
+        waiting.set()
+        return waitFor(*args, **kwargs)
+    cachingProvider._wait_for = wait_for
+
+    # Act
+    second = threading.Thread(target=lambda: results.update(second=cachingProvider.get_image_from_string("prompt")))
+    second.start()
+    assert waiting.wait(10), "second call joins the one in flight"
+    release.set()
+    first.join(10)
+    second.join(10)
+
+    # Assert
+    assert provider.prompts == ["prompt"]
+    assert results["second"] == { 'img': results["first"]['img'], 'errorMessage': None }
+    assert cachingProvider.pendingSaves == {}
+
+
+def test_joined_call_handed_on_right_away_when_save_fails(repoManager: RepoManager):
+    """
+    Given a prompt being generated whose image fails to save
+    When the same prompt is asked for again before it's done
+    Then the second call gets the image as a new one as soon as the save failed instead of waiting for it
+    """
+    # Arrange
+    release = threading.Event()
+    started = threading.Event()
+    class BlockingProvider(CountingProvider):
+        def get_image_from_string(self, prompt, timeout: float = None) -> ImageProviderResult:
+            started.set()
+            release.wait(10)
+            return super().get_image_from_string(prompt, timeout)
+    provider = BlockingProvider()
+    cachingProvider = CachingProvider(provider, repoManager, prompt_cache_path(repoManager.reposPath), saveWaitSeconds=30)
+    results = {}
+    def generate_and_fail_to_save():
+        results["first"] = cachingProvider.get_image_from_string("prompt")
+        cachingProvider.image_save_failed("prompt")
+    first = threading.Thread(target=generate_and_fail_to_save)
+    first.start()
+    started.wait(10)
+    waiting = threading.Event()
+    waitFor = cachingProvider._wait_for
+    def wait_for(*args, **kwargs):
+        waiting.set()
+        return waitFor(*args, **kwargs)
+    cachingProvider._wait_for = wait_for
+
+    # Act
+    second = threading.Thread(target=lambda: results.update(second=cachingProvider.get_image_from_string("prompt")))
+    second.start()
+    assert waiting.wait(10), "second call joins the one in flight"
+    release.set()
+    first.join(10)
+    second.join(5)
+
+    # Assert
+    assert not second.is_alive()
+    assert results["second"] == { 'img': results["first"]['img'], 'errorMessage': None }
+    assert cachingProvider.pendingSaves == {}
+
+
+def test_cache_checked_while_index_is_written(repoManager: RepoManager, monkeypatch):
+    """
+    Given a cached prompt
+    When the index is being written to disk for another prompt
+    Then the cached prompt is still served without waiting for the write
+    """
+    # Arrange
+    import imageProviders.CachingProvider as cachingProviderModule
+    provider = CountingProvider()
+    cachingProvider = CachingProvider(provider, repoManager, prompt_cache_path(repoManager.reposPath))
+    generate(cachingProvider, repoManager, "prompt")
+    writing = threading.Event()
+    release = threading.Event()
+    atomicWriteBytes = cachingProviderModule.atomic_write_bytes
+    def slow_atomic_write_bytes(*args, **kwargs):
+        writing.set()
+        release.wait(10)
+        return atomicWriteBytes(*args, **kwargs)
+    monkeypatch.setattr(cachingProviderModule, "atomic_write_bytes", slow_atomic_write_bytes)
+    saving = threading.Thread(target=lambda: generate(cachingProvider, repoManager, "other prompt"))
+    saving.start()
+    assert writing.wait(10), "index write started"
+
+    # Act
+    results = {}
+    checking = threading.Thread(target=lambda: results.update(hit=cachingProvider.get_image_from_string("prompt")))
+    checking.start()
+    checking.join(5)
+    servedDuringWrite = not checking.is_alive()
+    release.set()
+    saving.join(10)
+    checking.join(10)
+
+    # Assert
+    assert servedDuringWrite
+    assert results["hit"].get('cacheHit') is True
+    assert provider.prompts == ["prompt", "other prompt"]
@@ -0,0 +1,135 @@
+import base64
+import sys
+import time
+from types import SimpleNamespace
+
+from imageProviders.DalleProvider import DalleProvider
+from imageProviders.ImageProvider import ProviderErrorKind
+
+
+IMAGE_BYTES = b"\x89PNG\r\n\x1a\n" + b"image" * 100
+
+
+class StubImages(object):
+    def __init__(self, data):
+        self.data = data
+        self.requests = []
+
+    def generate(self, **kwargs):
+        self.requests.append(kwargs)
+        return SimpleNamespace(data=[self.data])
+
+
+class StubResponse(object):
+    def __init__(self, chunkSeconds: float = 0):
+        self.chunkSeconds = chunkSeconds
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def raise_for_status(self):
+        return
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(IMAGE_BYTES), chunk_size):
+            time.sleep(self.chunkSeconds)
+            yield IMAGE_BYTES[i:i + chunk_size]
+
+
+class StubSession(object):
+    def __init__(self, chunkSeconds: float = 0):
+        self.chunkSeconds = chunkSeconds
+        self.requests = []
+
+    def get(self, url, **kwargs):
+        self.requests.append((url, kwargs))
+        return StubResponse(self.chunkSeconds)
+
+
+def test_image_returned_inline():
+    """
+    Given the API returns the image as base64
+    When an image is generated
+    Then the image is decoded from the response without downloading anything
+    """
+    # Arrange
+    provider = DalleProvider(key="key")
+    images = StubImages(SimpleNamespace(b64_json=base64.b64encode(IMAGE_BYTES).decode("ascii"), url=None))
+    provider.openAiClient = SimpleNamespace(images=images)
+    provider.session = StubSession()
+
+    # Act
+    result = provider.get_image_from_string("a prompt")
+
+    # Assert
+    assert result['img'] == IMAGE_BYTES
+    assert result['errorMessage'] is None
+    assert images.requests[0]["response_format"] == "b64_json"
+    assert provider.session.requests == []
+    assert set(result['timings']) == {"generate", "decode", "total"}
+
+
+def test_image_downloaded_over_session_when_only_url_returned():
+    """
+    Given the API returns only a url for the image
+    When two images are generated
+    Then both are streamed over the same session
+    """
+    # Arrange
+    provider = DalleProvider(key="key")
+    provider.openAiClient = SimpleNamespace(images=StubImages(SimpleNamespace(b64_json=None, url="https://images/1.png")))
+    session = StubSession()
+    provider.session = session
+
+    # Act
+    results = [provider.get_image_from_string("a prompt") for _ in range(2)]
+
+    # Assert
+    assert all(result['img'] == IMAGE_BYTES and result['errorMessage'] is None for result in results)
+    assert provider.session is session
+    assert [url for url, _ in session.requests] == ["https://images/1.png"] * 2
+    assert all(kwargs["stream"] for _, kwargs in session.requests)
+    assert all(set(result['timings']) == {"generate", "download", "total"} for result in results)
+
+
+def test_download_gives_up_at_the_deadline():
+    """
+    Given an image host that sends the image slower then the time left
+    When an image is generated with a timeout
+    Then the download is cut short by the timeout and fails as a timeout
+    """
+    # Arrange
+    provider = DalleProvider(key="key")
+    provider.openAiClient = SimpleNamespace(images=StubImages(SimpleNamespace(b64_json=None, url="https://images/1.png")), with_options=lambda **kwargs: provider.openAiClient)
+    provider.session = StubSession(chunkSeconds=0.2)
+
+    # Act
+    result = provider.get_image_from_string("a prompt", timeout=0.1)
+
+    # Assert
+    assert result['img'] is None
+    assert result['errorKind'] == ProviderErrorKind.TIMEOUT
+    [(_, kwargs)] = provider.session.requests
+    assert all(limit <= 0.1 for limit in kwargs["timeout"])
+
+
+def test_missing_openai_returns_an_error(monkeypatch):
+    """
+    Given the openai package can't be imported
+    When an image is generated
+    Then an error result is returned instead of raising
+    """
+    # Arrange
+    monkeypatch.setitem(sys.modules, "openai", None)
+    provider = DalleProvider(key="key")
+
+    # Act
+    result = provider.get_image_from_string("a prompt")
+
+    # Assert
+    assert result['img'] is None
+    assert result['errorKind'] == ProviderErrorKind.OTHER
+    assert result['errorMessage'] is not None
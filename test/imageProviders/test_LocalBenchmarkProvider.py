@@ -0,0 +1,77 @@
+import io
+
+from PIL import Image
+
+from imageProviders.DalleProvider import DalleProvider
+from imageProviders.ImageProvider import ProviderErrorKind
+from imageProviders.LocalBenchmarkProvider import LocalBenchmarkProvider, OpenAiStandIn
+
+
+def test_images_and_outcomes_deterministic():
+    """
+    Given two providers with the same seed
+    When they are asked for the same prompts
+    Then they make the same images of the requested size and fail the same prompts
+    """
+    # Arrange
+    def make_provider():
+        return LocalBenchmarkProvider(latencySeconds=0, imageSize=(64, 32), failureRate=0.5, seed=7)
+    prompts = [f'prompt {i}' for i in range(20)]
+
+    # Act
+    firstProvider, secondProvider = make_provider(), make_provider()
+    firstRun = [firstProvider.get_image_from_string(prompt) for prompt in prompts]
+    secondRun = [secondProvider.get_image_from_string(prompt) for prompt in prompts]
+
+    # Assert
+    assert firstRun == secondRun
+    failures = [result for result in firstRun if result['errorMessage'] is not None]
+    assert 0 < len(failures) < len(prompts)
+    assert all(result['errorKind'] == ProviderErrorKind.RATE_LIMITED for result in failures)
+    image = next(result['img'] for result in firstRun if result['errorMessage'] is None)
+    assert Image.open(io.BytesIO(image)).size == (64, 32)
+
+
+def test_slower_than_timeout_fails_with_timeout():
+    """
+    Given a provider that takes a second per image
+    When asked for an image with a shorter timeout
+    Then it gives up with a timeout
+    """
+    # Arrange
+    provider = LocalBenchmarkProvider(latencySeconds=1.0, imageSize=(8, 8))
+
+    # Act
+    result = provider.get_image_from_string("prompt", timeout=0.01)
+
+    # Assert
+    assert result['errorKind'] == ProviderErrorKind.TIMEOUT
+
+
+def test_dalle_provider_against_stand_in():
+    """
+    Given the OpenAI stand in failing every other request with a rate limit
+    When a DalleProvider pointed at it asks for images
+    Then it gets the images and maps the 429s to rate limits with their Retry-After
+    """
+    # Arrange
+    provider = LocalBenchmarkProvider(latencySeconds=0, imageSize=(16, 16), failureRate=0.5, seed=1)
+    standIn = OpenAiStandIn(provider, retryAfterSeconds=3).start()
+    dalleProvider = DalleProvider(key="key", maxRetries=0, baseUrl=standIn.base_url())
+    prompts = [f'prompt {i}' for i in range(6)]
+    sameSeedProvider = LocalBenchmarkProvider(latencySeconds=0, imageSize=(16, 16), failureRate=0.5, seed=1)
+    expected = [sameSeedProvider.get_image_from_string(prompt) for prompt in prompts]
+
+    # Act
+    try:
+        results = [dalleProvider.get_image_from_string(prompt) for prompt in prompts]
+    finally:
+        standIn.stop()
+
+    # Assert
+    for result, expectedResult in zip(results, expected):
+        if expectedResult['errorMessage'] is None:
+            assert result['img'] == expectedResult['img']
+        else:
+            assert result['errorKind'] == ProviderErrorKind.RATE_LIMITED
+            assert result['retryAfter'] == 3
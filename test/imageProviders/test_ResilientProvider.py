@@ -0,0 +1,267 @@
+from typing import List, Union
+
+from imageProviders.ImageProvider import ImageProvider, ImageProviderResult, ProviderErrorKind
+from imageProviders.ResilientProvider import ResilientProvider, TokenBucket
+
+
+IMAGE_BYTES = b"image"
+
+
+class FakeClock(object):
+    """
+    Clock that only moves when slept on so tests don't wait for real
+    """
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps: List[float] = []
+
+    def clock(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class ScriptedProvider(ImageProvider):
+    """
+    Answers with the given results in order (raising the ones that are exceptions), then succeeds
+    """
+    def __init__(self, results: List[Union[ImageProviderResult, Exception, None]]):
+        super().__init__()
+        self.results = results
+        self.timeouts: List[float] = []
+
+    def get_image_from_string(self, prompt, timeout: float = None) -> ImageProviderResult:
+        self.timeouts.append(timeout)
+        if len(self.results) > 0:
+            result = self.results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return { 'img': IMAGE_BYTES, 'errorMessage': None }
+
+
+def failure(errorKind: ProviderErrorKind, retryAfter: float = None) -> ImageProviderResult:
+    result = { 'img': None, 'errorMessage': errorKind.value, 'errorKind': errorKind }
+    if retryAfter is not None:
+        result['retryAfter'] = retryAfter
+    return result
+
+
+def resilient(provider: ImageProvider, fakeClock: FakeClock, **kwargs) -> ResilientProvider:
+    return ResilientProvider(provider, clock=fakeClock.clock, sleep=fakeClock.sleep, jitter=lambda: 1.0, **kwargs)
+
+
+def test_rate_limited_prompt_retried_after_retry_after():
+    """
+    Given an upstream that rate limits the first request and asks to wait 30 seconds
+    When a prompt is generated
+    Then it's retried no sooner than asked, succeeds and the rate is lowered
+    """
+    # Arrange
+    fakeClock = FakeClock()
+    provider = ScriptedProvider([failure(ProviderErrorKind.RATE_LIMITED, retryAfter=30)])
+    resilientProvider = resilient(provider, fakeClock)
+    start = fakeClock.now
+
+    # Act
+    result = resilientProvider.get_image_from_string("prompt")
+
+    # Assert
+    assert result == { 'img': IMAGE_BYTES, 'errorMessage': None }
+    assert len(provider.timeouts) == 2
+    assert fakeClock.now - start >= 30
+    assert resilientProvider.bucket.rate < resilientProvider.bucket.maxRate
+
+
+def test_not_retryable_failure_returned_right_away():
+    """
+    Given an upstream that rejects the credentials
+    When a prompt is generated
+    Then the failure is returned after a single call without waiting
+    """
+    # Arrange
+    fakeClock = FakeClock()
+    provider = ScriptedProvider([failure(ProviderErrorKind.AUTHENTICATION)])
+    resilientProvider = resilient(provider, fakeClock)
+
+    # Act
+    result = resilientProvider.get_image_from_string("prompt")
+
+    # Assert
+    assert result['errorKind'] == ProviderErrorKind.AUTHENTICATION
+    assert len(provider.timeouts) == 1
+    assert fakeClock.sleeps == []
+
+
+def test_retries_stop_at_deadline():
+    """
+    Given an upstream that keeps timing out
+    When a prompt with a 10 second deadline is generated
+    Then it gives up once the next backoff would pass the deadline and every call only gets the time left
+    """
+    # Arrange
+    fakeClock = FakeClock()
+    provider = ScriptedProvider([failure(ProviderErrorKind.TIMEOUT) for _ in range(10)])
+    resilientProvider = resilient(provider, fakeClock, deadlineSeconds=10, baseBackoffSeconds=2, maxAttempts=10, failureThreshold=100, requestsPerMinute=600)
+    start = fakeClock.now
+
+    # Act
+    result = resilientProvider.get_image_from_string("prompt")
+
+    # Assert
+    assert result['errorKind'] == ProviderErrorKind.TIMEOUT
+    assert fakeClock.now - start <= 10
+    # Backoffs of 2, 4 then 8 seconds, the last one would end past the deadline
+    assert len(provider.timeouts) == 3
+    assert provider.timeouts == sorted(provider.timeouts, reverse=True) and provider.timeouts[0] == 10
+
+
+def test_circuit_opens_while_upstream_down_and_closes_once_back():
+    """
+    Given an upstream that's down for the first three calls
+    When prompts keep being generated
+    Then the circuit opens and fails prompts without calling the upstream until the reset time has passed
+    """
+    # Arrange
+    fakeClock = FakeClock()
+    provider = ScriptedProvider([failure(ProviderErrorKind.CONNECTION) for _ in range(3)])
+    resilientProvider = resilient(provider, fakeClock, maxAttempts=1, failureThreshold=3, resetSeconds=60, requestsPerMinute=600)
+
+    # Act
+    failures = [resilientProvider.get_image_from_string("prompt") for _ in range(3)]
+    whileOpen = resilientProvider.get_image_from_string("prompt")
+    callsWhileOpen = len(provider.timeouts)
+    fakeClock.sleep(61)
+    afterReset = resilientProvider.get_image_from_string("prompt")
+
+    # Assert
+    assert all(result['errorKind'] == ProviderErrorKind.CONNECTION for result in failures)
+    assert whileOpen['errorKind'] == ProviderErrorKind.UNAVAILABLE
+    assert callsWhileOpen == 3
+    assert afterReset == { 'img': IMAGE_BYTES, 'errorMessage': None }
+    assert resilientProvider.breaker.openedAt is None
+
+
+def test_trial_call_always_recorded_whatever_the_upstream_does():
+    """
+    Given an open circuit whose trial calls raise, return nothing or leave out the error message
+    When prompts are generated after each reset
+    Then every trial is recorded so the circuit is never stuck waiting on a trial
+    """
+    # Arrange
+    fakeClock = FakeClock()
+    provider = ScriptedProvider([failure(ProviderErrorKind.SERVER), ConnectionError("connection dropped"), None, { 'img': IMAGE_BYTES }])
+    resilientProvider = resilient(provider, fakeClock, maxAttempts=1, failureThreshold=1, resetSeconds=60, requestsPerMinute=600)
+    resilientProvider.get_image_from_string("prompt")
+
+    # Act
+    results = []
+    for _ in range(3):
+        resilientProvider.breaker.openedAt = fakeClock.now
+        fakeClock.sleep(61)
+        results.append(resilientProvider.get_image_from_string("prompt"))
+
+    # Assert
+    assert [result['errorKind'] for result in results[:2]] == [ProviderErrorKind.OTHER, ProviderErrorKind.OTHER]
+    assert results[2] == { 'img': IMAGE_BYTES, 'errorMessage': None }
+    assert len(provider.timeouts) == 4
+    assert resilientProvider.breaker.trialRunning is False
+
+
+def test_prompts_during_trial_call_fail_without_a_zero_wait():
+    """
+    Given an open circuit whose reset time passed and whose trial call is still in flight
+    When another prompt is generated
+    Then it fails right away saying the provider is being checked rather then to try again in 0 seconds
+    """
+    # Arrange
+    fakeClock = FakeClock()
+    provider = ScriptedProvider([failure(ProviderErrorKind.CONNECTION)])
+    resilientProvider = resilient(provider, fakeClock, maxAttempts=1, failureThreshold=1, resetSeconds=60, requestsPerMinute=600)
+    resilientProvider.get_image_from_string("prompt")
+    fakeClock.sleep(61)
+    assert resilientProvider.breaker.allow() is True
+
+    # Act
+    result = resilientProvider.get_image_from_string("prompt")
+
+    # Assert
+    assert result['errorKind'] == ProviderErrorKind.UNAVAILABLE
+    assert "0 seconds" not in result['errorMessage']
+    assert "Checking whether it is back" in result['errorMessage']
+    assert len(provider.timeouts) == 1
+
+
+def test_expired_deadline_times_out_without_calling_upstream():
+    """
+    Given a prompt whose deadline passed while it waited for a request slot
+    When it's generated
+    Then it times out without calling the upstream with no time left
+    """
+    # Arrange
+    fakeClock = FakeClock()
+    provider = ScriptedProvider([])
+    resilientProvider = resilient(provider, fakeClock, requestsPerMinute=600)
+    def acquire_at_deadline(deadline: float) -> bool:
+        fakeClock.sleep(deadline - fakeClock.now)
+        return True
+    resilientProvider.bucket.acquire = acquire_at_deadline
+
+    # Act
+    result = resilientProvider.get_image_from_string("prompt", timeout=5)
+
+    # Assert
+    assert result['errorKind'] == ProviderErrorKind.TIMEOUT
+    assert provider.timeouts == []
+
+
+def test_token_bucket_spaces_requests_after_burst():
+    """
+    Given a bucket of 6 requests a minute with a burst of 2
+    When 4 requests are made back to back
+    Then the first 2 go right away and the rest are 10 seconds apart
+    """
+    # Arrange
+    fakeClock = FakeClock()
+    bucket = TokenBucket(6, 2, clock=fakeClock.clock, sleep=fakeClock.sleep)
+    start = fakeClock.now
+
+    # Act
+    times = []
+    for _ in range(4):
+        assert bucket.acquire(deadline=start + 100)
+        times.append(fakeClock.now - start)
+
+    # Assert
+    assert [round(t, 6) for t in times] == [0, 0, 10, 20]
+    assert bucket.acquire(deadline=fakeClock.now + 1) is False
+
+
+def test_rejected_trial_call_keeps_circuit_half_open():
+    """
+    Given an open circuit whose reset time passed
+    When the trial call is rejected for a reason other then an outage
+    Then the circuit doesn't close, the next prompt is the trial and closes it once it succeeds
+    """
+    # Arrange
+    fakeClock = FakeClock()
+    provider = ScriptedProvider([failure(ProviderErrorKind.CONNECTION), failure(ProviderErrorKind.OTHER)])
+    resilientProvider = resilient(provider, fakeClock, maxAttempts=1, failureThreshold=1, resetSeconds=60, requestsPerMinute=600)
+    resilientProvider.get_image_from_string("prompt")
+    fakeClock.sleep(61)
+
+    # Act
+    rejected = resilientProvider.get_image_from_string("prompt")
+    openedAfterRejected = resilientProvider.breaker.openedAt
+    trialRunningAfterRejected = resilientProvider.breaker.trialRunning
+    succeeded = resilientProvider.get_image_from_string("prompt")
+
+    # Assert
+    assert rejected['errorKind'] == ProviderErrorKind.OTHER
+    assert openedAfterRejected is not None
+    assert trialRunningAfterRejected is False
+    assert succeeded == { 'img': IMAGE_BYTES, 'errorMessage': None }
+    assert resilientProvider.breaker.openedAt is None
+    assert len(provider.timeouts) == 3
@@ -0,0 +1,92 @@
+import os
+import time
+from pathlib import Path
+
+from repoManager.DatePack import PACK_FILE_NAME, DatePack, get_reverse_sorted_listing, pack_date_directory, remove_packed_images
+
+
+def create_date(datePath: Path, timePrompts: dict):
+   """
+   Packs are plain zip files so the real file system is used
+   """
+   for timePrompt, images in timePrompts.items():
+      (datePath/timePrompt).mkdir(parents=True, exist_ok=True)
+      for image, content in images.items():
+         (datePath/timePrompt/image).write_bytes(content)
+
+
+def test_pack_replaces_directories_and_reads_by_offset(tmp_path: Path):
+   """
+   Given date with a packed prompt and a prompt added after packing
+   When date is packed again
+   Then every prompt ends up in one pack file whose images read back by offset and list like directories
+   """
+   # Arrange
+   datePath = tmp_path/"2024-01-13"
+   create_date(datePath, {"03:03:45.522668_Shrek Eat Chips": {"1.png": b"shrek one", "2.png": b"shrek two"}})
+   pack_date_directory(datePath)
+   create_date(datePath, {"04:03:45.522668_Fiona Eat Chips": {"1.png": b"fiona one"}})
+
+   # Act
+   packed = pack_date_directory(datePath)
+   pack = DatePack(datePath)
+
+   # Assert
+   assert packed == ["04:03:45.522668_Fiona Eat Chips"]
+   assert sorted(path.name for path in datePath.iterdir()) == [PACK_FILE_NAME]
+   assert get_reverse_sorted_listing(datePath) == ["04:03:45.522668_Fiona Eat Chips", "03:03:45.522668_Shrek Eat Chips"]
+   assert [pack.read_image(image) for image in pack.images["03:03:45.522668_Shrek Eat Chips"]] == [b"shrek one", b"shrek two"]
+   assert [pack.read_image(image) for image in pack.images["04:03:45.522668_Fiona Eat Chips"]] == [b"fiona one"]
+
+
+def test_remove_packed_images_rewrites_and_removes_empty_pack(tmp_path: Path):
+   """
+   Given packed date with two prompts
+   When one image and then every other image is removed
+   Then the pack keeps only what's left and is gone once empty
+   """
+   # Arrange
+   datePath = tmp_path/"2024-01-13"
+   create_date(datePath, {
+      "03:03:45.522668_Shrek Eat Chips": {"1.png": b"shrek one", "2.png": b"shrek two"},
+      "04:03:45.522668_Fiona Eat Chips": {"1.png": b"fiona one"},
+   })
+   pack_date_directory(datePath)
+
+   # Act
+   removedOne = remove_packed_images(datePath, "03:03:45.522668_Shrek Eat Chips", ["1.png"])
+   pack = DatePack(datePath)
+   leftOver = {timePrompt: [pack.read_image(image) for image in images] for timePrompt, images in pack.images.items()}
+   remove_packed_images(datePath, "03:03:45.522668_Shrek Eat Chips")
+   remove_packed_images(datePath, "04:03:45.522668_Fiona Eat Chips")
+
+   # Assert
+   assert removedOne == ["1.png"]
+   assert leftOver == {"03:03:45.522668_Shrek Eat Chips": [b"shrek two"], "04:03:45.522668_Fiona Eat Chips": [b"fiona one"]}
+   assert not (datePath/PACK_FILE_NAME).exists()
+
+
+def test_pack_keeps_image_times(tmp_path: Path):
+   """
+   Given date with one image from before zip can store times and one recent image
+   When date is packed and then packed again with another prompt
+   Then the recent image keeps its time through both packs and the old one is clamped instead of failing the pack
+   """
+   # Arrange
+   datePath = tmp_path/"2024-01-13"
+   create_date(datePath, {"03:03:45.522668_Shrek Eat Chips": {"1.png": b"shrek one", "2.png": b"shrek two"}})
+   os.utime(datePath/"03:03:45.522668_Shrek Eat Chips"/"1.png", (0, 0))
+   recentTime = time.mktime((2024, 1, 13, 3, 3, 46, 0, 0, -1))
+   os.utime(datePath/"03:03:45.522668_Shrek Eat Chips"/"2.png", (recentTime, recentTime))
+   pack_date_directory(datePath)
+   create_date(datePath, {"04:03:45.522668_Fiona Eat Chips": {"1.png": b"fiona one"}})
+
+   # Act
+   pack_date_directory(datePath)
+   pack = DatePack(datePath)
+
+   # Assert
+   [oldImage, recentImage] = pack.images["03:03:45.522668_Shrek Eat Chips"]
+   assert oldImage[3] == time.mktime((1980, 1, 1, 0, 0, 0, 0, 0, -1))
+   assert recentImage[3] == recentTime
+   assert pack.read_image(recentImage) == b"shrek two"
@@ -450,3 +450,73 @@ def test_backwards_starting_directory_provided(fs: FakeFilesystem):
       assert True
    else:
       assert False
+
+
+@pytest.mark.parametrize("direction", [DIRECTION.FORWARD, DIRECTION.BACKWARD])
+def test_empty_date_directories_skipped(fs: FakeFilesystem, direction: DIRECTION):
+   """
+   Given empty date directories left between and around dates with prompts
+   When iterated in either direction
+   Then the empty dates are passed over instead of failing
+   """
+   # Arrange
+   fsState = {
+      "2024-01-15": {},
+      "2024-01-14": {"03:03:45.522668_Shrek Eat Chips": []},
+      "2024-01-13": {},
+      "2024-01-12": {"03:03:45.522668_Fiona Eat Chips": []},
+      "2024-01-11": {},
+   }
+   populate_fs_with(fs, TEST_RESOURCES_FOLDER_NAME, dateDictStructure=fsState)
+
+   # Act
+   prompts = [directory.prompt for directory in DirectoryIterator(pathToDirectories = TEST_RESOURCES_FOLDER_NAME, direction=direction)]
+
+   # Assert
+   expected = ["Shrek Eat Chips", "Fiona Eat Chips"]
+   assert prompts == (expected if direction is DIRECTION.FORWARD else list(reversed(expected)))
+
+
+@pytest.mark.parametrize("direction", [DIRECTION.FORWARD, DIRECTION.BACKWARD])
+@pytest.mark.parametrize("startingDate", [None, "2024-01-15", "2024-01-13", "2024-01-11"])
+def test_dates_bounded_by_newest_and_oldest_date(fs: FakeFilesystem, direction: DIRECTION, startingDate: str):
+   """
+   Given dates before, within and after a date range
+   When iterated with the range as bounds, starting from nothing, outside of the range or within it
+   Then only the entries past the start and within the range are returned
+   """
+   # Arrange
+   fsState = {
+      "2024-01-15": {"03:03:45.522668_Shrek Eat Chips": []},
+      "2024-01-14": {"03:03:45.522668_Donkey Eat Chips": []},
+      "2024-01-13": {"04:03:45.522668_Fiona Eat Chips": [], "03:03:45.522668_Puss Eat Chips": []},
+      "2024-01-12": {"03:03:45.522668_Dragon Eat Chips": []},
+      "2024-01-11": {"03:03:45.522668_Farquaad Eat Chips": []},
+   }
+   populate_fs_with(fs, TEST_RESOURCES_FOLDER_NAME, dateDictStructure=fsState)
+   startingDirectory = ImagePromptDirectory(
+      prompt="Start",
+      time="03:30:00.000000",
+      repo=TEST_RESOURCES_FOLDER_NAME,
+      date=startingDate,
+   ) if startingDate is not None else None
+
+   # Act
+   directoryIterator = DirectoryIterator(
+      pathToDirectories = TEST_RESOURCES_FOLDER_NAME, startingDirectory=startingDirectory, direction=direction, newestDate="2024-01-14", oldestDate="2024-01-12"
+   )
+   prompts = [directory.prompt for directory in directoryIterator]
+
+   # Assert
+   inRange = ["Donkey Eat Chips", "Fiona Eat Chips", "Puss Eat Chips", "Dragon Eat Chips"]
+   expected = {
+      (None, DIRECTION.FORWARD): inRange,
+      (None, DIRECTION.BACKWARD): list(reversed(inRange)),
+      ("2024-01-15", DIRECTION.FORWARD): inRange,
+      ("2024-01-15", DIRECTION.BACKWARD): [],
+      ("2024-01-13", DIRECTION.FORWARD): ["Puss Eat Chips", "Dragon Eat Chips"],
+      ("2024-01-13", DIRECTION.BACKWARD): ["Fiona Eat Chips", "Donkey Eat Chips"],
+      ("2024-01-11", DIRECTION.FORWARD): [],
+      ("2024-01-11", DIRECTION.BACKWARD): list(reversed(inRange)),
+   }
+   assert prompts == expected[(startingDate, direction)]
@@ -0,0 +1,64 @@
+from pathlib import Path
+
+from repoManager.DirectoryIterator import DirectoryIterator
+from repoManager.DirectoryListingCache import DirectoryListingCache
+
+
+def create_dirs(path: Path, dateDictStructure: dict):
+   """
+   Uses the real file system since directory mtimes are what the cache is keyed by
+   """
+   for date, timePrompts in dateDictStructure.items():
+      for timePrompt in timePrompts:
+         (path/date/timePrompt).mkdir(parents=True, exist_ok=True)
+
+
+def test_warm_iteration_does_not_scan(tmp_path: Path):
+   """
+   Given repo already iterated once with a listing cache
+   When iterated again
+   Then no directory is scanned again
+   """
+   # Arrange
+   create_dirs(tmp_path, {
+      "2024-01-14": ["03:03:45.522668_Shrek Eat Chips", "01:03:45.522668_Donkey Eat Chips"],
+      "2024-01-13": ["03:03:45.522668_Fiona Eat Chips"],
+   })
+   listingCache = DirectoryListingCache()
+   cold = [d.prompt for d in DirectoryIterator(pathToDirectories=tmp_path, listingCache=listingCache)]
+   scansAfterCold = listingCache.stats()['scans']
+
+   # Act
+   warm = [d.prompt for d in DirectoryIterator(pathToDirectories=tmp_path, listingCache=listingCache)]
+
+   # Assert
+   assert cold == warm == ["Shrek Eat Chips", "Donkey Eat Chips", "Fiona Eat Chips"]
+   assert scansAfterCold == 3
+   assert listingCache.stats()['scans'] == 3
+
+
+def test_changed_directory_listed_again(tmp_path: Path):
+   """
+   Given cached listings
+   When a directory gets a new entry or is invalidated
+   Then only that directory is listed again
+   """
+   # Arrange
+   create_dirs(tmp_path, {
+      "2024-01-14": ["03:03:45.522668_Shrek Eat Chips"],
+      "2024-01-13": ["03:03:45.522668_Fiona Eat Chips"],
+   })
+   listingCache = DirectoryListingCache()
+   listingCache.get_reverse_sorted(tmp_path/"2024-01-14")
+   listingCache.get_reverse_sorted(tmp_path/"2024-01-13")
+
+   # Act
+   create_dirs(tmp_path, {"2024-01-14": ["04:03:45.522668_Puss Eat Chips"]})
+   listingCache.invalidate(tmp_path/"2024-01-14") # what the repo manager does on writes
+   changed = listingCache.get_reverse_sorted(tmp_path/"2024-01-14")
+   unchanged = listingCache.get_reverse_sorted(tmp_path/"2024-01-13")
+
+   # Assert
+   assert changed == ["04:03:45.522668_Puss Eat Chips", "03:03:45.522668_Shrek Eat Chips"]
+   assert unchanged == ["03:03:45.522668_Fiona Eat Chips"]
+   assert listingCache.stats()['scans'] == 3
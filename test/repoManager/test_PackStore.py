@@ -0,0 +1,66 @@
+from pathlib import Path
+
+from repoManager.DatePack import PACK_FILE_NAME
+from repoManager.DirectoryListingCache import DirectoryListingCache
+from repoManager.PackStore import PackStore
+
+
+def create_repo(path: Path, dateDictStructure: dict):
+   """
+   Packs are plain zip files so the real file system is used
+   """
+   for date, timePrompts in dateDictStructure.items():
+      for timePrompt, images in timePrompts.items():
+         (path/date/timePrompt).mkdir(parents=True, exist_ok=True)
+         for image, content in images.items():
+            (path/date/timePrompt/image).write_bytes(content)
+
+
+def test_only_dates_before_cutoff_packed_and_read_back(tmp_path: Path):
+   """
+   Given repo with a date before and a date after the cutoff
+   When dates are packed
+   Then only the older date is packed and its images read back through handles
+   """
+   # Arrange
+   create_repo(tmp_path, {
+      "2024-01-14": {"03:03:45.522668_Shrek Eat Chips": {"1.png": b"shrek one"}},
+      "2024-01-12": {"03:03:45.522668_Fiona Eat Chips": {"1.png": b"fiona one", "2.png": b"fiona two"}},
+   })
+   packStore = PackStore(DirectoryListingCache())
+
+   # Act
+   numPacked = packStore.pack_dates(tmp_path, "2024-01-13")
+   fionaPath = tmp_path/"2024-01-12"/"03:03:45.522668_Fiona Eat Chips"
+   handles = packStore.get_image_handles(fionaPath)
+
+   # Assert
+   assert numPacked == 1
+   assert sorted(path.name for path in (tmp_path/"2024-01-12").iterdir()) == [PACK_FILE_NAME]
+   assert packStore.is_packed(fionaPath)
+   assert not packStore.is_packed(tmp_path/"2024-01-14"/"03:03:45.522668_Shrek Eat Chips")
+   assert [(handle.name, handle.read_bytes()) for handle in handles] == [("1.png", b"fiona one"), ("2.png", b"fiona two")]
+
+
+def test_delete_images_rewrites_pack_and_survives_missing_pack(tmp_path: Path):
+   """
+   Given packed date
+   When an image is deleted from it and from a date without a pack
+   Then the image is gone from the pack and the date without a pack reports nothing removed
+   """
+   # Arrange
+   create_repo(tmp_path, {
+      "2024-01-12": {"03:03:45.522668_Fiona Eat Chips": {"1.png": b"fiona one", "2.png": b"fiona two"}},
+   })
+   packStore = PackStore(DirectoryListingCache())
+   packStore.pack_dates(tmp_path, "2024-01-13")
+   fionaPath = tmp_path/"2024-01-12"/"03:03:45.522668_Fiona Eat Chips"
+
+   # Act
+   removed = packStore.delete_images(tmp_path/"2024-01-12", {"03:03:45.522668_Fiona Eat Chips": ["1.png"]})
+   removedWithoutPack = packStore.delete_images(tmp_path/"2024-01-11", {"03:03:45.522668_Donkey Eat Chips": ["1.png"]})
+
+   # Assert
+   assert removed == {"03:03:45.522668_Fiona Eat Chips": ["1.png"]}
+   assert [handle.name for handle in packStore.get_image_handles(fionaPath)] == ["2.png"]
+   assert removedWithoutPack == {}
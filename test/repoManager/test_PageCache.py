@@ -0,0 +1,99 @@
+from repoManager.Models import GetImagePrompsResult, ImagePromptDirectory, ImagePrompResult, NextToken
+from repoManager.PageCache import PageCache
+from utils.enums import DIRECTION
+
+
+def make_result(date: str, time: str, prompt: str, imageBytes: bytes = b"") -> ImagePrompResult:
+   return ImagePrompResult(prompt=prompt, repo="testRepo", date=date, time=time, num="1", images=[imageBytes])
+
+
+def make_token(date: str, time: str, prompt: str) -> NextToken:
+   return NextToken(prompt=prompt, repo="testRepo", date=date, time=time)
+
+
+def test_hits_and_misses_counted():
+   """
+   Given empty cache
+   When page requested, cached and requested again
+   Then one miss and one hit counted
+   """
+   # Arrange
+   pageCache = PageCache()
+   page = GetImagePrompsResult([make_result("2024-01-14", "03:03:45.522668", "Shrek")])
+
+   # Act
+   first = pageCache.get("testRepo", None, DIRECTION.FORWARD, 10)
+   pageCache.put("testRepo", None, DIRECTION.FORWARD, 10, (), page)
+   second = pageCache.get("testRepo", None, DIRECTION.FORWARD, 10)
+
+   # Assert
+   assert first is None
+   assert second is page
+   assert pageCache.stats()['hits'] == 1
+   assert pageCache.stats()['misses'] == 1
+
+
+def test_least_recently_used_evicted_over_budget():
+   """
+   Given cache with room for two pages
+   When a third page is cached
+   Then the least recently used page is evicted
+   """
+   # Arrange
+   pageCache = PageCache(maxBytes=3100)
+   pages = [GetImagePrompsResult([make_result("2024-01-14", f"0{i}:00:00.000000", "Shrek", b"x" * 1000)]) for i in range(3)]
+   tokens = [make_token("2024-01-15", f"0{i}:00:00.000000", "Donkey") for i in range(3)]
+
+   # Act
+   pageCache.put("testRepo", tokens[0], DIRECTION.FORWARD, 1, (), pages[0])
+   pageCache.put("testRepo", tokens[1], DIRECTION.FORWARD, 1, (), pages[1])
+   pageCache.get("testRepo", tokens[0], DIRECTION.FORWARD, 1)
+   pageCache.put("testRepo", tokens[2], DIRECTION.FORWARD, 1, (), pages[2])
+
+   # Assert
+   assert pageCache.get("testRepo", tokens[0], DIRECTION.FORWARD, 1) is pages[0]
+   assert pageCache.get("testRepo", tokens[1], DIRECTION.FORWARD, 1) is None
+   assert pageCache.get("testRepo", tokens[2], DIRECTION.FORWARD, 1) is pages[2]
+   assert pageCache.stats()['evictions'] == 1
+
+
+def test_invalidation_only_affects_covering_pages():
+   """
+   Given first and second pages cached
+   When a new most recent directory is saved
+   Then only the first page is invalidated
+   """
+   # Arrange
+   pageCache = PageCache()
+   firstPageToken = make_token("2024-01-14", "01:00:00.000000", "Donkey")
+   firstPage = GetImagePrompsResult([make_result("2024-01-14", "02:00:00.000000", "Shrek"), make_result("2024-01-14", "01:00:00.000000", "Donkey")], nextToken=firstPageToken)
+   secondPage = GetImagePrompsResult([make_result("2024-01-13", "01:00:00.000000", "Fiona")])
+   pageCache.put("testRepo", None, DIRECTION.FORWARD, 2, (), firstPage)
+   pageCache.put("testRepo", firstPageToken, DIRECTION.FORWARD, 2, (), secondPage)
+
+   # Act
+   invalidated = pageCache.invalidate_directory(ImagePromptDirectory(prompt="Puss", repo="testRepo", date="2024-01-15", time="01:00:00.000000"))
+
+   # Assert
+   assert invalidated == 1
+   assert pageCache.get("testRepo", None, DIRECTION.FORWARD, 2) is None
+   assert pageCache.get("testRepo", firstPageToken, DIRECTION.FORWARD, 2) is secondPage
+
+
+def test_page_read_before_invalidation_not_cached():
+   """
+   Given page read on another thread
+   When the repo changes before the page is cached
+   Then the stale page is not cached
+   """
+   # Arrange
+   pageCache = PageCache()
+   generation = pageCache.current_generation()
+   page = GetImagePrompsResult([make_result("2024-01-14", "03:03:45.522668", "Shrek")])
+
+   # Act
+   pageCache.invalidate_directory(ImagePromptDirectory(prompt="Puss", repo="testRepo", date="2024-01-15", time="01:00:00.000000"))
+   pageCache.put("testRepo", None, DIRECTION.FORWARD, 10, (), page, generation)
+
+   # Assert
+   assert pageCache.get("testRepo", None, DIRECTION.FORWARD, 10) is None
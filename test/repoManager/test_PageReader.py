@@ -0,0 +1,78 @@
+import threading
+
+from repoManager.Models import GetImagePrompsResult, ImagePromptDirectory, ImagePrompResult
+from repoManager.PageReader import PageReader
+from utils.enums import DIRECTION
+
+
+def read_directory(directory: ImagePromptDirectory, includeThumbnails: bool, eager: bool) -> ImagePrompResult:
+   return ImagePrompResult(prompt=directory.prompt, repo=directory.repo, date=directory.date, time=directory.time, num="1", images=[])
+
+
+def test_page_read_once_then_served_from_cache_unless_it_failed():
+   """
+   Given page reader
+   When a page is requested twice and a failing page is requested twice
+   Then the good page is read once while the failing page is read every time
+   """
+   # Arrange
+   pageReader = PageReader(read_directory, readWorkers=1)
+   reads = []
+   def read_page() -> GetImagePrompsResult:
+      reads.append("good")
+      return GetImagePrompsResult([])
+   def read_failing_page() -> GetImagePrompsResult:
+      reads.append("failing")
+      return GetImagePrompsResult([], errorMessage="broken")
+
+   # Act
+   first = pageReader.get_page("testRepo", None, DIRECTION.FORWARD, 10, (), read_page)
+   second = pageReader.get_page("testRepo", None, DIRECTION.FORWARD, 10, (), read_page)
+   pageReader.get_page("testRepo", None, DIRECTION.FORWARD, 5, (), read_failing_page)
+   pageReader.get_page("testRepo", None, DIRECTION.FORWARD, 5, (), read_failing_page)
+   pageReader.close()
+
+   # Assert
+   assert second is first
+   assert reads == ["good", "failing", "failing"]
+
+
+def test_read_page_keeps_order_of_directories():
+   """
+   Given page reader with a read pool
+   When a page of directories is read
+   Then results come back in the order of the directories
+   """
+   # Arrange
+   pageReader = PageReader(read_directory, readWorkers=4)
+   directories = [ImagePromptDirectory(prompt=f'Shrek {i}', repo="testRepo", date="2024-01-14", time=f'0{i}:03:45.522668') for i in range(8)]
+
+   # Act
+   results = pageReader.read_page(directories)
+   pageReader.close()
+
+   # Assert
+   assert [result.prompt for result in results] == [directory.prompt for directory in directories]
+
+
+def test_cancelled_prefetch_never_reads():
+   """
+   Given prefetch queued behind a busy prefetch thread
+   When prefetches are cancelled
+   Then the queued prefetch resolves to None without reading its page
+   """
+   # Arrange
+   pageReader = PageReader(read_directory, readWorkers=1)
+   busy = threading.Event()
+   pageReader.submit_background(busy.wait)
+   reads = []
+   prefetched = pageReader.prefetch(lambda: reads.append("read"))
+
+   # Act
+   pageReader.cancel_prefetches()
+   busy.set()
+
+   # Assert
+   assert prefetched.result(timeout=10) is None
+   assert reads == []
+   pageReader.close()
@@ -0,0 +1,133 @@
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from repoManager import RepoFsck as repoFsckModule
+from repoManager.DatePack import PACK_FILE_NAME, DatePack, pack_date_directory
+from repoManager.RepoFsck import RepoFsck
+from repoManager.RepoManager import RepoManager
+from utils.pathingUtils import get_project_root, read_file_as_bytes
+
+
+PNG_BYTES = read_file_as_bytes(get_project_root()/'..'/'testResources'/'images'/'ai'/"test1.png")
+
+
+def create_repo(path: Path, dateDictStructure: dict):
+   """
+   Checks run in worker processes which can't see a fake file system so the real file system is used
+   """
+   path.mkdir(parents=True, exist_ok=True)
+   for date, timePrompts in dateDictStructure.items():
+      (path/date).mkdir(exist_ok=True)
+      for timePrompt, images in timePrompts.items():
+         (path/date/timePrompt).mkdir(parents=True, exist_ok=True)
+         for image, content in images.items():
+            (path/date/timePrompt/image).write_bytes(content)
+
+
+def age_path(path: Path, seconds: float):
+   modified = time.time() - seconds
+   os.utime(path, (modified, modified))
+
+
+@pytest.mark.timeout(60)
+def test_check_finds_and_repairs_power_loss_leftovers(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+   """
+   Given repo with broken images, temporary files, empty directories and orphan thumbnails, some of them packed
+   When checked on worker processes and then repaired
+   Then every problem is reported, removed and the index only holds what's left
+   """
+   # Arrange
+   monkeypatch.setattr(repoFsckModule, "CHECK_BATCH_SIZE", 1)
+   repoManager = RepoManager(tmp_path, "testRepo")
+   repoPath = repoManager.current_repo_abs_path()
+   create_repo(repoPath, {
+      "2024-01-14": {
+         "03:03:45.522668_Shrek Eat Chips": {"1.png": PNG_BYTES, "2.png": b"", ".3.png.tmp": b"half"},
+         "02:03:45.522668_Donkey Eat Chips": {},
+      },
+      "2024-01-13": {},
+      "2024-01-12": {
+         "03:03:45.522668_Fiona Eat Chips": {"1.png": PNG_BYTES, "2.png": PNG_BYTES[:len(PNG_BYTES) // 2]},
+         "02:03:45.522668_Puss Eat Chips": {"1.png": b"not really a png at all, just some text"},
+      },
+   })
+   pack_date_directory(repoPath/"2024-01-12")
+   age_path(repoPath/"2024-01-14"/"03:03:45.522668_Shrek Eat Chips"/".3.png.tmp", 2 * 60 * 60)
+   orphanThumbnail = repoManager.thumbnailStore.thumbnailsPath/"testRepo"/"2024-01-11"/"03:03:45.522668_Farquaad Eat Chips"/"1.png"
+   orphanThumbnail.parent.mkdir(parents=True)
+   orphanThumbnail.write_bytes(PNG_BYTES)
+   repoFsck = RepoFsck(repoManager, workers=2)
+
+   # Act
+   report = repoFsck.check()
+   repaired = repoFsck.check(repair=True)
+   afterRepair = repoFsck.check()
+
+   # Assert
+   assert sorted((path.parent.name, path.name, problem) for path, problem in report.corruptImages) == [
+      ("02:03:45.522668_Puss Eat Chips", "1.png", "not a png"),
+      ("03:03:45.522668_Fiona Eat Chips", "2.png", "truncated"),
+      ("03:03:45.522668_Shrek Eat Chips", "2.png", "empty"),
+   ]
+   assert [path.name for path in report.temporaryFiles] == [".3.png.tmp"]
+   assert [path.name for path in report.emptyPromptDirectories] == ["02:03:45.522668_Donkey Eat Chips"]
+   assert [path.name for path in report.emptyDateDirectories] == ["2024-01-13"]
+   assert report.orphanThumbnails == [orphanThumbnail]
+   assert report.imagesChecked == 5
+   assert repaired.repaired is True
+   assert afterRepair.problem_count() == 0
+   assert afterRepair.imagesChecked == 2
+   assert sorted(DatePack(repoPath/"2024-01-12").images) == ["03:03:45.522668_Fiona Eat Chips"]
+   assert sorted(path.name for path in (repoPath/"2024-01-12").iterdir()) == [PACK_FILE_NAME]
+   assert [(r.prompt, len(r.images)) for r in repoManager.get_images(10).results] == [("Shrek Eat Chips", 1), ("Fiona Eat Chips", 1)]
+
+
+@pytest.mark.timeout(60)
+def test_stray_files_left_after_repair(tmp_path: Path):
+   """
+   Given repo with a stray file where a date directory belongs
+   When repaired
+   Then the stray file is kept and counted as not repaired
+   """
+   # Arrange
+   repoManager = RepoManager(tmp_path, "testRepo")
+   repoPath = repoManager.current_repo_abs_path()
+   create_repo(repoPath, {"2024-01-14": {"03:03:45.522668_Shrek Eat Chips": {"1.png": PNG_BYTES}}})
+   (repoPath/"notes.txt").write_bytes(b"notes")
+
+   # Act
+   repaired = RepoFsck(repoManager, workers=1).check(repair=True)
+
+   # Assert
+   assert repaired.problem_count() == 1
+   assert repaired.unrepaired_count() == 1
+   assert (repoPath/"notes.txt").exists()
+
+
+@pytest.mark.timeout(60)
+def test_repair_keeps_temporary_files_of_saves_in_progress(tmp_path: Path):
+   """
+   Given repo with an old temporary directory and one a running app is still saving to
+   When repaired
+   Then only the old temporary directory is reported and removed
+   """
+   # Arrange
+   repoManager = RepoManager(tmp_path, "testRepo")
+   repoPath = repoManager.current_repo_abs_path()
+   create_repo(repoPath, {"2024-01-14": {
+      "03:03:45.522668_Shrek Eat Chips": {"1.png": PNG_BYTES},
+      ".02:03:45.522668_Fiona Eat Chips.tmp": {"1.png": PNG_BYTES},
+      ".04:03:45.522668_Donkey Eat Chips.tmp": {"1.png": PNG_BYTES},
+   }})
+   age_path(repoPath/"2024-01-14"/".02:03:45.522668_Fiona Eat Chips.tmp", 2 * 60 * 60)
+
+   # Act
+   repaired = RepoFsck(repoManager, workers=1, temporaryFileMinAge=60).check(repair=True)
+
+   # Assert
+   assert [path.name for path in repaired.temporaryFiles] == [".02:03:45.522668_Fiona Eat Chips.tmp"]
+   assert not (repoPath/"2024-01-14"/".02:03:45.522668_Fiona Eat Chips.tmp").exists()
+   assert (repoPath/"2024-01-14"/".04:03:45.522668_Donkey Eat Chips.tmp"/"1.png").exists()
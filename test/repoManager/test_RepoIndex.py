@@ -0,0 +1,172 @@
+from pathlib import Path
+
+from repoManager.Models import ImagePromptDirectory
+from repoManager.RepoIndex import RepoIndex
+from utils.enums import DIRECTION
+
+
+def create_repo(path: Path, dateDictStructure: dict):
+   """
+   Simulates a repo on the real file system (SQLite can't open files in a fake file system)
+   """
+   for date, timePrompts in dateDictStructure.items():
+      for timePrompt, images in timePrompts.items():
+         (path/date/timePrompt).mkdir(parents=True, exist_ok=True)
+         for image in images:
+            (path/date/timePrompt/image).write_bytes(b"not really a png")
+
+
+def test_rebuild_iterates_like_directory_iterator(tmp_path: Path):
+   """
+   Given repo with several dates
+   When index is built and iterated forward and backwards
+   Then entries are returned most recent first (or last when backwards)
+   """
+   # Arrange
+   repoPath = tmp_path/"testRepo"
+   create_repo(repoPath, {
+      "2024-01-14": {
+         "03:03:45.522668_Shrek Eat Chips": ["1.png"],
+         "01:03:45.522668_Donkey Eat Chips": ["1.png", "2.png"]
+      },
+      "2024-01-13": {
+         "03:03:45.522668_Fiona Eat Chips": ["1.png"],
+      }
+   })
+   repoIndex = RepoIndex(tmp_path/"index.sqlite")
+
+   # Act
+   rebuilt = repoIndex.ensure_fresh("testRepo", repoPath)
+   forward = [d.prompt for d in repoIndex.iterate_directories("testRepo", batchSize=2)]
+   backward = [d.prompt for d in repoIndex.iterate_directories("testRepo", direction=DIRECTION.BACKWARD, batchSize=2)]
+   fromToken = [d.prompt for d in repoIndex.iterate_directories(
+      "testRepo",
+      startingDirectory=ImagePromptDirectory(prompt="Shrek Eat Chips", repo="testRepo", date="2024-01-14", time="03:03:45.522668")
+   )]
+
+   # Assert
+   assert rebuilt is True
+   assert forward == ["Shrek Eat Chips", "Donkey Eat Chips", "Fiona Eat Chips"]
+   assert backward == ["Fiona Eat Chips", "Donkey Eat Chips", "Shrek Eat Chips"]
+   assert fromToken == ["Donkey Eat Chips", "Fiona Eat Chips"]
+
+
+def test_persisted_index_is_reused(tmp_path: Path):
+   """
+   Given index already built for an unchanged repo
+   When index is reopened
+   Then it is not rebuilt
+   """
+   # Arrange
+   repoPath = tmp_path/"testRepo"
+   create_repo(repoPath, {"2024-01-14": {"03:03:45.522668_Shrek Eat Chips": ["1.png"]}})
+   RepoIndex(tmp_path/"index.sqlite").ensure_fresh("testRepo", repoPath)
+
+   # Act
+   repoIndex = RepoIndex(tmp_path/"index.sqlite")
+   rebuilt = repoIndex.ensure_fresh("testRepo", repoPath)
+
+   # Assert
+   assert rebuilt is False
+   assert [d.prompt for d in repoIndex.iterate_directories("testRepo")] == ["Shrek Eat Chips"]
+
+
+def test_external_changes_make_index_stale(tmp_path: Path):
+   """
+   Given index already built
+   When a new date directory is added outside of the index
+   Then the index is rebuilt with the new entry
+   """
+   # Arrange
+   repoPath = tmp_path/"testRepo"
+   create_repo(repoPath, {"2024-01-13": {"03:03:45.522668_Fiona Eat Chips": ["1.png"]}})
+   repoIndex = RepoIndex(tmp_path/"index.sqlite")
+   repoIndex.ensure_fresh("testRepo", repoPath)
+
+   # Act
+   create_repo(repoPath, {"2024-01-14": {"03:03:45.522668_Shrek Eat Chips": ["1.png"]}})
+   rebuilt = repoIndex.ensure_fresh("testRepo", repoPath)
+
+   # Assert
+   assert rebuilt is True
+   assert [d.prompt for d in repoIndex.iterate_directories("testRepo")] == ["Shrek Eat Chips", "Fiona Eat Chips"]
+
+
+def test_older_dates_changed_while_closed_are_scanned_on_open(tmp_path: Path):
+   """
+   Given index built and closed
+   When a prompt is added to an older date and another one removed before the index is opened again
+   Then only the changed date is scanned again and the index matches the file system
+   """
+   # Arrange
+   repoPath = tmp_path/"testRepo"
+   create_repo(repoPath, {
+      "2024-01-14": {"03:03:45.522668_Shrek Eat Chips": ["1.png"]},
+      "2024-01-13": {"03:03:45.522668_Fiona Eat Chips": ["1.png"], "02:03:45.522668_Donkey Eat Chips": ["1.png"]},
+   })
+   RepoIndex(tmp_path/"index.sqlite").ensure_fresh("testRepo", repoPath)
+   create_repo(repoPath, {"2024-01-13": {"04:00:00.000000_Puss Eat Chips": ["1.png"]}})
+   (repoPath/"2024-01-13"/"02:03:45.522668_Donkey Eat Chips"/"1.png").unlink()
+   (repoPath/"2024-01-13"/"02:03:45.522668_Donkey Eat Chips").rmdir()
+
+   # Act
+   repoIndex = RepoIndex(tmp_path/"index.sqlite")
+   scanned = repoIndex.ensure_fresh("testRepo", repoPath)
+   scannedAgain = repoIndex.ensure_fresh("testRepo", repoPath)
+
+   # Assert
+   assert scanned is True
+   assert scannedAgain is False
+   assert [d.prompt for d in repoIndex.iterate_directories("testRepo")] == ["Shrek Eat Chips", "Puss Eat Chips", "Fiona Eat Chips"]
+   assert repoIndex.get_prompt_counts("testRepo").total == 3
+   assert [d.prompt for d in repoIndex.iterate_search("testRepo", "puss")] == ["Puss Eat Chips"]
+
+
+def test_unopenable_index_falls_back_to_memory(tmp_path: Path):
+   """
+   Given index path that can't be created
+   When index is opened
+   Then an in memory index is used instead
+   """
+   # Arrange
+   blocker = tmp_path/"blocker"
+   blocker.write_bytes(b"")
+
+   # Act
+   repoIndex = RepoIndex(blocker/"index.sqlite")
+
+   # Assert
+   assert repoIndex.indexPath == ":memory:"
+
+
+def test_search_follows_added_and_removed_entries(tmp_path: Path):
+   """
+   Given built index
+   When entries are added and removed and then searched by word prefixes
+   Then only the current entries matching every word are found, most recent first
+   """
+   # Arrange
+   repoPath = tmp_path/"testRepo"
+   create_repo(repoPath, {
+      "2024-01-14": {"03:03:45.522668_Shrek Eat Chips": ["1.png"]},
+      "2024-01-13": {"03:03:45.522668_Fiona eats CHIPS": ["1.png"]},
+   })
+   repoIndex = RepoIndex(tmp_path/"index.sqlite")
+   repoIndex.ensure_fresh("testRepo", repoPath)
+   donkey = ImagePromptDirectory(prompt="Donkey Eat Chips", repo="testRepo", date="2024-01-14", time="04:03:45.522668")
+   fiona = ImagePromptDirectory(prompt="Fiona eats CHIPS", repo="testRepo", date="2024-01-13", time="03:03:45.522668")
+
+   # Act
+   create_repo(repoPath, {"2024-01-14": {"04:03:45.522668_Donkey Eat Chips": ["1.png"]}})
+   repoIndex.add_directory(donkey, 1, 16, repoPath)
+   (repoPath/"2024-01-13"/"03:03:45.522668_Fiona eats CHIPS"/"1.png").unlink()
+   (repoPath/"2024-01-13"/"03:03:45.522668_Fiona eats CHIPS").rmdir()
+   repoIndex.remove_directory(fiona, repoPath)
+
+   # Assert
+   assert [d.prompt for d in repoIndex.iterate_search("testRepo", "chip", batchSize=1)] == ["Donkey Eat Chips", "Shrek Eat Chips"]
+   assert [d.prompt for d in repoIndex.iterate_search("testRepo", "EAT don")] == ["Donkey Eat Chips"]
+   assert [d.prompt for d in repoIndex.iterate_search("testRepo", "chip", startingDirectory=donkey)] == ["Shrek Eat Chips"]
+   assert [d.prompt for d in repoIndex.iterate_search("testRepo", "chip", direction=DIRECTION.BACKWARD)] == ["Shrek Eat Chips", "Donkey Eat Chips"]
+   assert list(repoIndex.iterate_search("testRepo", "fiona")) == []
+   assert list(repoIndex.iterate_search("testRepo", "  ")) == []
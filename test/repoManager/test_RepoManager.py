@@ -1,11 +1,17 @@
 
 import io
+import os
+import sqlite3
+import threading
 from utils.enums import DIRECTION
 
 from PIL import Image
 
 from depdencyInjection.Container import Container
+from repoManager.DatePack import pack_date_directory
+from repoManager.Models import DeleteImagePrompsRequest, ImageHandle, NextToken
 from repoManager.RepoManager import RepoManager
+from utils.pathingUtils import get_project_root, read_file_as_bytes
 from utils_for_test import populate_fs_with
 from pyfakefs.fake_filesystem import FakeFilesystem 
 
@@ -59,7 +65,7 @@ def test_images_exist_get_images(containerWithMocks: Container, fs: FakeFilesyst
    assert onlyResult.repo == "testRepo"
    assert onlyResult.date == "2024-01-14"
    assert onlyResult.time == "03:03:45.522668"
-   with Image.open(io.BytesIO(onlyResult.images[0])): # if no exception is thrown then the bytes are a proper image
+   with Image.open(io.BytesIO(onlyResult.images[0].read_bytes())): # if no exception is thrown then the bytes are a proper image
       assert True
 
 
@@ -97,14 +103,14 @@ def test_lots_of_images_exist_get_images(containerWithMocks: Container, fs: Fake
    assert resultOne.repo == "testRepo"
    assert resultOne.date == "2024-01-14"
    assert resultOne.time == "03:03:45.522668"
-   with Image.open(io.BytesIO(resultOne.images[0])): # if no exception is thrown then the bytes are a proper image
+   with Image.open(io.BytesIO(resultOne.images[0].read_bytes())): # if no exception is thrown then the bytes are a proper image
       assert True
 
    assert resultTwo.prompt == "Donkey Eat Chips"
    assert resultTwo.repo == "testRepo"
    assert resultTwo.date == "2024-01-14"
    assert resultTwo.time == "01:03:45.522668"
-   with Image.open(io.BytesIO(resultTwo.images[0])): # if no exception is thrown then the bytes are a proper image
+   with Image.open(io.BytesIO(resultTwo.images[0].read_bytes())): # if no exception is thrown then the bytes are a proper image
       assert True
 
 
@@ -143,7 +149,7 @@ def test_pagination(containerWithMocks: Container, fs: FakeFilesystem):
    assert resultOne.repo == "testRepo"
    assert resultOne.date == "2024-01-13"
    assert resultOne.time == "03:03:45.522668"
-   with Image.open(io.BytesIO(resultOne.images[0])): # if no exception is thrown then the bytes are a proper image
+   with Image.open(io.BytesIO(resultOne.images[0].read_bytes())): # if no exception is thrown then the bytes are a proper image
       assert True
 
 
@@ -178,14 +184,14 @@ def test_backwards_pagination_normal(containerWithMocks: Container, fs: FakeFile
    assert resultOne.repo == "testRepo"
    assert resultOne.date == "2024-01-14"
    assert resultOne.time == "03:03:45.522668"
-   with Image.open(io.BytesIO(resultOne.images[0])): # if no exception is thrown then the bytes are a proper image
+   with Image.open(io.BytesIO(resultOne.images[0].read_bytes())): # if no exception is thrown then the bytes are a proper image
       assert True
 
    assert resultTwo.prompt == "Donkey Eat Chips"
    assert resultTwo.repo == "testRepo"
    assert resultTwo.date == "2024-01-14"
    assert resultTwo.time == "01:03:45.522668"
-   with Image.open(io.BytesIO(resultTwo.images[0])): # if no exception is thrown then the bytes are a proper image
+   with Image.open(io.BytesIO(resultTwo.images[0].read_bytes())): # if no exception is thrown then the bytes are a proper image
       assert True
 
 
@@ -225,14 +231,14 @@ def test_backwards_pagination_multi(containerWithMocks: Container, fs: FakeFiles
    assert resultOne.repo == "testRepo"
    assert resultOne.date == "2024-01-13"
    assert resultOne.time == "03:03:45.522668"
-   with Image.open(io.BytesIO(resultOne.images[0])): # if no exception is thrown then the bytes are a proper image
+   with Image.open(io.BytesIO(resultOne.images[0].read_bytes())): # if no exception is thrown then the bytes are a proper image
       assert True
 
    assert resultTwo.prompt == "Puss Eat Chips"
    assert resultTwo.repo == "testRepo"
    assert resultTwo.date == "2024-01-13"
    assert resultTwo.time == "02:03:45.522668"
-   with Image.open(io.BytesIO(resultTwo.images[0])): # if no exception is thrown then the bytes are a proper image
+   with Image.open(io.BytesIO(resultTwo.images[0].read_bytes())): # if no exception is thrown then the bytes are a proper image
       assert True
 
    assert len(result2.results) == 2
@@ -244,12 +250,633 @@ def test_backwards_pagination_multi(containerWithMocks: Container, fs: FakeFiles
    assert resultOne.repo == "testRepo"
    assert resultOne.date == "2024-01-14"
    assert resultOne.time == "03:03:45.522668"
-   with Image.open(io.BytesIO(resultOne.images[0])): # if no exception is thrown then the bytes are a proper image
+   with Image.open(io.BytesIO(resultOne.images[0].read_bytes())): # if no exception is thrown then the bytes are a proper image
       assert True
 
    assert resultTwo.prompt == "Donkey Eat Chips"
    assert resultTwo.repo == "testRepo"
    assert resultTwo.date == "2024-01-14"
    assert resultTwo.time == "01:03:45.522668"
-   with Image.open(io.BytesIO(resultTwo.images[0])): # if no exception is thrown then the bytes are a proper image
+   with Image.open(io.BytesIO(resultTwo.images[0].read_bytes())): # if no exception is thrown then the bytes are a proper image
       assert True
+
+
+def test_failing_index_queries_fall_back_to_file_system(containerWithMocks: Container, fs: FakeFilesystem, monkeypatch):
+   """
+   Given repo index whose queries fail, right away or part way through a walk
+   When the repo is paged
+   Then entries are read from the file system instead, carrying on after the last entry read from the index
+   """
+
+   # Arrange
+   repoManager: RepoManager = containerWithMocks.repoManager()
+
+   fsState = {
+      "2024-01-14": { 
+         "03:03:45.522668_Shrek Eat Chips": ["1.png"],
+         "01:03:45.522668_Donkey Eat Chips": ["1.png"]
+      },
+      "2024-01-13": { 
+         "03:03:45.522668_Fiona Eat Chips": ["1.png"],
+      }
+   }
+   populate_fs_with(fs,repoManager.current_repo_abs_path(), dateDictStructure=fsState)
+   repoManager.get_images(1)
+
+   queryPage = repoManager.repoIndex._query_page
+   queries = []
+   def failing_query_page(*args, **kwargs):
+      queries.append(args)
+      if len(queries) > failAfter:
+         raise sqlite3.OperationalError("database is locked")
+      return queryPage(*args, **kwargs)
+   monkeypatch.setattr(repoManager.repoIndex, "_query_page", failing_query_page)
+
+   # Act
+   failAfter = 0
+   result = repoManager.get_images(3)
+   failAfter = 1
+   queries.clear()
+   walked = list(repoManager._iterate_directories(batchSize=1))
+
+   # Assert
+   assert result.errorMessage is None
+   assert [r.prompt for r in result.results] == ["Shrek Eat Chips", "Donkey Eat Chips", "Fiona Eat Chips"]
+   assert [directory.prompt for directory in walked] == ["Shrek Eat Chips", "Donkey Eat Chips", "Fiona Eat Chips"]
+   assert len(queries) == 2, "the walk took over after the first batch from the index"
+
+
+def test_save_and_delete_keep_index_current(containerWithMocks: Container, fs: FakeFilesystem):
+   """
+   Given index built from existing entries
+   When images are saved and deleted through the repo manager
+   Then pages reflect the changes without rebuilding the index
+   """
+
+   # Arrange
+   repoManager: RepoManager = containerWithMocks.repoManager()
+
+   fsState = {
+      "2024-01-13": { 
+         "03:03:45.522668_Fiona Eat Chips": ["1.png"],
+      }
+   }
+   populate_fs_with(fs,repoManager.current_repo_abs_path(), dateDictStructure=fsState)
+   repoManager.get_images(2)
+
+   # Act
+   saved = repoManager.save_image("Shrek Eat Chips", b"some image")
+   afterSave = repoManager.get_images(2)
+   repoManager.delete_image(DeleteImagePrompsRequest(prompt=saved.prompt, repo=saved.repo, date=saved.date, time=saved.time, nums=["1"]))
+   afterDelete = repoManager.get_images(2)
+
+   # Assert
+   assert [result.prompt for result in afterSave.results] == ["Shrek Eat Chips", "Fiona Eat Chips"]
+   assert [result.prompt for result in afterDelete.results] == ["Fiona Eat Chips"]
+   assert repoManager.repoIndex.ensure_fresh(repoManager.current_repo(), repoManager.current_repo_abs_path()) is False
+
+
+def test_save_image_makes_thumbnail(containerWithMocks: Container, fs: FakeFilesystem):
+   """
+   Given a real image
+   When save_image called
+   Then a small thumbnail is returned with the page results
+   """
+
+   # Arrange
+   repoManager: RepoManager = containerWithMocks.repoManager()
+   fs.pause()
+   imageBytes = read_file_as_bytes(get_project_root()/'..'/'testResources'/'images'/'ai'/"test1.png")
+   fs.resume()
+
+   # Act
+   repoManager.save_image("Shrek Eat Chips", imageBytes)
+   result = repoManager.get_images(1, includeThumbnails=True)
+
+   # Assert
+   [onlyResult] = result.results
+   [thumbnail] = onlyResult.thumbnails
+   assert len(thumbnail) < len(imageBytes)
+   with Image.open(io.BytesIO(thumbnail)) as image:
+      assert max(image.size) <= 128
+
+
+def test_save_image_async_writes_provider_bytes_atomically(containerWithMocks: Container, fs: FakeFilesystem):
+   """
+   Given image bytes from a provider
+   When save_image_async called
+   Then the future resolves once the exact bytes are on disk with no temporary file left behind
+   """
+
+   # Arrange
+   repoManager: RepoManager = containerWithMocks.repoManager()
+   fs.pause()
+   imageBytes = read_file_as_bytes(get_project_root()/'..'/'testResources'/'images'/'ai'/"test1.png")
+   fs.resume()
+
+   # Act
+   saved = repoManager.save_image_async("Shrek Eat Chips", imageBytes).result(timeout=10)
+
+   # Assert
+   promptPath = repoManager.current_repo_abs_path()/saved.date/f'{saved.time}_{saved.prompt}'
+   assert sorted(os.listdir(promptPath.parent)) == [promptPath.name]
+   assert sorted(os.listdir(promptPath)) == ["1.png"]
+   assert read_file_as_bytes(promptPath/"1.png") == imageBytes
+   assert [result.prompt for result in repoManager.get_images(1).results] == ["Shrek Eat Chips"]
+
+
+def test_unreadable_directory_does_not_fail_page(containerWithMocks: Container, fs: FakeFilesystem):
+   """
+   Given a page worth of directories read in parallel
+   When one of them disappears before its files are read
+   Then the rest of the page is still returned in order and the missing directory has no images
+   """
+
+   # Arrange
+   repoManager: RepoManager = containerWithMocks.repoManager()
+
+   fsState = {
+      "2024-01-14": { 
+         "03:03:45.522668_Shrek Eat Chips": ["1.png"],
+      },
+      "2024-01-13": { 
+         "02:03:45.522668_Donkey Eat Chips": ["1.png"],
+         "01:03:45.522668_Fiona Eat Chips": ["1.png"],
+      }
+   }
+   populate_fs_with(fs,repoManager.current_repo_abs_path(), dateDictStructure=fsState)
+   repoManager.get_images(1) # builds the index
+
+   # Act
+   # Older dates aren't part of the index signature so the index still lists the directory
+   donkeyPath = repoManager.current_repo_abs_path()/"2024-01-13"/"02:03:45.522668_Donkey Eat Chips"
+   fs.remove_object((donkeyPath/"1.png").as_posix())
+   fs.remove_object(donkeyPath.as_posix())
+   result = repoManager.get_images(3, eager=True)
+
+   # Assert
+   assert result.errorMessage is None
+   assert [r.prompt for r in result.results] == ["Shrek Eat Chips", "Donkey Eat Chips", "Fiona Eat Chips"]
+   assert [len(r.images) for r in result.results] == [1, 0, 1]
+
+
+def test_backfill_thumbnails(containerWithMocks: Container, fs: FakeFilesystem):
+   """
+   Given images saved before thumbnails existed and an image still being written
+   When backfill_thumbnails called
+   Then every image gets a thumbnail but the one still being written
+   """
+
+   # Arrange
+   repoManager: RepoManager = containerWithMocks.repoManager()
+
+   fsState = {
+      "2024-01-14": { 
+         "03:03:45.522668_Shrek Eat Chips": ["1.png", ".2.png.tmp"],
+      },
+      "2024-01-13": { 
+         "03:03:45.522668_Fiona Eat Chips": ["1.png"],
+      }
+   }
+   populate_fs_with(fs,repoManager.current_repo_abs_path(), dateDictStructure=fsState)
+
+   # Act
+   made = repoManager.backfill_thumbnails()
+   madeAgain = repoManager.backfill_thumbnails()
+
+   # Assert
+   assert made == 2
+   assert madeAgain == 0
+   assert sorted(os.listdir(repoManager.thumbnailStore.thumbnailsPath/"testRepo"/"2024-01-14"/"03:03:45.522668_Shrek Eat Chips")) == ["1.png"]
+
+
+def test_get_images_lazy_and_eager(containerWithMocks: Container, fs: FakeFilesystem):
+   """
+   Given single prompt entry
+   When get_images called lazily and eagerly
+   Then lazy results only carry file meta data and eager results carry the same bytes
+   """
+
+   # Arrange
+   repoManager: RepoManager = containerWithMocks.repoManager()
+
+   fsState = {
+      "2024-01-14": { 
+         "03:03:45.522668_Shrek Eat Chips": ["1.png"]
+      }
+   }
+   populate_fs_with(fs,repoManager.current_repo_abs_path(), dateDictStructure=fsState)
+
+   # Act
+   lazyResult = repoManager.get_images(1)
+   eagerResult = repoManager.get_images(1, eager=True)
+
+   # Assert
+   [handle] = lazyResult.results[0].images
+   [imageBytes] = eagerResult.results[0].images
+   assert isinstance(handle, ImageHandle)
+   assert handle.name == "1.png"
+   assert handle.size == len(imageBytes)
+   assert handle.read_bytes() == imageBytes
+   with handle.load_image() as image:
+      assert image.size[0] > 0
+
+
+def test_flipping_pages_hits_page_cache(containerWithMocks: Container, fs: FakeFilesystem):
+   """
+   Given two pages of prompt entries
+   When user flips forward and then back to the first page
+   Then the first page is served from the page cache
+   """
+
+   # Arrange
+   repoManager: RepoManager = containerWithMocks.repoManager()
+
+   fsState = {
+      "2024-01-14": { 
+         "03:03:45.522668_Shrek Eat Chips": ["1.png"],
+         "01:03:45.522668_Donkey Eat Chips": ["1.png"]
+      },
+      "2024-01-13": { 
+         "03:03:45.522668_Fiona Eat Chips": ["1.png"],
+      }
+   }
+   populate_fs_with(fs,repoManager.current_repo_abs_path(), dateDictStructure=fsState)
+
+   # Act
+   firstPage = repoManager.get_images(2)
+   repoManager.get_images(2, firstPage.nextToken)
+   firstPageAgain = repoManager.get_images(2)
+
+   # Assert
+   assert firstPageAgain is firstPage
+   assert repoManager.page_cache_stats()['hits'] == 1
+   assert repoManager.page_cache_stats()['misses'] == 2
+
+
+def test_prefetch_warms_page_cache(containerWithMocks: Container, fs: FakeFilesystem):
+   """
+   Given first page already shown
+   When the next page is prefetched and then requested
+   Then it's served from the page cache while cancelled prefetches read nothing
+   """
+
+   # Arrange
+   repoManager: RepoManager = containerWithMocks.repoManager()
+
+   fsState = {
+      "2024-01-14": { 
+         "03:03:45.522668_Shrek Eat Chips": ["1.png"],
+         "02:03:45.522668_Donkey Eat Chips": ["1.png"],
+         "01:03:45.522668_Fiona Eat Chips": ["1.png"],
+      }
+   }
+   populate_fs_with(fs,repoManager.current_repo_abs_path(), dateDictStructure=fsState)
+   firstPage = repoManager.get_images(1)
+
+   # Act
+   prefetched = repoManager.prefetch_images(1, token=firstPage.nextToken).result(timeout=10)
+   hitsBefore = repoManager.page_cache_stats()['hits']
+   secondPage = repoManager.get_images(1, token=firstPage.nextToken)
+
+   busy = threading.Event()
+   repoManager.pageReader.prefetchExecutor.submit(busy.wait) # keep the prefetch worker busy so the next prefetch is still pending
+   cancelled = repoManager.prefetch_images(1, token=secondPage.nextToken)
+   repoManager.cancel_prefetches()
+   busy.set()
+
+   # Assert
+   assert secondPage is prefetched
+   assert repoManager.page_cache_stats()['hits'] == hitsBefore + 1
+   assert cancelled.result(timeout=10) is None
+
+
+
+def test_iter_images_ranges(containerWithMocks: Container, fs: FakeFilesystem):
+   """
+   Given repo spanning several dates
+   When iterated with date ranges, tokens, directions and batches
+   Then only the entries in range are yielded in order
+   """
+
+   # Arrange
+   repoManager: RepoManager = containerWithMocks.repoManager()
+
+   fsState = {
+      "2024-01-15": {"03:03:45.522668_Puss Eat Chips": ["1.png"]},
+      "2024-01-14": {
+         "03:03:45.522668_Shrek Eat Chips": ["1.png"],
+         "02:03:45.522668_Donkey Eat Chips": ["1.png"],
+      },
+      "2024-01-13": {"03:03:45.522668_Fiona Eat Chips": ["1.png"]},
+      "2024-01-12": {"03:03:45.522668_Farquaad Eat Chips": ["1.png"]},
+   }
+   populate_fs_with(fs,repoManager.current_repo_abs_path(), dateDictStructure=fsState)
+   shrekToken = NextToken(prompt="Shrek Eat Chips", repo=repoManager.current_repo(), date="2024-01-14", time="03:03:45.522668")
+   farquaadToken = NextToken(prompt="Farquaad Eat Chips", repo=repoManager.current_repo(), date="2024-01-12", time="03:03:45.522668")
+
+   # Act
+   everything = [d.prompt for d in repoManager.iter_images()]
+   backward = [d.prompt for d in repoManager.iter_images(direction=DIRECTION.BACKWARD)]
+   dateRange = [d.prompt for d in repoManager.iter_images(newestDate="2024-01-14", oldestDate="2024-01-13")]
+   backwardDateRange = [d.prompt for d in repoManager.iter_images(direction=DIRECTION.BACKWARD, newestDate="2024-01-14", oldestDate="2024-01-13")]
+   tokens = [d.prompt for d in repoManager.iter_images(startToken=shrekToken, stopToken=farquaadToken)]
+   batches = [[d.prompt for d in batch] for batch in repoManager.iter_images(batchSize=2)]
+   loaded = list(repoManager.iter_images(oldestDate="2024-01-15", loadImages=True, eager=True))
+
+   # Assert
+   assert everything == ["Puss Eat Chips", "Shrek Eat Chips", "Donkey Eat Chips", "Fiona Eat Chips", "Farquaad Eat Chips"]
+   assert backward == list(reversed(everything))
+   assert dateRange == ["Shrek Eat Chips", "Donkey Eat Chips", "Fiona Eat Chips"]
+   assert backwardDateRange == ["Fiona Eat Chips", "Donkey Eat Chips", "Shrek Eat Chips"]
+   assert tokens == ["Donkey Eat Chips", "Fiona Eat Chips"]
+   assert batches == [["Puss Eat Chips", "Shrek Eat Chips"], ["Donkey Eat Chips", "Fiona Eat Chips"], ["Farquaad Eat Chips"]]
+   assert [r.prompt for r in loaded] == ["Puss Eat Chips"]
+   assert isinstance(loaded[0].images[0], bytes)
+
+
+def test_page_tokens_jump_to_any_page(containerWithMocks: Container, fs: FakeFilesystem):
+   """
+   Given repo with pages spread unevenly over several dates
+   When the token of every page is looked up directly
+   Then each page matches the page reached by stepping forward one page at a time
+   """
+
+   # Arrange
+   repoManager: RepoManager = containerWithMocks.repoManager()
+
+   fsState = {
+      "2024-01-15": {f"0{i}:03:45.522668_Puss Eat Chips{i}": ["1.png"] for i in range(3)},
+      "2024-01-14": {"03:03:45.522668_Shrek Eat Chips": ["1.png"]},
+      "2024-01-12": {f"0{i}:03:45.522668_Fiona Eat Chips{i}": ["1.png"] for i in range(4)},
+   }
+   populate_fs_with(fs,repoManager.current_repo_abs_path(), dateDictStructure=fsState)
+   steppedPages = []
+   token = None
+   while True:
+      page = repoManager.get_images(3, token=token)
+      steppedPages.append([r.prompt for r in page.results])
+      if page.nextToken is None:
+         break
+      token = page.nextToken
+
+   # Act
+   total = repoManager.count_images()
+   jumpedPages = [[r.prompt for r in repoManager.get_images(3, token=repoManager.get_page_token(pageNum, 3)).results] for pageNum in range(1, 4)]
+   pastTheEnd = repoManager.get_images(3, token=repoManager.get_page_token(10, 3))
+
+   # Assert
+   assert total == 8
+   assert jumpedPages == steppedPages[:3]
+   assert [len(page) for page in jumpedPages] == [3, 3, 2]
+   assert pastTheEnd.results == []
+
+
+def test_get_images_in_range_pages_within_range(containerWithMocks: Container, fs: FakeFilesystem):
+   """
+   Given repo with entries before, within and after a date range
+   When the range is paged forward and back
+   Then only entries of the range are returned with tokens that stay within it
+   """
+
+   # Arrange
+   repoManager: RepoManager = containerWithMocks.repoManager()
+
+   fsState = {
+      "2024-01-20": {"03:03:45.522668_Puss Eat Chips": ["1.png"]},
+      "2024-01-14": {
+         "03:03:45.522668_Shrek Eat Chips": ["1.png"],
+         "02:03:45.522668_Donkey Eat Chips": ["1.png"],
+      },
+      "2024-01-11": {"03:03:45.522668_Fiona Eat Chips": ["1.png"]},
+      "2024-01-02": {"03:03:45.522668_Farquaad Eat Chips": ["1.png"]},
+   }
+   populate_fs_with(fs,repoManager.current_repo_abs_path(), dateDictStructure=fsState)
+
+   # Act
+   firstPage = repoManager.get_images_in_range("2024-01-08", "2024-01-14", 2)
+   secondPage = repoManager.get_images_in_range("2024-01-08", "2024-01-14", 2, token=firstPage.nextToken)
+   backToFirstPage = repoManager.get_images_in_range("2024-01-08", "2024-01-14", 2, token=firstPage.nextToken, direction=DIRECTION.BACKWARD)
+   emptyRange = repoManager.get_images_in_range("2024-01-15", "2024-01-19", 2)
+
+   # Assert
+   assert [r.prompt for r in firstPage.results] == ["Shrek Eat Chips", "Donkey Eat Chips"]
+   assert [r.prompt for r in secondPage.results] == ["Fiona Eat Chips"]
+   assert secondPage.nextToken is None
+   assert [r.prompt for r in backToFirstPage.results] == ["Shrek Eat Chips", "Donkey Eat Chips"]
+   assert backToFirstPage.nextToken is None # Puss is newer but outside of the range
+   assert emptyRange.results == [] and emptyRange.errorMessage is None
+
+
+def test_get_images_in_range_served_like_get_images(containerWithMocks: Container, fs: FakeFilesystem):
+   """
+   Given repo whose older dates are packed
+   When a range covering packed and loose dates is paged twice
+   Then it returns the same entries as get_images for those dates and the second read is served from the page cache
+   """
+
+   # Arrange
+   repoManager: RepoManager = containerWithMocks.repoManager()
+
+   fsState = {
+      "2024-01-14": {"03:03:45.522668_Shrek Eat Chips": ["1.png"]},
+      "2024-01-11": {
+         "03:03:45.522668_Fiona Eat Chips": ["1.png"],
+         "02:03:45.522668_Donkey Eat Chips": ["1.png", "2.png"],
+      },
+      "2024-01-02": {"03:03:45.522668_Farquaad Eat Chips": ["1.png"]},
+   }
+   populate_fs_with(fs,repoManager.current_repo_abs_path(), dateDictStructure=fsState)
+   pack_date_directory(repoManager.current_repo_abs_path()/"2024-01-11")
+
+   # Act
+   everything = repoManager.get_images(10)
+   rangePage = repoManager.get_images_in_range("2024-01-08", "2024-01-14", 10)
+   hitsBefore = repoManager.page_cache_stats()['hits']
+   rangePageAgain = repoManager.get_images_in_range("2024-01-08", "2024-01-14", 10)
+
+   # Assert
+   assert [(r.prompt, len(r.images)) for r in rangePage.results] == [(r.prompt, len(r.images)) for r in everything.results[:3]]
+   assert rangePageAgain is rangePage
+   assert repoManager.page_cache_stats()['hits'] == hitsBefore + 1
+
+
+def test_search_images_pages_through_matches(containerWithMocks: Container, fs: FakeFilesystem):
+   """
+   Given repo with prompts that do and don't match a search
+   When the search is paged forward and back
+   Then only matching prompts are returned with tokens that move between matches
+   """
+
+   # Arrange
+   repoManager: RepoManager = containerWithMocks.repoManager()
+
+   fsState = {
+      "2024-01-14": {
+         "03:03:45.522668_Shrek Eat Chips": ["1.png"],
+         "02:03:45.522668_Donkey Eat Waffles": ["1.png"],
+      },
+      "2024-01-11": {"03:03:45.522668_Fiona eats chips": ["1.png"]},
+      "2024-01-02": {"03:03:45.522668_Farquaad Eat Chips": ["1.png"]},
+   }
+   populate_fs_with(fs,repoManager.current_repo_abs_path(), dateDictStructure=fsState)
+
+   # Act
+   firstPage = repoManager.search_images("chips eat", 2)
+   secondPage = repoManager.search_images("chips eat", 2, token=firstPage.nextToken)
+   backToFirstPage = repoManager.search_images("chips eat", 2, token=firstPage.nextToken, direction=DIRECTION.BACKWARD)
+   noWords = repoManager.search_images("?!", 2)
+
+   # Assert
+   assert [r.prompt for r in firstPage.results] == ["Shrek Eat Chips", "Fiona eats chips"]
+   assert [r.prompt for r in secondPage.results] == ["Farquaad Eat Chips"]
+   assert secondPage.nextToken is None
+   assert [r.prompt for r in backToFirstPage.results] == ["Shrek Eat Chips", "Fiona eats chips"]
+   assert noWords.results == [] and noWords.errorMessage is None
+
+
+def test_search_falls_back_to_file_system_when_index_queries_fail(containerWithMocks: Container, fs: FakeFilesystem, monkeypatch):
+   """
+   Given repo index whose search queries fail
+   When a search is paged
+   Then matching entries are found by walking the file system instead
+   """
+
+   # Arrange
+   repoManager: RepoManager = containerWithMocks.repoManager()
+
+   fsState = {
+      "2024-01-14": {
+         "03:03:45.522668_Shrek Eat Chips": ["1.png"],
+         "02:03:45.522668_Donkey Eat Waffles": ["1.png"],
+      },
+      "2024-01-11": {"03:03:45.522668_Fiona eats chips": ["1.png"]},
+   }
+   populate_fs_with(fs,repoManager.current_repo_abs_path(), dateDictStructure=fsState)
+   repoManager.get_images(1)
+
+   def failing_query(*args, **kwargs):
+      raise sqlite3.OperationalError("database is locked")
+   monkeypatch.setattr(repoManager.repoIndex, "_query_search_page", failing_query)
+
+   # Act
+   result = repoManager.search_images("chips eat", 2)
+
+   # Assert
+   assert result.errorMessage is None
+   assert [r.prompt for r in result.results] == ["Shrek Eat Chips", "Fiona eats chips"]
+
+
+def test_get_merged_images_interleaves_repos(containerWithMocks: Container, fs: FakeFilesystem):
+   """
+   Given several repos with entries interleaved in time
+   When the merged timeline is paged forward
+   Then entries of every repo come most recent first and each page resumes every repo where it left off
+   """
+
+   # Arrange
+   repoManager: RepoManager = containerWithMocks.repoManager()
+
+   populate_fs_with(fs, repoManager.reposPath/"dalle", dateDictStructure={
+      "2024-01-14": {"03:03:45.522668_Shrek Eat Chips": ["1.png"]},
+      "2024-01-12": {"03:03:45.522668_Donkey Eat Chips": ["1.png"]},
+   })
+   populate_fs_with(fs, repoManager.reposPath/"local", dateDictStructure={
+      "2024-01-13": {
+         "05:03:45.522668_Fiona Eat Chips": ["1.png"],
+         "04:03:45.522668_Puss Eat Chips": ["1.png"],
+      },
+      "2024-01-11": {"03:03:45.522668_Farquaad Eat Chips": ["1.png"]},
+   })
+
+   # Act
+   firstPage = repoManager.get_merged_images(2, repos=["dalle", "local"])
+   secondPage = repoManager.get_merged_images(2, repos=["dalle", "local"], token=firstPage.nextToken)
+   thirdPage = repoManager.get_merged_images(2, repos=["dalle", "local"], token=secondPage.nextToken)
+   allRepos = repoManager.get_merged_images(10)
+
+   # Assert
+   assert [(r.repo, r.prompt) for r in firstPage.results] == [("dalle", "Shrek Eat Chips"), ("local", "Fiona Eat Chips")]
+   assert [(r.repo, r.prompt) for r in secondPage.results] == [("local", "Puss Eat Chips"), ("dalle", "Donkey Eat Chips")]
+   assert [(r.repo, r.prompt) for r in thirdPage.results] == [("local", "Farquaad Eat Chips")]
+   assert thirdPage.nextToken is None
+   assert [r.prompt for r in allRepos.results] == ["Shrek Eat Chips", "Fiona Eat Chips", "Puss Eat Chips", "Donkey Eat Chips", "Farquaad Eat Chips"]
+
+
+def test_packed_dates_read_and_delete_like_loose_ones(containerWithMocks: Container, fs: FakeFilesystem):
+   """
+   Given repo whose old dates were packed
+   When pages are read and packed images are deleted
+   Then packed entries come back exactly like loose ones and deletes only remove the requested images
+   """
+
+   # Arrange
+   repoManager: RepoManager = containerWithMocks.repoManager()
+
+   fsState = {
+      "2024-01-14": {"03:03:45.522668_Shrek Eat Chips": ["1.png"]},
+      "2024-01-13": {
+         "03:03:45.522668_Fiona Eat Chips": ["1.png", "2.png"],
+         "02:03:45.522668_Donkey Eat Chips": ["1.png"],
+      },
+   }
+   populate_fs_with(fs,repoManager.current_repo_abs_path(), dateDictStructure=fsState)
+   looseBytes = read_file_as_bytes(repoManager.current_repo_abs_path()/"2024-01-13"/"03:03:45.522668_Fiona Eat Chips"/"1.png")
+
+   # Act
+   packed = repoManager.pack_cold_dates(olderThanDays=0)
+   page = repoManager.get_images(10, eager=True)
+   searched = repoManager.search_images("fiona", 10)
+   deleted = repoManager.delete_image(DeleteImagePrompsRequest(prompt="Fiona Eat Chips", repo=repoManager.current_repo(), date="2024-01-13", time="03:03:45.522668", nums=["1"]))
+   repoManager.delete_image(DeleteImagePrompsRequest(prompt="Donkey Eat Chips", repo=repoManager.current_repo(), date="2024-01-13", time="02:03:45.522668", nums=["1"]))
+   afterDeletes = repoManager.get_images(10)
+
+   # Assert
+   assert packed == 3
+   assert not (repoManager.current_repo_abs_path()/"2024-01-13"/"03:03:45.522668_Fiona Eat Chips").exists()
+   assert [(r.prompt, len(r.images)) for r in page.results] == [("Shrek Eat Chips", 1), ("Fiona Eat Chips", 2), ("Donkey Eat Chips", 1)]
+   assert page.results[1].images[0] == looseBytes
+   assert [r.prompt for r in searched.results] == ["Fiona Eat Chips"]
+   assert deleted == 1
+   assert [(r.prompt, [image.name for image in r.images]) for r in afterDeletes.results] == [("Shrek Eat Chips", ["1.png"]), ("Fiona Eat Chips", ["2.png"])]
+   assert afterDeletes.results[1].images[0].read_bytes() == looseBytes
+
+
+def test_delete_images_batch_across_dates(containerWithMocks: Container, fs: FakeFilesystem):
+   """
+   Given repo with a cached first page
+   When images across several dates and prompts are deleted in one batch
+   Then emptied prompt and date directories are gone and pages, counts and search reflect every delete
+   """
+
+   # Arrange
+   repoManager: RepoManager = containerWithMocks.repoManager()
+
+   fsState = {
+      "2024-01-14": {"03:03:45.522668_Shrek Eat Chips": ["1.png", "2.png"]},
+      "2024-01-13": {
+         "03:03:45.522668_Fiona Eat Chips": ["1.png"],
+         "02:03:45.522668_Donkey Eat Chips": ["1.png"],
+      },
+      "2024-01-12": {"03:03:45.522668_Farquaad Eat Chips": ["1.png"]},
+   }
+   populate_fs_with(fs,repoManager.current_repo_abs_path(), dateDictStructure=fsState)
+   repo = repoManager.current_repo()
+   assert len(repoManager.get_images(10).results) == 4
+
+   # Act
+   deleted = repoManager.delete_images([
+      DeleteImagePrompsRequest(prompt="Shrek Eat Chips", repo=repo, date="2024-01-14", time="03:03:45.522668", nums=["1"]),
+      DeleteImagePrompsRequest(prompt="Fiona Eat Chips", repo=repo, date="2024-01-13", time="03:03:45.522668", nums=["1"]),
+      DeleteImagePrompsRequest(prompt="Donkey Eat Chips", repo=repo, date="2024-01-13", time="02:03:45.522668", nums=["1"]),
+      DeleteImagePrompsRequest(prompt="Donkey Eat Chips", repo=repo, date="2024-01-13", time="02:03:45.522668", nums=["1"]),
+      DeleteImagePrompsRequest(prompt="Gone Eat Chips", repo=repo, date="2024-01-11", time="03:03:45.522668", nums=["1"]),
+   ])
+   page = repoManager.get_images(10)
+
+   # Assert
+   assert deleted == 3
+   assert not (repoManager.current_repo_abs_path()/"2024-01-13").exists()
+   assert [(r.prompt, [image.name for image in r.images]) for r in page.results] == [("Shrek Eat Chips", ["2.png"]), ("Farquaad Eat Chips", ["1.png"])]
+   assert repoManager.count_images() == 2
+   assert repoManager.search_images("donkey", 10).results == []
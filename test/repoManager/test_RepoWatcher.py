@@ -0,0 +1,258 @@
+from pathlib import Path
+
+import pytest
+
+from repoManager.RepoManager import RepoManager
+from repoManager.RepoWatcher import RepoWatcher
+
+
+def create_repo(path: Path, dateDictStructure: dict):
+   """
+   Watching relies on real directory mtimes and inotify so the real file system is used
+   """
+   for date, timePrompts in dateDictStructure.items():
+      for timePrompt, images in timePrompts.items():
+         (path/date/timePrompt).mkdir(parents=True, exist_ok=True)
+         for image in images:
+            (path/date/timePrompt/image).write_bytes(b"not really a png")
+
+
+@pytest.mark.timeout(20)
+@pytest.mark.parametrize("useInotify", [True, False])
+def test_external_copy_applied_incrementally(tmp_path: Path, useInotify: bool):
+   """
+   Given watched repo with its first page already read
+   When a prompt directory is copied in from outside of the repo manager
+   Then the index and cached pages pick it up without a rebuild and listeners are told about it
+   """
+   # Arrange
+   repoManager = RepoManager(tmp_path, "testRepo")
+   create_repo(repoManager.current_repo_abs_path(), {
+      "2024-01-13": {"03:03:45.522668_Fiona Eat Chips": ["1.png"]},
+   })
+   assert [r.prompt for r in repoManager.get_images(10).results] == ["Fiona Eat Chips"]
+
+   notified = []
+   watcher = RepoWatcher(repoManager, onChange=notified.extend, pollInterval=0.05, useInotify=useInotify)
+   watcher.poll_once(timeout=0)
+
+   # Act
+   create_repo(repoManager.current_repo_abs_path(), {
+      "2024-01-14": {"03:03:45.522668_Shrek Eat Chips": ["1.png"]},
+   })
+   changed = []
+   while not changed:
+      changed = watcher.poll_once(timeout=1)
+   rebuilt = repoManager.repoIndex.ensure_fresh("testRepo", repoManager.current_repo_abs_path())
+
+   # Assert
+   assert watcher.backend == ("inotify" if useInotify else "polling")
+   assert [d.prompt for d in changed] == ["Shrek Eat Chips"]
+   assert notified == changed
+   assert rebuilt is False
+   assert [r.prompt for r in repoManager.get_images(10).results] == ["Shrek Eat Chips", "Fiona Eat Chips"]
+
+
+def test_external_delete_only_invalidates_covering_pages(tmp_path: Path):
+   """
+   Given three cached pages
+   When a prompt directory on the first page is removed outside of the repo manager
+   Then it's dropped from the first page while the last page stays cached
+   """
+   # Arrange
+   repoManager = RepoManager(tmp_path, "testRepo")
+   create_repo(repoManager.current_repo_abs_path(), {
+      "2024-01-14": {"03:03:45.522668_Shrek Eat Chips": ["1.png"]},
+      "2024-01-13": {"03:03:45.522668_Fiona Eat Chips": ["1.png"]},
+      "2024-01-12": {"03:03:45.522668_Donkey Eat Chips": ["1.png"]},
+   })
+   firstPage = repoManager.get_images(1)
+   secondPage = repoManager.get_images(1, token=firstPage.nextToken)
+   repoManager.get_images(1, token=secondPage.nextToken)
+
+   # Act
+   shrekPath = repoManager.current_repo_abs_path()/"2024-01-14"/"03:03:45.522668_Shrek Eat Chips"
+   (shrekPath/"1.png").unlink()
+   shrekPath.rmdir()
+   shrekPath.parent.rmdir()
+   changed = repoManager.apply_external_changes(["2024-01-14"])
+   hitsBefore = repoManager.page_cache_stats()['hits']
+   lastPage = repoManager.get_images(1, token=secondPage.nextToken)
+
+   # Assert
+   assert [d.prompt for d in changed] == ["Shrek Eat Chips"]
+   assert [r.prompt for r in lastPage.results] == ["Donkey Eat Chips"]
+   assert repoManager.page_cache_stats()['hits'] == hitsBefore + 1
+   assert [r.prompt for r in repoManager.get_images(1).results] == ["Fiona Eat Chips"]
+
+
+@pytest.mark.timeout(20)
+def test_watch_recovers_when_reopening_it_fails(tmp_path: Path):
+   """
+   Given watched repo whose watch breaks and can't be opened again right away
+   When the repo keeps being polled
+   Then the watch is opened again on a later poll and picks up changes from then on
+   """
+   # Arrange
+   repoManager = RepoManager(tmp_path, "testRepo")
+   create_repo(repoManager.current_repo_abs_path(), {
+      "2024-01-13": {"03:03:45.522668_Fiona Eat Chips": ["1.png"]},
+   })
+   watcher = RepoWatcher(repoManager, pollInterval=0.05, useInotify=False)
+   watcher.poll_once(timeout=0)
+
+   def broken_read(timeout: float):
+      raise TypeError("file descriptor is None")
+   watcher.watch.read_changed_dates = broken_read
+
+   openWatch = watcher._open_watch
+   def failing_open_watch():
+      watcher._open_watch = openWatch
+      raise OSError("out of watches")
+   watcher._open_watch = failing_open_watch
+
+   # Act
+   afterBreaking = watcher.poll_once(timeout=0)
+   watchAfterBreaking = watcher.watch
+   watcher.poll_once(timeout=0)
+   # The index was dropped when the watch broke, the next read rebuilds it
+   repoManager.get_images(10)
+   create_repo(repoManager.current_repo_abs_path(), {
+      "2024-01-14": {"03:03:45.522668_Shrek Eat Chips": ["1.png"]},
+   })
+   changed = []
+   while not changed:
+      changed = watcher.poll_once(timeout=0.05)
+
+   # Assert
+   assert afterBreaking == []
+   assert watchAfterBreaking is None
+   assert [d.prompt for d in changed] == ["Shrek Eat Chips"]
+
+
+@pytest.mark.timeout(20)
+@pytest.mark.parametrize("useInotify", [True, False])
+def test_images_copied_into_existing_prompt_directory_applied_with_their_date(tmp_path: Path, useInotify: bool):
+   """
+   Given watched repo with its first page already read
+   When a sync copies an image into an existing prompt directory along with a new prompt directory of the same date
+   Then both directories are reported as changed and the next read returns the new image instead of the cached page
+   """
+   # Arrange
+   repoManager = RepoManager(tmp_path, "testRepo")
+   create_repo(repoManager.current_repo_abs_path(), {
+      "2024-01-14": {"03:03:45.522668_Shrek Eat Chips": ["1.png"]},
+      "2024-01-13": {"03:03:45.522668_Fiona Eat Chips": ["1.png"]},
+   })
+   assert [len(r.images) for r in repoManager.get_images(10).results] == [1, 1]
+
+   watcher = RepoWatcher(repoManager, pollInterval=0.05, useInotify=useInotify)
+   watcher.poll_once(timeout=0)
+
+   # Act
+   create_repo(repoManager.current_repo_abs_path(), {
+      "2024-01-13": {"03:03:45.522668_Fiona Eat Chips": ["2.png"], "04:03:45.522668_Donkey Eat Chips": ["1.png"]},
+   })
+   changed = []
+   while not changed:
+      changed = watcher.poll_once(timeout=1)
+   rebuilt = repoManager.repoIndex.ensure_fresh("testRepo", repoManager.current_repo_abs_path())
+
+   # Assert
+   assert sorted((d.date, d.prompt) for d in changed) == [("2024-01-13", "Donkey Eat Chips"), ("2024-01-13", "Fiona Eat Chips")]
+   assert rebuilt is False
+   assert [len(r.images) for r in repoManager.get_images(10).results] == [1, 1, 2]
+
+
+@pytest.mark.timeout(20)
+@pytest.mark.parametrize("useInotify", [True, False])
+def test_watch_follows_switched_repo(tmp_path: Path, useInotify: bool):
+   """
+   Given watched repo
+   When the repo manager switches to another repo and a prompt directory is copied into it
+   Then the watch moves to the new repo and the change is applied to it rather then the old one
+   """
+   # Arrange
+   repoManager = RepoManager(tmp_path, "testRepo")
+   create_repo(repoManager.current_repo_abs_path(), {
+      "2024-01-13": {"03:03:45.522668_Fiona Eat Chips": ["1.png"]},
+   })
+   watcher = RepoWatcher(repoManager, pollInterval=0.05, useInotify=useInotify)
+   watcher.poll_once(timeout=0)
+
+   # Act
+   repoManager.switch_repo("otherRepo")
+   assert repoManager.get_images(10).results == []
+   watcher.poll_once(timeout=0)
+   create_repo(repoManager.current_repo_abs_path(), {
+      "2024-01-14": {"03:03:45.522668_Shrek Eat Chips": ["1.png"]},
+   })
+   changed = []
+   while not changed:
+      changed = watcher.poll_once(timeout=1)
+
+   # Assert
+   assert watcher.repo == "otherRepo"
+   assert [(d.repo, d.prompt) for d in changed] == [("otherRepo", "Shrek Eat Chips")]
+   assert [r.prompt for r in repoManager.get_images(10).results] == ["Shrek Eat Chips"]
+
+
+@pytest.mark.timeout(20)
+def test_image_copied_into_existing_prompt_directory_applied(tmp_path: Path):
+   """
+   Given repo watched with inotify with its first page already read
+   When a sync copies an image into an existing prompt directory and changes nothing else
+   Then the directory is reported as changed and the next read returns the new image
+   """
+   # Arrange
+   repoManager = RepoManager(tmp_path, "testRepo")
+   create_repo(repoManager.current_repo_abs_path(), {
+      "2024-01-13": {"03:03:45.522668_Fiona Eat Chips": ["1.png"]},
+   })
+   assert [len(r.images) for r in repoManager.get_images(10).results] == [1]
+
+   watcher = RepoWatcher(repoManager, pollInterval=0.05)
+   watcher.poll_once(timeout=0)
+
+   # Act
+   create_repo(repoManager.current_repo_abs_path(), {
+      "2024-01-13": {"03:03:45.522668_Fiona Eat Chips": ["2.png"]},
+   })
+   changed = []
+   while not changed:
+      changed = watcher.poll_once(timeout=1)
+
+   # Assert
+   assert watcher.backend == "inotify"
+   assert [(d.date, d.prompt) for d in changed] == [("2024-01-13", "Fiona Eat Chips")]
+   assert [len(r.images) for r in repoManager.get_images(10).results] == [2]
+
+
+def test_own_saves_not_reported_as_outside_changes(tmp_path: Path):
+   """
+   Given repo whose first page was read
+   When a watcher applies the date of an image being saved before the save updated the index
+   Then the saved prompt directory isn't reported as an outside change, while one copied in at the same time is
+   """
+   # Arrange
+   repoManager = RepoManager(tmp_path, "testRepo")
+   create_repo(repoManager.current_repo_abs_path(), {
+      "2024-01-13": {"03:03:45.522668_Fiona Eat Chips": ["1.png"]},
+   })
+   repoManager.get_images(10)
+   changed = []
+   directoryChanged = repoManager._directory_changed
+   def watcher_racing_save(directory):
+      create_repo(repoManager.current_repo_abs_path(), {directory.date: {"00:00:00.000000_Donkey Eat Chips": ["1.png"]}})
+      changed.extend(repoManager.apply_external_changes([directory.date]))
+      directoryChanged(directory)
+   repoManager._directory_changed = watcher_racing_save
+
+   # Act
+   repoManager.save_image("Shrek Eat Chips", b"not really a png")
+   page = repoManager.get_images(10)
+   repoManager.close()
+
+   # Assert
+   assert [d.prompt for d in changed] == ["Donkey Eat Chips"]
+   assert [r.prompt for r in page.results] == ["Shrek Eat Chips", "Donkey Eat Chips", "Fiona Eat Chips"]
@@ -0,0 +1,161 @@
+import io
+import threading
+
+from depdencyInjection.Container import Container
+from PIL import Image
+from pyfakefs.fake_filesystem import FakeFilesystem
+
+from repoManager.Models import DeleteImagePrompsRequest, ImageHandle
+from repoManager.RepoManager import RepoManager
+from repoManager.StartupSnapshot import PREVIEW_SIZE
+from utils.pathingUtils import get_project_root, read_file_as_bytes
+from utils_for_test import populate_fs_with
+
+
+def test_save_writes_snapshot_read_back_without_repo(containerWithMocks: Container, fs: FakeFilesystem):
+   """
+   Given repo with an image
+   When an image is saved and the app starts again
+   Then the startup snapshot holds a preview of the saved image, the first page with thumbnails and the count, and matches the repo
+   """
+
+   # Arrange
+   repoManager: RepoManager = containerWithMocks.repoManager()
+   fsState = {
+      "2024-01-13": {"03:03:45.522668_Fiona Eat Chips": ["1.png"]},
+   }
+   populate_fs_with(fs,repoManager.current_repo_abs_path(), dateDictStructure=fsState)
+   fs.pause()
+   imageBytes = read_file_as_bytes(get_project_root()/'..'/'testResources'/'images'/'ai'/"test2.png")
+   fs.resume()
+
+   # Act
+   saved = repoManager.save_image("Shrek Eat Chips", imageBytes)
+   repoManager.close()
+   restarted = RepoManager(repoManager.reposPath, repoManager.current_repo())
+   snapshot = restarted.get_startup_snapshot()
+
+   # Assert
+   assert snapshot is not None
+   assert (snapshot.latest.prompt, snapshot.latest.date, snapshot.latest.time) == (saved.prompt, saved.date, saved.time)
+   assert Image.open(io.BytesIO(snapshot.latest.images[0])).size == PREVIEW_SIZE
+   assert snapshot.imageCount == 2
+   assert [r.prompt for r in snapshot.page.results] == ["Shrek Eat Chips", "Fiona Eat Chips"]
+   assert all(r.thumbnails[0] is not None for r in snapshot.page.results)
+   assert snapshot.page.results[1].images[0].read_bytes() == read_file_as_bytes(repoManager.current_repo_abs_path()/"2024-01-13"/"03:03:45.522668_Fiona Eat Chips"/"1.png")
+   assert restarted.verify_startup_snapshot() is True
+   restarted.close()
+
+
+def test_verify_detects_changes_made_while_closed(containerWithMocks: Container, fs: FakeFilesystem):
+   """
+   Given snapshot written by a delete
+   When the repo changes while the app isn't running
+   Then the snapshot is still drawn at startup but fails verification and is written again
+   """
+
+   # Arrange
+   repoManager: RepoManager = containerWithMocks.repoManager()
+   fsState = {
+      "2024-01-13": {
+         "03:03:45.522668_Fiona Eat Chips": ["1.png"],
+         "02:03:45.522668_Donkey Eat Chips": ["1.png"],
+      },
+   }
+   populate_fs_with(fs,repoManager.current_repo_abs_path(), dateDictStructure=fsState)
+   repoManager.delete_image(DeleteImagePrompsRequest(prompt="Donkey Eat Chips", repo=repoManager.current_repo(), date="2024-01-13", time="02:03:45.522668", nums=["1"]))
+   repoManager.close()
+   populate_fs_with(fs,repoManager.current_repo_abs_path(), dateDictStructure={"2024-01-14": {"03:03:45.522668_Shrek Eat Chips": ["1.png"]}})
+
+   # Act
+   restarted = RepoManager(repoManager.reposPath, repoManager.current_repo())
+   drawn = restarted.get_startup_snapshot()
+   verified = restarted.verify_startup_snapshot()
+   restarted.close()
+   rewritten = RepoManager(repoManager.reposPath, repoManager.current_repo()).get_startup_snapshot()
+
+   # Assert
+   assert [r.prompt for r in drawn.page.results] == ["Fiona Eat Chips"]
+   assert verified is False
+   assert [r.prompt for r in rewritten.page.results] == ["Shrek Eat Chips", "Fiona Eat Chips"]
+   assert rewritten.latest.prompt == "Shrek Eat Chips"
+
+
+def test_saves_in_a_row_write_one_snapshot_from_saved_bytes(containerWithMocks: Container, fs: FakeFilesystem, monkeypatch):
+   """
+   Given empty repo
+   When several images are saved in a row and the app closes
+   Then the first save writes a snapshot, the rest are written once on close, and no preview reads an image back from the repo
+   """
+
+   # Arrange
+   repoManager: RepoManager = containerWithMocks.repoManager()
+   fs.pause()
+   imageBytes = read_file_as_bytes(get_project_root()/'..'/'testResources'/'images'/'ai'/"test2.png")
+   fs.resume()
+   written = []
+   write = repoManager.snapshotStore.write
+   def counting_write():
+      snapshot = write()
+      written.append(snapshot)
+      return snapshot
+   monkeypatch.setattr(repoManager.snapshotStore, "write", counting_write)
+   readBack = []
+   readBytes = ImageHandle.read_bytes
+   def recording_read_bytes(handle: ImageHandle) -> bytes:
+      readBack.append(handle.path)
+      return readBytes(handle)
+   monkeypatch.setattr(ImageHandle, "read_bytes", recording_read_bytes)
+
+   # Act
+   saved = [repoManager.save_image(prompt, imageBytes) for prompt in ["Shrek Eat Chips", "Fiona Eat Chips", "Donkey Eat Chips"]]
+   repoManager.close()
+
+   # Assert
+   assert len(written) == 2
+   assert written[-1].latest.prompt == saved[-1].prompt
+   assert written[-1].imageCount == 3
+   assert Image.open(io.BytesIO(written[-1].latest.images[0])).size == PREVIEW_SIZE
+   assert readBack == []
+
+
+def test_scheduled_writes_share_one_timer_thread(containerWithMocks: Container, fs: FakeFilesystem, monkeypatch):
+   """
+   Given repo with an image
+   When snapshot writes are scheduled one after another
+   Then every write is done and only one timer thread is started for all of them
+   """
+
+   # Arrange
+   repoManager: RepoManager = containerWithMocks.repoManager()
+   fsState = {
+      "2024-01-13": {"03:03:45.522668_Fiona Eat Chips": ["1.png"]},
+   }
+   populate_fs_with(fs,repoManager.current_repo_abs_path(), dateDictStructure=fsState)
+   store = repoManager.snapshotStore
+   store.writeSeconds = 0
+   repoManager.saveExecutor.submit(lambda: None).result()
+   written = threading.Semaphore(0)
+   write = store.write
+   def signalling_write():
+      snapshot = write()
+      written.release()
+      return snapshot
+   monkeypatch.setattr(store, "write", signalling_write)
+   started = []
+   start = threading.Thread.start
+   def recording_start(thread: threading.Thread):
+      started.append(thread)
+      start(thread)
+   monkeypatch.setattr(threading.Thread, "start", recording_start)
+
+   # Act
+   allWritten = True
+   for _ in range(3):
+      store.schedule()
+      allWritten = written.acquire(timeout=5) and allWritten
+   repoManager.close()
+
+   # Assert
+   assert allWritten
+   assert len(started) == 1
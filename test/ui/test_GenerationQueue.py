@@ -0,0 +1,207 @@
+"""
+Tests For the queue of prompts waiting to be generated
+"""
+import threading
+import time
+
+import pytest
+from depdencyInjection.Container import Container
+
+from pytestqt.qtbot import QtBot
+from pyfakefs.fake_filesystem import FakeFilesystem 
+
+from imageProviders.CachingProvider import CachingProvider, prompt_cache_path
+from imageProviders.ImageProvider import ImageProvider, ImageProviderResult
+from repoManager.Models import ImagePrompResult
+from ui.GenerationQueue import GenerationQueue
+from utils.pathingUtils import get_project_root, read_file_as_bytes
+from utils_for_test import populate_fs_with
+
+
+class SlowImageProvider(ImageProvider):
+   """
+   Takes as many seconds to generate an image as the prompt says, keeping track of how many prompts it works on at once
+   and the order it finished them in.
+   """
+   def __init__(self, image: bytes):
+      super().__init__()
+      self.image = image
+      self.lock = threading.Lock()
+      self.running = 0
+      self.mostRunning = 0
+      self.finished = []
+
+   def get_image_from_string(self, prompt, timeout: float = None) -> ImageProviderResult:
+      with self.lock:
+         self.running += 1
+         self.mostRunning = max(self.mostRunning, self.running)
+      time.sleep(float(prompt.split(" ")[0]))
+      with self.lock:
+         self.running -= 1
+         self.finished.append(prompt)
+      if prompt.endswith("fail"):
+         return { 'img': None, 'errorMessage': "Upstream down" }
+      return { 'img': self.image, 'errorMessage': None }
+
+
+@pytest.fixture
+def slowImageProvider(fs: FakeFilesystem):
+   fs.pause()
+   image = read_file_as_bytes(get_project_root()/'..'/'testResources'/'images'/'ai'/"test1.png")
+   fs.resume()
+   return SlowImageProvider(image)
+
+
+@pytest.mark.timeout(10)
+def test_prompts_generated_concurrently_and_saved_in_completion_order(containerWithMocks: Container, qtbot: QtBot, fs: FakeFilesystem, slowImageProvider: SlowImageProvider):
+   """
+   Given a queue that runs two prompts at a time
+   When more prompts are submitted than it can run
+   Then no more than two run at once and every image is handed on and saved in the order the provider finished them
+   """
+
+   # Arrange
+   repoManager = containerWithMocks.repoManager()
+   populate_fs_with(fs, repoManager.current_repo_abs_path(), {})
+   queue = GenerationQueue(slowImageProvider, repoManager, maxConcurrent=2)
+   generated = []
+   saved = []
+   queue.generatedSignal.connect(lambda jobId, prompt, response: generated.append(prompt))
+   queue.savedSignal.connect(lambda jobId, future: saved.append(future.result().prompt))
+   prompts = ["0.6 first", "0.1 second", "0.3 third", "0.1 fourth", "0.1 fifth"]
+
+   # Act
+   jobIds = [queue.submit(prompt) for prompt in prompts]
+   qtbot.waitUntil(lambda: len(saved) == len(prompts), timeout=5000)
+   queue.close()
+
+   # Assert
+   assert jobIds == [1, 2, 3, 4, 5]
+   assert slowImageProvider.mostRunning == 2
+   assert generated == slowImageProvider.finished
+   assert saved == slowImageProvider.finished
+   assert sorted(saved) == sorted(prompts)
+   assert repoManager.get_images(10).results[0].prompt == slowImageProvider.finished[-1]
+   assert queue.pending_count() == 0 and queue.running_count() == 0
+
+
+@pytest.mark.timeout(10)
+def test_failed_prompt_reported_and_not_saved(containerWithMocks: Container, qtbot: QtBot, fs: FakeFilesystem, slowImageProvider: SlowImageProvider):
+   """
+   Given a provider that fails a prompt
+   When the prompt is submitted along with others
+   Then its error is handed on, nothing is saved for it and the other prompts still go through
+   """
+
+   # Arrange
+   repoManager = containerWithMocks.repoManager()
+   populate_fs_with(fs, repoManager.current_repo_abs_path(), {})
+   queue = GenerationQueue(slowImageProvider, repoManager, maxConcurrent=2)
+   errors = []
+   saved = []
+   queue.generatedSignal.connect(lambda jobId, prompt, response: errors.append(response['errorMessage']) if response['errorMessage'] else None)
+   queue.savedSignal.connect(lambda jobId, future: saved.append(future.result().prompt))
+
+   # Act
+   queue.submit("0.1 fail")
+   queue.submit("0.2 works")
+   qtbot.waitUntil(lambda: len(saved) == 1 and len(errors) == 1, timeout=5000)
+   queue.close()
+
+   # Assert
+   assert errors == ["Upstream down"]
+   assert saved == ["0.2 works"]
+
+
+@pytest.mark.timeout(10)
+def test_warm_up_does_not_hold_up_prompts(containerWithMocks: Container, qtbot: QtBot, fs: FakeFilesystem, slowImageProvider: SlowImageProvider):
+   """
+   Given a queue that runs one prompt at a time and a provider whose warm up is slow
+   When the queue warms up the provider and a prompt is submitted right after
+   Then the prompt is generated without waiting for the warm up to finish
+   """
+
+   # Arrange
+   repoManager = containerWithMocks.repoManager()
+   populate_fs_with(fs, repoManager.current_repo_abs_path(), {})
+   warmUpAllowed = threading.Event()
+   slowImageProvider.warm_up = lambda: warmUpAllowed.wait(timeout=5)
+   queue = GenerationQueue(slowImageProvider, repoManager, maxConcurrent=1)
+   generated = []
+   queue.generatedSignal.connect(lambda jobId, prompt, response: generated.append(prompt))
+
+   # Act
+   queue.warm_up()
+   queue.submit("0.1 first")
+   qtbot.waitUntil(lambda: len(generated) == 1, timeout=2000)
+   warmUpAllowed.set()
+   queue.close()
+
+   # Assert
+   assert generated == ["0.1 first"]
+
+
+@pytest.mark.timeout(10)
+def test_cache_hits_not_saved_again(containerWithMocks: Container, qtbot: QtBot, fs: FakeFilesystem, slowImageProvider: SlowImageProvider):
+   """
+   Given a provider that serves a prompt from an image already in the repo
+   When that prompt and a new one are submitted
+   Then only the new image is saved and the provider is told where it was saved
+   """
+
+   # Arrange
+   repoManager = containerWithMocks.repoManager()
+   populate_fs_with(fs, repoManager.current_repo_abs_path(), {})
+   existing = ImagePrompResult(prompt="0.1 cached", repo="testRepo", date="2024-01-14", time="03:03:45.522668", num=1, images=[slowImageProvider.image])
+   getImage = slowImageProvider.get_image_from_string
+   slowImageProvider.get_image_from_string = lambda prompt: { 'img': existing.images[0], 'errorMessage': None, 'cacheHit': True, 'savedImage': existing } if prompt == "0.1 cached" else getImage(prompt)
+   told = []
+   slowImageProvider.image_saved = lambda prompt, savedImage: told.append((prompt, savedImage.prompt))
+   queue = GenerationQueue(slowImageProvider, repoManager, maxConcurrent=1)
+   generated = []
+   saved = []
+   queue.generatedSignal.connect(lambda jobId, prompt, response: generated.append(prompt))
+   queue.savedSignal.connect(lambda jobId, future: saved.append(future.result().prompt))
+
+   # Act
+   queue.submit("0.1 cached")
+   queue.submit("0.1 new")
+   qtbot.waitUntil(lambda: len(generated) == 2 and len(saved) == 1, timeout=5000)
+   queue.close()
+
+   # Assert
+   assert saved == ["0.1 new"]
+   assert told == [("0.1 new", "0.1 new")]
+   assert [result.prompt for result in repoManager.get_images(10).results] == ["0.1 new"]
+
+
+@pytest.mark.timeout(10)
+def test_same_prompt_submitted_twice_saved_once(containerWithMocks: Container, qtbot: QtBot, fs: FakeFilesystem, slowImageProvider: SlowImageProvider):
+   """
+   Given a queue in front of a prompt cache
+   When the same prompt is submitted again while the first is still being generated
+   Then the image is generated and saved once and the second job is served the saved entry from the cache
+   """
+
+   # Arrange
+   repoManager = containerWithMocks.repoManager()
+   populate_fs_with(fs, repoManager.current_repo_abs_path(), {})
+   cachingProvider = CachingProvider(slowImageProvider, repoManager, prompt_cache_path(repoManager.reposPath))
+   queue = GenerationQueue(cachingProvider, repoManager, maxConcurrent=2)
+   generated = []
+   saved = []
+   queue.generatedSignal.connect(lambda jobId, prompt, response: generated.append(response))
+   queue.savedSignal.connect(lambda jobId, future: saved.append(future.result()))
+
+   # Act
+   queue.submit("0.5 same")
+   queue.submit("0.5 same")
+   qtbot.waitUntil(lambda: len(generated) == 2 and len(saved) == 1, timeout=5000)
+   queue.close()
+
+   # Assert
+   assert slowImageProvider.finished == ["0.5 same"]
+   assert len(saved) == 1
+   assert [result.prompt for result in repoManager.get_images(10).results] == ["0.5 same"]
+   cacheHit = next(response for response in generated if response.get('cacheHit'))
+   assert (cacheHit['savedImage'].date, cacheHit['savedImage'].time) == (saved[0].date, saved[0].time)
@@ -2,6 +2,8 @@
 """
 Integration Tests For Inter-page interactrivity and high level applicaiton behavior
 """
+import threading
+
 import pytest
 
 from depdencyInjection.Container import Container
@@ -11,6 +13,7 @@ from pytestqt.qtbot import QtBot
 from PyQt5.QtTest import QTest
 from PyQt5.QtCore import Qt
 from pyfakefs.fake_filesystem import FakeFilesystem 
+from utils.pageUtils import PageName
 from utils_for_test import populate_fs_with
 
 
@@ -43,7 +46,7 @@ def test_home_page_loads_with_default_state(containerWithMocks: Container, qtbot
 @pytest.mark.timeout(25)
 def test_home_page_image_generation_refreshes_gallery(containerWithMocks: Container, qtbot: QtBot, fs: FakeFilesystem):
    """
-   Given application
+   Given application whose gallery was already visited
    When user clicks generate image
    Then gallery page refreshes
    """
@@ -60,7 +63,11 @@ def test_home_page_image_generation_refreshes_gallery(containerWithMocks: Contai
    while ( mainWindow.isVisible() is False ):
       QTest.qWait(200)
 
+   # The gallery is only built once it's routed to
    homePage = containerWithMocks.home()
+   with qtbot.waitSignal(containerWithMocks.gallery().pageLoadedSignal, timeout=5000):
+      mainWindow.route_to_page(PageName.GALLERY)
+   mainWindow.route_to_page(PageName.HOME)
 
    # Act
    QTest.keyClicks(homePage.imageGenerator.promptbox, "some prompt")
@@ -73,3 +80,107 @@ def test_home_page_image_generation_refreshes_gallery(containerWithMocks: Contai
    imagerow = containerWithMocks.gallery().gallery.contentWidget.layout().itemAt(0).widget()
    assert imagerow is not None
    assert imagerow.image_meta.prompt == "some prompt"
+
+
+@pytest.mark.timeout(10)
+def test_gallery_built_only_when_routed_to(containerWithMocks: Container, qtbot: QtBot, fs: FakeFilesystem):
+   """
+   Given application with images
+   When it starts on the home page
+   Then the gallery isn't built until it's routed to and shows its first page then
+   """
+
+   # Arrange
+   repoConfiguredPath = containerWithMocks.repoManager().current_repo_abs_path()
+   fsState = {"2024-01-14": {"03:03:45.522668_Shrek Eat Chips": ["1.png"]}}
+   populate_fs_with(fs,repoConfiguredPath, dateDictStructure=fsState)
+   containerWithMocks.uiOrchestrator().start_with_bot(qtbot)
+
+   mainWindow = containerWithMocks.mainWindow()
+   while ( mainWindow.isVisible() is False ):
+      QTest.qWait(200)
+   builtAtStartup = mainWindow.pages[PageName.GALLERY].widget is not None
+
+   # Act
+   with qtbot.waitSignal(mainWindow.pageCreatedSignal, timeout=5000) as created:
+      mainWindow.route_to_page(PageName.GALLERY)
+   gallery = created.args[1]
+   qtbot.waitUntil(lambda: gallery.gallery.contentWidget.layout().count() == 1) # pages are read in the background
+
+   # Assert
+   assert builtAtStartup is False
+   assert gallery is containerWithMocks.gallery()
+   assert mainWindow.central_widget.currentWidget() is gallery
+   assert gallery.loaded is True
+   assert gallery.gallery.contentWidget.layout().itemAt(0).widget().image_meta.prompt == "Shrek Eat Chips"
+
+
+@pytest.mark.timeout(10)
+def test_home_page_reads_latest_image_in_background(containerWithMocks: Container, qtbot: QtBot, fs: FakeFilesystem):
+   """
+   Given application with images but no startup snapshot
+   When it starts on the home page
+   Then the page comes up without an image and shows the latest image once it's read in the background
+   """
+
+   # Arrange
+   repoManager = containerWithMocks.repoManager()
+   repoConfiguredPath = repoManager.current_repo_abs_path()
+   fsState = {"2024-01-14": {"03:03:45.522668_Shrek Eat Chips": ["1.png"]}}
+   populate_fs_with(fs,repoConfiguredPath, dateDictStructure=fsState)
+
+   # Hold the background read back until the page is up
+   readAllowed = threading.Event()
+   getLatestImages = repoManager.get_latest_images_in_repo
+   def held_get_latest_images(*args, **kwargs):
+      readAllowed.wait(timeout=5)
+      return getLatestImages(*args, **kwargs)
+   repoManager.get_latest_images_in_repo = held_get_latest_images
+
+   # Act
+   homePage = containerWithMocks.home()
+   shownRightAway = homePage.imageViewer.has_photo()
+   readAllowed.set()
+   qtbot.waitUntil(homePage.imageViewer.has_photo, timeout=5000)
+
+   # Assert
+   assert shownRightAway is False
+   assert homePage.imageMetaInfo.prompt == "Shrek Eat Chips"
+   assert homePage.showingPreview is False
+
+
+@pytest.mark.timeout(10)
+def test_verifying_startup_snapshot_does_not_read_latest_image_twice(containerWithMocks: Container, qtbot: QtBot, fs: FakeFilesystem):
+   """
+   Given application with images but no startup snapshot
+   When the snapshot is verified while the home page is still reading the latest image
+   Then the latest image is read only once
+   """
+
+   # Arrange
+   repoManager = containerWithMocks.repoManager()
+   repoConfiguredPath = repoManager.current_repo_abs_path()
+   fsState = {"2024-01-14": {"03:03:45.522668_Shrek Eat Chips": ["1.png"]}}
+   populate_fs_with(fs,repoConfiguredPath, dateDictStructure=fsState)
+
+   # Hold the background read back until the snapshot was verified
+   readAllowed = threading.Event()
+   reads = []
+   getLatestImages = repoManager.get_latest_images_in_repo
+   def held_get_latest_images(*args, **kwargs):
+      reads.append(args)
+      readAllowed.wait(timeout=5)
+      return getLatestImages(*args, **kwargs)
+   repoManager.get_latest_images_in_repo = held_get_latest_images
+   homePage = containerWithMocks.home()
+
+   # Act
+   with qtbot.waitSignal(homePage.replacePreviewSignal, timeout=5000):
+      containerWithMocks.uiOrchestrator().verify_startup_snapshot()
+   QTest.qWait(200)
+   readAllowed.set()
+   qtbot.waitUntil(homePage.imageViewer.has_photo, timeout=5000)
+
+   # Assert
+   assert len(reads) == 1
+   assert homePage.imageMetaInfo.prompt == "Shrek Eat Chips"
@@ -2,6 +2,8 @@
 """
 Integration Tests For Gallery Page
 """
+import threading
+
 import pytest
 from depdencyInjection.Container import Container
 
@@ -11,6 +13,8 @@ from pyfakefs.fake_filesystem import FakeFilesystem
 from PyQt5.QtTest import QTest
 from PyQt5.QtCore import Qt
 
+from ui.widgets.gallery.GalleryPage import PageLink
+from utils.pathingUtils import read_file_as_bytes
 from utils_for_test import populate_fs_with
 
 
@@ -32,7 +36,8 @@ def test_gallery_loads_correctly(containerWithMocks: Container, qtbot: QtBot, fs
     # Act
     gallery = containerWithMocks.gallery()
     qtbot.addWidget(gallery)
-    gallery.show()
+    with qtbot.waitSignal(gallery.pageLoadedSignal, timeout=5000): # pages are read in the background
+        gallery.show()
 
     # Assert   
     while ( gallery.isVisible() is False ):
@@ -76,7 +81,8 @@ def test_gallery_loads_with_images(containerWithMocks: Container, qtbot: QtBot,
     # Act
     gallery = containerWithMocks.gallery()
     qtbot.addWidget(gallery)
-    gallery.show()
+    with qtbot.waitSignal(gallery.pageLoadedSignal, timeout=5000): # pages are read in the background
+        gallery.show()
 
     # Assert   
     while ( gallery.isVisible() is False ):
@@ -123,7 +129,8 @@ def test_gallery_forward_button_click(containerWithMocks: Container, qtbot: QtBo
 
     gallery = containerWithMocks.gallery()
     qtbot.addWidget(gallery)
-    gallery.show()
+    with qtbot.waitSignal(gallery.pageLoadedSignal, timeout=5000): # pages are read in the background
+        gallery.show()
     while ( gallery.isVisible() is False ):
         QTest.qWait(200)
 
@@ -140,3 +147,254 @@ def test_gallery_forward_button_click(containerWithMocks: Container, qtbot: QtBo
     assert gallery.gallery.contentWidget.layout().itemAt(0).widget() is not None
     assert gallery.gallery.contentWidget.layout().itemAt(1).widget() is not None
     assert gallery.current_page.text == "2"
+
+
+@pytest.mark.timeout(20)
+def test_gallery_refreshes_on_repo_change(containerWithMocks: Container, qtbot: QtBot, fs: FakeFilesystem):
+    """
+    Given gallery showing the first page
+    When a prompt directory is added to the repo from outside of the app
+    Then the first page is refreshed to show it
+    """
+
+    # Arrange
+    repoManager = containerWithMocks.repoManager()
+
+    # Setup fake file system
+    fsState = {
+        "2024-01-13": {
+            "03:03:45.522668_Fiona Eat Chips": ["1.png"],
+        }
+    }
+    populate_fs_with(fs, repoManager.current_repo_abs_path(), fsState)
+
+    gallery = containerWithMocks.gallery()
+    qtbot.addWidget(gallery)
+    with qtbot.waitSignal(gallery.pageLoadedSignal, timeout=5000): # pages are read in the background
+        gallery.show()
+    while ( gallery.isVisible() is False ):
+        QTest.qWait(200)
+    qtbot.waitUntil(lambda: gallery.imageCount is not None) # the repo is counted in the background
+
+    # Act
+    populate_fs_with(fs, repoManager.current_repo_abs_path(), {"2024-01-14": {"03:03:45.522668_Shrek Eat Chips": ["1.png"]}})
+    changed = repoManager.apply_external_changes(["2024-01-14"]) # what the repo watcher does when it sees the new date
+    with qtbot.waitSignal(gallery.pageLoadedSignal, timeout=5000):
+        gallery.repoChangedSignal.emit(changed)
+
+    # Assert
+    assert gallery.gallery.contentWidget.layout().count() == 2
+    assert gallery.gallery.contentWidget.layout().itemAt(0).widget().image_meta.prompt == "Shrek Eat Chips"
+    assert gallery.current_page.text == "1"
+
+
+@pytest.mark.timeout(20)
+def test_gallery_prefetches_next_page(containerWithMocks: Container, qtbot: QtBot, fs: FakeFilesystem):
+    """
+    Given gallery showing the first of two pages
+    When the prefetch finishes and the user clicks forward
+    Then the second page comes from the page cache
+    """
+
+    # Arrange
+    repoManager = containerWithMocks.repoManager()
+
+    # Setup fake file system
+    fsState = {
+        "2024-01-14": {f"03:03:45.5226{i:02d}_Shrek Eat Chips{i}": ["1.png"] for i in range(12)}
+    }
+    populate_fs_with(fs, repoManager.current_repo_abs_path(), fsState)
+
+    gallery = containerWithMocks.gallery()
+    qtbot.addWidget(gallery)
+    with qtbot.waitSignal(gallery.pageLoadedSignal, timeout=5000): # pages are read in the background
+        gallery.show()
+    while ( gallery.isVisible() is False ):
+        QTest.qWait(200)
+    [nextPagePrefetch] = gallery.prefetches
+    nextPagePrefetch.result(timeout=10)
+    hitsBefore = repoManager.page_cache_stats()['hits']
+
+    # Act
+    with qtbot.waitSignal(gallery.pageLoadedSignal, timeout=5000):
+        QTest.mouseClick(gallery.forward_page_button, Qt.LeftButton)
+
+    # Assert
+    assert repoManager.page_cache_stats()['hits'] == hitsBefore + 1
+    assert gallery.gallery.contentWidget.layout().count() == 2
+    assert gallery.current_page.text == "2"
+
+
+@pytest.mark.timeout(20)
+def test_gallery_jumps_to_last_and_linked_pages(containerWithMocks: Container, qtbot: QtBot, fs: FakeFilesystem):
+    """
+    Given gallery with three pages
+    When user clicks the last page button and then the link to page 2
+    Then those pages are shown directly
+    """
+
+    # Arrange
+    repoManager = containerWithMocks.repoManager()
+
+    # Setup fake file system
+    fsState = {
+        "2024-01-14": {f"03:03:45.5226{i:02d}_Shrek Eat Chips{i}": ["1.png"] for i in range(25)}
+    }
+    populate_fs_with(fs, repoManager.current_repo_abs_path(), fsState)
+
+    gallery = containerWithMocks.gallery()
+    qtbot.addWidget(gallery)
+    with qtbot.waitSignal(gallery.pageLoadedSignal, timeout=5000): # pages are read in the background
+        gallery.show()
+    while ( gallery.isVisible() is False ):
+        QTest.qWait(200)
+
+    qtbot.waitUntil(lambda: gallery.last_page_button.isEnabled()) # enabled once the repo was counted in the background
+
+    # Act
+    QTest.mouseClick(gallery.last_page_button, Qt.LeftButton)
+    qtbot.waitUntil(lambda: gallery.current_page.text == "3") # the token of the page is found in the background
+    lastPageCount = gallery.gallery.contentWidget.layout().count()
+    lastPageNum = gallery.current_page.text
+    [pageTwoLink] = [link for link in gallery.findChildren(PageLink) if link.text == "2"]
+    QTest.mouseClick(pageTwoLink, Qt.LeftButton)
+    qtbot.waitUntil(lambda: gallery.current_page.text == "2")
+
+    # Assert
+    assert lastPageCount == 5
+    assert lastPageNum == "3"
+    assert gallery.current_page.text == "2"
+    assert gallery.gallery.contentWidget.layout().count() == 10
+    assert gallery.gallery.contentWidget.layout().itemAt(0).widget().image_meta.prompt == "Shrek Eat Chips14"
+    assert gallery.forward_page_button.isEnabled()
+    assert gallery.backward_page_button.isEnabled()
+
+
+@pytest.mark.timeout(20)
+def test_gallery_search_box_filters_images(containerWithMocks: Container, qtbot: QtBot, fs: FakeFilesystem):
+    """
+    Given gallery showing every image
+    When user searches for a word and then clears the search
+    Then only matching images are shown until the search is cleared
+    """
+
+    # Arrange
+    repoManager = containerWithMocks.repoManager()
+
+    # Setup fake file system
+    fsState = {
+        "2024-01-14": {f"03:03:45.5226{i:02d}_{'Shrek' if i % 2 else 'Donkey'} Eat Chips{i}": ["1.png"] for i in range(25)}
+    }
+    populate_fs_with(fs, repoManager.current_repo_abs_path(), fsState)
+
+    gallery = containerWithMocks.gallery()
+    qtbot.addWidget(gallery)
+    with qtbot.waitSignal(gallery.pageLoadedSignal, timeout=5000): # pages are read in the background
+        gallery.show()
+    while ( gallery.isVisible() is False ):
+        QTest.qWait(200)
+
+    # Act
+    QTest.keyClicks(gallery.search_box, "shrek")
+    with qtbot.waitSignal(gallery.pageLoadedSignal, timeout=5000):
+        QTest.keyClick(gallery.search_box, Qt.Key_Return)
+    searchPrompts = [gallery.gallery.contentWidget.layout().itemAt(i).widget().image_meta.prompt for i in range(gallery.gallery.contentWidget.layout().count())]
+    with qtbot.waitSignal(gallery.pageLoadedSignal, timeout=5000):
+        QTest.mouseClick(gallery.forward_page_button, Qt.LeftButton)
+    secondSearchPageCount = gallery.gallery.contentWidget.layout().count()
+    secondSearchPageNum = gallery.current_page.text
+    lastPageEnabledWhileSearching = gallery.last_page_button.isEnabled()
+    gallery.search_box.clear()
+    with qtbot.waitSignal(gallery.pageLoadedSignal, timeout=5000):
+        QTest.keyClick(gallery.search_box, Qt.Key_Return)
+    qtbot.waitUntil(lambda: gallery.last_page_button.isEnabled())
+
+    # Assert
+    assert searchPrompts == [f"Shrek Eat Chips{i}" for i in range(23, 4, -2)]
+    assert secondSearchPageCount == 2
+    assert secondSearchPageNum == "2"
+    assert lastPageEnabledWhileSearching is False
+    assert gallery.gallery.contentWidget.layout().count() == 10
+    assert gallery.current_page.text == "1"
+    assert gallery.last_page_button.isEnabled()
+
+
+@pytest.mark.timeout(20)
+def test_gallery_image_click_reads_image_in_background(containerWithMocks: Container, qtbot: QtBot, fs: FakeFilesystem):
+    """
+    Given a gallery showing an image
+    When user clicks the image
+    Then the full image is read off the UI thread and emitted with its meta info
+    """
+
+    # Arrange
+    repoManager = containerWithMocks.repoManager()
+
+    # Setup fake file system
+    fsState = {
+        "2024-01-14": {
+            "03:03:45.522668_Shrek Eat Chips": ["1.png"],
+        }
+    }
+    populate_fs_with(fs, repoManager.current_repo_abs_path(), fsState)
+    imagePath = repoManager.current_repo_abs_path()/"2024-01-14"/"03:03:45.522668_Shrek Eat Chips"/"1.png"
+
+    gallery = containerWithMocks.gallery()
+    qtbot.addWidget(gallery)
+    with qtbot.waitSignal(gallery.pageLoadedSignal, timeout=5000): # pages are read in the background
+        gallery.show()
+    while ( gallery.isVisible() is False ):
+        QTest.qWait(200)
+    imageDisplay = gallery.gallery.contentWidget.layout().itemAt(0).widget()
+
+    # Act
+    with qtbot.waitSignal(gallery.imageClickedSignal, timeout=5000) as clicked:
+        QTest.mouseClick(imageDisplay.image_label, Qt.LeftButton)
+
+    # Assert
+    metaInfo, imageBytes = clicked.args
+    assert metaInfo.prompt == "Shrek Eat Chips"
+    assert metaInfo.date == "2024-01-14"
+    assert imageBytes == read_file_as_bytes(imagePath)
+
+
+@pytest.mark.timeout(20)
+def test_gallery_drops_page_read_after_another_page_asked_for(containerWithMocks: Container, qtbot: QtBot, fs: FakeFilesystem, monkeypatch):
+    """
+    Given gallery showing the first of two pages
+    When user clicks forward and goes back to the first page before the second page was read
+    Then the UI isn't blocked on the read and the second page is dropped once read
+    """
+
+    # Arrange
+    repoManager = containerWithMocks.repoManager()
+
+    # Setup fake file system
+    fsState = {
+        "2024-01-14": {f"03:03:45.5226{i:02d}_Shrek Eat Chips{i}": ["1.png"] for i in range(12)}
+    }
+    populate_fs_with(fs, repoManager.current_repo_abs_path(), fsState)
+
+    gallery = containerWithMocks.gallery()
+    qtbot.addWidget(gallery)
+    with qtbot.waitSignal(gallery.pageLoadedSignal, timeout=5000):
+        gallery.show()
+    secondPageRead = threading.Event()
+    getImages = repoManager.get_images
+    def slow_get_images(number, token=None, **kwargs):
+        if token is not None:
+            secondPageRead.wait(timeout=10)
+        return getImages(number, token=token, **kwargs)
+    monkeypatch.setattr(repoManager, "get_images", slow_get_images)
+
+    # Act
+    QTest.mouseClick(gallery.forward_page_button, Qt.LeftButton)
+    with qtbot.waitSignals([gallery.pageLoadedSignal, gallery.pageLoadedSignal], timeout=5000):
+        gallery.init_page()
+        secondPageRead.set()
+
+    # Assert
+    assert gallery.gallery.contentWidget.layout().count() == 10
+    assert gallery.gallery.contentWidget.layout().itemAt(0).widget().image_meta.prompt == "Shrek Eat Chips11"
+    assert gallery.current_page.text == "1"
+    assert gallery.forward_page_button.isEnabled()
@@ -0,0 +1,42 @@
+from pathlib import Path
+
+import pytest
+
+from utils.pathingUtils import atomic_write_bytes
+
+
+def test_atomic_write_replaces_file(tmp_path: Path):
+    """
+    Given existing file
+    When atomically written over
+    Then file has the new contents and no temporary file is left
+    """
+    # Arrange
+    path = tmp_path/"1.png"
+    path.write_bytes(b"old")
+
+    # Act
+    atomic_write_bytes(path, b"new")
+
+    # Assert
+    assert path.read_bytes() == b"new"
+    assert [p.name for p in tmp_path.iterdir()] == ["1.png"]
+
+
+def test_failed_atomic_write_keeps_old_file(tmp_path: Path):
+    """
+    Given existing file
+    When writing over it fails part way
+    Then the old contents are untouched and the temporary file is cleaned up
+    """
+    # Arrange
+    path = tmp_path/"1.png"
+    path.write_bytes(b"old")
+
+    # Act
+    with pytest.raises(TypeError):
+        atomic_write_bytes(path, "not bytes")
+
+    # Assert
+    assert path.read_bytes() == b"old"
+    assert [p.name for p in tmp_path.iterdir()] == ["1.png"]
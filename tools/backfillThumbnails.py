@@ -0,0 +1,39 @@
+
+import argparse
+import logging
+from pathlib import Path
+
+import sys
+
+sys.path.append(Path(__file__).parent.parent.as_posix()+"/src") # Add src directory to python path so we can access src modules
+
+from repoManager.RepoManager import RepoManager
+
+from utils.pathingUtils import get_or_create_image_repos
+
+
+def main() -> None:
+    """
+    Makes thumbnails for every image saved before thumbnails were added to PAIID.
+
+    Should be run once on existing installs (ex: `python3 tools/backfillThumbnails.py`). Its safe to run again since images
+    that already have a thumbnail are skipped.
+    """
+    parser = argparse.ArgumentParser(description="Backfill gallery thumbnails for existing image repos")
+    parser.add_argument("--repos", default=get_or_create_image_repos(), help="path to the image repos")
+    parser.add_argument("--repo", action="append", help="repo to backfill. Can be given multiple times. Defaults to every repo")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    reposPath = Path(args.repos)
+    repos = args.repo if args.repo else [entry.name for entry in reposPath.iterdir() if entry.is_dir() and not entry.name.startswith(".")]
+
+    for repo in repos:
+        repoManager = RepoManager(reposPath, repo)
+        made = repoManager.backfill_thumbnails()
+        print(f'{repo}: made {made} thumbnails')
+
+
+if __name__ == "__main__":
+    main()
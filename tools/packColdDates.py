@@ -0,0 +1,42 @@
+
+import argparse
+import logging
+from pathlib import Path
+
+import sys
+
+sys.path.append(Path(__file__).parent.parent.as_posix()+"/src") # Add src directory to python path so we can access src modules
+
+from repoManager.RepoManager import DEFAULT_PACK_AFTER_DAYS, RepoManager
+
+from utils.pathingUtils import get_or_create_image_repos
+
+
+def main() -> None:
+    """
+    Packs the prompt directories of old dates into one file per date so years of history don't leave hundreds of thousands
+    of tiny directories on the SD card.
+
+    Can be run periodically (ex: from cron with `python3 tools/packColdDates.py`). Its safe to run again since only
+    directories added since the last run are packed.
+    """
+    parser = argparse.ArgumentParser(description="Pack old dates of image repos into one file per date")
+    parser.add_argument("--repos", default=get_or_create_image_repos(), help="path to the image repos")
+    parser.add_argument("--repo", action="append", help="repo to pack. Can be given multiple times. Defaults to every repo")
+    parser.add_argument("--days", type=int, default=DEFAULT_PACK_AFTER_DAYS, help="only pack dates at least this many days old")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    reposPath = Path(args.repos)
+    repos = args.repo if args.repo else [entry.name for entry in reposPath.iterdir() if entry.is_dir() and not entry.name.startswith(".")]
+
+    for repo in repos:
+        repoManager = RepoManager(reposPath, repo)
+        packed = repoManager.pack_cold_dates(olderThanDays=args.days)
+        repoManager.close()
+        print(f'{repo}: packed {packed} prompt directories')
+
+
+if __name__ == "__main__":
+    main()
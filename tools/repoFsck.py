@@ -0,0 +1,80 @@
+
+import argparse
+import logging
+from pathlib import Path
+
+import sys
+
+sys.path.append(Path(__file__).parent.parent.as_posix()+"/src") # Add src directory to python path so we can access src modules
+
+from repoManager.RepoFsck import DEFAULT_TEMPORARY_FILE_MIN_AGE_SECONDS, FsckReport, RepoFsck
+from repoManager.RepoManager import RepoManager
+
+from utils.pathingUtils import get_or_create_image_repos
+
+
+def print_report(report: FsckReport, verbose: bool):
+    found = [
+        ("corrupt images", [f'{path} ({problem})' for path, problem in report.corruptImages]),
+        ("temporary files", report.temporaryFiles),
+        ("empty prompt directories", report.emptyPromptDirectories),
+        ("empty date directories", report.emptyDateDirectories),
+        ("orphan thumbnails", report.orphanThumbnails),
+        ("stray files (not removed)", report.strayFiles),
+        ("corrupt packs (not removed)", report.corruptPacks),
+    ]
+    print(f'{report.repo}: {report.problem_count()} problems{" repaired" if report.repaired else ""}')
+    for name, items in found:
+        if len(items) == 0:
+            continue
+        print(f'  {len(items)} {name}')
+        if verbose:
+            for item in items:
+                print(f'    {item}')
+    print(
+        f'  checked {report.imagesChecked} images ({report.bytesChecked / (1024 * 1024):.1f} MiB) in {report.seconds:.2f} s'
+        f', {report.images_per_second():.0f} images/s'
+    )
+
+
+def main() -> None:
+    """
+    Checks image repos for what power losses leave behind (empty or truncated images, temporary files, empty directories,
+    orphan thumbnails) and optionally repairs them, rebuilding the index and thumbnails of every repaired repo.
+
+    Run with `python3 tools/repoFsck.py` to only report, add `--repair` to fix what was found.
+    Temporary files younger than `--temporary-min-age` seconds may belong to a save still in progress and are left alone.
+    Repairs rebuild the index of the repo so they are best run while the app is closed.
+    Exits with 1 when problems were found, or with `--repair` when some of them can't be repaired.
+    """
+    parser = argparse.ArgumentParser(description="Check and repair image repos")
+    parser.add_argument("--repos", default=get_or_create_image_repos(), help="path to the image repos")
+    parser.add_argument("--repo", action="append", help="repo to check. Can be given multiple times. Defaults to every repo")
+    parser.add_argument("--repair", action="store_true", help="remove what's broken and rebuild indexes and caches")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes, defaults to one per cpu")
+    parser.add_argument(
+        "--temporary-min-age", type=float, default=DEFAULT_TEMPORARY_FILE_MIN_AGE_SECONDS,
+        help="only treat temporary files not modified for this many seconds as leftovers, so saves of a running app are never removed"
+    )
+    parser.add_argument("--verbose", action="store_true", help="list every problem found")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    reposPath = Path(args.repos)
+    repos = args.repo if args.repo else [entry.name for entry in reposPath.iterdir() if entry.is_dir() and not entry.name.startswith(".")]
+
+    # Everything found when only reporting, what couldn't be repaired otherwise
+    problems = 0
+    for repo in repos:
+        repoManager = RepoManager(reposPath, repo)
+        report = RepoFsck(repoManager, workers=args.workers, temporaryFileMinAge=args.temporary_min_age).check(repair=args.repair)
+        repoManager.close()
+        print_report(report, args.verbose)
+        problems += report.unrepaired_count() if args.repair else report.problem_count()
+
+    sys.exit(1 if problems > 0 else 0)
+
+
+if __name__ == "__main__":
+    main()